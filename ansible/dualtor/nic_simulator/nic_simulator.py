@@ -75,11 +75,15 @@ def get_ip_address(ifname):
     return addr
 
 
-def run_command(cmd, check=True):
-    """Run a command."""
+def run_command(cmd, check=True, input_data=None):
+    """Run a command, input_data is written to its stdin."""
     logging.debug("COMMAND: %s", cmd)
+    if input_data is not None:
+        logging.debug("COMMAND STDIN:\n%s\n", input_data)
+        input_data = input_data.encode()
     result = subprocess.run(
         cmd,
+        input=input_data,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
         shell=True,
@@ -104,6 +108,8 @@ class OVSCommand(object):
     OVS_OFCTL_DEL_GROUPS_CMD = "ovs-ofctl -O OpenFlow13 del-groups {bridge_name}"
     OVS_OFCTL_ADD_GROUP_CMD = "ovs-ofctl -O OpenFlow13 add-group {bridge_name} {group}"
     OVS_OFCTL_MOD_GROUP_CMD = "ovs-ofctl -O OpenFlow13 mod-group {bridge_name} {group}"
+    # bundles need OpenFlow14 and above
+    OVS_OFCTL_BUNDLE_CMD = "ovs-ofctl -O OpenFlow14 bundle {bridge_name} -"
 
     @staticmethod
     def setup_openflow_version():
@@ -122,6 +128,7 @@ class OVSCommand(object):
                 OVSCommand.OVS_OFCTL_DEL_GROUPS_CMD = "ovs-ofctl -O OpenFlow15 del-groups {bridge_name}"
                 OVSCommand.OVS_OFCTL_ADD_GROUP_CMD = "ovs-ofctl -O OpenFlow15 add-group {bridge_name} {group}"
                 OVSCommand.OVS_OFCTL_MOD_GROUP_CMD = "ovs-ofctl -O OpenFlow15 mod-group {bridge_name} {group}"
+                OVSCommand.OVS_OFCTL_BUNDLE_CMD = "ovs-ofctl -O OpenFlow15 bundle {bridge_name} -"
         except Exception:
             raise ValueError("Failed to find/setup openflow version: %s" % out.stdout)
 
@@ -157,6 +164,12 @@ class OVSCommand(object):
     def ovs_ofctl_mod_groups(bridge_name, group):
         return run_command(OVSCommand.OVS_OFCTL_MOD_GROUP_CMD.format(bridge_name=bridge_name, group=group))
 
+    @staticmethod
+    def ovs_ofctl_bundle(bridge_name, mods):
+        """Apply flow and group mods as one atomic transaction, mods are lines like 'flow add <flow>'."""
+        return run_command(OVSCommand.OVS_OFCTL_BUNDLE_CMD.format(bridge_name=bridge_name),
+                           input_data="\n".join(mods) + "\n")
+
 
 class StrObj(abc.ABC):
     """Abstract class defines objects that could be represented as a string."""
@@ -431,9 +444,22 @@ class OVSBridge(object):
         "upstream_lower_tor_loopback3_flow",
         "upstream_arp_flow",
         "upstream_icmpv6_flow",
-        "flap_counter"
+        "flap_counter",
+        "pending_mods"
     )
 
+    # types of the flow and group mods, same as the keywords in ovs-ofctl bundle file
+    FLOW_ADD = "flow add"
+    FLOW_MOD = "flow modify_strict"
+    GROUP_ADD = "group add"
+    GROUP_MOD = "group modify"
+    MOD_COMMANDS = {
+        FLOW_ADD: OVSCommand.ovs_ofctl_add_flow,
+        FLOW_MOD: OVSCommand.ovs_ofctl_mod_flow,
+        GROUP_ADD: OVSCommand.ovs_ofctl_add_group,
+        GROUP_MOD: OVSCommand.ovs_ofctl_mod_groups
+    }
+
     def __init__(self, bridge_name, loopback_ips, duplicate_nic_upstream=False):
         self.bridge_name = bridge_name
         self.loopback2_ip = loopback_ips[0]
@@ -449,6 +475,7 @@ class OVSBridge(object):
         self.upstream_ecmp_group = None
         self.flows = []
         self.groups = []
+        self.pending_mods = None
         self._init_ports()
         self._init_flows(duplicate_nic_upstream)
         self.states_getter = {
@@ -502,6 +529,10 @@ class OVSBridge(object):
         logging.info("Init flows for bridge %s", self.bridge_name)
         self._del_flows()
         self._del_groups()
+        with self.transaction():
+            self._add_init_flows(duplicate_nic_upstream)
+
+    def _add_init_flows(self, duplicate_nic_upstream):
         # downstream flows
         self.downstream_upper_tor_flow = self._add_flow(self.upper_tor_port,
                                                         output_ports=[self.ptf_port, self.server_nic], priority=11)
@@ -586,6 +617,48 @@ class OVSBridge(object):
             priority=4
         )
 
+    @contextlib.contextmanager
+    def transaction(self):
+        """
+        Accumulate the flow and group mods made in the context, and apply them in one
+        ovs-ofctl bundle when the outermost transaction exits.
+
+        The mods are applied even if the context raises, so the bridge stays consistent
+        with the flow and group objects.
+        """
+        with self.lock:
+            if self.pending_mods is not None:
+                yield
+                return
+            self.pending_mods = {}
+            try:
+                yield
+            finally:
+                mods, self.pending_mods = self.pending_mods, None
+                self._apply_mods(list(mods.values()))
+
+    def _apply_mod(self, mod_type, obj):
+        """Apply a flow or group mod, or add it to the current transaction."""
+        with self.lock:
+            if self.pending_mods is None:
+                self._apply_mods([(mod_type, obj)])
+            else:
+                # an object modified several times in a transaction is applied once with
+                # its final string representation
+                self.pending_mods.setdefault(id(obj), (mod_type, obj))
+
+    def _apply_mods(self, mods):
+        if len(mods) > 1:
+            try:
+                OVSCommand.ovs_ofctl_bundle(self.bridge_name, ["%s %s" % (mod_type, obj) for mod_type, obj in mods])
+                return
+            except subprocess.CalledProcessError as e:
+                # bundles are atomic, none of the mods is applied if the bundle fails
+                logging.warning("Failed to apply bundle to bridge %s, apply the mods one by one: %s",
+                                self.bridge_name, e.stderr)
+        for mod_type, obj in mods:
+            self.MOD_COMMANDS[mod_type](self.bridge_name, obj)
+
     def _get_ports(self):
         result = OVSCommand.ovs_vsctl_list_ports(self.bridge_name)
         return result.stdout.split()
@@ -609,7 +682,7 @@ class OVSBridge(object):
             flow = OVSFlow(in_port, packet_filter=packet_filter, output_ports=output_ports,
                            group=group, priority=priority)
         logging.info("Add flow to bridge %s: %s", self.bridge_name, flow)
-        OVSCommand.ovs_ofctl_add_flow(self.bridge_name, flow)
+        self._apply_mod(self.FLOW_ADD, flow)
         self.flows.append(flow)
         return flow
 
@@ -617,7 +690,7 @@ class OVSBridge(object):
         group = UpstreamECMPGroup(group_id, upper_tor_port, lower_tor_port)
         logging.info("Add upstream ecmp group to bridge %s: %s",
                      self.bridge_name, group)
-        OVSCommand.ovs_ofctl_add_group(self.bridge_name, group)
+        self._apply_mod(self.GROUP_ADD, group)
         self.groups.append(group)
         return group
 
@@ -625,19 +698,23 @@ class OVSBridge(object):
         flow = UpstreamECMPFlow(in_port, group, priority=priority)
         logging.info("Add upstream ecmp flow to bridge %s: %s",
                      self.bridge_name, flow)
-        OVSCommand.ovs_ofctl_add_flow(self.bridge_name, flow)
+        self._apply_mod(self.FLOW_ADD, flow)
         self.flows.append(flow)
         return flow
 
     def set_forwarding_state(self, portids, states):
         """Set forwarding state."""
         with self.lock:
+            changed = False
             for portid, state in zip(portids, states):
                 logging.info("Set bridge %s port %s forwarding state: %s",
                              self.bridge_name, portid, ForwardingState.STATE_LABELS[state])
-                self.flap_counter[portid] += self.states_setter[portid](state)
-            OVSCommand.ovs_ofctl_mod_groups(
-                self.bridge_name, self.upstream_ecmp_group)
+                is_changed = self.states_setter[portid](state)
+                self.flap_counter[portid] += is_changed
+                changed |= is_changed
+            # all the ports share the upstream ECMP group, modify it once
+            if changed:
+                self._apply_mod(self.GROUP_MOD, self.upstream_ecmp_group)
             return self.query_forwarding_state(portids)
 
     def query_forwarding_state(self, portids):
@@ -652,7 +729,7 @@ class OVSBridge(object):
         """Set drop on a link."""
         logging.info("Set drop on bridge %s: portids=%s, directions=%s, recover=%s"
                      % (self.bridge_name, portids, directions, recover))
-        with self.lock:
+        with self.transaction():
             result = []
             for portid, direction in zip(portids, directions):
                 downstream_flow = self.downstream_flows[portid]
@@ -663,8 +740,7 @@ class OVSBridge(object):
                     # recover downstream
                     if downstream_flow.drop:
                         downstream_flow.set_drop(recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, downstream_flow)
+                        self._apply_mod(self.FLOW_MOD, downstream_flow)
 
                     # recover upstream
                     # recover upstream traffic from server NiC
@@ -672,111 +748,92 @@ class OVSBridge(object):
                         if self.upstream_upper_tor_nic_flow.get_drop(portid):
                             self.upstream_upper_tor_nic_flow.set_drop(
                                 portid=portid, recover=recover)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_upper_tor_nic_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_upper_tor_nic_flow)
                     if self.upstream_lower_tor_nic_flow.get_port_enable(portid):
                         if self.upstream_lower_tor_nic_flow.get_drop(portid):
                             self.upstream_lower_tor_nic_flow.set_drop(
                                 portid=portid, recover=recover)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_lower_tor_nic_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_lower_tor_nic_flow)
                     if self.upstream_nic_flow.get_drop(portid):
                         self.upstream_nic_flow.set_drop(
                             portid=portid, recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, self.upstream_nic_flow)
+                        self._apply_mod(self.FLOW_MOD, self.upstream_nic_flow)
                     # recover upstream loopback2 traffic from ptf
                     if self.upstream_loopback2_flow.get_drop(portid):
                         self.upstream_loopback2_flow.set_drop(
                             portid=portid, recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, self.upstream_loopback2_flow)
+                        self._apply_mod(self.FLOW_MOD, self.upstream_loopback2_flow)
                     # recover upstream upper ToR loopback3 traffic from ptf
                     if self.upstream_upper_tor_loopback3_flow.get_drop(portid):
                         self.upstream_upper_tor_loopback3_flow.set_drop(
                             portid=portid, recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, self.upstream_upper_tor_loopback3_flow)
+                        self._apply_mod(self.FLOW_MOD, self.upstream_upper_tor_loopback3_flow)
                     # recover upstream lower ToR loopback3 traffic from ptf
                     if self.upstream_lower_tor_loopback3_flow.get_drop(portid):
                         self.upstream_lower_tor_loopback3_flow.set_drop(
                             portid=portid, recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, self.upstream_lower_tor_loopback3_flow)
+                        self._apply_mod(self.FLOW_MOD, self.upstream_lower_tor_loopback3_flow)
                     # recover upstream arp traffic from ptf
                     if self.upstream_arp_flow.get_drop(portid):
                         self.upstream_arp_flow.set_drop(
                             portid=portid, recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, self.upstream_arp_flow)
+                        self._apply_mod(self.FLOW_MOD, self.upstream_arp_flow)
                     # recover upstream icmpv6 traffic from ptf
                     if self.upstream_icmpv6_flow.get_drop(portid):
                         self.upstream_icmpv6_flow.set_drop(
                             portid=portid, recover=recover)
-                        OVSCommand.ovs_ofctl_mod_flow(
-                            self.bridge_name, self.upstream_icmpv6_flow)
+                        self._apply_mod(self.FLOW_MOD, self.upstream_icmpv6_flow)
 
                     forwarding_state = forwarding_state_getter()
                     if forwarding_state == ForwardingState.STANDBY:
                         forwarding_state_setter(ForwardingState.ACTIVE)
-                        OVSCommand.ovs_ofctl_mod_groups(
-                            self.bridge_name, self.upstream_ecmp_group)
+                        self._apply_mod(self.GROUP_MOD, self.upstream_ecmp_group)
                 else:
                     if direction == 0:
                         # downstream
                         if not downstream_flow.drop:
                             downstream_flow.set_drop()
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, downstream_flow)
+                            self._apply_mod(self.FLOW_MOD, downstream_flow)
                     elif direction == 1:
                         # upstream
                         # drop upstream traffic from server NiC
                         if self.upstream_upper_tor_nic_flow.get_port_enable(portid):
                             if not self.upstream_upper_tor_nic_flow.get_drop(portid):
                                 self.upstream_upper_tor_nic_flow.set_drop(portid)
-                                OVSCommand.ovs_ofctl_mod_flow(
-                                    self.bridge_name, self.upstream_upper_tor_nic_flow)
+                                self._apply_mod(self.FLOW_MOD, self.upstream_upper_tor_nic_flow)
                         if self.upstream_lower_tor_nic_flow.get_port_enable(portid):
                             if not self.upstream_lower_tor_nic_flow.get_drop(portid):
                                 self.upstream_lower_tor_nic_flow.set_drop(portid)
-                                OVSCommand.ovs_ofctl_mod_flow(
-                                    self.bridge_name, self.upstream_lower_tor_nic_flow)
+                                self._apply_mod(self.FLOW_MOD, self.upstream_lower_tor_nic_flow)
                         if not self.upstream_nic_flow.get_drop(portid):
                             self.upstream_nic_flow.set_drop(portid)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_nic_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_nic_flow)
                         # drop upstream loopback2 traffic from ptf
                         if not self.upstream_loopback2_flow.get_drop(portid):
                             self.upstream_loopback2_flow.set_drop(portid)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_loopback2_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_loopback2_flow)
                         # drop upstream upper ToR loopback3 traffic from ptf
                         if not self.upstream_upper_tor_loopback3_flow.get_drop(portid):
                             self.upstream_upper_tor_loopback3_flow.set_drop(portid)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_upper_tor_loopback3_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_upper_tor_loopback3_flow)
                         # drop upstream lower ToR loopback3 traffic from ptf
                         if not self.upstream_lower_tor_loopback3_flow.get_drop(portid):
                             self.upstream_lower_tor_loopback3_flow.set_drop(portid)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_lower_tor_loopback3_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_lower_tor_loopback3_flow)
                         # drop upstream arp traffic from ptf
                         if not self.upstream_arp_flow.get_drop(portid):
                             self.upstream_arp_flow.set_drop(portid)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_arp_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_arp_flow)
                         # drop upstream icmpv6 traffic from ptf
                         if not self.upstream_icmpv6_flow.get_drop(portid):
                             self.upstream_icmpv6_flow.set_drop(portid)
-                            OVSCommand.ovs_ofctl_mod_flow(
-                                self.bridge_name, self.upstream_icmpv6_flow)
+                            self._apply_mod(self.FLOW_MOD, self.upstream_icmpv6_flow)
 
                         forwarding_state = forwarding_state_getter()
                         # use set forwarding state to standby to simulator link drop
                         if forwarding_state == ForwardingState.ACTIVE:
                             forwarding_state_setter(ForwardingState.STANDBY)
-                            OVSCommand.ovs_ofctl_mod_groups(
-                                self.bridge_name, self.upstream_ecmp_group)
+                            self._apply_mod(self.GROUP_MOD, self.upstream_ecmp_group)
                     else:
                         raise ValueError("Invalid direction %s, please use 0 for downstream and 1 for upstream"
                                          % (direction))
@@ -981,25 +1038,35 @@ class MgmtServer(nic_simulator_grpc_mgmt_service_pb2_grpc.DualTorMgmtServiceServ
             self.client_stubs[nic_address] = client_stub
         return client_stub
 
+    def _call_nic_servers(self, context, method, nic_addresses, requests, timeout=GRPC_TIMEOUT):
+        """
+        Call the method of the NiC servers concurrently, one request per NiC server.
+
+        Return the replies in the order of nic_addresses, or None if any call fails.
+        """
+        calls = []
+        for nic_address, request in zip(nic_addresses, requests):
+            client_stub = self._get_client_stub(nic_address)
+            calls.append(getattr(client_stub, method).future(request, timeout=timeout))
+        replies = []
+        for nic_address, call in zip(nic_addresses, calls):
+            try:
+                replies.append(call.result())
+            except Exception as e:
+                context.set_code(grpc.StatusCode.ABORTED)
+                context.set_details("Error in %s to %s: %s" % (method, nic_address, repr(e)))
+                return None
+        return replies
+
     def QueryAdminForwardingPortState(self, request, context):
         nic_addresses = request.nic_addresses
         admin_requests = request.admin_requests
         logging.debug(
             "QueryAdminForwardingPortState[mgmt]: request query admin port state for %s\n", nic_addresses)
-        query_responses = []
-        for nic_address, admin_request in zip(nic_addresses, admin_requests):
-            client_stub = self._get_client_stub(nic_address)
-            try:
-                state = client_stub.QueryAdminForwardingPortState(
-                    admin_request,
-                    timeout=GRPC_TIMEOUT
-                )
-                query_responses.append(state)
-            except Exception as e:
-                context.set_code(grpc.StatusCode.ABORTED)
-                context.set_details(
-                    "Error in QueryAdminForwardingPortState to %s: %s" % (nic_address, repr(e)))
-                return nic_simulator_grpc_mgmt_service_pb2.ListOfAdminReply()
+        query_responses = self._call_nic_servers(
+            context, "QueryAdminForwardingPortState", nic_addresses, admin_requests)
+        if query_responses is None:
+            return nic_simulator_grpc_mgmt_service_pb2.ListOfAdminReply()
         response = nic_simulator_grpc_mgmt_service_pb2.ListOfAdminReply(
             nic_addresses=nic_addresses,
             admin_replies=query_responses
@@ -1013,20 +1080,9 @@ class MgmtServer(nic_simulator_grpc_mgmt_service_pb2_grpc.DualTorMgmtServiceServ
         admin_requests = request.admin_requests
         logging.debug(
             "SetAdminForwardingPortState[mgmt]: request set admin port state: %s\n", request)
-        set_responses = []
-        for nic_address, admin_request in zip(nic_addresses, admin_requests):
-            client_stub = self._get_client_stub(nic_address)
-            try:
-                state = client_stub.SetAdminForwardingPortState(
-                    admin_request,
-                    timeout=GRPC_TIMEOUT
-                )
-                set_responses.append(state)
-            except Exception as e:
-                context.set_code(grpc.StatusCode.ABORTED)
-                context.set_details(
-                    "Error in SetAdminForwardingPortState to %s: %s" % (nic_address, repr(e)))
-                return nic_simulator_grpc_mgmt_service_pb2.ListOfAdminRequest()
+        set_responses = self._call_nic_servers(context, "SetAdminForwardingPortState", nic_addresses, admin_requests)
+        if set_responses is None:
+            return nic_simulator_grpc_mgmt_service_pb2.ListOfAdminRequest()
         response = nic_simulator_grpc_mgmt_service_pb2.ListOfAdminReply(
             nic_addresses=nic_addresses,
             admin_replies=set_responses
@@ -1042,20 +1098,9 @@ class MgmtServer(nic_simulator_grpc_mgmt_service_pb2_grpc.DualTorMgmtServiceServ
         nic_addresses = request.nic_addresses
         drop_requests = request.drop_requests
         logging.debug("SetDrop[mgmt]: request set drop: %s\n", request)
-        set_drop_responses = []
-        for nic_address, drop_request in zip(nic_addresses, drop_requests):
-            client_stub = self._get_client_stub(nic_address)
-            try:
-                set_drop_response = client_stub.SetDrop(
-                    drop_request,
-                    timeout=10
-                )
-                set_drop_responses.append(set_drop_response)
-            except Exception as e:
-                context.set_code(grpc.StatusCode.ABORTED)
-                context.set_details("Error in SetDrop to %s: %s" %
-                                    (nic_address, repr(e)))
-                return nic_simulator_grpc_mgmt_service_pb2.ListOfDropReply()
+        set_drop_responses = self._call_nic_servers(context, "SetDrop", nic_addresses, drop_requests, timeout=10)
+        if set_drop_responses is None:
+            return nic_simulator_grpc_mgmt_service_pb2.ListOfDropReply()
         response = nic_simulator_grpc_mgmt_service_pb2.ListOfDropReply(
             nic_addresses=nic_addresses,
             drop_replies=set_drop_responses
@@ -1110,20 +1155,9 @@ class MgmtServer(nic_simulator_grpc_mgmt_service_pb2_grpc.DualTorMgmtServiceServ
         logging.debug(
             "QueryFlapCounter[mgmt]: request query port flap counter for %s\n", nic_addresses)
 
-        query_responses = []
-        for nic_address, flap_counter_request in zip(nic_addresses, flap_counter_requests):
-            client_stub = self._get_client_stub(nic_address)
-            try:
-                flap_counter_reply = client_stub.QueryFlapCounter(
-                    flap_counter_request,
-                    timeout=GRPC_TIMEOUT
-                )
-                query_responses.append(flap_counter_reply)
-            except Exception as e:
-                context.set_code(grpc.StatusCode.ABORTED)
-                context.set_details(
-                    "Error in QueryFlapCounter to %s: %s" % (nic_address, repr(e)))
-                return nic_simulator_grpc_mgmt_service_pb2.ListOfFlapCounterReply()
+        query_responses = self._call_nic_servers(context, "QueryFlapCounter", nic_addresses, flap_counter_requests)
+        if query_responses is None:
+            return nic_simulator_grpc_mgmt_service_pb2.ListOfFlapCounterReply()
 
         response = nic_simulator_grpc_mgmt_service_pb2.ListOfFlapCounterReply(
             nic_addresses=nic_addresses,
@@ -1139,20 +1173,9 @@ class MgmtServer(nic_simulator_grpc_mgmt_service_pb2_grpc.DualTorMgmtServiceServ
         logging.debug(
             "ResetFlapCounter[mgmt]: request reset port flap counter for %s\n", nic_addresses)
 
-        reset_responses = []
-        for nic_address, flap_counter_request in zip(nic_addresses, flap_counter_requests):
-            client_stub = self._get_client_stub(nic_address)
-            try:
-                flap_counter_reply = client_stub.ResetFlapCounter(
-                    flap_counter_request,
-                    timeout=GRPC_TIMEOUT
-                )
-                reset_responses.append(flap_counter_reply)
-            except Exception as e:
-                context.set_code(grpc.StatusCode.ABORTED)
-                context.set_details(
-                    "Error in ResetFlapCounter to %s: %s" % (nic_address, repr(e)))
-                return nic_simulator_grpc_mgmt_service_pb2.ListOfFlapCounterReply()
+        reset_responses = self._call_nic_servers(context, "ResetFlapCounter", nic_addresses, flap_counter_requests)
+        if reset_responses is None:
+            return nic_simulator_grpc_mgmt_service_pb2.ListOfFlapCounterReply()
 
         response = nic_simulator_grpc_mgmt_service_pb2.ListOfFlapCounterReply(
             nic_addresses=nic_addresses,
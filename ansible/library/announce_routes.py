@@ -1,5 +1,8 @@
 #!/usr/bin/python
 
+import bisect
+import collections
+import hashlib
 import itertools
 import math
 import os
@@ -9,10 +12,15 @@ import requests
 import ipaddress
 import json
 import sys
+import tempfile
 import socket
+import stat
+import struct
 import random
 import logging
+import threading
 import time
+import types
 from multiprocessing.pool import ThreadPool
 from ansible.module_utils.basic import AnsibleModule
 from ansible.module_utils.debug_utils import config_module_logging
@@ -45,6 +53,18 @@ Options:
     - option-name: path
       description: to figure out the path of topo_{}.yml
       required: False
+
+    - option-name: routes_cache_dir
+      description: Directory of the route sets generated for the topologies, which are reused if the topology file
+          and the parameters didn't change. Empty string to always generate the routes. The directory must be owned
+          by the user and not accessible by others, otherwise the routes are not cached.
+      required: False
+
+    - option-name: announce_concurrency
+      description: Maximum number of route batches posted to exabgp processes concurrently.
+      required: False
+
+The result has announce_stats with the number of routes and batches posted, the time and the routes per second.
 '''
 
 EXAMPLES = '''
@@ -84,6 +104,13 @@ BGP_SCALE_T1S = [
     't1-isolated-d510u2', 't1-isolated-d510u2s2'
 ]
 ROUTES_BATCH_SIZE = 200
+# Maximum number of route batches posted to exabgp processes concurrently, see RouteAnnouncer
+ROUTES_ANNOUNCE_CONCURRENCY = 16
+# Maximum number of route batches waiting to be posted before route generation waits for them
+ROUTES_ANNOUNCE_QUEUE_SIZE = 64
+# Directory of the route sets cached between module invocations, see RoutesCache
+ROUTES_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'announce_routes')
+ROUTES_CACHE_VERSION = 4
 
 # Describe default number of COLOs
 COLO_NUMBER = 30
@@ -161,35 +188,183 @@ def read_topo(topo_name, path):
         return {}
 
 
-def change_routes(action, ptf_ip, port, routes, routes_batch_size=ROUTES_BATCH_SIZE):
-    logging.debug("action = {}, ptf_ip = {}, port = {}, routes_batch_size = {}, routes = {}"
-                  .format(action, ptf_ip, port, routes_batch_size, routes))
-    messages = []
+def route_messages(action, routes):
     for prefix, nexthop, aspath in routes:
         if aspath:
-            messages.append(
-                "{} route {} next-hop {} as-path [ {} ]".format(action, prefix, nexthop, aspath))
+            yield "{} route {} next-hop {} as-path [ {} ]".format(action, prefix, nexthop, aspath)
         else:
-            messages.append(
-                "{} route {} next-hop {}".format(action, prefix, nexthop))
-    wait_for_http(ptf_ip, port, timeout=60)
-    url = "http://%s:%d" % (ptf_ip, port)
-    for i in range(0, len(messages), routes_batch_size):
-        batch_messages = messages[i:i+routes_batch_size]
-        data = {"commands": ";".join(batch_messages)}
-        logging.debug("Posting to url={} data={}".format(url, json.dumps(data)))
-        post_data_to_url(url, data)
-
-
-def post_data_to_url(url, data):
+            yield "{} route {} next-hop {}".format(action, prefix, nexthop)
+
+
+class RouteAnnouncer(object):
+    """
+    Post route changes to the exabgp processes of all the neighbors concurrently.
+
+    The batches of an exabgp port are posted in order, with a keep-alive HTTP session of the port. Batches of different
+    ports are posted in parallel by up to 'concurrency' threads. change_routes only queues the batches, so routes of
+    the next neighbors are generated while the batches are posted, until 'queue_size' batches are waiting.
+
+    Usage:
+        with RouteAnnouncer() as announcer:
+            change_routes(...)
+        logging.info(announcer.stats())
+
+    All the batches are posted when the with block exits, the first failure is raised then.
+    """
+
+    _current = None
+
+    def __init__(self, concurrency=ROUTES_ANNOUNCE_CONCURRENCY, queue_size=ROUTES_ANNOUNCE_QUEUE_SIZE, record=False):
+        """
+        Args:
+            concurrency: Maximum number of batches posted concurrently.
+            queue_size: Maximum number of batches waiting to be posted.
+            record: If True, keep (port, routes) of all the changes in 'changes', for caching them.
+        """
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(queue_size)
+        self.cond = threading.Condition()
+        self.pool = None
+        # (ptf_ip, port) -> deque of batches waiting to be posted
+        self.pending = {}
+        # ports which have a thread posting their batches
+        self.active = set()
+        self.sessions = {}
+        self.errors = []
+        self.record = record
+        self.changes = []
+        self.routes = 0
+        self.batches = 0
+        self.start = None
+        self.end = None
+
+    def __enter__(self):
+        self.pool = ThreadPool(processes=self.concurrency)
+        self.start = time.time()
+        RouteAnnouncer._current = self
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        RouteAnnouncer._current = None
+        try:
+            with self.cond:
+                if exc_type is not None:
+                    # Don't post the rest of the batches if route generation failed
+                    self._drop_pending()
+                while self.active:
+                    self.cond.wait()
+        finally:
+            self.end = time.time()
+            self.pool.close()
+            self.pool.join()
+            for session in self.sessions.values():
+                session.close()
+        if exc_type is None and self.errors:
+            raise self.errors[0]
+        logging.info("Announcer stats: {}".format(self.stats()))
+        return False
+
+    @classmethod
+    def current(cls):
+        return cls._current
+
+    def stats(self):
+        seconds = (self.end or time.time()) - self.start if self.start else 0.0
+        return {
+            "routes": self.routes,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "routes_per_second": int(self.routes / seconds) if seconds > 0 else 0
+        }
+
+    def submit(self, action, ptf_ip, port, routes, routes_batch_size=ROUTES_BATCH_SIZE):
+        if self.record:
+            self.changes.append((port, routes))
+        messages = route_messages(action, routes)
+        key = (ptf_ip, port)
+        while True:
+            batch = list(itertools.islice(messages, routes_batch_size))
+            if not batch:
+                break
+            # Back-pressure, wait for the posting threads if too many batches are waiting
+            self.slots.acquire()
+            with self.cond:
+                if self.errors:
+                    self.slots.release()
+                    raise self.errors[0]
+                self.pending.setdefault(key, collections.deque()).append(batch)
+                if key not in self.active:
+                    self.active.add(key)
+                    self.pool.apply_async(self._post_batches, (key,))
+
+    def _drop_pending(self):
+        for batches in self.pending.values():
+            while batches:
+                batches.popleft()
+                self.slots.release()
+
+    def _post_batches(self, key):
+        ptf_ip, port = key
+        url = "http://%s:%d" % (ptf_ip, port)
+        try:
+            if key not in self.sessions:
+                wait_for_http(ptf_ip, port, timeout=60)
+                session = requests.Session()
+                # Don't use proxies from environment variables
+                session.trust_env = False
+                self.sessions[key] = session
+            while True:
+                with self.cond:
+                    batches = self.pending[key]
+                    if not batches:
+                        self.active.discard(key)
+                        self.cond.notify_all()
+                        return
+                    batch = batches.popleft()
+                data = {"commands": ";".join(batch)}
+                logging.debug("Posting to url={} data={}".format(url, json.dumps(data)))
+                try:
+                    post_data_to_url(url, data, session=self.sessions[key])
+                finally:
+                    self.slots.release()
+                with self.cond:
+                    self.routes += len(batch)
+                    self.batches += 1
+        except Exception as e:
+            with self.cond:
+                self.errors.append(e)
+                self._drop_pending()
+                self.active.discard(key)
+                self.cond.notify_all()
+
+
+def change_routes(action, ptf_ip, port, routes, routes_batch_size=ROUTES_BATCH_SIZE):
+    """
+    Announce or withdraw routes via the exabgp process listening on the port.
+
+    Within a RouteAnnouncer with block, the routes are queued to the announcer and posted in background.
+    """
+    logging.debug("action = {}, ptf_ip = {}, port = {}, routes_batch_size = {}, routes = {}"
+                  .format(action, ptf_ip, port, routes_batch_size, routes))
+    announcer = RouteAnnouncer.current()
+    if announcer is not None:
+        announcer.submit(action, ptf_ip, port, routes, routes_batch_size)
+        return
+
+    with RouteAnnouncer(concurrency=1) as announcer:
+        announcer.submit(action, ptf_ip, port, routes, routes_batch_size)
+
+
+def post_data_to_url(url, data, session=None):
     # nosemgrep-next-line
     # Flaky error `ConnectionResetError(104, 'Connection reset by peer')` may happen while using `requests.post`
     # To avoid this error, we add sleep time before sending request.
     # We use a "backoff" algorithm here, the maximum retry times is five.
     # If one retry fails, we increase the waiting time.
+    post = session.post if session is not None else requests.post
     for i in range(0, 5):
         try:
-            r = requests.post(url, data=data, timeout=360, proxies={"http": None, "https": None})
+            r = post(url, data=data, timeout=360, proxies={"http": None, "https": None})
             break
         except Exception as e:
             logging.debug("Got exception {}, will try to connect again".format(e))
@@ -217,7 +392,7 @@ def send_routes_for_each_set(args):
 
 def send_routes_in_parallel(route_set):
     """
-    Sends the given set of routes in parallel using a thread pool.
+    Sends the given set of routes in parallel, see RouteAnnouncer.
 
     Args:
         route_set (list): A list of route sets to send.
@@ -225,20 +400,15 @@ def send_routes_in_parallel(route_set):
     Returns:
         None
     """
-    # Create a pool of worker processes
-    pool = ThreadPool(processes=len(route_set))
-
-    # Use the ThreadPool.map function to apply the function to each set of routes
-    results = pool.map(send_routes_for_each_set, route_set)
+    announcer = RouteAnnouncer.current()
+    if announcer is not None:
+        for args in route_set:
+            send_routes_for_each_set(args)
+        return
 
-    # Optionally, process the results
-    for result in results:
-        # Process individual results here
-        pass
-
-    # Close the pool and wait for all processes to complete
-    pool.close()
-    pool.join()
+    with RouteAnnouncer():
+        for args in route_set:
+            send_routes_for_each_set(args)
 
 
 # AS path from Leaf router for T0 topology
@@ -288,10 +458,87 @@ def get_uplink_router_as_path(uplink_router_type, spine_asn):
     return default_route_as_path
 
 
+def ipv4_to_str(value):
+    return "%d.%d.%d.%d" % (value >> 24, (value >> 16) & 0xff, (value >> 8) & 0xff, value & 0xff)
+
+
+def ipv6_to_str(value):
+    """
+    Format IPv6 address in integer the same as str(ipaddress.IPv6Address(value)).
+    """
+    hextets = ["%x" % ((value >> shift) & 0xffff) for shift in range(112, -16, -16)]
+    # Replace the longest run of zero hextets by '::', if it's longer than one hextet
+    best_start, best_len, start = -1, 1, -1
+    for index, hextet in enumerate(hextets + ["-"]):
+        if hextet == "0":
+            if start < 0:
+                start = index
+        elif start >= 0:
+            if index - start > best_len:
+                best_start, best_len = start, index - start
+            start = -1
+    if best_start >= 0:
+        best_end = best_start + best_len
+        if best_end == len(hextets):
+            hextets.append("")
+        hextets[best_start:best_end] = [""]
+        if best_start == 0:
+            hextets.insert(0, "")
+    return ":".join(hextets)
+
+
+def prefix_to_interval(prefix):
+    """
+    Parse prefix to integer interval of its addresses, validating it like ipaddress.ip_network.
+
+    Returns:
+        (version, first address, last address)
+    """
+    addr, _, prefixlen = UNICODE_TYPE(prefix).partition("/")
+    try:
+        if ":" in addr:
+            high, low = struct.unpack("!QQ", socket.inet_pton(socket.AF_INET6, addr))
+            version, max_len, start = 6, 128, (high << 64) | low
+        else:
+            version, max_len, start = 4, 32, struct.unpack("!I", socket.inet_pton(socket.AF_INET, addr))[0]
+        prefixlen = int(prefixlen) if prefixlen else max_len
+    except (socket.error, ValueError, UnicodeEncodeError):
+        # Netmask or other notations which ipaddress accepts
+        network = ipaddress.ip_network(UNICODE_TYPE(prefix))
+        return network.version, int(network.network_address), int(network.broadcast_address)
+    hostmask = (1 << (max_len - prefixlen)) - 1
+    if not 0 <= prefixlen <= max_len or start & hostmask:
+        # Let ipaddress raise the same error as before
+        network = ipaddress.ip_network(UNICODE_TYPE(prefix))
+        return network.version, int(network.network_address), int(network.broadcast_address)
+    return version, start, start | hostmask
+
+
+def generate_subnets(network, new_prefix, count=None):
+    """
+    Generate the subnets of the network with new_prefix length, like ipaddress network.subnets(new_prefix=new_prefix)
+    but formatted and only the first count of them.
+
+    Returns:
+        list: Subnets in string.
+    """
+    version, start, end = prefix_to_interval(network)
+    max_len, to_str = (32, ipv4_to_str) if version == 4 else (128, ipv6_to_str)
+    step = 1 << (max_len - new_prefix)
+    number = (end - start + 1) // step
+    if count is not None:
+        number = min(number, count)
+    return ["{}/{}".format(to_str(start + index * step), new_prefix) for index in range(number)]
+
+
 # Generate prefixs of route
 def generate_prefix(subnet_size, ip_base, offset):
-    ip = get_new_ip(ip_base, offset)
     prefixlen = (ip_base.max_prefixlen - int(math.log(subnet_size, 2)))
+    value = int(ip_base) + offset
+    if value >> ip_base.max_prefixlen:
+        # Let ipaddress raise the address out of range error
+        get_new_ip(ip_base, offset)
+    ip = ipv4_to_str(value) if ip_base.version == 4 else ipv6_to_str(value)
     prefix = "{}/{}".format(ip, prefixlen)
     return prefix
 
@@ -372,6 +619,10 @@ def generate_m0_routes(nexthop, colo_number, m0_number, m0_subnet_number, m0_asn
     return []
 
 
+# Routes generated by generate_routes in this module invocation, keyed by the arguments
+_generated_routes = {}
+
+
 def generate_routes(family, podset_number, tor_number, tor_subnet_number,
                     spine_asn, leaf_asn_start, tor_asn_start, nexthop,
                     nexthop_v6, tor_subnet_size, max_tor_subnet_number, topo,
@@ -379,6 +630,31 @@ def generate_routes(family, podset_number, tor_number, tor_subnet_number,
                     no_default_route=False, core_ra_asn=CORE_RA_ASN,
                     ipv6_address_pattern=IPV6_ADDRESS_PATTERN_DEFAULT_VALUE,
                     tor_default_route=False, offset=0):
+    """
+    Generate routes of the podsets, see _generate_routes.
+
+    Many neighbors advertise the same routes, e.g. all the T1 VMs of the same set for T2, so the routes are generated
+    once for the same arguments. The returned list is a copy, callers may modify it.
+    """
+    args = (family, podset_number, tor_number, tor_subnet_number, spine_asn, leaf_asn_start, tor_asn_start, nexthop,
+            nexthop_v6, tor_subnet_size, max_tor_subnet_number, topo, router_type, tor_index, set_num,
+            no_default_route, core_ra_asn, ipv6_address_pattern, tor_default_route, offset)
+    try:
+        routes, suffix = _generated_routes[args]
+    except KeyError:
+        routes, suffix = _generate_routes(*args)
+        _generated_routes[args] = (routes, suffix)
+    except TypeError:
+        # Unhashable argument
+        return _generate_routes(*args)
+    return list(routes), suffix
+
+
+def _generate_routes(family, podset_number, tor_number, tor_subnet_number,
+                     spine_asn, leaf_asn_start, tor_asn_start, nexthop,
+                     nexthop_v6, tor_subnet_size, max_tor_subnet_number, topo,
+                     router_type, tor_index, set_num, no_default_route, core_ra_asn,
+                     ipv6_address_pattern, tor_default_route, offset):
     routes = []
     if not no_default_route and (router_type != "tor" or tor_default_route):
         default_route_as_path = get_uplink_router_as_path(
@@ -394,110 +670,115 @@ def generate_routes(family, podset_number, tor_number, tor_subnet_number,
     # us to overflow the 192.168.0.0/16 private address space here.
     # This should be fine for internal use, but may pose an issue if used otherwise
     suffix = 0
+    prefixlen_v4 = (32 - int(math.log(tor_subnet_size, 2)))
+    # First 3 pods are advertised from T1 - so remove 3 from the total pods being advertised by T3
+    first_third_podset_number = int(math.ceil((podset_number - 3) / 3.0))
+    second_third_podset_number = int(math.ceil(((podset_number - 3) * 2) / 3.0))
+    with_v4 = family in ["v4", "both"]
+    with_v6 = family in ["v6", "both"]
     for podset in range(0, podset_number):
+        if not _podset_advertised(podset, router_type, topo, set_num,
+                                  first_third_podset_number, second_third_podset_number):
+            continue
+        leaf_asn = leaf_asn_start + podset
         for tor in range(0, tor_number):
-            for subnet in range(0, tor_subnet_number):
-                if router_type == "core":
-                    # Advertise podset 3+ to T2 DUT
-                    if podset < 3:
-                        continue
-
-                    # First 3 pods are advertised from T1 - so remove 3 from the total pods being advertised by T3
-                    first_third_podset_number = int(
-                        math.ceil((podset_number - 3) / 3.0))
-                    second_third_podset_number = int(
-                        math.ceil(((podset_number - 3) * 2) / 3.0))
-
-                    if set_num is not None:
-                        # For T2, we have 3 sets - 1 set advertises first 1/3 podsets,
-                        # second set advertises second 1/3 podsets, and all VM's advertises the last 1/3 podsets
-                        if podset <= first_third_podset_number and set_num != 0:
-                            continue
-                        elif podset > first_third_podset_number and \
-                                podset < second_third_podset_number and set_num != 1:
-                            continue
-                if router_type == "spine" or router_type == "mgmtleaf":
-                    # Skip podset 0 for T2
+            if router_type == "leaf" and topo not in ("t2", "t0-mclag") and podset == 0 and tor == 0:
+                # Skip tor 0 podset 0 for T1
+                continue
+            if router_type == "tor" and tor != tor_index:
+                continue
+            tor_asn = tor_asn_start + tor
+
+            aspath = None
+            if router_type == "core":
+                aspath = "{} {}".format(leaf_asn, core_ra_asn)
+            elif router_type == "spine" or router_type == "mgmtleaf":
+                aspath = "{} {}".format(leaf_asn, tor_asn)
+            elif router_type == "leaf":
+                if topo == "t2":
+                    aspath = "{}".format(tor_asn)
+                elif topo == "t0-mclag":
+                    aspath = "{}".format(tor_asn)
+                else:
                     if podset == 0:
-                        continue
-                elif router_type == "leaf":
-                    if topo == 't2':
-                        # Send routes for podset 0-2 (first 3 pods) to the T2 DUT
-                        if podset > 2:
-                            continue
-
-                        if set_num is not None:
-                            # For T2, we have 3 sets - 1 set advertises podset 1,
-                            # second set advertises podset 2, and all VM's advertises podset3
-                            if podset == 0 and set_num != 0:
-                                continue
-                            elif podset == 1 and set_num != 1:
-                                continue
-                    elif topo == 't0-mclag':
-                        if podset > 1:
-                            continue
-                        if set_num is not None:
-                            if podset == 0 and set_num != 0:
-                                continue
-                            elif podset == 1 and set_num != 1:
-                                continue
-                    else:
-                        # Skip tor 0 podset 0 for T1
-                        if podset == 0 and tor == 0:
-                            continue
-                elif router_type == "tor":
-                    # Skip non podset 0 for T0
-                    if podset != 0:
-                        continue
-                    # Skip subnet 0 (vlan ip) for M0
-                    elif topo == "m0" and subnet == 0:
-                        continue
-                    elif tor != tor_index:
-                        continue
-
-                suffix = ((podset * tor_number * max_tor_subnet_number * tor_subnet_size) +
-                          (tor * max_tor_subnet_number * tor_subnet_size) +
-                          (subnet * tor_subnet_size) + offset)
-                octet2 = (168 + int(suffix / (256 ** 2)))
-                octet1 = (192 + int(octet2 / 256))
-                octet2 = (octet2 % 256)
-                octet3 = (int(suffix / 256) % 256)
-                octet4 = (suffix % 256)
-                prefixlen_v4 = (32 - int(math.log(tor_subnet_size, 2)))
-
-                prefix = "{}.{}.{}.{}/{}".format(octet1,
-                                                 octet2, octet3, octet4, prefixlen_v4)
-                prefix_v6 = ipv6_address_pattern % (
-                    octet1, octet2, octet3, octet4)
-
-                leaf_asn = leaf_asn_start + podset
-                tor_asn = tor_asn_start + tor
-
-                aspath = None
-                if router_type == "core":
-                    aspath = "{} {}".format(leaf_asn, core_ra_asn)
-                elif router_type == "spine" or router_type == "mgmtleaf":
-                    aspath = "{} {}".format(leaf_asn, tor_asn)
-                elif router_type == "leaf":
-                    if topo == "t2":
-                        aspath = "{}".format(tor_asn)
-                    elif topo == "t0-mclag":
                         aspath = "{}".format(tor_asn)
                     else:
-                        if podset == 0:
-                            aspath = "{}".format(tor_asn)
-                        else:
-                            aspath = "{} {} {}".format(
-                                spine_asn, leaf_asn, tor_asn)
+                        aspath = "{} {} {}".format(
+                            spine_asn, leaf_asn, tor_asn)
 
-                if family in ["v4", "both"]:
-                    routes.append((prefix, nexthop, aspath))
-                if family in ["v6", "both"]:
-                    routes.append((prefix_v6, nexthop_v6, aspath))
+            tor_suffix = ((podset * tor_number * max_tor_subnet_number * tor_subnet_size) +
+                          (tor * max_tor_subnet_number * tor_subnet_size) + offset)
+            for subnet in range(0, tor_subnet_number):
+                # Skip subnet 0 (vlan ip) for M0
+                if router_type == "tor" and topo == "m0" and subnet == 0:
+                    continue
+
+                suffix = tor_suffix + subnet * tor_subnet_size
+                # 192.168.0.0 + suffix, the first octet may overflow 255 like before
+                value = 0xc0a80000 + suffix
+                octet1 = value >> 24
+                octet2 = (value >> 16) & 0xff
+                octet3 = (value >> 8) & 0xff
+                octet4 = value & 0xff
+
+                if with_v4:
+                    routes.append(("%d.%d.%d.%d/%d" % (octet1, octet2, octet3, octet4, prefixlen_v4),
+                                   nexthop, aspath))
+                if with_v6:
+                    routes.append((ipv6_address_pattern % (octet1, octet2, octet3, octet4), nexthop_v6, aspath))
 
     return routes, suffix
 
 
+def _podset_advertised(podset, router_type, topo, set_num, first_third_podset_number, second_third_podset_number):
+    """
+    Check if routes of the podset are advertised by the router, the rules only depending on podset in
+    generate_routes.
+    """
+    if router_type == "core":
+        # Advertise podset 3+ to T2 DUT
+        if podset < 3:
+            return False
+        if set_num is not None:
+            # For T2, we have 3 sets - 1 set advertises first 1/3 podsets,
+            # second set advertises second 1/3 podsets, and all VM's advertises the last 1/3 podsets
+            if podset <= first_third_podset_number and set_num != 0:
+                return False
+            elif podset > first_third_podset_number and \
+                    podset < second_third_podset_number and set_num != 1:
+                return False
+    if router_type == "spine" or router_type == "mgmtleaf":
+        # Skip podset 0 for T2
+        if podset == 0:
+            return False
+    elif router_type == "leaf":
+        if topo == 't2':
+            # Send routes for podset 0-2 (first 3 pods) to the T2 DUT
+            if podset > 2:
+                return False
+
+            if set_num is not None:
+                # For T2, we have 3 sets - 1 set advertises podset 1,
+                # second set advertises podset 2, and all VM's advertises podset3
+                if podset == 0 and set_num != 0:
+                    return False
+                elif podset == 1 and set_num != 1:
+                    return False
+        elif topo == 't0-mclag':
+            if podset > 1:
+                return False
+            if set_num is not None:
+                if podset == 0 and set_num != 0:
+                    return False
+                elif podset == 1 and set_num != 1:
+                    return False
+    elif router_type == "tor":
+        # Skip non podset 0 for T0
+        if podset != 0:
+            return False
+    return True
+
+
 def generate_t1_to_t0_routes(family, offset, leaf_number, subnet_size, tor_asn, leaf_asn_start, nexthop, nexthop_v6,
                              podset_num=1, ipv6_address_pattern=IPV6_ADDRESS_PATTERN_DEFAULT_VALUE):
     routes = []
@@ -1273,8 +1554,8 @@ def fib_ft2_routes(topo, ptf_ip, action="announce", topo_routes={}):
 
     group_number = int(math.ceil(float(len(vms)) / GROUP_SIZE))
     routes_per_group = ROUTE_NUMBER // group_number  # Number of routes per group
-    subnets_ipv4 = list(ipaddress.ip_network(UNICODE_TYPE(BASE_NETWORK_V4)).subnets(new_prefix=PREFIX_LEN_V4))
-    subnets_ipv6 = list(ipaddress.ip_network(UNICODE_TYPE(BASE_NETWORK_V6)).subnets(new_prefix=PREFIX_LEN_V6))
+    subnets_ipv4 = generate_subnets(BASE_NETWORK_V4, PREFIX_LEN_V4, routes_per_group * group_number)
+    subnets_ipv6 = generate_subnets(BASE_NETWORK_V6, PREFIX_LEN_V6, routes_per_group * group_number)
     route_offset = 0
     # Generate routes for each group
     for group_index in range(group_number):
@@ -1294,11 +1575,11 @@ def fib_ft2_routes(topo, ptf_ip, action="announce", topo_routes={}):
             ipv4_routes = []
             for subnet in group_subnets_ipv4:
                 # Generate IPv4 routes
-                ipv4_routes.append((str(subnet), nhipv4, as_path))
+                ipv4_routes.append((subnet, nhipv4, as_path))
             ipv6_routes = []
             for subnet in group_subnets_ipv6:
                 # Generate IPv6 routes
-                ipv6_routes.append((str(subnet), nhipv6, as_path))
+                ipv6_routes.append((subnet, nhipv6, as_path))
             # Generate default routes for both IPv4 and IPv6
             ipv4_routes.append(("0.0.0.0/0", nhipv4, default_route_as_path))
             ipv6_routes.append(("::/0", nhipv6, default_route_as_path))
@@ -1484,19 +1765,19 @@ def fib_lt2_routes(topo, ptf_ip, action="annouce", topo_routes={}):
 
     default_route_as_path = get_uplink_router_as_path("upperspine", None)
 
-    all_subnetv4 = list(ipaddress.ip_network(UNICODE_TYPE(BASE_ADDR_V4)).subnets(new_prefix=24))
-    all_subnetv6 = list(ipaddress.ip_network(UNICODE_TYPE(BASE_ADDR_V6)).subnets(new_prefix=124))
-
     group_nums = int(math.ceil(float(len(t1_vms)) / T1_GROUP_SIZE))
     t1_route_per_group = int(math.ceil(ROUTE_NUMBER_T1 / T1_GROUP_SIZE / group_nums))
 
-    # 32 route each x 4 to match 110 T1
-    extra_ipv4_t1 = itertools.chain(
-        ipaddress.ip_network("192.168.0.0/27"),
-        ipaddress.ip_network("192.169.0.0/27"),
-        ipaddress.ip_network("192.170.0.0/27"),
-        ipaddress.ip_network("192.171.0.0/27"),
-    )
+    all_subnetv4 = generate_subnets(BASE_ADDR_V4, 24, t1_route_per_group * group_nums)
+    all_subnetv6 = generate_subnets(BASE_ADDR_V6, 124, t1_route_per_group * group_nums)
+
+    # 32 route each x 4 to match 110 T1, the addresses of the networks
+    extra_ipv4_t1 = (ipv4_to_str(start + index) for _, start, end in (
+        prefix_to_interval("192.168.0.0/27"),
+        prefix_to_interval("192.169.0.0/27"),
+        prefix_to_interval("192.170.0.0/27"),
+        prefix_to_interval("192.171.0.0/27"),
+    ) for index in range(end - start + 1))
 
     for group in range(group_nums):
         selected_v4_subnets = all_subnetv4[group * t1_route_per_group: group * t1_route_per_group + t1_route_per_group]
@@ -1514,10 +1795,10 @@ def fib_lt2_routes(topo, ptf_ip, action="annouce", topo_routes={}):
             ipv6_routes = []
 
             for subnetv4, subnetv6 in zip(selected_v4_subnets, selected_v6_subnets):
-                ipv4_routes.append((str(subnetv4), nhipv4, as_path))
-                ipv6_routes.append((str(subnetv6), nhipv6, as_path))
+                ipv4_routes.append((subnetv4, nhipv4, as_path))
+                ipv6_routes.append((subnetv6, nhipv6, as_path))
 
-            ipv4_routes.append((str(next(extra_ipv4_t1)), nhipv4, as_path))
+            ipv4_routes.append((next(extra_ipv4_t1), nhipv4, as_path))
 
             topo_routes[vm_name] = {}
             topo_routes[vm_name][IPV4] = ipv4_routes
@@ -1598,11 +1879,11 @@ def adhoc_routes(topo, ptf_ip, peers_routes_to_change, action):
 
 
 def get_ipv4_routes(routes):
-    return [r for r in routes if ipaddress.ip_network(UNICODE_TYPE(r[0])).version == 4]
+    return [r for r in routes if prefix_to_interval(r[0])[0] == 4]
 
 
 def get_ipv6_routes(routes):
-    return [r for r in routes if ipaddress.ip_network(UNICODE_TYPE(r[0])).version == 6]
+    return [r for r in routes if prefix_to_interval(r[0])[0] == 6]
 
 
 def filterout_subnet_ipv4(aggregate_routes, candidate_routes):
@@ -1616,15 +1897,231 @@ def filterout_subnet_ipv6(aggregate_routes, candidate_routes):
 
 
 def filterout_subnet(aggregate_routes, candidate_routes):
+    """
+    Remove the candidate routes whose prefix is a subnet of the prefix of any aggregate route.
+
+    Prefixes are either nested or disjoint, so the aggregate prefixes are reduced to the outermost ones, which are
+    sorted and disjoint, and the aggregate containing a candidate prefix is found by binary search.
+    """
+    outermost = {4: ([], []), 6: ([], [])}
+    for version, start, end in sorted((prefix_to_interval(ar[0]) for ar in aggregate_routes),
+                                      key=lambda interval: (interval[0], interval[1], -interval[2])):
+        starts, ends = outermost[version]
+        if ends and start <= ends[-1]:
+            continue
+        starts.append(start)
+        ends.append(end)
+
     subnets = []
-    for ar in aggregate_routes:
-        ar_net = ipaddress.ip_network(UNICODE_TYPE(ar[0]))
+    if aggregate_routes:
         for cr in candidate_routes:
-            if ipaddress.ip_network(UNICODE_TYPE(cr[0])).subnet_of(ar_net):
+            version, start, end = prefix_to_interval(cr[0])
+            starts, ends = outermost[version]
+            index = bisect.bisect_right(starts, start) - 1
+            if index >= 0 and end <= ends[index]:
                 subnets.append(cr)
     return list(set(candidate_routes) - set(subnets))
 
 
+def _code_digest(key, code):
+    key.update(code.co_code)
+    key.update(repr(code.co_names).encode())
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            _code_digest(key, const)
+        else:
+            key.update(repr(const).encode())
+
+
+def routes_generation_digest():
+    """
+    Digest of the code and the constants of this module, so that cached routes are not used after the module changed.
+
+    The module source file can't be used, ansible runs the module from a zip archive in a temporary directory.
+    """
+    key = hashlib.md5()
+    for name, value in sorted(globals().items()):
+        if isinstance(value, types.FunctionType):
+            _code_digest(key, value.__code__)
+        elif isinstance(value, type) and value.__module__ == __name__:
+            for attr_name, attr in sorted(vars(value).items()):
+                if isinstance(attr, types.FunctionType):
+                    _code_digest(key, attr.__code__)
+        elif name.isupper() and isinstance(value, (int, str, list, tuple, dict)):
+            key.update(repr((name, value)).encode())
+    return key.hexdigest()
+
+
+def _is_private(st):
+    """
+    Check the file or directory is owned by the user and can't be accessed by others.
+    """
+    return st.st_uid == os.getuid() and not (st.st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+
+def _private_cache_dir(cache_dir):
+    """
+    Create the cache directory with mode 0700 if it doesn't exist.
+
+    Returns:
+        True if the cache directory is a directory private to the user.
+    """
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir, 0o700)
+        except OSError:
+            pass
+    try:
+        st = os.lstat(cache_dir)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and _is_private(st)
+
+
+class RoutesCache(object):
+    """
+    Routes generated for a topology, cached on disk between module invocations.
+
+    An entry has the topo_routes returned by the module and the route changes posted to exabgp, i.e. (port, routes)
+    of every change_routes call. On a hit, the changes are posted again with the requested action instead of
+    generating the routes. Entries are keyed by the topology, the parameters and the code of the module.
+
+    The routes are posted to exabgp as they are loaded, so only a directory and files private to the user are used,
+    a cache shared with other users would let them inject routes.
+    """
+
+    def __init__(self, cache_dir, topo_name, topo, params):
+        """
+        Args:
+            cache_dir: Directory of the cache files.
+            topo_name: Topology name.
+            topo: Topology loaded from the topology file.
+            params: Dict of other parameters the routes are generated from.
+        """
+        params_digest = hashlib.md5(json.dumps(params, sort_keys=True).encode()).hexdigest()
+        # One file for a topology and parameters, overwritten when the topology file or the module changes
+        self.cache_file = os.path.join(cache_dir, "{}_{}.json".format(topo_name, params_digest[:12]))
+        key = hashlib.md5(json.dumps(topo, sort_keys=True, default=str).encode())
+        key.update(params_digest.encode())
+        key.update(routes_generation_digest().encode())
+        key.update(str(ROUTES_CACHE_VERSION).encode())
+        self.key = key.hexdigest()
+
+    def load(self):
+        """
+        Returns:
+            (topo_routes, changes), or None if the routes are not cached. Routes are loaded as tuples.
+        """
+        if not _private_cache_dir(os.path.dirname(self.cache_file)):
+            return None
+        try:
+            with open(self.cache_file, "rb") as f:
+                if not _is_private(os.fstat(f.fileno())):
+                    return None
+                # The key is on the first line, so that a stale entry is not parsed
+                if f.readline().strip() != self.key.encode():
+                    return None
+                entry = json.loads(f.read().decode())
+            values = entry["values"]
+            route_lists = [tuple(zip(prefixes, [values[i] for i in nexthops], [values[i] for i in aspaths]))
+                           for prefixes, nexthops, aspaths in entry["route_lists"]]
+            topo_routes = dict((vm, dict((ip_version, route_lists[index])
+                                         for ip_version, index in vm_routes.items()))
+                               for vm, vm_routes in entry["topo_routes"].items())
+            changes = [(port, route_lists[index]) for port, index in entry["changes"]]
+        except (IOError, OSError, ValueError, KeyError, IndexError, TypeError, AttributeError):
+            return None
+        logging.info("Use routes cached in {}".format(self.cache_file))
+        return topo_routes, changes
+
+    def save(self, topo_routes, changes):
+        # Same route lists, e.g. topo_routes of a VM and the changes posted to it, are stored once
+        route_lists = []
+        indexes = {}
+        # Route lists are stored as columns, with the few distinct next hops and AS paths stored once in 'values',
+        # a list of strings is parsed by json several times faster than a list of routes
+        values = []
+        value_indexes = {}
+
+        def value_index(value):
+            value = None if value is None else str(value)
+            if value not in value_indexes:
+                value_indexes[value] = len(values)
+                values.append(value)
+            return value_indexes[value]
+
+        def route_list_index(routes):
+            routes = tuple(tuple(None if item is None else str(item) for item in route) for route in routes)
+            if routes not in indexes:
+                indexes[routes] = len(route_lists)
+                route_lists.append([[prefix for prefix, _, _ in routes],
+                                    [value_index(nexthop) for _, nexthop, _ in routes],
+                                    [value_index(aspath) for _, _, aspath in routes]])
+            return indexes[routes]
+
+        entry = {
+            "topo_routes": dict((vm, dict((ip_version, route_list_index(routes))
+                                          for ip_version, routes in vm_routes.items()))
+                                for vm, vm_routes in topo_routes.items()),
+            "changes": [(port, route_list_index(routes)) for port, routes in changes],
+            "route_lists": route_lists,
+            "values": values
+        }
+        cache_dir = os.path.dirname(self.cache_file)
+        if not _private_cache_dir(cache_dir):
+            logging.warning("Not caching routes, {} is not a directory private to the user".format(cache_dir))
+            return
+        tmp_file = None
+        try:
+            # mkstemp creates a new file with mode 0600 and an unpredictable name
+            fd, tmp_file = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(self.key.encode() + b"\n")
+                f.write(json.dumps(entry, separators=(",", ":")).encode())
+            os.rename(tmp_file, self.cache_file)
+        except (IOError, OSError) as e:
+            logging.warning("Failed to cache routes in {}: {}".format(self.cache_file, repr(e)))
+            if tmp_file is not None and os.path.exists(tmp_file):
+                os.remove(tmp_file)
+
+
+def fib_topo(topo_type, topo, ptf_ip, topo_name, action, no_default_route, tor_default_route,
+             upstream_neighbor_groups, downstream_neighbor_groups, topo_routes):
+    """
+    Generate the routes of the topology into topo_routes, and announce or withdraw them unless action is 'generate'.
+
+    Returns:
+        False if the topology type is not supported.
+    """
+    if topo_type == "t0":
+        fib_t0(topo, ptf_ip, no_default_route=no_default_route, action=action,
+               upstream_neighbor_groups=upstream_neighbor_groups, topo_routes=topo_routes)
+    elif topo_type == "t1" or topo_type == "smartswitch-t1":
+        fib_t1_lag(
+            topo, ptf_ip, topo_name, no_default_route=no_default_route, action=action,
+            tor_default_route=tor_default_route, downstream_neighbor_groups=downstream_neighbor_groups,
+            topo_routes=topo_routes)
+    elif topo_type == "t2":
+        fib_t2_lag(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "t0-mclag":
+        fib_t0_mclag(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "m1":
+        fib_m1(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "m0":
+        fib_m0(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "mx":
+        fib_mx(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "dpu":
+        fib_dpu(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "lt2":
+        fib_lt2_routes(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    elif topo_type == "ft2":
+        fib_ft2_routes(topo, ptf_ip, action=action, topo_routes=topo_routes)
+    else:
+        return False
+    return True
+
+
 def convert_routes_to_str(topo_routes):
     for vm in topo_routes.keys():
         for ip_version in topo_routes[vm].keys():
@@ -1647,7 +2144,9 @@ def main():
             peers_routes_to_change=dict(required=False, type='dict', default={}),
             log_path=dict(required=False, type='str', default='/tmp'),
             upstream_neighbor_groups=dict(required=False, type='int', default=0),
-            downstream_neighbor_groups=dict(required=False, type='int', default=0)
+            downstream_neighbor_groups=dict(required=False, type='int', default=0),
+            routes_cache_dir=dict(required=False, type='str', default=ROUTES_CACHE_DIR),
+            announce_concurrency=dict(required=False, type='int', default=ROUTES_ANNOUNCE_CONCURRENCY)
         ),
         supports_check_mode=False)
 
@@ -1663,6 +2162,8 @@ def main():
     peers_routes_to_change = module.params['peers_routes_to_change']
     upstream_neighbor_groups = module.params['upstream_neighbor_groups']
     downstream_neighbor_groups = module.params['downstream_neighbor_groups']
+    routes_cache_dir = module.params['routes_cache_dir']
+    announce_concurrency = module.params['announce_concurrency']
 
     topo = read_topo(topo_name, path)
     if not topo:
@@ -1680,49 +2181,43 @@ def main():
     topo_routes = {}
     try:
         if adhoc:
-            adhoc_routes(topo, ptf_ip, peers_routes_to_change, action)
-            module.exit_json(change=True)
-        elif topo_type == "t0":
-            fib_t0(topo, ptf_ip, no_default_route=is_storage_backend, action=action,
-                   upstream_neighbor_groups=upstream_neighbor_groups, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "t1" or topo_type == "smartswitch-t1":
-            fib_t1_lag(
-                topo, ptf_ip, topo_name, no_default_route=is_storage_backend, action=action,
-                tor_default_route=tor_default_route, downstream_neighbor_groups=downstream_neighbor_groups,
-                topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "t2":
-            fib_t2_lag(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "t0-mclag":
-            fib_t0_mclag(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "m1":
-            fib_m1(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "m0":
-            fib_m0(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "mx":
-            fib_mx(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(changed=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "dpu":
-            fib_dpu(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "lt2":
-            fib_lt2_routes(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes))
-        elif topo_type == "ft2":
-            fib_ft2_routes(topo, ptf_ip, action=action, topo_routes=topo_routes)
-            module.exit_json(change=True, topo_routes=convert_routes_to_str(topo_routes))
-        else:
-            module.exit_json(
-                msg='Unsupported topology "{}" - skipping announcing routes'.format(topo_name))
+            with RouteAnnouncer(concurrency=announce_concurrency) as announcer:
+                adhoc_routes(topo, ptf_ip, peers_routes_to_change, action)
+            module.exit_json(changed=True, announce_stats=announcer.stats())
+
+        routes_cache = None
+        if routes_cache_dir:
+            routes_cache = RoutesCache(routes_cache_dir, topo_name, topo, {
+                "no_default_route": is_storage_backend,
+                "tor_default_route": tor_default_route,
+                "upstream_neighbor_groups": upstream_neighbor_groups,
+                "downstream_neighbor_groups": downstream_neighbor_groups,
+                # no routes are posted for 'generate', so there are no changes to replay in its entries
+                "apply": action != GENERATE_WITHOUT_APPLY
+            })
+        cached = routes_cache.load() if routes_cache else None
+
+        with RouteAnnouncer(concurrency=announce_concurrency, record=routes_cache is not None) as announcer:
+            if cached is not None:
+                topo_routes, changes = cached
+                for port, routes in changes:
+                    change_routes(action, ptf_ip, port, routes)
+            elif fib_topo(topo_type, topo, ptf_ip, topo_name, action, is_storage_backend, tor_default_route,
+                          upstream_neighbor_groups, downstream_neighbor_groups, topo_routes):
+                topo_routes = convert_routes_to_str(topo_routes)
+            else:
+                module.exit_json(
+                    msg='Unsupported topology "{}" - skipping announcing routes'.format(topo_name))
+
+        if cached is None and routes_cache is not None:
+            routes_cache.save(topo_routes, announcer.changes)
     except Exception as e:
         module.fail_json(msg='Announcing routes failed, topo_name={}, topo_type={}, exception={}'
                          .format(topo_name, topo_type, repr(e)))
 
+    module.exit_json(changed=True, topo_routes=topo_routes, announce_stats=announcer.stats(),
+                     routes_cached=cached is not None)
+
 
 if __name__ == '__main__':
     main()
@@ -3,6 +3,8 @@
 from ansible.module_utils.basic import AnsibleModule
 from functools import cmp_to_key
 import datetime
+import json
+import shutil
 import traceback
 import logging.handlers
 import logging
@@ -42,6 +44,14 @@ Options:
       required: True
       Default: None
 
+    - option-name: marker_index
+      description: a path to the index of start marker positions saved by loganalyzer.py.
+        If 'start_string' is found in the index, the file containing it is looked up by inode,
+        and the lines are copied starting from the recorded byte offset, without scanning
+        all the rotated files. Falls back to the scan if the index can't be used.
+      required: False
+      Default: None
+
 '''
 
 EXAMPLES = '''
@@ -58,6 +68,14 @@ EXAMPLES = '''
     dest: '/tmp/'
     flat: yes
 
+- name: Extract all syslog entries since the loganalyzer start marker using the marker index
+  extract_log:
+    directory: '/var/log'
+    file_prefix: 'syslog'
+    start_string: 'start-LogAnalyzer-test_bgp.2024-01-01-00:00:00'
+    target_filename: '/tmp/syslog'
+    marker_index: '/tmp/loganalyzer.marker_index.json'
+
 - name: Extract all sairedis.rec entries since the last reboot
   extract_log:
     directory: '/var/log/swss'
@@ -282,10 +300,68 @@ def combine_logs_and_save(directory, filenames, start_string, target_string, tar
                 path, line_processed, line_copied))
 
 
-def extract_log(directory, prefixname, target_string, target_filename):
+def find_indexed_start(directory, filenames, start_string, marker_index):
+    """Looks up the file and the byte offset of @start_string in the @marker_index
+    saved by loganalyzer.py, format: {marker: {log file path: [inode, byte offset]}}.
+    Log files are renamed by logrotate, so the file is found by inode. Compressed files
+    get a new inode, so only the plain files are checked.
+    Returns (filename, offset) or None if the index can't be used"""
+
+    try:
+        with open(marker_index) as fp:
+            positions = json.load(fp).get(start_string, {})
+    except (IOError, OSError, ValueError, AttributeError):
+        return None
+    inodes = dict((inode, offset) for inode, offset in positions.values())
+
+    for filename in filenames:
+        if 'gz' in filename:
+            break
+        path = os.path.join(directory, filename)
+        offset = inodes.get(os.stat(path).st_ino)
+        if offset is None:
+            continue
+        with open(path, 'rb') as fp:
+            fp.seek(offset)
+            if start_string.encode('utf-8') in fp.readline():
+                return filename, offset
+        break
+    return None
+
+
+def copy_logs_from_offset(directory, filenames, offset, target_filename):
+    """Copies the oldest file of @filenames starting from @offset and all newer files
+    into @target_filename. Assumes @filenames are sorted and first file is the newest"""
+
+    with open(target_filename, 'wb') as fp:
+        for filename in reversed(filenames):
+            path = os.path.join(directory, filename)
+            if 'gz' in path:
+                file = gzip.open(path, mode='rb')
+            else:
+                file = open(path, 'rb')
+            with file:
+                if filename == filenames[-1]:
+                    file.seek(offset)
+                shutil.copyfileobj(file, fp)
+            logger.debug("extract_log copied file {} from offset {}".format(
+                path, offset if filename == filenames[-1] else 0))
+
+
+def extract_log(directory, prefixname, target_string, target_filename, marker_index=None):
     logger.debug("extract_log for start string {}".format(
         target_string.replace("start-", "")))
     filenames = list_files(directory, prefixname)
+    if marker_index:
+        indexed_start = find_indexed_start(directory, filenames, target_string, marker_index)
+        if indexed_start is not None:
+            file_with_start, offset = indexed_start
+            files_to_copy = calculate_files_to_copy(filenames, file_with_start)
+            logger.debug("extract_log indexed start file {} offset {}, subsequent files {}".format(
+                file_with_start, offset, files_to_copy))
+            copy_logs_from_offset(directory, files_to_copy, offset, target_filename)
+            return
+        logger.debug("extract_log start string is not indexed in {}".format(marker_index))
     logger.debug("extract_log from files {}".format(filenames))
     file_with_latest_line, file_create_time, latest_line, file_size = extract_latest_line_with_string(
         directory, filenames, target_string)
@@ -308,6 +384,7 @@ def main():
             file_prefix=dict(required=True, type='str'),
             start_string=dict(required=True, type='str'),
             target_filename=dict(required=True, type='str'),
+            marker_index=dict(required=False, type='str', default=None),
         ),
         supports_check_mode=False)
 
@@ -319,7 +396,7 @@ def main():
 
     try:
         extract_log(p['directory'], p['file_prefix'],
-                    p['start_string'], p['target_filename'])
+                    p['start_string'], p['target_filename'], p['marker_index'])
     except Exception:
         tb = traceback.format_exc()
         module.fail_json(msg=tb)
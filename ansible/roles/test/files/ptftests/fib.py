@@ -1,7 +1,15 @@
+import bisect
+import hashlib
+import os
+import pickle
 import re
 import six
+import socket
+import stat
+import struct
 
-from ipaddress import ip_address, ip_network
+from array import array
+from ipaddress import IPv4Address, IPv6Address
 from lpm import LpmDict
 
 # These subnets are excluded from FIB test
@@ -25,6 +33,146 @@ EXCLUDE_IPV6_PREFIXES = [
     'ff00::/8'              # Multicast             RFC 4291
 ]
 
+# Directory of pickled FIBs reused between PTF test invocations, see load_fib. Loading a pickle can execute code,
+# so the FIBs are only loaded from a directory private to the user.
+FIB_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'ptf_fib')
+FIB_CACHE_VERSION = 1
+# Maximum number of pickled FIBs kept in the cache directory, the least recently used ones are removed
+FIB_CACHE_MAX_FILES = 16
+
+IPV4_MAX = (1 << 32) - 1
+IPV6_MAX = (1 << 128) - 1
+
+'''
+Fib is a longest prefix match table of the routes in the FIB file dumped from DUT.
+
+All the prefixes are flattened to sorted integer interval arrays, one for IPv4 and one for IPv6. The start of the
+intervals are the boundaries of all the prefixes, so the longest matching prefix is the same for all the addresses of
+an interval, and it's precomputed at load time as index to the list of unique next hop groups. An address lookup is a
+binary search for the interval, a bulk lookup of sorted addresses is a single merge pass over the interval array.
+The intervals are the same as LpmDict.ranges() segmentation of the IP space.
+'''
+
+
+def _parse_ipv4(addr):
+    return struct.unpack('!I', socket.inet_aton(addr))[0]
+
+
+def _parse_ipv6(addr):
+    high, low = struct.unpack('!QQ', socket.inet_pton(socket.AF_INET6, addr))
+    return (high << 64) | low
+
+
+def _parse_ip(ip):
+    '''
+    @summary: Parse IP address to integer.
+    @return: (version, integer value of the address)
+    '''
+    ip = str(ip)
+    if ':' in ip:
+        return 6, _parse_ipv6(ip)
+    return 4, _parse_ipv4(ip)
+
+
+def _parse_prefix(prefix):
+    '''
+    @summary: Parse prefix to integer interval.
+    @return: (version, prefix length, first address, last address)
+    '''
+    addr, _, prefixlen = prefix.partition('/')
+    if ':' in addr:
+        version, max_len, start = 6, 128, _parse_ipv6(addr)
+    else:
+        version, max_len, start = 4, 32, _parse_ipv4(addr)
+    prefixlen = int(prefixlen) if prefixlen else max_len
+    if not 0 <= prefixlen <= max_len:
+        raise ValueError('{} is not a valid prefix'.format(prefix))
+    hostmask = (1 << (max_len - prefixlen)) - 1
+    if start & hostmask:
+        raise ValueError('{} has host bits set'.format(prefix))
+    return version, prefixlen, start, start | hostmask
+
+
+class _IntervalTable():
+    '''
+    Sorted interval array of one address family.
+    '''
+    def __init__(self, ipv4, routes, next_hops):
+        '''
+        @param routes: dict of {(prefix length, first address, last address): next hop group index}
+        @param next_hops: list of next hop groups
+        '''
+        self._ipv4 = ipv4
+        max_ip = IPV4_MAX if ipv4 else IPV6_MAX
+        default_route = routes.pop((0, 0, max_ip), -1)
+
+        # Start of intervals, 0.0.0.0 or :: is always a boundary like in LpmDict
+        boundaries = set([0])
+        for _, start, end in routes:
+            boundaries.add(start)
+            if end != max_ip:
+                boundaries.add(end + 1)
+        starts = sorted(boundaries)
+
+        # Sweep the boundaries keeping stack of prefixes containing the current interval. Prefixes are either
+        # nested or disjoint, so the top of the stack is the longest matching prefix.
+        prefixes = sorted(routes, key=lambda route: (route[1], route[0]))
+        values = []
+        stack = []
+        index = 0
+        for boundary in starts:
+            while stack and stack[-1][2] < boundary:
+                stack.pop()
+            while index < len(prefixes) and prefixes[index][1] == boundary:
+                stack.append(prefixes[index])
+                index += 1
+            values.append(routes[stack[-1]] if stack else default_route)
+
+        self._starts = array('L', starts) if ipv4 else starts
+        self._values = array('l', values)
+        self._next_hops = next_hops
+
+    def __len__(self):
+        return len(self._starts)
+
+    def _value(self, ip):
+        return self._values[bisect.bisect_right(self._starts, ip) - 1]
+
+    def lookup(self, ip):
+        value = self._value(ip)
+        if value < 0:
+            raise KeyError(ip)
+        return self._next_hops[value]
+
+    def contains(self, ip):
+        return self._value(ip) >= 0
+
+    def lookup_many(self, ips):
+        '''
+        @summary: Look up many addresses in one pass over the intervals.
+        @param ips: list of integer addresses
+        @return: list of next hop groups in the order of ips, None for addresses without matching route
+        '''
+        results = [None] * len(ips)
+        starts = self._starts
+        interval = 0
+        for position in sorted(range(len(ips)), key=ips.__getitem__):
+            ip = ips[position]
+            while interval + 1 < len(starts) and starts[interval + 1] <= ip:
+                interval += 1
+            value = self._values[interval]
+            if value >= 0:
+                results[position] = self._next_hops[value]
+        return results
+
+    def ranges(self):
+        ranges = []
+        max_ip, address = (IPV4_MAX, IPv4Address) if self._ipv4 else (IPV6_MAX, IPv6Address)
+        for index, start in enumerate(self._starts):
+            end = self._starts[index + 1] - 1 if index + 1 < len(self._starts) else max_ip
+            ranges.append(LpmDict.IpInterval(address(start), address(end)))
+        return ranges
+
 
 class Fib():
     class NextHop():
@@ -46,45 +194,157 @@ class Fib():
 
     # Initialize FIB with FIB file
     def __init__(self, file_path):
-        self._ipv4_lpm_dict = LpmDict()
-        for ip in EXCLUDE_IPV4_PREFIXES:
-            self._ipv4_lpm_dict[ip] = self.NextHop()
+        # Next hop groups are shared by routes with the same next hops
+        next_hop_index = {}
+        next_hops = []
+
+        def get_next_hop_index(next_hop):
+            if next_hop not in next_hop_index:
+                next_hop_index[next_hop] = len(next_hops)
+                next_hops.append(self.NextHop(next_hop))
+            return next_hop_index[next_hop]
 
-        self._ipv6_lpm_dict = LpmDict(ipv4=False)
-        for ip in EXCLUDE_IPV6_PREFIXES:
-            self._ipv6_lpm_dict[ip] = self.NextHop()
+        routes = {4: {}, 6: {}}
+        for prefix in EXCLUDE_IPV4_PREFIXES + EXCLUDE_IPV6_PREFIXES:
+            version, prefixlen, start, end = _parse_prefix(prefix)
+            routes[version][(prefixlen, start, end)] = get_next_hop_index('')
 
         # filter out empty lines and lines starting with '#'
         pattern = re.compile("^#.*$|^[ \t]*$")
 
         with open(file_path, 'r') as f:
-            for line in f.readlines():
+            for line in f:
                 if pattern.match(line):
                     continue
                 entry = line.split(' ', 1)
-                prefix = ip_network(six.text_type(entry[0]))
-                next_hop = self.NextHop(entry[1])
-                if prefix.version == 4:
-                    self._ipv4_lpm_dict[str(prefix)] = next_hop
-                elif prefix.version == 6:
-                    self._ipv6_lpm_dict[str(prefix)] = next_hop
+                version, prefixlen, start, end = _parse_prefix(six.text_type(entry[0]))
+                routes[version][(prefixlen, start, end)] = get_next_hop_index(entry[1] if len(entry) > 1 else '')
+
+        self._ipv4_table = _IntervalTable(True, routes[4], next_hops)
+        self._ipv6_table = _IntervalTable(False, routes[6], next_hops)
+
+    def _table(self, version):
+        return self._ipv4_table if version == 4 else self._ipv6_table
 
     def __getitem__(self, ip):
-        ip = ip_address(six.text_type(ip))
-        if ip.version == 4:
-            return self._ipv4_lpm_dict[str(ip)]
-        elif ip.version == 6:
-            return self._ipv6_lpm_dict[str(ip)]
+        version, value = _parse_ip(ip)
+        try:
+            return self._table(version).lookup(value)
+        except KeyError:
+            raise KeyError(ip)
 
     def __contains__(self, ip):
-        ip_obj = ip_address(six.text_type(ip))
-        if ip_obj.version == 4:
-            return self._ipv4_lpm_dict.contains(ip)
-        elif ip_obj.version == 6:
-            return self._ipv6_lpm_dict.contains(ip)
+        version, value = _parse_ip(ip)
+        return self._table(version).contains(value)
+
+    def lookup_many(self, ips):
+        '''
+        @summary: Look up next hops of many IP addresses, e.g. destinations of a whole packet batch.
+        @param ips: list of IP addresses, IPv4 and IPv6 can be mixed
+        @return: list of NextHop in the order of ips, None for addresses without matching route
+        '''
+        results = [None] * len(ips)
+        for version in (4, 6):
+            positions = []
+            values = []
+            for position, ip in enumerate(ips):
+                ip_version, value = _parse_ip(ip)
+                if ip_version == version:
+                    positions.append(position)
+                    values.append(value)
+            if values:
+                for position, next_hop in zip(positions, self._table(version).lookup_many(values)):
+                    results[position] = next_hop
+        return results
 
     def ipv4_ranges(self):
-        return self._ipv4_lpm_dict.ranges()
+        return self._ipv4_table.ranges()
 
     def ipv6_ranges(self):
-        return self._ipv6_lpm_dict.ranges()
+        return self._ipv6_table.ranges()
+
+
+def _is_private(st):
+    '''
+    @summary: Check the file or directory is owned by the user and can't be accessed by others.
+    '''
+    return st.st_uid == os.getuid() and not (st.st_mode & (stat.S_IRWXG | stat.S_IRWXO))
+
+
+def _private_cache_dir(cache_dir):
+    '''
+    @summary: Create the cache directory with mode 0700 if it doesn't exist.
+    @return: True if the cache directory is a directory private to the user
+    '''
+    if not os.path.isdir(cache_dir):
+        try:
+            os.makedirs(cache_dir, 0o700)
+        except OSError:
+            pass
+    try:
+        st = os.lstat(cache_dir)
+    except OSError:
+        return False
+    return stat.S_ISDIR(st.st_mode) and _is_private(st)
+
+
+def _trim_cache_dir(cache_dir, max_files):
+    '''
+    @summary: Remove the least recently used pickled FIBs, so that at most max_files are kept.
+    '''
+    cache_files = []
+    for name in os.listdir(cache_dir):
+        if not name.endswith('.pickle'):
+            # e.g. FIB being written by another process
+            continue
+        path = os.path.join(cache_dir, name)
+        try:
+            cache_files.append((os.stat(path).st_mtime, path))
+        except OSError:
+            pass
+    cache_files.sort(reverse=True)
+    for _, path in cache_files[max_files:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def load_fib(file_path, cache_dir=FIB_CACHE_DIR):
+    '''
+    @summary: Load FIB from FIB file, reusing the FIB pickled by a previous PTF test invocation if the content of
+              the FIB file and the excluded prefixes didn't change.
+    @param file_path: Path of the FIB file
+    @param cache_dir: Directory of the pickled FIBs, None to disable the cache. The cache is not used if the
+                      directory is not owned by the user or can be accessed by others.
+    @return: Fib
+    '''
+    if not cache_dir or not _private_cache_dir(cache_dir):
+        return Fib(file_path)
+
+    # FIB files are copied to PTF for every test, so the cache is keyed by content instead of modification time
+    key = hashlib.md5(repr((FIB_CACHE_VERSION, EXCLUDE_IPV4_PREFIXES, EXCLUDE_IPV6_PREFIXES)).encode())
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            key.update(chunk)
+    cache_file = os.path.join(cache_dir, key.hexdigest() + '.pickle')
+    try:
+        with open(cache_file, 'rb') as f:
+            if _is_private(os.fstat(f.fileno())):
+                fib = pickle.load(f)
+                # Modification time of the cache files is their last use, see _trim_cache_dir
+                os.utime(cache_file, None)
+                return fib
+    except Exception:
+        pass
+
+    fib = Fib(file_path)
+    try:
+        tmp_file = '{}.{}.tmp'.format(cache_file, os.getpid())
+        with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'wb') as f:
+            pickle.dump(fib, f, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp_file, cache_file)
+        _trim_cache_dir(cache_dir, FIB_CACHE_MAX_FILES)
+    except (IOError, OSError):
+        pass
+    return fib
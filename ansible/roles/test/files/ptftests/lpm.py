@@ -2,7 +2,6 @@ import random
 import six
 
 from ipaddress import ip_address, ip_network
-from SubnetTree import SubnetTree
 
 '''
 LpmDict is a class used in FIB test for LPM and IP segmentation.
@@ -54,6 +53,9 @@ class LpmDict():
             return str(self._start) + ' - ' + str(self._end)
 
     def __init__(self, ipv4=True):
+        # Imported here so that IpInterval can be used without SubnetTree, e.g. by Fib.ranges()
+        from SubnetTree import SubnetTree
+
         self._ipv4 = ipv4
         self._prefix_set = set()
         self._subnet_tree = SubnetTree()
@@ -121,7 +121,7 @@ class DecapPacketTest(BaseTest):
             fib.EXCLUDE_IPV4_PREFIXES.append("240.0.0.0/4")
         self.fibs = []
         for fib_info_file in self.test_params.get('fib_info_files'):
-            self.fibs.append(fib.Fib(fib_info_file))
+            self.fibs.append(fib.load_fib(fib_info_file))
 
         ptf_test_port_map = self.test_params.get('ptf_test_port_map')
         with open(ptf_test_port_map) as f:
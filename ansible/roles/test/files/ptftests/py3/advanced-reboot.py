@@ -73,6 +73,7 @@ import scapy.all as scapyall
 from scapy.arch.linux import attach_filter as attach_filter
 
 import sad_path as sp
+from disruption_monitor import DisruptionMonitor
 
 from ptf import config
 from ptf.base_tests import BaseTest
@@ -245,6 +246,8 @@ class ReloadTest(BaseTest):
         #   Improve this interval to gain more precision of disruptions.
         self.send_interval = 0.0035
         self.sent_packet_count = 0
+        # Analyzer of the captured data plane flow, updated while sniffing
+        self.flow_monitor = None
         # Thread pool for background watching operations
         self.pool = ThreadPool(processes=3)
 
@@ -1884,13 +1887,16 @@ class ReloadTest(BaseTest):
         """
         This function listens on all ports, in both directions, for the TCP src=1234 dst=5000 packets, until timeout.
         Once found, all packets are dumped to local pcap file,
-        and all packets are saved to self.packets as scapy type(pcap format).
+        and the flow packets are analyzed by self.flow_monitor while the file is written.
         """
         if not wait:
             wait = self.time_to_listen + self.test_params['sniff_time_incr']
         sniffer_start = datetime.datetime.now()
         self.log("Sniffer started at %s" % str(sniffer_start))
         sniff_filter = "tcp and tcp dst port 5000 and tcp src port 1234 and not icmp"
+        if self.vnet:
+            # The flow is VXLAN encapsulated on some of the ports, it is decapsulated by self.flow_monitor
+            sniff_filter = "({}) or (udp and udp src port 1234)".format(sniff_filter)
         sniffer = threading.Thread(target=self.tcpdump_sniff, kwargs={
                                    'wait': wait, 'sniff_filter': sniff_filter})
         sniffer.start()
@@ -1913,16 +1919,24 @@ class ReloadTest(BaseTest):
                             if self.logfile_suffix is not None else "/tmp/capture.pcapng")
             subprocess.call(["rm", "-rf", capture_pcap])  # remove old capture
             self.kill_sniffer = False
-            self.start_sniffer(capture_pcap, sniff_filter, wait)
-            self.packets = scapyall.rdpcap(capture_pcap)
-            self.log("Number of all packets captured: {}".format(len(self.packets)))
+            monitor = DisruptionMonitor(self.dut_mac, self.vlan_mac, log=self.log, vnet=self.vnet)
+            monitor.follow(capture_pcap)
+            try:
+                self.start_sniffer(capture_pcap, sniff_filter, wait, monitor)
+                # Analyze the rest of the capture
+                monitor.poll()
+            finally:
+                monitor.close()
+            self.flow_monitor = monitor
+            self.log("Number of all packets captured: {}".format(monitor.captured_count))
         except Exception:
             traceback_msg = traceback.format_exc()
             self.log("Error in tcpdump_sniff: {}".format(traceback_msg))
 
-    def start_sniffer(self, pcap_path, tcpdump_filter, timeout):
+    def start_sniffer(self, pcap_path, tcpdump_filter, timeout, monitor=None):
         """
-        Start tcpdump sniffer on all data interfaces, and kill them after a specified timeout
+        Start tcpdump sniffer on all data interfaces, and kill them after a specified timeout.
+        The captured packets are analyzed by the monitor every second, if given.
         """
         self.tcpdump_data_ifaces = [
             iface for iface in scapyall.get_if_list() if iface.startswith('eth')]
@@ -1951,6 +1965,13 @@ class ReloadTest(BaseTest):
         time_start = time.time()
         while not self.kill_sniffer:
             time.sleep(1)
+            if monitor is not None:
+                try:
+                    monitor.poll()
+                except Exception:
+                    # Don't leave dumpcap running, the error is raised again by the last poll
+                    self.log("Error in flow monitor: {}".format(traceback.format_exc()))
+                    monitor = None
             curr_time = time.time()
             if curr_time - time_start > timeout:
                 break
@@ -1977,83 +1998,29 @@ class ReloadTest(BaseTest):
         if process.returncode is not None:
             self.log("Dumpcap process killed")
 
-    def check_tcp_payload(self, packet):
-        """
-        This method is used by examine_flow() method.
-        It returns True if a packet is not corrupted and has a valid TCP sequential TCP Payload
-        """
-        try:
-            int(bytes(packet[scapyall.TCP].payload)
-                ) in range(self.sent_packet_count)
-            return True
-        except Exception:
-            return False
-
-    def no_flood(self, packet):
-        """
-        This method filters packets which are unique (i.e. no floods).
-        """
-        if (not int(bytes(packet[scapyall.TCP].payload)) in self.unique_id) and \
-                (packet[scapyall.Ether].src == self.dut_mac or packet[scapyall.Ether].src == self.vlan_mac):
-            # This is a unique (no flooded) received packet.
-            # for dualtor, t1->server rcvd pkt will have src MAC as vlan_mac,
-            # and server->t1 rcvd pkt will have src MAC as dut_mac
-            self.unique_id.append(int(bytes(packet[scapyall.TCP].payload)))
-            return True
-        elif packet[scapyall.Ether].dst == self.dut_mac or packet[scapyall.Ether].dst == self.vlan_mac:
-            # This is a sent packet.
-            # for dualtor, t1->server sent pkt will have dst MAC as dut_mac,
-            # and server->t1 sent pkt will have dst MAC as vlan_mac
-            return True
-        else:
-            return False
-
     def examine_flow(self, filename=None):
         """
-        This method examines pcap file (if given), or self.packets scapy file.
+        This method examines pcap file (if given), or the packets analyzed by self.flow_monitor while sniffing.
         The method compares TCP payloads of the packets one by one (assuming all payloads are consecutive integers),
         and the losses if found - are treated as disruptions in Dataplane forwarding.
         All disruptions are saved to self.lost_packets dictionary, in format:
         disrupt_start_id = (missing_packets_count, disrupt_time, disrupt_start_timestamp, disrupt_stop_timestamp)
         """
         if filename:
-            all_packets = scapyall.rdpcap(filename)
-        elif self.packets:
-            all_packets = self.packets
+            # Filter out packets and remove floods
+            monitor = DisruptionMonitor(self.dut_mac, self.vlan_mac, vnet=self.vnet)
+            for pkt in scapyall.rdpcap(filename):
+                monitor.add_packet(pkt)
+        elif self.flow_monitor:
+            monitor = self.flow_monitor
+            self.log("Flow monitor: {}".format(monitor.summary()))
         else:
-            self.log("Filename and self.packets are not defined.")
-            self.fails['dut'].add("Filename and self.packets are not defined")
+            self.log("Filename and self.flow_monitor are not defined.")
+            self.fails['dut'].add("Filename and self.flow_monitor are not defined")
             return None
-        # Filter out packets and remove floods:
-        # This list will contain all unique Payload ID, to filter out received floods.
-        self.unique_id = list()
-        filtered_packets = [pkt for pkt in all_packets if
-                            scapyall.TCP in pkt and
-                            scapyall.ICMP not in pkt and
-                            pkt[scapyall.TCP].sport == 1234 and
-                            pkt[scapyall.TCP].dport == 5000 and
-                            self.check_tcp_payload(pkt) and
-                            self.no_flood(pkt)
-                            ]
-
-        if self.vnet:
-            decap_packets = [scapyall.Ether(bytes(pkt.payload.payload.payload)[8:]) for pkt in all_packets if
-                             scapyall.UDP in pkt and
-                             pkt[scapyall.UDP].sport == 1234
-                             ]
-            filtered_decap_packets = [pkt for pkt in decap_packets if
-                                      scapyall.TCP in pkt and
-                                      scapyall.ICMP not in pkt and
-                                      pkt[scapyall.TCP].sport == 1234 and
-                                      pkt[scapyall.TCP].dport == 5000 and
-                                      self.check_tcp_payload(pkt) and
-                                      self.no_flood(pkt)
-                                      ]
-            filtered_packets = filtered_packets + filtered_decap_packets
 
         # Re-arrange packets, if delayed, by Payload ID and Timestamp:
-        packets = sorted(filtered_packets, key=lambda packet: (
-            int(bytes(packet[scapyall.TCP].payload)), float(packet.time)))
+        packets = monitor.sorted_packets()
         self.lost_packets = dict()
         self.max_disrupt, self.total_disruption = 0, 0
         sent_packets = dict()
@@ -2076,29 +2043,28 @@ class ReloadTest(BaseTest):
             flooded_pkts = []
             self.disruption_start, self.disruption_stop = None, None
             for packet in packets:
-                if packet[scapyall.Ether].dst == self.dut_mac or packet[scapyall.Ether].dst == self.vlan_mac:
+                if packet.sent:
                     # This is a sent packet - keep track of it as payload_id:timestamp.
                     # for dualtor both MACs are needed:
                     #   t1->server sent pkt will have dst MAC as dut_mac,
                     #   and server->t1 sent pkt will have dst MAC as vlan_mac
-                    sent_payload = int(bytes(packet[scapyall.TCP].payload))
+                    sent_payload = packet.payload_id
                     if sent_payload in sent_packets:
                         flooded_pkts.append(sent_payload)
-                    sent_packets[sent_payload] = float(packet.time)
+                    sent_packets[sent_payload] = packet.time
                     sent_counter += 1
                     continue
-                if packet[scapyall.Ether].src == self.dut_mac or packet[scapyall.Ether].src == self.vlan_mac:
-                    # This is a received packet.
-                    # for dualtor both MACs are needed:
-                    #   t1->server rcvd pkt will have src MAC as vlan_mac,
-                    #   and server->t1 rcvd pkt will have src MAC as dut_mac
-                    received_time = float(packet.time)
-                    received_payload = int(bytes(packet[scapyall.TCP].payload))
-                    if (received_payload % 5) == 0:   # From vlan to T1.
-                        received_vlan_to_t1 += 1
-                    else:
-                        received_t1_to_vlan += 1
-                    received_counter += 1
+                # This is a received packet.
+                # for dualtor both MACs are needed:
+                #   t1->server rcvd pkt will have src MAC as vlan_mac,
+                #   and server->t1 rcvd pkt will have src MAC as dut_mac
+                received_time = packet.time
+                received_payload = packet.payload_id
+                if (received_payload % 5) == 0:   # From vlan to T1.
+                    received_vlan_to_t1 += 1
+                else:
+                    received_t1_to_vlan += 1
+                received_counter += 1
                 if not (received_payload and received_time):
                     # This is the first valid received packet.
                     prev_payload = received_payload
@@ -2233,7 +2199,7 @@ class ReloadTest(BaseTest):
         if packets:
             filename = ('/tmp/capture_filtered.pcap' if self.logfile_suffix is None
                         else "/tmp/capture_filtered_%s.pcap" % self.logfile_suffix)
-            scapyall.wrpcap(filename, packets)
+            monitor.write_pcap(filename, packets)
             self.log("Filtered pcap dumped to %s" % filename)
 
     def check_forwarding_stop(self, signal):
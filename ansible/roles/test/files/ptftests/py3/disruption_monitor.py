@@ -0,0 +1,349 @@
+"""
+Online analysis of the data plane flow sent by advanced-reboot.
+
+The sniffer of advanced-reboot runs dumpcap for the whole reboot window. Instead of loading the complete capture
+with scapy once the sniffer is finished, DisruptionMonitor follows the pcapng file while dumpcap writes it, and keeps
+only what the disruption analysis needs: payload ID and timestamp of the sent and received packets of the flow.
+Received floods are dropped as soon as they are captured, and the longest disruption and the lost packets are
+tracked as the packets arrive.
+"""
+import heapq
+import struct
+from collections import namedtuple
+
+import scapy.all as scapyall
+
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_IDB = 1
+PCAPNG_EPB = 6
+PCAPNG_BYTE_ORDER = {
+    b"\x4d\x3c\x2b\x1a": "<",
+    b"\x1a\x2b\x3c\x4d": ">",
+}
+PCAPNG_OPT_ENDOFOPT = 0
+PCAPNG_OPT_IF_TSRESOL = 9
+PCAPNG_DEFAULT_TSRESOL = 1000000
+
+PCAP_HEADER = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 65535, 1)
+LINKTYPE_ETHERNET = 1
+
+FLOW_SPORT = 1234
+FLOW_DPORT = 5000
+ETH_TYPE_IPV4 = 0x0800
+ETH_TYPE_IPV6 = 0x86dd
+IP_PROTO_TCP = 6
+IP_PROTO_UDP = 17
+# VXLAN encapsulated flow of vnet tests, and the VXLAN header before the inner frame
+VXLAN_SPORT = 1234
+VXLAN_HEADER_LEN = 8
+# Ethernet, IPv4 and TCP headers without options
+PLAIN_HEADERS_LEN = 14 + 20 + 20
+# Received packets may be captured out of order, the live disruptions are counted once the received packet is
+# REORDER_WINDOW packet IDs behind the highest received ID
+REORDER_WINDOW = 1000
+
+# Packet of the flow, sorted the way the flow is examined: by payload ID, timestamp, then capture order.
+# source is (file offset, length) of the captured frame, or the scapy packet.
+FlowPacket = namedtuple("FlowPacket", ["payload_id", "time", "order", "sent", "source"])
+
+
+def mac_str(mac_bytes):
+    """Format MAC address the way scapy does."""
+    return ":".join("%02x" % octet for octet in bytearray(mac_bytes))
+
+
+class PcapngTail(object):
+    """Reader of the packets appended to a pcapng file which is still being written."""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.buffer = b""
+        # File offset of the buffer
+        self.offset = 0
+        self.byte_order = "<"
+        # (linktype, tsresol) of the interfaces of the current section
+        self.interfaces = []
+
+    def read(self):
+        """
+        Read the complete blocks written since the previous call.
+
+        Returns: list of (frame offset, linktype, timestamp, frame) of the captured packets
+        """
+        if self.file is None:
+            try:
+                self.file = open(self.path, "rb")
+            except IOError:
+                return []
+        data = self.file.read()
+        if not data:
+            return []
+        buf = self.buffer + data
+        try:
+            packets, pos = self._read_blocks(buf)
+        except Exception:
+            # Read the same data again on the next call
+            self.file.seek(self.offset + len(self.buffer))
+            raise
+        self.buffer = buf[pos:]
+        self.offset += pos
+        return packets
+
+    def _read_blocks(self, buf):
+        byte_order, interfaces = self.byte_order, list(self.interfaces)
+        packets = []
+        pos = 0
+        while len(buf) - pos >= 12:
+            if buf[pos:pos + 4] == b"\x0a\x0d\x0d\x0a":
+                if buf[pos + 8:pos + 12] not in PCAPNG_BYTE_ORDER:
+                    raise ValueError("{} is not a pcapng file".format(self.path))
+                byte_order = PCAPNG_BYTE_ORDER[buf[pos + 8:pos + 12]]
+            block_type, length = struct.unpack_from(byte_order + "II", buf, pos)
+            if length < 12 or length % 4:
+                raise ValueError("Invalid pcapng block length {} at offset {}".format(length, self.offset + pos))
+            if len(buf) - pos < length:
+                break
+            body = pos + 8
+            if block_type == PCAPNG_SHB:
+                interfaces = []
+            elif block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(byte_order + "H", buf, body)[0]
+                interfaces.append((linktype, self._read_tsresol(buf, byte_order, body + 8, pos + length - 4)))
+            elif block_type == PCAPNG_EPB:
+                intid, tshigh, tslow, caplen = struct.unpack_from(byte_order + "IIII", buf, body)
+                linktype, tsresol = interfaces[intid]
+                frame = body + 20
+                packets.append((self.offset + frame, linktype, ((tshigh << 32) + tslow) / tsresol,
+                                buf[frame:frame + caplen]))
+            pos += length
+        self.byte_order, self.interfaces = byte_order, interfaces
+        return packets, pos
+
+    @staticmethod
+    def _read_tsresol(buf, byte_order, pos, end):
+        while pos + 4 <= end:
+            code, length = struct.unpack_from(byte_order + "HH", buf, pos)
+            if code == PCAPNG_OPT_ENDOFOPT:
+                break
+            if code == PCAPNG_OPT_IF_TSRESOL and length == 1:
+                tsresol = bytearray(buf[pos + 4:pos + 5])[0]
+                return (2 if tsresol & 128 else 10) ** (tsresol & 127)
+            pos += 4 + (length + 3) // 4 * 4
+        return PCAPNG_DEFAULT_TSRESOL
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+
+class DisruptionMonitor(object):
+    """
+    Incremental analyzer of the TCP flow (sport 1234, dport 5000) sent by advanced-reboot.
+
+    The packets are kept if they have a valid payload ID, and are either sent to the DUT (destination MAC is the
+    DUT or VLAN MAC), or are the first packet with the payload ID received from the DUT (source MAC is the DUT or
+    VLAN MAC). Received floods are dropped.
+    With vnet, the inner frames of the VXLAN packets (UDP sport 1234) are analyzed too.
+    """
+
+    def __init__(self, dut_mac, vlan_mac, log=None, vnet=False):
+        self.macs = (dut_mac, vlan_mac)
+        self.log = log
+        self.vnet = vnet
+        self.tail = None
+        self.captured_count = 0
+        self.flow_packets = []
+        self.received_ids = set()
+        # Payload of the flow is dissected as some protocol by scapy, frames must be dissected by scapy too
+        self.dissect_all = any(
+            all({"sport": FLOW_SPORT, "dport": FLOW_DPORT}.get(field) == value for field, value in fields.items())
+            for fields, _ in scapyall.TCP.payload_guess)
+
+        # Disruptions between the received packets, available while capturing
+        self.pending_ids = []
+        self.pending_times = {}
+        self.max_received_id = None
+        self.last_received = None
+        self.disrupts_count = 0
+        self.lost_count = 0
+        self.max_lost = 0
+        self.max_disrupt_time = 0
+
+    def follow(self, path):
+        """Analyze packets of the pcapng file being written, on every call to poll()."""
+        self.tail = PcapngTail(path)
+
+    def poll(self):
+        """Analyze packets captured since the previous poll."""
+        for source, linktype, timestamp, frame in self.tail.read():
+            self.captured_count += 1
+            flow = self._decode(frame, linktype)
+            if flow is not None:
+                self._add(flow, timestamp, (source, len(frame)))
+            inner = self._decap(frame, linktype) if self.vnet else None
+            if inner is not None:
+                start, end = inner
+                flow = self._decode(frame[start:end], LINKTYPE_ETHERNET)
+                if flow is not None:
+                    self._add(flow, timestamp, (source + start, end - start))
+
+    def close(self):
+        """Count the disruptions of all the received packets and close the capture file."""
+        if self.max_received_id is not None:
+            self._settle(self.max_received_id)
+        if self.tail is not None:
+            self.tail.close()
+
+    def add_packet(self, packet):
+        """Analyze scapy packet, eg. read from pcap file."""
+        self.captured_count += 1
+        flow = self._dissect(packet)
+        if flow is not None:
+            self._add(flow, float(packet.time), packet)
+        if self.vnet and scapyall.Ether in packet:
+            frame = bytes(packet)
+            inner = self._decap(frame, LINKTYPE_ETHERNET)
+            if inner is not None:
+                inner_packet = scapyall.Ether(frame[inner[0]:inner[1]])
+                inner_packet.time = packet.time
+                flow = self._dissect(inner_packet)
+                if flow is not None:
+                    self._add(flow, float(packet.time), inner_packet)
+
+    @staticmethod
+    def _decap(frame, linktype):
+        """
+        Get (start, end) of the inner frame of the VXLAN packet (Ethernet/IP/UDP sport 1234/VXLAN), or None for
+        other packets.
+        """
+        if linktype != LINKTYPE_ETHERNET or len(frame) < 14:
+            return None
+        ethertype = struct.unpack_from("!H", frame, 12)[0]
+        if ethertype == ETH_TYPE_IPV4 and len(frame) >= 14 + 20:
+            ihl = (bytearray(frame[14:15])[0] & 0xf) * 4
+            proto = bytearray(frame[23:24])[0]
+            udp = 14 + ihl
+        elif ethertype == ETH_TYPE_IPV6 and len(frame) >= 14 + 40:
+            proto = bytearray(frame[20:21])[0]
+            udp = 14 + 40
+        else:
+            return None
+        if proto != IP_PROTO_UDP or len(frame) < udp + 8 + VXLAN_HEADER_LEN:
+            return None
+        sport, udp_len = struct.unpack_from("!H2xH", frame, udp)
+        if sport != VXLAN_SPORT:
+            return None
+        return udp + 8 + VXLAN_HEADER_LEN, min(udp + udp_len, len(frame))
+
+    def _decode(self, frame, linktype):
+        """
+        Decode (source MAC, destination MAC, payload ID) of the flow packet from the frame, or None for
+        other packets.
+        Ethernet/IPv4/TCP frames without options or padding are decoded in place, others are dissected by scapy.
+        """
+        if linktype == LINKTYPE_ETHERNET and not self.dissect_all and len(frame) >= PLAIN_HEADERS_LEN:
+            ethertype, version_ihl = struct.unpack_from("!HB", frame, 12)
+            ip_len, fragment, proto = struct.unpack_from("!H2xH1xB", frame, 16)
+            sport, dport, offset = struct.unpack_from("!HH8xB", frame, 34)
+            if ethertype == ETH_TYPE_IPV4 and version_ihl == 0x45 and (fragment & 0x3fff) == 0 and \
+                    proto == IP_PROTO_TCP and offset >> 4 == 5 and 14 + ip_len == len(frame):
+                if sport != FLOW_SPORT or dport != FLOW_DPORT:
+                    return None
+                try:
+                    payload_id = int(frame[PLAIN_HEADERS_LEN:])
+                except Exception:
+                    return None
+                return mac_str(frame[6:12]), mac_str(frame[0:6]), payload_id
+        try:
+            packet = scapyall.conf.l2types.num2layer.get(linktype, scapyall.conf.raw_layer)(frame)
+        except Exception:
+            return None
+        return self._dissect(packet)
+
+    def _dissect(self, packet):
+        if scapyall.TCP not in packet or scapyall.ICMP in packet or scapyall.Ether not in packet:
+            return None
+        if packet[scapyall.TCP].sport != FLOW_SPORT or packet[scapyall.TCP].dport != FLOW_DPORT:
+            return None
+        try:
+            payload_id = int(bytes(packet[scapyall.TCP].payload))
+        except Exception:
+            return None
+        return packet[scapyall.Ether].src, packet[scapyall.Ether].dst, payload_id
+
+    def _add(self, flow, timestamp, source):
+        src, dst, payload_id = flow
+        if payload_id not in self.received_ids and src in self.macs:
+            # This is a unique (no flooded) received packet.
+            self.received_ids.add(payload_id)
+        elif dst not in self.macs:
+            return
+        sent = dst in self.macs
+        self.flow_packets.append(FlowPacket(payload_id, timestamp, len(self.flow_packets), sent, source))
+        if not sent:
+            self._track(payload_id, timestamp)
+
+    def _track(self, payload_id, timestamp):
+        if self.last_received is not None and payload_id <= self.last_received[0]:
+            # Received after the window, the ID was counted as lost
+            return
+        heapq.heappush(self.pending_ids, payload_id)
+        self.pending_times[payload_id] = timestamp
+        if self.max_received_id is None or payload_id > self.max_received_id:
+            self.max_received_id = payload_id
+        self._settle(self.max_received_id - REORDER_WINDOW)
+
+    def _settle(self, max_id):
+        while self.pending_ids and self.pending_ids[0] <= max_id:
+            payload_id = heapq.heappop(self.pending_ids)
+            timestamp = self.pending_times.pop(payload_id)
+            if self.last_received is not None and payload_id > self.last_received[0] + 1:
+                last_id, last_time = self.last_received
+                lost = payload_id - last_id - 1
+                disrupt_time = timestamp - last_time
+                self.disrupts_count += 1
+                self.lost_count += lost
+                if (lost, disrupt_time) > (self.max_lost, self.max_disrupt_time):
+                    self.max_lost, self.max_disrupt_time = lost, disrupt_time
+                    if self.log:
+                        self.log("Longest disruption so far between packet ID %d and %d. For %.4f" % (
+                            last_id, payload_id, disrupt_time))
+            self.last_received = (payload_id, timestamp)
+
+    def summary(self):
+        return "%d packets captured, %d packets of the flow, %d disruptions, %d packets lost, " \
+               "the longest disruption lasted %.3f seconds, %d packets lost" % (
+                   self.captured_count, len(self.flow_packets), self.disrupts_count, self.lost_count,
+                   self.max_disrupt_time, self.max_lost)
+
+    def sorted_packets(self):
+        """Return the packets of the flow sorted by payload ID, then timestamp, to re-arrange delayed packets."""
+        return sorted(self.flow_packets)
+
+    def write_pcap(self, filename, packets):
+        """Dump the flow packets to pcap file."""
+        capture = open(self.tail.path, "rb") if self.tail is not None else None
+        try:
+            self._write_pcap(filename, packets, capture)
+        finally:
+            if capture is not None:
+                capture.close()
+
+    def _write_pcap(self, filename, packets, capture):
+        with open(filename, "wb") as pcap:
+            pcap.write(PCAP_HEADER)
+            for packet in packets:
+                if isinstance(packet.source, tuple):
+                    offset, length = packet.source
+                    capture.seek(offset)
+                    frame = capture.read(length)
+                else:
+                    frame = bytes(packet.source)
+                sec = int(packet.time)
+                usec = int(round((packet.time - sec) * 1000000))
+                if usec == 1000000:
+                    sec, usec = sec + 1, 0
+                pcap.write(struct.pack("<IIII", sec, usec, len(frame), len(frame)))
+                pcap.write(frame)
@@ -5,8 +5,10 @@ Description:    This file contains the hash test for SONiC
 # Global imports
 # ---------------------------------------------------------------------
 import logging
+import os
 import random
 import json
+import struct
 import time
 import six
 import itertools
@@ -16,6 +18,7 @@ from collections import defaultdict
 from ipaddress import ip_address, ip_network
 import ptf
 import ptf.packet as scapy
+import ptf.testutils
 from utilities import retry_call
 from ptf.base_tests import BaseTest
 from ptf.mask import Mask
@@ -41,6 +44,11 @@ class HashTest(BaseTest):
     RELAXED_BALANCING_RANGE = 0.80
     BALANCING_TEST_TIMES = 250
     DEFAULT_SWITCH_TYPE = 'voq'
+    DEFAULT_BATCH_SIZE = 256
+    # Tag embedded at the start of the TCP payload in batch mode: prefix, batch id and packet index
+    BATCH_TAG_PREFIX = b'HASHTEST'
+    BATCH_TAG_FORMAT = '!8sII'
+    BATCH_DRAIN_TIMEOUT = 1
     _required_params = [
         'fib_info_files',
         'ptf_test_port_map'
@@ -72,7 +80,7 @@ class HashTest(BaseTest):
         self.dataplane = ptf.dataplane_instance
         self.fibs = []
         for fib_info_file in self.test_params.get('fib_info_files'):
-            self.fibs.append(fib.Fib(fib_info_file))
+            self.fibs.append(fib.load_fib(fib_info_file))
         ptf_test_port_map = self.test_params.get('ptf_test_port_map')
         with open(ptf_test_port_map) as f:
             self.ptf_test_port_map = json.load(f)
@@ -111,6 +119,12 @@ class HashTest(BaseTest):
         self.base_mac = self.dataplane.get_mac(
             *random.choice(list(self.dataplane.ports.keys())))
         self.vxlan_dest_port = int(self.test_params.get('vxlan_dest_port', 0))
+        # In batch mode, packets are sent in bursts and received packets are classified by a tag in their payload,
+        # instead of sending a packet and waiting for it one by one. Only supported by HashTest.
+        self.batch_mode = self.test_params.get('batch_mode', False)
+        # A burst must fit in the dataplane queue of a port, otherwise received packets are dropped
+        self.batch_size = min(int(self.test_params.get('batch_size', self.DEFAULT_BATCH_SIZE)),
+                              int(ptf.config.get('qlen', 100)))
 
     def _get_nexthops(self, src_port, dst_ip):
         active_dut_indexes = [0]
@@ -214,6 +228,14 @@ class HashTest(BaseTest):
             # in the hit count map.
             assert len(hit_count_map.keys()) == len(
                 self.ptf_test_port_map[str(ingress_port)]["target_dut"])
+        elif self.batch_mode:
+            hit_count_map = self.check_ip_route_batch(
+                hash_key, src_port, dst_ip, exp_port_lists,
+                self.balancing_test_times * len(list(itertools.chain(*exp_port_lists))))
+            logging.info("hash_key={}, hit count map: {}".format(
+                hash_key, hit_count_map))
+            for next_hop in next_hops:
+                self.check_balancing(next_hop.get_next_hop(), hit_count_map, src_port, hash_key)
         else:
             for _ in range(0, self.balancing_test_times * len(list(itertools.chain(*exp_port_lists)))):
                 logging.info('Checking hash key {}, src_port={}, exp_ports={}, dst_ip={}'
@@ -227,6 +249,94 @@ class HashTest(BaseTest):
             for next_hop in next_hops:
                 self.check_balancing(next_hop.get_next_hop(), hit_count_map, src_port, hash_key)
 
+    def add_packet_tag(self, pkt, exp_pkt, tag):
+        '''
+        @summary: Embed the tag at the start of the TCP payload of the packet and the expected packet.
+                  The payload is not used by hashing, so the tag doesn't change the egress port.
+        '''
+        for packet in (pkt, exp_pkt):
+            payload = bytes(packet[scapy.TCP].payload)
+            packet[scapy.TCP].remove_payload()
+            packet[scapy.TCP].add_payload(scapy.Raw(load=tag + payload[len(tag):]))
+
+    def get_packet_tag(self, batch_id, rcvd_pkt):
+        '''
+        @summary: Get index of the packet in batch from the tag in the received packet.
+        @return: index of the packet, or None if the packet is not tagged by the batch.
+        '''
+        offset = rcvd_pkt.find(self.BATCH_TAG_PREFIX)
+        tag_len = struct.calcsize(self.BATCH_TAG_FORMAT)
+        if offset < 0 or len(rcvd_pkt) < offset + tag_len:
+            return None
+        _, rcvd_batch_id, index = struct.unpack_from(self.BATCH_TAG_FORMAT, rcvd_pkt, offset)
+        return index if rcvd_batch_id == batch_id else None
+
+    def collect_batch_packets(self, batch_id, count):
+        '''
+        @summary: Drain the dataplane until all the packets of the batch are received or no packet is received
+                  for BATCH_DRAIN_TIMEOUT seconds.
+        @return: dict of {packet index: (received port, received packet)}
+        '''
+        received = {}
+        while len(received) < count:
+            result = ptf.testutils.dp_poll(self, device_number=0, timeout=self.BATCH_DRAIN_TIMEOUT)
+            if not isinstance(result, self.dataplane.PollSuccess):
+                break
+            index = self.get_packet_tag(batch_id, result.packet)
+            if index is not None and index < count and index not in received:
+                received[index] = (result.port, result.packet)
+        return received
+
+    def check_ip_route_batch(self, hash_key, src_port, dst_ip, dst_port_lists, count):
+        '''
+        @summary: Batched check_ip_route. Build packets in batches, send each batch as a burst, then drain the
+                  dataplane once and classify the received packets by the tag embedded in their payload.
+                  Packets which were not received are checked again one by one.
+        @return: hit count map of { port: number of received packets }
+        '''
+        ipv4 = ip_network(six.text_type(dst_ip)).version == 4
+        dst_ports = list(itertools.chain(*dst_port_lists))
+        hit_count_map = {}
+        sent = 0
+        while sent < count:
+            batch_id = struct.unpack('!I', os.urandom(4))[0]
+            batch = []
+            for index in range(min(self.batch_size, count - sent)):
+                tag = struct.pack(self.BATCH_TAG_FORMAT, self.BATCH_TAG_PREFIX, batch_id, index)
+                if ipv4:
+                    batch.append(self.generate_ipv4_packet(hash_key, src_port, tag=tag))
+                else:
+                    batch.append(self.generate_ipv6_packet(hash_key, src_port, tag=tag))
+
+            logging.info('Checking hash key {} with batch of {} packets, src_port={}, exp_ports={}, dst_ip={}'
+                         .format(hash_key, len(batch), src_port, dst_port_lists, dst_ip))
+            self.dataplane.flush()
+            for pkt, _, _, _, _ in batch:
+                send_packet(self, src_port, pkt)
+            received = self.collect_batch_packets(batch_id, len(batch))
+
+            missed = 0
+            for index, (pkt, masked_exp_pkt, logs, ip_src, ip_dst) in enumerate(batch):
+                if index in received and received[index][0] in dst_ports and \
+                        masked_exp_pkt.pkt_match(received[index][1]):
+                    rcvd_port, rcvd_pkt = received[index]
+                else:
+                    missed += 1
+                    rcvd_port, rcvd_pkt = retry_call(
+                        self.send_and_verify_packets,
+                        fargs=[src_port, pkt, masked_exp_pkt, dst_port_lists, logs],
+                        tries=2,
+                        delay=2
+                    )
+                (matched_port, _) = self.get_validated_packet(
+                    rcvd_port, rcvd_pkt, dst_port_lists, ip_src, ip_dst, src_port)
+                hit_count_map[matched_port] = hit_count_map.get(matched_port, 0) + 1
+            if missed:
+                logging.warning('{} of {} packets of the batch were not received, checked them one by one'
+                                .format(missed, len(batch)))
+            sent += len(batch)
+        return hit_count_map
+
     def check_ip_route(self, hash_key, src_port, dst_ip, dst_port_lists):
         if ip_network(six.text_type(dst_ip)).version == 4:
             (matched_port, received) = self.check_ipv4_route(
@@ -392,12 +502,12 @@ class HashTest(BaseTest):
                 pkt['IPv6'].nh = ip_proto
                 exp_pkt['IPv6'].nh = ip_proto
 
-    def check_ipv4_route(self, hash_key, src_port, dst_port_lists, outer_sport=None, outer_dst_ip=None,
-                         outer_src_ip=None):
+    def generate_ipv4_packet(self, hash_key, src_port, outer_dst_ip=None, outer_src_ip=None, tag=None):
         '''
-        @summary: Check IPv4 route works.
+        @summary: Generate IPv4 packet varying the field of the hash key.
+        @param tag: Tag embedded in the payload of the packet, used by batch mode
+        @return: (packet, masked expected packet, logs, ip_src, ip_dst)
         '''
-        class_name = self.__class__.__name__
         ip_src = self.src_ip_interval.get_random_ip(
         ) if hash_key == 'src-ip' else self.src_ip_interval.get_first_ip()
         ip_dst = self.dst_ip_interval.get_random_ip(
@@ -430,6 +540,8 @@ class HashTest(BaseTest):
             hash_key=hash_key
         )
         self.set_packet_parameter(pkt, exp_pkt, hash_key, ip_proto, version='IP')
+        if tag is not None:
+            self.add_packet_tag(pkt, exp_pkt, tag)
         masked_exp_pkt = Mask(exp_pkt)
         masked_exp_pkt = self.apply_mask_to_exp_pkt(masked_exp_pkt, version='IP')
         logs = self.create_packets_logs(
@@ -446,6 +558,16 @@ class HashTest(BaseTest):
             ip_dst=ip_dst,
             ip_proto=ip_proto
         )
+        return pkt, masked_exp_pkt, logs, ip_src, ip_dst
+
+    def check_ipv4_route(self, hash_key, src_port, dst_port_lists, outer_sport=None, outer_dst_ip=None,
+                         outer_src_ip=None):
+        '''
+        @summary: Check IPv4 route works.
+        '''
+        class_name = self.__class__.__name__
+        pkt, masked_exp_pkt, logs, ip_src, ip_dst = self.generate_ipv4_packet(
+            hash_key, src_port, outer_dst_ip=outer_dst_ip, outer_src_ip=outer_src_ip)
         if class_name == 'HashTest':
             rcvd_port, rcvd_pkt = retry_call(
                 self.send_and_verify_packets,
@@ -457,11 +579,12 @@ class HashTest(BaseTest):
             rcvd_port, rcvd_pkt = self.send_and_verify_packets(src_port, pkt, masked_exp_pkt, dst_port_lists, logs=logs)
         return self.get_validated_packet(rcvd_port, rcvd_pkt, dst_port_lists, ip_src, ip_dst, src_port)
 
-    def check_ipv6_route(self, hash_key, src_port, dst_port_lists, outer_src_ip=None, outer_dst_ip=None):
+    def generate_ipv6_packet(self, hash_key, src_port, outer_src_ip=None, outer_dst_ip=None, tag=None):
         '''
-        @summary: Check IPv6 route works.
+        @summary: Generate IPv6 packet varying the field of the hash key.
+        @param tag: Tag embedded in the payload of the packet, used by batch mode
+        @return: (packet, masked expected packet, logs, ip_src, ip_dst)
         '''
-        class_name = self.__class__.__name__
         ip_src = self.src_ip_interval.get_random_ip(
         ) if hash_key == 'src-ip' else self.src_ip_interval.get_first_ip()
         ip_dst = self.dst_ip_interval.get_random_ip(
@@ -495,6 +618,8 @@ class HashTest(BaseTest):
             hash_key=hash_key
         )
         self.set_packet_parameter(pkt, exp_pkt, hash_key, ip_proto, version='IPv6')
+        if tag is not None:
+            self.add_packet_tag(pkt, exp_pkt, tag)
         masked_exp_pkt = Mask(exp_pkt)
         masked_exp_pkt = self.apply_mask_to_exp_pkt(masked_exp_pkt, version='IPv6')
         logs = self.create_packets_logs(
@@ -512,6 +637,15 @@ class HashTest(BaseTest):
             ip_proto=ip_proto,
             version='IPv6'
         )
+        return pkt, masked_exp_pkt, logs, ip_src, ip_dst
+
+    def check_ipv6_route(self, hash_key, src_port, dst_port_lists, outer_src_ip=None, outer_dst_ip=None):
+        '''
+        @summary: Check IPv6 route works.
+        '''
+        class_name = self.__class__.__name__
+        pkt, masked_exp_pkt, logs, ip_src, ip_dst = self.generate_ipv6_packet(
+            hash_key, src_port, outer_src_ip=outer_src_ip, outer_dst_ip=outer_dst_ip)
         if class_name == 'HashTest':
             rcvd_port, rcvd_pkt = retry_call(
                 self.send_and_verify_packets,
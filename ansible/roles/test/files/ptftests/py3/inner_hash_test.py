@@ -60,7 +60,7 @@ class InnerHashTest(BaseTest):
         '''
         self.dataplane = ptf.dataplane_instance
 
-        self.fib = fib.Fib(self.test_params['fib_info'])
+        self.fib = fib.load_fib(self.test_params['fib_info'])
         self.router_mac = self.test_params['router_mac']
 
         inner_src_ip_range = [
@@ -0,0 +1,139 @@
+import binascii
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+import scapy.all as scapyall
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from disruption_monitor import DisruptionMonitor  # noqa: E402
+
+DUT_MAC = "00:11:22:33:44:55"
+VLAN_MAC = "00:11:22:33:44:56"
+PTF_MAC = "00:de:ad:be:ef:01"
+
+# VXLAN packet of the vnet flow received from the DUT: payload ID 42 sent by the server is encapsulated
+# by the DUT (outer source MAC is the DUT MAC) to the VXLAN port 13330 of vnet tests, which scapy doesn't
+# dissect as VXLAN.
+CAPTURED_VXLAN_FRAME = binascii.unhexlify(
+    "00deadbeef0100112233445508004500005c000100004011666e0a0100200a010001"
+    "04d2341200482c7d0800000000fa000000aabbcc789a00112233445508004500002a"
+    "000100003f065520c0a801026401010204d213880000000000000000500220001ca7"
+    "00003432")
+CAPTURED_INNER_FRAME = CAPTURED_VXLAN_FRAME[50:]
+VXLAN_DPORT = 13330
+
+
+def vxlan_frame(payload_id, ipv6=False):
+    """VXLAN frame of the vnet flow received from the DUT, the way CAPTURED_VXLAN_FRAME was built."""
+    inner = scapyall.Ether(src=DUT_MAC, dst="00:aa:bb:cc:78:9a") / \
+        scapyall.IP(src="192.168.1.2", dst="100.1.1.2", ttl=63) / \
+        scapyall.TCP(sport=1234, dport=5000, flags="S") / str(payload_id).encode()
+    outer_ip = scapyall.IPv6(src="fc00::20", dst="fc00::1") if ipv6 else scapyall.IP(src="10.1.0.32", dst="10.1.0.1")
+    return bytes(scapyall.Ether(src=DUT_MAC, dst=PTF_MAC) / outer_ip /
+                 scapyall.UDP(sport=1234, dport=VXLAN_DPORT) /
+                 binascii.unhexlify("0800000000fa0000") / inner)
+
+
+def sent_frame(payload_id):
+    """Packet of the flow sent by the server to the DUT."""
+    return bytes(scapyall.Ether(src=PTF_MAC, dst=VLAN_MAC) /
+                 scapyall.IP(src="192.168.1.2", dst="100.1.1.2") /
+                 scapyall.TCP(sport=1234, dport=5000, flags="S") / str(payload_id).encode())
+
+
+class TestDisruptionMonitorVxlan(unittest.TestCase):
+    """Test cases for the VXLAN decapsulation of the vnet flow by DisruptionMonitor."""
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def capture(self, frames):
+        """Write the frames to pcapng file the way dumpcap does, one packet per millisecond."""
+        path = os.path.join(self.tmp_dir, "capture.pcapng")
+        packets = []
+        for index, frame in enumerate(frames):
+            packet = scapyall.Ether(frame)
+            packet.time = 1000 + index * 0.001
+            packets.append(packet)
+        scapyall.wrpcapng(path, packets)
+        return path
+
+    def flow(self, monitor):
+        return [(packet.payload_id, packet.sent) for packet in monitor.sorted_packets()]
+
+    def test_decap_captured_frame(self):
+        self.assertEqual(vxlan_frame(42), CAPTURED_VXLAN_FRAME)
+        start, end = DisruptionMonitor._decap(CAPTURED_VXLAN_FRAME, scapyall.DLT_EN10MB)
+        self.assertEqual(CAPTURED_VXLAN_FRAME[start:end], CAPTURED_INNER_FRAME)
+
+        frame = vxlan_frame(42, ipv6=True)
+        start, end = DisruptionMonitor._decap(frame, scapyall.DLT_EN10MB)
+        self.assertEqual(frame[start:end], CAPTURED_INNER_FRAME)
+
+        # Not the VXLAN packet of the flow
+        self.assertIsNone(DisruptionMonitor._decap(sent_frame(42), scapyall.DLT_EN10MB))
+        other = bytes(scapyall.Ether(CAPTURED_VXLAN_FRAME))
+        other = other[:34] + b"\x04\xd3" + other[36:]
+        self.assertIsNone(DisruptionMonitor._decap(other, scapyall.DLT_EN10MB))
+
+    def test_captured_frame_poll(self):
+        path = self.capture([sent_frame(42), CAPTURED_VXLAN_FRAME])
+
+        monitor = DisruptionMonitor(DUT_MAC, VLAN_MAC)
+        monitor.follow(path)
+        monitor.poll()
+        monitor.close()
+        # Received packet is missed without the decapsulation
+        self.assertEqual(self.flow(monitor), [(42, True)])
+
+        monitor = DisruptionMonitor(DUT_MAC, VLAN_MAC, vnet=True)
+        monitor.follow(path)
+        monitor.poll()
+        monitor.close()
+        self.assertEqual(self.flow(monitor), [(42, True), (42, False)])
+
+        # The inner frame is dumped for the received packet
+        filtered = os.path.join(self.tmp_dir, "filtered.pcap")
+        monitor.write_pcap(filtered, monitor.sorted_packets())
+        self.assertEqual([bytes(packet) for packet in scapyall.rdpcap(filtered)],
+                         [sent_frame(42), CAPTURED_INNER_FRAME])
+
+    def test_poll_same_as_pcap(self):
+        frames = []
+        for payload_id in range(100):
+            frames.append(sent_frame(payload_id))
+            # Disruption of 20 packets and a packet received twice, VXLAN over IPv6 from payload ID 50
+            if not 40 <= payload_id < 60:
+                frames.append(vxlan_frame(payload_id, ipv6=payload_id >= 50))
+            if payload_id == 70:
+                frames.append(vxlan_frame(payload_id))
+        path = self.capture(frames)
+
+        polled = DisruptionMonitor(DUT_MAC, VLAN_MAC, vnet=True)
+        polled.follow(path)
+        polled.poll()
+        polled.close()
+
+        # examine_flow with the pcap file
+        read = DisruptionMonitor(DUT_MAC, VLAN_MAC, vnet=True)
+        for packet in scapyall.rdpcap(path):
+            read.add_packet(packet)
+        read.close()
+
+        self.assertEqual(polled.captured_count, len(frames))
+        self.assertEqual(self.flow(polled), self.flow(read))
+        self.assertEqual([packet.time for packet in polled.sorted_packets()],
+                         [float(packet.time) for packet in read.sorted_packets()])
+        self.assertEqual(len([sent for _, sent in self.flow(polled) if not sent]), 80)
+        for monitor in (polled, read):
+            self.assertEqual((monitor.disrupts_count, monitor.lost_count, monitor.max_lost), (1, 20, 20))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -29,18 +29,31 @@ import re
 import os
 import os.path
 import csv
+import gzip
+import io
+import json
 import time
 import logging
 import logging.handlers
 import subprocess
 from datetime import datetime
 
+try:
+    import re._parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+
 # ---------------------------------------------------------------------
 # Global variables
 # ---------------------------------------------------------------------
 tokenizer = ','
 comment_key = '#'
 system_log_file = '/var/log/syslog'
+# -- Index of start marker positions, see save_marker_index().
+# -- Also read by the extract_log ansible module, keep the format in sync.
+marker_index_file = '/tmp/loganalyzer.marker_index.json'
+marker_index_max_entries = 64
 re_rsyslog_pid = re.compile(r"PID:\s+(\d+)")
 
 # -- List of ERROR codes to be returned by AnsibleLogAnalyzer
@@ -52,12 +65,164 @@ err_invalid_string_format = -5
 err_invalid_input = -6
 err_end_ignore_marker = -7
 err_start_ignore_marker = -8
+err_invalid_request = -9
 
 # -- Max log message length
 # The default maximum length of a single log message. Any line longer than MAX_LOG_MESSAGE_LENGTH
 # will not be picked up by the analyzer.
 MAX_LOG_MESSAGE_LENGTH = 1000
 
+# -- Max number of compiled regex sets kept by get_regex_set()
+MAX_REGEX_SET_CACHE_SIZE = 32
+
+
+class RegexSet:
+    '''
+    @summary: Set of regular expressions evaluated together against log lines.
+
+    Loganalyzer only needs to know whether a line matches any regex of the set,
+    which allows the following optimizations over one plain alternation:
+    - leading and trailing '.*' are stripped from the regexes used for search,
+      they don't change the search result but make every failed search quadratic;
+    - a literal substring required by each regex is extracted, lines which contain
+      none of them are rejected by a prefilter of escaped literals before running
+      the regexes;
+    - search_all() returns indexes of all the regexes that hit the line, checking only
+      the regexes which required literal is present in the line.
+
+    Instances are immutable, use get_regex_set() to share them between analysis runs.
+    '''
+
+    def __init__(self, regex_list):
+        self.patterns = list(regex_list)
+        self.regex = re.compile('|'.join(self.patterns))
+        self.pattern = self.regex.pattern
+        self.search_patterns = [self.strip_wildcards(pattern) for pattern in self.patterns]
+        self.search_regex = re.compile('|'.join(self.search_patterns))
+        self.compiled = [re.compile(pattern) for pattern in self.search_patterns]
+
+        # -- map required literal -> indexes of regexes requiring it
+        self.literals = {}
+        self.no_literal_indexes = []
+        for index, pattern in enumerate(self.search_patterns):
+            literal = self.required_literal(pattern)
+            if literal:
+                self.literals.setdefault(literal, []).append(index)
+            else:
+                self.no_literal_indexes.append(index)
+
+        if self.literals and not self.no_literal_indexes:
+            literals = sorted(self.literals, key=len, reverse=True)
+            self.prefilter = re.compile('|'.join(re.escape(literal) for literal in literals))
+        else:
+            self.prefilter = None
+    # ---------------------------------------------------------------------
+
+    @staticmethod
+    def is_wildcard(item):
+        op, av = item
+        return op == sre_parse.MAX_REPEAT and av[0] == 0 and list(av[2]) == [(sre_parse.ANY, None)]
+    # ---------------------------------------------------------------------
+
+    @classmethod
+    def strip_wildcards(cls, pattern):
+        '''
+        @summary: Strip top level leading and trailing '.*' from the regex.
+        '''
+        try:
+            items = list(sre_parse.parse(pattern))
+        except re.error:
+            return pattern
+
+        if len(items) > 1 and pattern.startswith('.*') and cls.is_wildcard(items[0]) \
+                and not pattern.startswith('.*?') and not pattern.startswith('.*+'):
+            pattern = pattern[2:]
+            items = items[1:]
+        if len(items) > 1 and pattern.endswith('.*') and not pattern.endswith('\\.*') \
+                and cls.is_wildcard(items[-1]):
+            pattern = pattern[:-2]
+        return pattern
+    # ---------------------------------------------------------------------
+
+    @staticmethod
+    def required_literal(pattern):
+        '''
+        @summary: Get the longest literal substring which is present in every line matching the regex.
+
+        @return: Literal string or None if regex has no required literal.
+        '''
+        try:
+            parsed = sre_parse.parse(pattern)
+        except re.error:
+            return None
+        if parsed.state.flags & (re.IGNORECASE | re.VERBOSE):
+            return None
+
+        longest = ''
+        current = []
+        for op, av in parsed:
+            if op == sre_parse.LITERAL:
+                current.append(chr(av))
+                continue
+            if len(current) > len(longest):
+                longest = ''.join(current)
+            current = []
+        if len(current) > len(longest):
+            longest = ''.join(current)
+        return longest or None
+    # ---------------------------------------------------------------------
+
+    def search(self, line):
+        '''
+        @summary: Check whether the line matches any regex of the set.
+        '''
+        if self.prefilter is not None and self.prefilter.search(line) is None:
+            return None
+        return self.search_regex.search(line)
+    # ---------------------------------------------------------------------
+
+    def match(self, line):
+        '''
+        @summary: Check whether the beginning of the line matches any regex of the set.
+        '''
+        return self.regex.match(line)
+    # ---------------------------------------------------------------------
+
+    def search_all(self, line):
+        '''
+        @summary: Get indexes of all the regexes which match the line.
+        '''
+        candidates = list(self.no_literal_indexes)
+        for literal, indexes in self.literals.items():
+            if literal in line:
+                candidates.extend(indexes)
+        return sorted(index for index in candidates if self.compiled[index].search(line))
+    # ---------------------------------------------------------------------
+
+
+_regex_set_cache = {}
+
+
+def get_regex_set(regex_list):
+    '''
+    @summary: Get compiled RegexSet for the list of regular expressions.
+              Compiled sets are cached, so repeated analysis with the same regexes
+              doesn't parse and compile them again.
+
+    @return: RegexSet instance or None if regex_list is empty.
+    '''
+    if not regex_list:
+        return None
+    key = tuple(regex_list)
+    regex_set = _regex_set_cache.get(key)
+    if regex_set is None:
+        if len(_regex_set_cache) >= MAX_REGEX_SET_CACHE_SIZE:
+            _regex_set_cache.pop(next(iter(_regex_set_cache)))
+        regex_set = RegexSet(regex_list)
+        _regex_set_cache[key] = regex_set
+    return regex_set
+# ---------------------------------------------------------------------
+
 
 class AnsibleLogAnalyzer:
     '''
@@ -184,6 +349,8 @@ class AnsibleLogAnalyzer:
         @summary: Place marker into each log file specified.
         @param log_file : File path, to be applied with marker.
         @param marker:    Marker to be placed into log files.
+
+        @return: Tuple of (inode, byte offset) of the marker line.
         '''
         if not len(log_file) or self.is_filename_stdin(log_file):
             self.print_diagnostic_message(
@@ -191,10 +358,12 @@ class AnsibleLogAnalyzer:
         self.print_diagnostic_message(
             'log file:{}, place marker {}'.format(log_file, marker))
         with open(log_file, 'a') as file:
+            position = (os.fstat(file.fileno()).st_ino, file.tell())
             file.write(datetime.now().strftime("%b %d %H:%M:%S.%f") + ' ')
             file.write(marker)
             file.write('\n')
             file.flush()
+        return position
 
     def place_marker_to_syslog(self, marker):
         '''
@@ -246,22 +415,134 @@ class AnsibleLogAnalyzer:
 
         return False
 
-    def place_marker(self, log_file_list, marker, wait_for_marker=False):
+    def get_file_position(self, log_file):
+        '''
+        @summary: Get inode and size of the log file.
+
+        @return: Tuple of (inode, size) or None if file doesn't exist.
+        '''
+        try:
+            stat = os.stat(log_file)
+        except OSError:
+            return None
+        return stat.st_ino, stat.st_size
+
+    def find_marker_position(self, log_file, marker, position, timeout=5, polling_interval=0.5):
+        '''
+        @summary: Find the marker written by rsyslogd after the given position of the log file.
+        @param log_file:  Log file path.
+        @param marker:    Marker to look for.
+        @param position:  Tuple of (inode, size) of the log file before the marker was placed.
+        @param timeout:   Maximum time in seconds to wait till the marker is written.
+
+        @return: Tuple of (inode, byte offset) of the marker line, or None if the marker
+                 was not found or the file was rotated meanwhile.
+        '''
+        inode, offset = position
+        marker = marker.encode('utf-8')
+        end = time.time() + timeout
+        while True:
+            with open(log_file, 'rb') as fp:
+                if os.fstat(fp.fileno()).st_ino != inode:
+                    return None
+                fp.seek(offset)
+                while True:
+                    line = fp.readline()
+                    if not line.endswith(b'\n'):
+                        # Incomplete line, rsyslogd may still be writing it
+                        break
+                    if marker in line:
+                        return inode, offset
+                    offset += len(line)
+            if time.time() > end:
+                return None
+            time.sleep(polling_interval)
+
+    def load_marker_index(self):
+        '''
+        @summary: Load index of marker positions, see save_marker_index().
+        '''
+        try:
+            with open(marker_index_file) as fp:
+                index = json.load(fp)
+        except (IOError, OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def save_marker_index(self, marker, positions):
+        '''
+        @summary: Record positions of the marker in the log files, so the logs can be
+                  read starting straight from the marker instead of scanning all rotated files.
+
+        Index format: {marker: {log file path: [inode, byte offset of the marker line]}}
+        Log file is renamed by logrotate, so it is looked up by inode when the index is used.
+
+        @param marker:    Marker placed into log files.
+        @param positions: Map <log file path, (inode, byte offset)>
+        '''
+        index = self.load_marker_index()
+        index.pop(marker, None)
+        index[marker] = dict((log_file, list(position)) for log_file, position in positions.items())
+        while len(index) > marker_index_max_entries:
+            index.pop(next(iter(index)))
+
+        tmp_file = marker_index_file + '.tmp'
+        with open(tmp_file, 'w') as fp:
+            json.dump(index, fp)
+        os.rename(tmp_file, marker_index_file)
+
+    def lookup_marker_position(self, marker, log_files):
+        '''
+        @summary: Find the log file containing the marker using the marker index.
+        @param marker:    Marker placed into log files.
+        @param log_files: List of rotated log file paths, sorted from the newest to the oldest.
+
+        @return: Tuple of (index in log_files, byte offset of the marker line) or None if the marker
+                 is not indexed, or the indexed position doesn't contain the marker anymore.
+        '''
+        positions = self.load_marker_index().get(marker, {})
+        inodes = dict((inode, offset) for inode, offset in positions.values())
+        for index, log_file_path in enumerate(log_files):
+            if log_file_path.endswith('.gz'):
+                # Compressed file is a new inode
+                break
+            position = self.get_file_position(log_file_path)
+            if position is None or position[0] not in inodes:
+                continue
+            offset = inodes[position[0]]
+            with open(log_file_path, 'rb') as fp:
+                fp.seek(offset)
+                if marker.encode('utf-8') in fp.readline():
+                    return index, offset
+            break
+        return None
+
+    def place_marker(self, log_file_list, marker, wait_for_marker=False, index_marker=False):
         '''
         @summary: Place marker into '/dev/log' and each log file specified.
         @param log_file_list : List of file paths, to be applied with marker.
         @param marker:         Marker to be placed into log files.
+        @param index_marker:   Record positions of the marker, see save_marker_index().
         '''
 
+        positions = {}
         for log_file in log_file_list:
-            self.place_marker_to_file(log_file, marker)
+            positions[log_file] = self.place_marker_to_file(log_file, marker)
 
+        syslog_position = self.get_file_position(system_log_file) if index_marker else None
         self.place_marker_to_syslog(marker)
         if wait_for_marker:
             if self.wait_for_marker(marker) is False:
                 raise RuntimeError(
                     "cannot find marker {} in /var/log/syslog".format(marker))
 
+        if index_marker:
+            if syslog_position is not None:
+                syslog_position = self.find_marker_position(system_log_file, marker, syslog_position)
+            if syslog_position is not None:
+                positions[system_log_file] = syslog_position
+            self.save_marker_index(marker, positions)
+
         return
     # ---------------------------------------------------------------------
 
@@ -376,48 +657,54 @@ class AnsibleLogAnalyzer:
             'ignore' set - will not be reported (will be ignored)
 
         @param match_messages_regex:
-            regex class instance containing messages to match against.
+            regex class or RegexSet instance containing messages to match against.
 
         @param ignore_messages_regex:
-            regex class instance containing messages to ignore match against.
+            regex class or RegexSet instance containing messages to ignore match against.
 
         @return: True is str matches regex criteria, otherwise False.
         '''
 
         ret_code = False
 
-        if ((match_messages_regex is not None) and (match_messages_regex.findall(str))):
+        if ((match_messages_regex is not None) and (match_messages_regex.search(str))):
             if (ignore_messages_regex is None):
                 ret_code = True
 
-            elif (not ignore_messages_regex.findall(str)):
+            elif (not ignore_messages_regex.search(str)):
                 self.print_diagnostic_message('matching line: %s' % str)
                 ret_code = True
 
         return ret_code
     # ---------------------------------------------------------------------
 
-    def line_is_expected(self, str, expect_messages_regex):
+    def line_is_expected(self, str, expect_messages_regex, expect_hits=None):
         '''
         @summary: This method checks whether given string matches against the
                   set of "expected" regular expressions.
+
+        @param expect_hits: Set to be updated with indexes of the expected regexes which
+            matched the string. Only supported if expect_messages_regex is a RegexSet.
         '''
 
         ret_code = False
         if self.run_id.startswith("test_advanced_reboot_test_"):
-            # Use the stricter (and better-performing) match instead of findall, but only when analyzing
+            # Use the stricter (and better-performing) match instead of search, but only when analyzing
             # logs for advanced reboot test cases. This is so that other test cases are not affected in
             # case their regexes don't start with .*
             if (expect_messages_regex is not None) and (expect_messages_regex.match(str)):
                 ret_code = True
         else:
-            if (expect_messages_regex is not None) and (expect_messages_regex.findall(str)):
+            if (expect_messages_regex is not None) and (expect_messages_regex.search(str)):
                 ret_code = True
 
+        if ret_code and expect_hits is not None and isinstance(expect_messages_regex, RegexSet):
+            expect_hits.update(expect_messages_regex.search_all(str))
+
         return ret_code
 
     def analyze_file(self, log_file_path, match_messages_regex, ignore_messages_regex, expect_messages_regex,
-                     maximum_log_length=None):
+                     maximum_log_length=None, expect_hits=None):
         '''
         @summary: Analyze input file content for messages matching input regex
                   expressions. See line_matches() for details on matching criteria.
@@ -437,6 +724,8 @@ class AnsibleLogAnalyzer:
 
         @param maximum_log_length - The long log message (length > maximum_log_length) will be dropped by LogAnalyzer.
 
+        @param expect_hits - Set to be updated with indexes of the expected regexes found in the file.
+
         @return: List of strings match search criteria.
         '''
 
@@ -522,7 +811,7 @@ class AnsibleLogAnalyzer:
                 if not check_marker and len(rev_line) > maximum_log_length:
                     continue
 
-                if self.line_is_expected(rev_line, expect_messages_regex):
+                if self.line_is_expected(rev_line, expect_messages_regex, expect_hits):
                     expected_lines.append(rev_line)
 
                 elif self.line_matches(rev_line, match_messages_regex, ignore_messages_regex):
@@ -541,8 +830,188 @@ class AnsibleLogAnalyzer:
         return matching_lines, expected_lines
     # ---------------------------------------------------------------------
 
+    def list_rotated_files(self, directory, file_prefix):
+        '''
+        @summary: List rotated log files in the directory, sorted from the newest to the oldest.
+                  logrotate is configured so that a file with a greater number is older,
+                  e.g. syslog.2.gz is older than syslog.1 which is older than syslog.
+
+        @param directory: Directory with the log files.
+        @param file_prefix: Prefix of the log file names, e.g. 'syslog'.
+
+        @return: List of full paths to the log files.
+        '''
+        def rotation_number(file_name):
+            numbers = re.findall(r'\d+', file_name[len(file_prefix):])
+            return int(numbers[0]) if numbers else 0
+
+        file_names = [file_name for file_name in os.listdir(directory) if file_name.startswith(file_prefix)]
+        file_names.sort(key=rotation_number)
+        return [os.path.join(directory, file_name) for file_name in file_names]
+    # ---------------------------------------------------------------------
+
+    def open_log_file(self, log_file_path, offset=0):
+        '''
+        @summary: Open plain or gzip compressed log file for reading in text mode.
+        @param offset: Byte offset to start reading the plain log file from.
+        '''
+        if log_file_path.endswith('.gz'):
+            return gzip.open(log_file_path, mode='rt', errors='replace')
+        fp = open(log_file_path, 'rb')
+        fp.seek(offset)
+        return io.TextIOWrapper(fp, errors='replace')
+    # ---------------------------------------------------------------------
+
+    def is_start_line(self, line, start_string):
+        return start_string in line and 'extract_log' not in line
+    # ---------------------------------------------------------------------
+
+    def analyze_rotated_logs(self, directory, file_prefix, start_string, match_messages_regex,
+                             ignore_messages_regex, expect_messages_regex, maximum_log_length=None,
+                             expect_hits=None):
+        '''
+        @summary: Analyze rotated log files in place, without combining them into one file first.
+
+        If 'start_string' is a marker recorded by save_marker_index(), the file containing it is
+        found by inode and streamed from the marker byte offset. Otherwise the newest file
+        containing 'start_string' is looked up by a plain substring scan. Then that file and
+        all newer ones are streamed once in chronological order.
+        Analysis restarts on every occurrence of 'start_string', so only the lines after
+        the latest one are reported, which is the same range 'extract_log' would extract.
+
+        @param directory: Directory with the log files.
+        @param file_prefix: Prefix of the log file names, e.g. 'syslog'.
+        @param start_string: String which latest occurrence starts the analysis range.
+        @param match_messages_regex: regex class instance containing messages to match against.
+        @param ignore_messages_regex: regex class instance containing messages to ignore match against.
+        @param expect_messages_regex: regex class instance containing messages that are expected to appear.
+        @param maximum_log_length: The long log message (length > maximum_log_length) will be dropped
+                                   for the files which have no start/end markers.
+        @param expect_hits: Set to be updated with indexes of the expected regexes found in the files.
+
+        @return: Tuple of (matching_lines, expected_lines, lines_processed)
+        '''
+        log_files = self.list_rotated_files(directory, file_prefix)
+        start_offset = 0
+        position = self.lookup_marker_position(start_string, log_files)
+        if position is not None:
+            start_index, start_offset = position
+            log_files = log_files[:start_index + 1]
+            self.print_diagnostic_message('found indexed start marker in %s at offset %d'
+                                          % (log_files[-1], start_offset))
+        else:
+            for index, log_file_path in enumerate(log_files):
+                with self.open_log_file(log_file_path) as log_file:
+                    if any(self.is_start_line(line, start_string) for line in log_file):
+                        log_files = log_files[:index + 1]
+                        break
+            else:
+                print('ERROR: {} was not found in {}'.format(start_string, directory))
+                sys.exit(err_no_start_marker)
+
+        if maximum_log_length is None:
+            maximum_log_length = MAX_LOG_MESSAGE_LENGTH
+        check_marker = self.require_marker_check(file_prefix)
+        end_marker = self.create_end_marker()
+        matching_lines = []
+        expected_lines = []
+        # Hits are merged into expect_hits only at the end, as a newer start line drops them
+        range_expect_hits = set()
+        lines_processed = 0
+        in_analysis_range = False
+        found_end_marker = False
+
+        for log_file_path in reversed(log_files):
+            self.print_diagnostic_message('streaming file: %s' % log_file_path)
+            offset = start_offset if log_file_path == log_files[-1] else 0
+            with self.open_log_file(log_file_path, offset) as log_file:
+                for line in log_file:
+                    line = line.replace('\x00', '')
+                    lines_processed += 1
+                    if self.is_start_line(line, start_string):
+                        # A newer start line was found, drop everything collected before it
+                        matching_lines = []
+                        expected_lines = []
+                        range_expect_hits = set()
+                        found_end_marker = False
+                        in_analysis_range = True
+                        if check_marker:
+                            continue
+                    elif found_end_marker:
+                        continue
+                    elif end_marker in line:
+                        found_end_marker = True
+                        in_analysis_range = False
+                        continue
+                    elif self.start_ignore_marker_prefix in line:
+                        in_analysis_range = False
+                        continue
+                    elif self.end_ignore_marker_prefix in line:
+                        in_analysis_range = True
+                        continue
+
+                    if not in_analysis_range:
+                        continue
+                    if not check_marker and len(line) > maximum_log_length:
+                        continue
+
+                    if self.line_is_expected(line, expect_messages_regex, range_expect_hits):
+                        expected_lines.append(line)
+                    elif self.line_matches(line, match_messages_regex, ignore_messages_regex):
+                        matching_lines.append(line)
+
+        if check_marker and not found_end_marker:
+            print('ERROR: end marker was not found')
+            sys.exit(err_no_end_marker)
+
+        if expect_hits is not None:
+            expect_hits.update(range_expect_hits)
+        return matching_lines, expected_lines, lines_processed
+    # ---------------------------------------------------------------------
+
+    def analyze_request(self, request_file):
+        '''
+        @summary: Analyze logs on the device as described in the JSON request file and
+                  return only the matching lines and counters.
+
+        Request file format:
+            {
+                "match_regex": [...],
+                "ignore_regex": [...],
+                "expect_regex": [...],
+                "maximum_log_length": null,
+                "logs": [{"directory": "/var/log", "file_prefix": "syslog", "start_string": "..."}, ...]
+            }
+
+        @return: Map <log path, {"match": [...], "expect": [...], "expect_hits": [...], "lines_processed": N}>,
+                 where "expect_hits" are indexes of the expected regexes found in the log.
+        '''
+        with open(request_file) as fp:
+            request = json.load(fp)
+
+        match_messages_regex = get_regex_set(request.get('match_regex'))
+        ignore_messages_regex = get_regex_set(request.get('ignore_regex'))
+        expect_messages_regex = get_regex_set(request.get('expect_regex'))
+
+        res = {}
+        for log in request['logs']:
+            expect_hits = set()
+            matching_lines, expected_lines, lines_processed = self.analyze_rotated_logs(
+                log['directory'], log['file_prefix'], log['start_string'],
+                match_messages_regex, ignore_messages_regex, expect_messages_regex,
+                maximum_log_length=request.get('maximum_log_length'), expect_hits=expect_hits)
+            res[os.path.join(log['directory'], log['file_prefix'])] = {
+                'match': matching_lines,
+                'expect': expected_lines,
+                'expect_hits': sorted(expect_hits),
+                'lines_processed': lines_processed
+            }
+
+        return res
+    # ---------------------------------------------------------------------
+
     def analyze_file_list(self, log_file_list, match_messages_regex, ignore_messages_regex, expect_messages_regex,
-                          maximum_log_length=None):
+                          maximum_log_length=None, expect_hits=None):
         '''
         @summary: Analyze input files messages matching input regex expressions.
             See line_matches() for details on matching criteria.
@@ -561,6 +1030,9 @@ class AnsibleLogAnalyzer:
         @param maximum_log_length
             The maximum length of the log message. If the length of the log message is greater than this value,
 
+        @param expect_hits
+            Set to be updated with indexes of the expected regexes found in the files.
+
         @return: Returns map <file_name, list_of_matching_strings>
         '''
         res = {}
@@ -570,7 +1042,8 @@ class AnsibleLogAnalyzer:
                 continue
             match_strings, expect_strings = self.analyze_file(log_file, match_messages_regex, ignore_messages_regex,
                                                               expect_messages_regex,
-                                                              maximum_log_length=maximum_log_length)
+                                                              maximum_log_length=maximum_log_length,
+                                                              expect_hits=expect_hits)
 
             match_strings.reverse()
             expect_strings.reverse()
@@ -589,6 +1062,8 @@ def usage():
     print('                                 to all log files specified in --logs parameter.')
     print('                                 analyze - perform log analysis of files specified in --logs parameter.')
     print('                                 add_end_marker - add end marker to all log files specified in --logs parameter.')           # noqa: E501
+    print('                                 analyze_on_dut - analyze rotated log files in place as described in')
+    print('                                 --request_file and print matching lines as JSON.')
     print('--out_dir path                   Directory path where to place output files, ')
     print('                                 must be present when --action == analyze')
     print('--logs path{,path}               List of full paths to log files to be analyzed.')
@@ -607,11 +1082,14 @@ def usage():
     print('                                 All the strings from these files will be expected to present')
     print('                                 in one of specified log files during the analysis. Must be present')
     print('                                 when action == analyze.')
+    print('--request_file path              JSON file with regular expressions and log files to analyze.')
+    print('                                 Must be present when action == analyze_on_dut.')
 
 # ---------------------------------------------------------------------
 
 
-def check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in):
+def check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in,
+                 request_file=None):
     '''
     @summary: This function validates command line parameter 'action' and
         other related parameters.
@@ -631,6 +1109,10 @@ def check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in,
         elif match_files_in is None or len(match_files_in) == 0:
             print('ERROR: missing required match_files_in for analyze action')
             ret_code = False
+    elif action == 'analyze_on_dut':
+        if request_file is None or not os.path.isfile(request_file):
+            print('ERROR: missing required request_file for analyze_on_dut action')
+            ret_code = False
 
     else:
         ret_code = False
@@ -771,13 +1253,14 @@ def main(argv):
     match_files_in = None
     ignore_files_in = None
     expect_files_in = None
+    request_file = None
     verbose = False
 
     try:
         opts, args = getopt.getopt(argv, "a:r:s:l:o:m:i:e:vh",
                                    ["action=", "run_id=", "start_marker=", "logs=",
                                     "out_dir=", "match_files_in=", "ignore_files_in=",
-                                    "expect_files_in=", "verbose", "help"])
+                                    "expect_files_in=", "request_file=", "verbose", "help"])
 
     except getopt.GetoptError:
         print("Invalid option specified")
@@ -813,10 +1296,14 @@ def main(argv):
         elif (opt in ("-e", "--expect_files_in")):
             expect_files_in = arg
 
+        elif (opt == "--request_file"):
+            request_file = arg
+
         elif (opt in ("-v", "--verbose")):
             verbose = True
 
-    if not (check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in)
+    if not (check_action(action, log_files_in, out_dir, match_files_in, ignore_files_in, expect_files_in,
+                         request_file)
             and check_run_id(run_id)):
         usage()
         sys.exit(err_invalid_input)
@@ -827,7 +1314,7 @@ def main(argv):
 
     result = {}
     if action == "init":
-        analyzer.place_marker(log_file_list, analyzer.create_start_marker())
+        analyzer.place_marker(log_file_list, analyzer.create_start_marker(), index_marker=True)
         return 0
     elif action == "analyze":
         match_file_list = match_files_in.split(tokenizer)
@@ -854,6 +1341,14 @@ def main(argv):
         write_result_file(run_id, out_dir, result,
                           messages_regex_e, unused_regex_messages)
         write_summary_file(run_id, out_dir, result, unused_regex_messages)
+    elif action == "analyze_on_dut":
+        try:
+            result = analyzer.analyze_request(request_file)
+        except (ValueError, KeyError) as e:
+            print('ERROR: invalid request file {}: {}'.format(request_file, repr(e)))
+            sys.exit(err_invalid_request)
+        print(json.dumps(result))
+        return 0
     elif action == "add_end_marker":
         analyzer.place_marker(
             log_file_list, analyzer.create_end_marker(), wait_for_marker=True)
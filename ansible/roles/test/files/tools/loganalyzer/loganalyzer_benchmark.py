@@ -0,0 +1,128 @@
+'''
+Description:    Benchmark of loganalyzer regex evaluation on a synthetic syslog.
+
+                Compares the plain alternation regexes evaluated with findall()
+                followed by the per expected regex "unused" pass, with the RegexSet
+                engine used by loganalyzer.py, and verifies that both report the same result.
+
+Usage:          python loganalyzer_benchmark.py [--lines 1000000] [--seed 0]
+'''
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from loganalyzer import AnsibleLogAnalyzer, get_regex_set   # noqa: E402
+
+LOGANALYZER_DIR = os.path.dirname(os.path.abspath(__file__))
+COMMON_MATCH = os.path.join(LOGANALYZER_DIR, "loganalyzer_common_match.txt")
+COMMON_IGNORE = os.path.join(LOGANALYZER_DIR, "loganalyzer_common_ignore.txt")
+
+EXPECT_REGEX = [
+    r".*NOTICE swss#orchagent:.*setState: Setting state to .*",
+    r".*INFO bgp#bgpcfgd:.*Peer .* admin state is set to 'up'.*",
+    r".*NOTICE syncd#syncd:.*RESTART_DONE.*",
+]
+
+LINE_TEMPLATES = [
+    "{ts} {host} INFO systemd[1]: Started Session {num} of user admin.",
+    "{ts} {host} NOTICE swss#orchagent: :- doTask: Processing PORT_TABLE:Ethernet{num} oper_status up",
+    "{ts} {host} INFO bgp#bgpd[{num}]: %ADJCHANGE: neighbor 10.0.0.{num} Up",
+    "{ts} {host} INFO kernel: [{num}.123456] Ethernet{num}: link becomes ready",
+    "{ts} {host} NOTICE swss#orchagent:  :- setState: Setting state to {num}",
+    "{ts} {host} INFO bgp#bgpcfgd: Peer 10.0.0.{num} admin state is set to 'up'",
+    "{ts} {host} ERR snmp#snmp-subagent [ax_interface] ERROR: MIBUpdater.process() caught an error {num}",
+    "{ts} {host} ERR syncd#syncd: :- collectData: Failed to get stats of port oid:0x1000000000{num}",
+    "{ts} {host} WARNING kernel: [{num}.000001] Call trace: unexpected crash in module",
+]
+LINE_WEIGHTS = [40, 20, 15, 15, 4, 4, 1, 0.5, 0.5]
+
+
+def generate_lines(count, seed):
+    rnd = random.Random(seed)
+    templates = rnd.choices(LINE_TEMPLATES, weights=LINE_WEIGHTS, k=count)
+    return [template.format(ts="Jan 01 00:00:00.{:06d}".format(index % 1000000), host="str-switch-01",
+                            num=rnd.randint(0, 255)) + "\n"
+            for index, template in enumerate(templates)]
+
+
+def run_plain(lines, match_regex, ignore_regex, expect_regex):
+    match_messages_regex = re.compile('|'.join(match_regex))
+    ignore_messages_regex = re.compile('|'.join(ignore_regex))
+    expect_messages_regex = re.compile('|'.join(expect_regex))
+    matching_lines = []
+    expected_lines = []
+    for line in lines:
+        if expect_messages_regex.findall(line):
+            expected_lines.append(line)
+        elif match_messages_regex.findall(line) and not ignore_messages_regex.findall(line):
+            matching_lines.append(line)
+
+    unused_regex = []
+    for regex in expect_regex:
+        for line in expected_lines:
+            if re.search(regex, line):
+                break
+        else:
+            unused_regex.append(regex)
+    return matching_lines, expected_lines, unused_regex
+
+
+def run_regex_set(analyzer, lines, match_regex, ignore_regex, expect_regex):
+    match_messages_regex = get_regex_set(match_regex)
+    ignore_messages_regex = get_regex_set(ignore_regex)
+    expect_messages_regex = get_regex_set(expect_regex)
+    matching_lines = []
+    expected_lines = []
+    expect_hits = set()
+    for line in lines:
+        if analyzer.line_is_expected(line, expect_messages_regex, expect_hits):
+            expected_lines.append(line)
+        elif analyzer.line_matches(line, match_messages_regex, ignore_messages_regex):
+            matching_lines.append(line)
+
+    unused_regex = [regex for index, regex in enumerate(expect_regex) if index not in expect_hits]
+    return matching_lines, expected_lines, unused_regex
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark loganalyzer regex evaluation")
+    parser.add_argument("--lines", type=int, default=1000000, help="Number of synthetic syslog lines")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed used to generate the syslog")
+    args = parser.parse_args()
+
+    analyzer = AnsibleLogAnalyzer("benchmark", False)
+    match_regex = analyzer.create_msg_regex([COMMON_MATCH])[1]
+    ignore_regex = analyzer.create_msg_regex([COMMON_IGNORE])[1]
+    # Expected regex which is never found, to exercise the unused regex report
+    expect_regex = EXPECT_REGEX + [r".*ERR pmon#thermalctld: .* never logged.*"]
+
+    print("Generating {} lines".format(args.lines))
+    lines = generate_lines(args.lines, args.seed)
+
+    start = time.time()
+    plain_result = run_plain(lines, match_regex, ignore_regex, expect_regex)
+    plain_time = time.time() - start
+
+    start = time.time()
+    regex_set_result = run_regex_set(analyzer, lines, match_regex, ignore_regex, expect_regex)
+    regex_set_time = time.time() - start
+
+    if plain_result != regex_set_result:
+        print("ERROR: results differ")
+        return 1
+
+    print("match: {}, expected: {}, unused expected regex: {}".format(
+        len(plain_result[0]), len(plain_result[1]), len(plain_result[2])))
+    print("plain regex: {:.2f}s".format(plain_time))
+    print("RegexSet:    {:.2f}s".format(regex_set_time))
+    print("speedup:     {:.1f}x".format(plain_time / regex_set_time))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
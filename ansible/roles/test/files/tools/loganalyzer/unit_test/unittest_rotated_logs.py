@@ -0,0 +1,86 @@
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from loganalyzer import AnsibleLogAnalyzer, get_regex_set   # noqa: E402
+
+RUN_ID = "test_run"
+START_MARKER = "start-LogAnalyzer-" + RUN_ID
+END_MARKER = "end-LogAnalyzer-" + RUN_ID
+
+EXPECT_REGEX = [
+    r".*NOTICE swss#orchagent:.*setState: Setting state to .*",
+    r".*NOTICE syncd#syncd:.*RESTART_DONE.*",
+]
+MATCH_REGEX = [r".*ERR .*"]
+
+
+class TestAnalyzeRotatedLogs(unittest.TestCase):
+    """Test cases for AnsibleLogAnalyzer.analyze_rotated_logs."""
+
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.analyzer = AnsibleLogAnalyzer(RUN_ID, False)
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir)
+
+    def write_log(self, file_name, lines):
+        path = os.path.join(self.log_dir, file_name)
+        opener = gzip.open if file_name.endswith(".gz") else open
+        with opener(path, "wt") as log_file:
+            log_file.writelines(line + "\n" for line in lines)
+
+    def analyze(self):
+        expect_hits = set()
+        matching_lines, expected_lines, _ = self.analyzer.analyze_rotated_logs(
+            self.log_dir, "syslog", START_MARKER, get_regex_set(MATCH_REGEX), None,
+            get_regex_set(EXPECT_REGEX), expect_hits=expect_hits)
+        return matching_lines, expected_lines, expect_hits
+
+    # Only the lines after the latest start marker are analyzed, expected regexes hit before it
+    # must not be reported as hit.
+    def test_latest_start_marker_across_rotated_files(self):
+        self.write_log("syslog.2.gz", [
+            "Jan 01 00:00:00 switch INFO " + START_MARKER,
+            "Jan 01 00:00:01 switch NOTICE syncd#syncd: :- main: RESTART_DONE",
+            "Jan 01 00:00:02 switch ERR swss#orchagent: :- doTask: old failure",
+        ])
+        self.write_log("syslog.1", [
+            "Jan 01 00:00:03 switch INFO " + START_MARKER,
+            "Jan 01 00:00:04 switch NOTICE swss#orchagent: :- setState: Setting state to 1",
+        ])
+        self.write_log("syslog", [
+            "Jan 01 00:00:05 switch ERR swss#orchagent: :- doTask: new failure",
+            "Jan 01 00:00:06 switch INFO " + END_MARKER,
+        ])
+
+        matching_lines, expected_lines, expect_hits = self.analyze()
+
+        self.assertEqual(matching_lines, ["Jan 01 00:00:05 switch ERR swss#orchagent: :- doTask: new failure\n"])
+        self.assertEqual(expected_lines,
+                         ["Jan 01 00:00:04 switch NOTICE swss#orchagent: :- setState: Setting state to 1\n"])
+        self.assertEqual(expect_hits, {0})
+
+    def test_latest_start_marker_in_same_file(self):
+        self.write_log("syslog", [
+            "Jan 01 00:00:00 switch INFO " + START_MARKER,
+            "Jan 01 00:00:01 switch NOTICE swss#orchagent: :- setState: Setting state to 1",
+            "Jan 01 00:00:02 switch INFO " + START_MARKER,
+            "Jan 01 00:00:03 switch NOTICE syncd#syncd: :- main: RESTART_DONE",
+            "Jan 01 00:00:04 switch INFO " + END_MARKER,
+        ])
+
+        matching_lines, expected_lines, expect_hits = self.analyze()
+
+        self.assertEqual(matching_lines, [])
+        self.assertEqual(expected_lines, ["Jan 01 00:00:03 switch NOTICE syncd#syncd: :- main: RESTART_DONE\n"])
+        self.assertEqual(expect_hits, {1})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -32,10 +32,12 @@ NIC = 'nic'
 MUX_BRIDGE_TEMPLATE = 'mbr-%s-%d'
 
 LIST_PORTS_CMD = 'ovs-vsctl list-ports {}'
+LIST_BRIDGE_PORTS_CMD = 'ovs-vsctl --format=json --columns=name,ports list Bridge'
+LIST_PORT_NAMES_CMD = 'ovs-vsctl --format=json --columns=_uuid,name list Port'
 DUMP_FLOW_CMD = 'ovs-ofctl --names dump-flows {}'
-DEL_FLOW_CMD = 'ovs-ofctl --names del-flows {} in_port="{}"'
-ADD_FLOW_CMD = 'ovs-ofctl --names add-flow {} in_port="{}",actions={}'
-MOD_FLOW_CMD = 'ovs-ofctl --names mod-flows {} in_port="{}",actions={}'
+# The flows of a mux bridge are replaced by the flows read from stdin in one atomic bundle
+REPLACE_FLOWS_CMD = 'ovs-ofctl --names --bundle replace-flows {} -'
+FLOW_TEMPLATE = 'in_port="{}",actions={}'
 
 RANDOM = 'random'
 TOGGLE = 'toggle'
@@ -106,11 +108,12 @@ def adaptive_name(template, vm_set, index):
     return rendered_name
 
 
-def run_cmd(cmdline):
+def run_cmd(cmdline, input_data=None):
     """Use subprocess to run a command line with shell=True
 
     Args:
         cmdline (string): The command to be executed.
+        input_data (string): Data written to stdin of the command.
 
     Raises:
         Exception: If return code of running command line is not zero, an exception is raised.
@@ -124,11 +127,12 @@ def run_cmd(cmdline):
         stdout=subprocess.PIPE,
         stdin=subprocess.PIPE,
         stderr=subprocess.PIPE)
-    stdout, stderr = process.communicate()
+    stdout, stderr = process.communicate(input_data.encode('utf-8') if input_data is not None else None)
     ret_code = process.returncode
 
     msg = {
         'cmd': cmdline,
+        'input': input_data.splitlines() if input_data is not None else None,
         'ret_code': ret_code,
         'stdout': stdout.decode('utf-8').splitlines(),
         'stderr': stderr.decode('utf-8').splitlines()
@@ -169,14 +173,20 @@ class Mux(object):
     All operations related with a single mux bridge is encapsulated in this class.
     '''
 
-    def __init__(self, vm_set, port_index):
+    def __init__(self, vm_set, port_index, ports=None):
+        """
+        Args:
+            vm_set (string): The vm_set of test setup.
+            port_index (int): Index of the port.
+            ports (list): Ports attached to the mux bridge. If it is None, the ports are read from the bridge.
+        """
         # Flag for skipping bridge without ports attached to it.
         # Workaround for uncleaned mbr-xx bridges on server
         self.isvalid = True
 
         # The flask server could be running in multi-threaded mode. This means that getting mux status and changing
-        # mux flow configuration could interleave with each other. The operation of updating flow configuration is
-        # not atomic, sometimes it needs to run a command to remove flow, then run a command to add a new flow.
+        # mux flow configuration could interleave with each other. The flows of the bridge are replaced atomically,
+        # but the mux state is updated before the flows are applied, and restored from the bridge if applying failed.
         # If a request of getting mux status come in in the middle of such flow configuration change, the mux
         # status returned may not match the actual flow status. Purpose of the lock is to workaround such conflicts.
         # All the operations of updating mux config and getting mux status must acquire the lock firstly.
@@ -190,7 +200,7 @@ class Mux(object):
         self._init_ports()
 
         # If the mux does not have valid ports attached, it is invalid
-        if not self._get_ports():
+        if not self._get_ports(ports):
             self.isvalid = False
             return
 
@@ -217,7 +227,7 @@ class Mux(object):
         }
         self.sides = {}
 
-    def _get_ports(self):
+    def _get_ports(self, ports=None):
         """Use the 'ovs-vsctl list-ports' command to get the ports attached to the mux bridge.
 
         Example bridge name: 'mbr-vms17-8-0'. In the bridge name, 'vms17-8' is vm_set. '0' is port_index.
@@ -228,11 +238,18 @@ class Mux(object):
         enp59s0f1.3272
         muxy-vms17-8-0
 
+        Args:
+            ports (list): Ports attached to the bridge, if they were already read for all bridges at once.
+
         Returns:
             boolean: Return False if it is not a valid mux bridge
         """
-        out = run_cmd(LIST_PORTS_CMD.format(self.bridge))
-        out_lines = out.splitlines()
+        if ports is None:
+            out = run_cmd(LIST_PORTS_CMD.format(self.bridge))
+            out_lines = out.splitlines()
+        else:
+            out_lines = sorted(ports)
+            out = '\n'.join(out_lines)
         if len(out_lines) != 3:
             self.error('unexpected ports, found ports:\n{}'.format(out))
             return False
@@ -344,6 +361,48 @@ class Mux(object):
                 self.flows['downstream']['out_sides'] = [self.sides[out_port] for out_port, action in
                                                          flows[in_port].items() if action == OUTPUT]
 
+    def _reload_flows(self):
+        """Read the flows back from the bridge, after the flows on the bridge may not match self.flows anymore.
+        """
+        self.flows['upstream']['out_sides'] = []
+        self.flows['downstream']['out_sides'] = []
+        self._get_flows()
+
+    def _flow_actions(self, out_sides):
+        # Keep the order of output ports stable, so that unchanged flows are not modified by replace-flows
+        out_ports = [self.ports[side] for side in [NIC, UPPER_TOR, LOWER_TOR] if side in out_sides]
+        return ','.join(['{}:"{}"'.format(OUTPUT, out_port) for out_port in out_ports])
+
+    def _flow_lines(self):
+        """Open flow rules of the bridge, based on self.flows. Flows without output side are not configured.
+        """
+        lines = []
+        if self.flows['upstream']['out_sides']:
+            lines.append(FLOW_TEMPLATE.format(self.ports[NIC], self._flow_actions(self.flows['upstream']['out_sides'])))
+        downstream = self.flows['downstream']
+        if downstream['in_side'] is not None and downstream['out_sides']:
+            lines.append(FLOW_TEMPLATE.format(self.ports[downstream['in_side']],
+                                              self._flow_actions(downstream['out_sides'])))
+        return lines
+
+    def _apply_flows(self):
+        """Replace the flows of the bridge with the flows of self.flows.
+
+        Instead of running one ovs-ofctl command for every changed flow, all the flows of the bridge are replaced in
+        one atomic bundle. Flows which are not changed are kept untouched by 'replace-flows'. If applying the flows
+        failed, the flows are read back from the bridge, so that the state in self.flows matches the bridge.
+        """
+        flows = '\n'.join(self._flow_lines()) + '\n'
+        try:
+            run_cmd(REPLACE_FLOWS_CMD.format(self.bridge), input_data=flows)
+        except Exception:
+            self.error('failed to apply flows:\n{}reloading flows from bridge'.format(flows))
+            try:
+                self._reload_flows()
+            except Exception as e:
+                self.error('failed to reload flows: {}'.format(repr(e)))
+            raise
+
     @property
     def status(self):
         """Property for status of the mux bridge.
@@ -390,8 +449,8 @@ class Mux(object):
         """Set the active side of the mux bridge to the specified side.
 
         If the specified side is same as the current active side of bridge, no config change is required. Otherwise,
-        this method will run ovs-ofctl command to remove flow and add a new flow to switch active side. All the
-        related instance attributes are updated after open flow rules are changed.
+        the downstream flow is moved to the new active side, and the flows of the bridge are replaced in one atomic
+        ovs-ofctl bundle.
         """
         with self.lock:
             self.info('>>>>>> updating mux active side from {} to {}'.format(self.active_side, new_active_side))
@@ -407,26 +466,11 @@ class Mux(object):
             if new_active_side == TOGGLE:
                 new_active_side = UPPER_TOR if self.active_side == LOWER_TOR else LOWER_TOR
 
-            new_active_port = self.ports[new_active_side]
-
             if len(self.flows['downstream']['out_sides']) == 1:
-                action_desc = '{}:"{}"'.format(OUTPUT, self.ports[NIC])
-                run_cmd(DEL_FLOW_CMD.format(
-                    self.bridge,
-                    self.active_port))
-                # Immediately update state after flow config changed to ensure consistency
-                self._active_standby_state_helper(None)
-                self.flows['downstream']['in_side'] = self.active_side
-                self.flows['downstream']['out_sides'] = []
-
-                run_cmd(ADD_FLOW_CMD.format(
-                    self.bridge,
-                    new_active_port,
-                    action_desc))
-                # Immediately update state after flow config changed to ensure consistency
                 self._active_standby_state_helper(new_active_side)
                 self.flows['downstream']['in_side'] = self.active_side
                 self.flows['downstream']['out_sides'] = [NIC]
+                self._apply_flows()
 
             else:
                 # If currently downstream flow action is drop, there should be no downstream flow config.
@@ -441,54 +485,55 @@ class Mux(object):
             self.info('updated mux active side to {} <<<<<<'.format(new_active_side))
 
     def _update_downstream_flow(self, new_action):
+        """Update downstream flow in self.flows, the flows of the bridge are applied by the caller.
+
+        Returns:
+            boolean: Return True if the flows need to be applied.
+        """
         self.debug('updating downstream flow, new_action={}'.format(new_action))
 
         # No action required for below scenarios
         if new_action == DROP and len(self.flows['downstream']['out_sides']) == 0:
             self.debug('no downstream flow change required')
-            return
+            return False
         elif new_action == OUTPUT and len(self.flows['downstream']['out_sides']) == 1:
             self.debug('no downstream flow change required')
-            return
+            return False
 
         if new_action == DROP:
-            # Update action from OUTPUT to DROP, del-flow
-            run_cmd(DEL_FLOW_CMD.format(
-                self.bridge,
-                self.active_port))
+            # Update action from OUTPUT to DROP, remove the flow
             self.flows['downstream']['out_sides'] = []
 
         else:
-            # Update action from DROP to OUTPUT, add-flow
-            action_desc = '{}:"{}"'.format(OUTPUT, self.ports[NIC])
+            # Update action from DROP to OUTPUT, add the flow
             if self.active_side is None:
                 active_side = random.choice([UPPER_TOR, LOWER_TOR])
             else:
                 active_side = self.active_side
 
-            run_cmd(ADD_FLOW_CMD.format(
-                self.bridge,
-                self.ports[active_side],
-                action_desc))
             self._active_standby_state_helper(active_side)
             self.flows['downstream']['in_side'] = active_side
             self.flows['downstream']['out_sides'] = [NIC]
 
         self.debug('updated downstream flow, new_action={}, flows={}'
                    .format(new_action, json.dumps(self.flows, indent=2)))
+        return True
 
     def _update_upstream_flow(self, new_action, out_sides=[]):
         """Update upstream flow. Apply new action to sides specified in out_sides.
 
         The upstream flow has 2 output sides, to UPPER_TOR or LOWER_TOR. This is to update the action (OUTPUT or DROP)
-        for the specified output sides.
+        for the specified output sides in self.flows, the flows of the bridge are applied by the caller.
+
+        Returns:
+            boolean: Return True if the flows need to be applied.
         """
         self.debug('updating upstream flow, new_action={}, out_sides={}'.format(new_action, out_sides))
 
         if len(out_sides) == 0:
             # Need to specify sides that need to apply the new OUTPUT or DROP action
             app.logger.debug('no out_sides specified, skip updating upstream flow')
-            return
+            return False
 
         # Figure out target upstream out_sides
         if new_action == DROP:
@@ -500,37 +545,12 @@ class Mux(object):
         # Based on current out_sides and target out_sides to determine what to do
         if set(self.flows['upstream']['out_sides']) == set(target_out_sides):
             app.logger.debug('target_out_sides same as current out_sides, no upstream flow change required')
-            return
-        operation = None
-        if len(target_out_sides) == 0:
-            operation = 'DEL-FLOW'   # Remove the upstream flow
-        else:
-            if len(self.flows['upstream']['out_sides']) == 0:
-                operation = 'ADD-FLOW'   # Need to add upstream flow
-            else:
-                operation = 'MOD-FLOW'   # Need to modify upstream flow
-
-        if operation == 'DEL-FLOW':
-            run_cmd(DEL_FLOW_CMD.format(
-                    self.bridge,
-                    self.ports[NIC]))
-            self.flows['upstream']['out_sides'] = []
-        elif operation == 'ADD-FLOW':
-            action_desc = ','.join(['{}:"{}"'.format(OUTPUT, self.ports[out_side]) for out_side in target_out_sides])
-            run_cmd(ADD_FLOW_CMD.format(
-                    self.bridge,
-                    self.ports[NIC],
-                    action_desc))
-            self.flows['upstream']['out_sides'] = target_out_sides
-        elif operation == 'MOD-FLOW':
-            action_desc = ','.join(['{}:"{}"'.format(OUTPUT, self.ports[out_side]) for out_side in target_out_sides])
-            run_cmd(MOD_FLOW_CMD.format(
-                    self.bridge,
-                    self.ports[NIC],
-                    action_desc))
-            self.flows['upstream']['out_sides'] = target_out_sides
+            return False
+
+        self.flows['upstream']['out_sides'] = target_out_sides
         self.debug('updated upstream flow, new_action={}, out_sides={}, flows={}'
                    .format(new_action, out_sides, json.dumps(self.flows, indent=2)))
+        return True
 
     def update_flows(self, new_action, out_sides):
         """
@@ -541,11 +561,15 @@ class Mux(object):
         with self.lock:
             self.info('>>>>> calling update_flows, new_action={}, out_sides={}, current flow:\n{}'
                       .format(new_action, out_sides, json.dumps(self.flows, indent=2)))
+            changed = False
             if NIC in out_sides:
-                self._update_downstream_flow(new_action)
+                changed = self._update_downstream_flow(new_action) or changed
             tor_sides = [out_side for out_side in out_sides if out_side != NIC]
             if len(tor_sides) > 0:
-                self._update_upstream_flow(new_action, tor_sides)
+                changed = self._update_upstream_flow(new_action, tor_sides) or changed
+            if changed:
+                # Both upstream and downstream flow changes are applied in one bundle
+                self._apply_flows()
             self.info('update_flows completed, current flows:\n{} <<<<<<'.format(json.dumps(self.flows, indent=2)))
 
     def reset_flows(self):
@@ -570,15 +594,51 @@ class Muxes(object):
         self.vm_set = vm_set
         self.muxes = {}
         self.thread_pool = ThreadPool(Muxes.MUXES_CONCURRENCY)
-        for bridge in self._mux_bridges():
+        bridges = self._mux_bridges()
+        bridge_ports = self._get_bridge_ports(bridges)
+
+        def _create_mux(bridge):
             bridge_fields = bridge.split('-')
             port_index = int(bridge_fields[-1])
-            mux = Mux(vm_set, port_index)
+            return Mux(self.vm_set, port_index, bridge_ports.get(bridge))
+
+        for bridge, mux in zip(bridges, self.thread_pool.map(_create_mux, bridges)):
             if mux.isvalid:
                 self.muxes[bridge] = mux
 
         self._recover_unhealthy_muxes()
 
+    def _get_bridge_ports(self, bridges):
+        """Get the ports attached to all the mux bridges with two ovs-vsctl commands, instead of one per bridge.
+
+        Example output of the 'ovs-vsctl --format=json --columns=name,ports list Bridge' command, a set with single
+        item is formatted as the item:
+            {"data":[["mbr-vms17-8-0",["set",[["uuid","5d7c..."],["uuid","9a1b..."],["uuid","c2e4..."]]]]],
+             "headings":["name","ports"]}
+
+        Returns:
+            dict: {bridge: [port, ...]}, bridges which are not found are not included, and the ports are read
+                by Mux for them.
+        """
+        def _uuids(value):
+            if value[0] == 'set':
+                return [item[1] for item in value[1]]
+            return [value[1]]
+
+        try:
+            bridge_out = json.loads(run_cmd(LIST_BRIDGE_PORTS_CMD))
+            port_out = json.loads(run_cmd(LIST_PORT_NAMES_CMD))
+        except Exception as e:
+            app.logger.warning('Failed to list ports of all bridges, list ports bridge by bridge: {}'.format(repr(e)))
+            return {}
+
+        port_names = {uuid[1]: name for uuid, name in port_out['data']}
+        bridge_ports = {}
+        for name, ports in bridge_out['data']:
+            if name in bridges:
+                bridge_ports[name] = [port_names[uuid] for uuid in _uuids(ports) if uuid in port_names]
+        return bridge_ports
+
     def _recover_unhealthy_muxes(self):
         """Recover unhealthy muxes by resetting their flows."""
         unhealthy_muxes = [mux for mux in self.muxes.values() if not mux.status['healthy']]
@@ -620,6 +680,19 @@ class Muxes(object):
                                       [(mux, new_active_side) for mux in self.muxes.values()]))
             return {mux.bridge: mux.status for mux in self.muxes.values()}
 
+    def set_active_sides(self, active_sides):
+        """Set the active side of multiple muxes in one call.
+
+        Args:
+            active_sides (dict): {port_index: active_side}, active_side can be different for every mux.
+
+        Returns:
+            dict: {bridge: mux_status} of the updated muxes.
+        """
+        muxes = [(self._port_to_mux(port_index), active_side) for port_index, active_side in active_sides.items()]
+        list(self.thread_pool.map(lambda args: Mux.set_active_side(*args), muxes))
+        return {mux.bridge: mux.status for mux, _ in muxes}
+
     def update_flows(self, new_action, out_sides, port_index=None):
         if port_index is not None:
             mux = self._port_to_mux(port_index)
@@ -762,6 +835,43 @@ def all_mux_status(vm_set):
         return g_muxes.set_active_side(data['active_side'])
 
 
+@app.route('/mux/<vm_set>/bulk', methods=['POST'])
+def bulk_set_active_side(vm_set):
+    """Handler for setting the active side of multiple muxes in one request.
+
+    Posted json data should be like:
+        {"active_side": {"<port_index>": "upper_tor|lower_tor|toggle|random", ...}}
+    The active side can be different for every port.
+
+    Args:
+        vm_set (string): The vm_set of test setup. Parsed by flask from request URL.
+
+    Returns:
+        object: Return a flask response object, status of the updated muxes.
+    """
+    _validate_vm_set(vm_set)
+    data = request.get_json()
+    msg = 'Bad posted data, expected: {"active_side": {"<port_index>": "upper_tor|lower_tor|toggle|random", ...}}'
+    active_sides = data.get('active_side') if isinstance(data, dict) else None
+    if not isinstance(active_sides, dict) or not active_sides \
+            or not all(re.match(r'^\d+$', str(port_index)) for port_index in active_sides) \
+            or not all(side in [UPPER_TOR, LOWER_TOR, TOGGLE, RANDOM] for side in active_sides.values()):
+        abort(400, description='remote_addr={} method={} url={} data={} msg={}'.format(
+            request.remote_addr,
+            request.method,
+            request.url,
+            json.dumps(data),
+            msg
+        ))
+    active_sides = {int(port_index): side for port_index, side in active_sides.items()}
+    unknown_ports = [port_index for port_index in active_sides if not g_muxes.has_mux(port_index)]
+    if unknown_ports:
+        abort(404, 'Unknown bridge, vm_set={}, port_index={}'.format(vm_set, unknown_ports))
+
+    app.logger.info('===== {} POST {} with {} ====='.format(request.remote_addr, request.url, json.dumps(data)))
+    return g_muxes.set_active_sides(active_sides)
+
+
 def _validate_out_sides(request):
     """Validate the posted data for updating flow action.
 
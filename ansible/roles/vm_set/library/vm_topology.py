@@ -1,5 +1,6 @@
 #!/usr/bin/python
 
+from collections import OrderedDict
 from contextlib import contextmanager
 import functools
 import hashlib
@@ -92,6 +93,9 @@ Parameters:
     - duts_mgmt_port: duts mgmt port
     - duts_name: duts names
     - fp_mtu: MTU for FP ports
+
+  The result has phase_timing: list of {phase, calls, seconds, commands} with the time and number of spawned
+  commands of each phase of the command, the same is logged at the end of the module log.
 '''
 
 EXAMPLES = '''
@@ -230,6 +234,100 @@ def adaptive_temporary_interface(vm_set_name, interface_name, reserved_space=0):
     return t_int_if
 
 
+class PhaseTimer(object):
+    """
+    Record the time spent and the number of commands spawned in each phase of a vm_topology command.
+
+    Phases are the VMTopology methods decorated with topology_phase. A phase called by another phase
+    is accounted to the outer one.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.current = None
+        # phase name -> [calls, seconds, commands]
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def measure(self, name):
+        with self.lock:
+            nested = self.current is not None
+            if not nested:
+                self.current = name
+                self.phases.setdefault(name, [0, 0.0, 0])[0] += 1
+        if nested:
+            yield
+            return
+        start = time.time()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.phases[name][1] += time.time() - start
+                self.current = None
+
+    def count_command(self):
+        with self.lock:
+            if self.current is not None:
+                self.phases[self.current][2] += 1
+
+    def report(self):
+        """Log the timing of all the phases and return it as a list of dicts."""
+        result = []
+        lines = ["%-40s %6s %10s %9s" % ("phase", "calls", "seconds", "commands")]
+        for name, (calls, seconds, commands) in self.phases.items():
+            result.append({"phase": name, "calls": calls, "seconds": round(seconds, 3), "commands": commands})
+            lines.append("%-40s %6d %10.3f %9d" % (name, calls, seconds, commands))
+        logging.info("Phase timing:\n%s", "\n".join(lines))
+        return result
+
+
+PHASE_TIMER = PhaseTimer()
+
+
+def topology_phase(func):
+    """Decorator to account the time and the commands of a VMTopology method to a phase."""
+    @functools.wraps(func)
+    def _phase(*args, **kwargs):
+        with PHASE_TIMER.measure(func.__name__):
+            return func(*args, **kwargs)
+    return _phase
+
+
+class IpBatch(object):
+    """
+    Collect ip commands of a network namespace and run them with one 'ip -batch' process.
+
+    The commands are the arguments of the ip command, e.g. 'link set dev eth0 up'. They are run in the
+    order they are added, and the batch stops at the first failed command.
+    """
+
+    def __init__(self, pid=None, netns=None):
+        """
+        Args:
+            pid (str, optional): Pid of the docker to run the commands in its network namespace.
+            netns (str, optional): Name of the network namespace to run the commands in.
+        """
+        self.pid = pid
+        self.netns = netns
+        self.cmds = []
+
+    def add(self, cmd):
+        self.cmds.append(cmd)
+
+    def run(self):
+        if not self.cmds:
+            return
+        if self.pid is not None:
+            cmdline = 'nsenter -t %s -n ip -batch -' % self.pid
+        elif self.netns is not None:
+            cmdline = 'ip -n %s -batch -' % self.netns
+        else:
+            cmdline = 'ip -batch -'
+        VMTopology.cmd(cmdline, input_data='\n'.join(self.cmds) + '\n')
+        self.cmds = []
+
+
 class VMTopology(object):
 
     def __init__(self, vm_names, vm_properties, fp_mtu, max_fp_num, topo, worker, current_vm_name=None,
@@ -248,6 +346,7 @@ class VMTopology(object):
         self._is_dpu = is_dpu
         self._is_vs_chassis = is_vs_chassis
 
+    @topology_phase
     def init(self, vm_set_name, vm_base, duts_fp_ports, duts_name, ptf_exists=True, check_bridge=True):
         self.vm_set_name = vm_set_name
         self.duts_name = duts_name
@@ -457,20 +556,24 @@ class VMTopology(object):
             vlans[VM] = attr['vlans'][:]
         return vlans
 
+    @topology_phase
     def add_network_namespace(self):
         """Create a network namespace."""
         self.delete_network_namespace()
         VMTopology.cmd("ip netns add %s" % self.netns)
 
+    @topology_phase
     def delete_network_namespace(self):
         """Delete a network namespace."""
         if os.path.exists("/var/run/netns/%s" % self.netns):
             VMTopology.cmd("ip netns delete %s" % self.netns)
 
+    @topology_phase
     def enable_arp_filter_netns(self):
         """ENable ARP filter in the netns."""
         VMTopology.cmd("ip netns exec %s sysctl -w net.ipv4.conf.all.arp_filter=1" % self.netns)
 
+    @topology_phase
     def add_mgmt_port_to_netns(self, mgmt_bridge, mgmt_ip, mgmt_gw, mgmt_ipv6_addr=None, mgmt_gw_v6=None):
         if VMTopology.intf_not_exists(MGMT_PORT_NAME, netns=self.netns):
             self.add_br_if_to_netns(
@@ -478,11 +581,29 @@ class VMTopology(object):
         self.add_ip_to_netns_if(MGMT_PORT_NAME, mgmt_ip, ipv6_addr=mgmt_ipv6_addr,
                                 default_gw=mgmt_gw, default_gw_v6=mgmt_gw_v6)
 
+    @topology_phase
     def create_bridges(self):
-        for vm in self.vm_names:
-            for fp_num in range(self.max_fp_num):
-                fp_br_name = adaptive_name(OVS_FP_BRIDGE_TEMPLATE, vm, fp_num)
-                self.create_ovs_bridge(fp_br_name, self.fp_mtu)
+        self.create_ovs_bridges(self.fp_bridge_names(), self.fp_mtu)
+
+    def fp_bridge_names(self):
+        return [adaptive_name(OVS_FP_BRIDGE_TEMPLATE, vm, fp_num)
+                for vm in self.vm_names for fp_num in range(self.max_fp_num)]
+
+    def create_ovs_bridges(self, bridge_names, mtu):
+        """Create OVS bridges with one ovs-vsctl transaction and bring them up with one ip batch."""
+        if not bridge_names:
+            return
+        logging.info('=== Create bridges %s with mtu %d ===' %
+                     (', '.join(bridge_names), mtu))
+        VMTopology.cmd('ovs-vsctl -- %s' %
+                       ' -- '.join('--may-exist add-br %s' % bridge_name for bridge_name in bridge_names))
+
+        ip_batch = IpBatch()
+        for bridge_name in bridge_names:
+            if mtu != DEFAULT_MTU:
+                ip_batch.add('link set dev %s mtu %d' % (bridge_name, mtu))
+            ip_batch.add('link set dev %s up' % bridge_name)
+        ip_batch.run()
 
     def create_ovs_bridge(self, bridge_name, mtu):
         logging.info('=== Create bridge %s with mtu %d ===' %
@@ -494,16 +615,20 @@ class VMTopology(object):
 
         VMTopology.cmd('ifconfig %s up' % bridge_name)
 
+    @topology_phase
     def destroy_bridges(self):
-        for vm in self.vm_names:
-            for fp_num in range(self.max_fp_num):
-                fp_br_name = adaptive_name(OVS_FP_BRIDGE_TEMPLATE, vm, fp_num)
-                self.destroy_ovs_bridge(fp_br_name)
+        bridge_names = self.fp_bridge_names()
+        if not bridge_names:
+            return
+        logging.info('=== Destroy bridges %s ===' % ', '.join(bridge_names))
+        VMTopology.cmd('ovs-vsctl -- %s' %
+                       ' -- '.join('--if-exists del-br %s' % bridge_name for bridge_name in bridge_names))
 
     def destroy_ovs_bridge(self, bridge_name):
         logging.info('=== Destroy bridge %s ===' % bridge_name)
         VMTopology.cmd('ovs-vsctl --if-exists del-br %s' % bridge_name)
 
+    @topology_phase
     def add_injected_fp_ports_to_docker(self):
         """
         add injected front panel ports to docker
@@ -512,6 +637,7 @@ class VMTopology(object):
             PTF (int_if) ----------- injected port (ext_if)
 
         """
+        veth_ifs = []
         for vm, vlans in self.injected_fp_ports.items():
             for vlan in vlans:
                 (_, _, ptf_index) = VMTopology.parse_vm_vlan_port(vlan)
@@ -533,17 +659,22 @@ class VMTopology(object):
                         sub_interface_vlan_id=vlan_subintf_vlan_id
                     )
                 else:
-                    self.add_veth_if_to_docker(ext_if, int_if)
+                    veth_ifs.append((ext_if, int_if))
+        self.add_veth_ifs_to_docker(veth_ifs)
 
+    @topology_phase
     def add_injected_VM_ports_to_docker(self):
+        veth_ifs = []
         for k, attr in self.OVS_LINKs.items():
             vlans = attr['vlans'][:]
             for vlan in vlans:
                 (_, _, ptf_index) = VMTopology.parse_vm_vlan_port(vlan)
                 int_if = PTF_FP_IFACE_TEMPLATE % ptf_index
                 injected_iface = adaptive_name(INJECTED_INTERFACES_TEMPLATE, self.vm_set_name, ptf_index)
-                self.add_veth_if_to_docker(injected_iface, int_if)
+                veth_ifs.append((injected_iface, int_if))
+        self.add_veth_ifs_to_docker(veth_ifs)
 
+    @topology_phase
     def add_mgmt_port_to_docker(self, mgmt_bridge, mgmt_ip, mgmt_gw,
                                 mgmt_ipv6_addr=None, mgmt_gw_v6=None, extra_mgmt_ip_addr=None,
                                 api_server_pid=None):
@@ -560,6 +691,7 @@ class VMTopology(object):
                                  mgmt_gw=mgmt_gw, mgmt_gw_v6=mgmt_gw_v6,
                                  extra_mgmt_ip_addr=extra_mgmt_ip_addr, api_server_pid=api_server_pid)
 
+    @topology_phase
     def add_bp_port_to_docker(self, mgmt_ip, mgmt_ipv6):
         self.add_br_if_to_docker(
             self.bp_bridge, PTF_BP_IF_TEMPLATE % self.vm_set_name, BP_PORT_NAME)
@@ -667,55 +799,72 @@ class VMTopology(object):
                     VMTopology.cmd("ip netns exec %s ip -6 route add default via %s dev %s" %
                                    (self.netns, default_gw_v6, int_if))
 
-    def add_dut_if_to_docker(self, iface_name, dut_iface):
-        logging.info("=== Add DUT interface %s to PTF docker as %s ===" %
-                     (dut_iface, iface_name))
-        if VMTopology.intf_exists(dut_iface) \
-                and VMTopology.intf_not_exists(dut_iface, pid=self.pid) \
-                and VMTopology.intf_not_exists(iface_name, pid=self.pid):
-            VMTopology.cmd("ip link set dev %s netns %s" % (dut_iface, self.pid))
-
-        if VMTopology.intf_exists(dut_iface, pid=self.pid) and VMTopology.intf_not_exists(iface_name, pid=self.pid):
-            VMTopology.cmd("nsenter -t %s -n ip link set dev %s name %s" % (self.pid, dut_iface, iface_name))
-
-        VMTopology.iface_up(iface_name, pid=self.pid)
-
-    def add_dut_vlan_subif_to_docker(self, iface_name, vlan_separator, vlan_id):
-        """Create a vlan sub interface for the ptf interface."""
-        if VMTopology.intf_not_exists(iface_name, pid=self.pid):
-            raise ValueError("Interface %s not present in docker" % iface_name)
-        vlan_sub_iface_name = iface_name + vlan_separator + vlan_id
-        VMTopology.cmd("nsenter -t %s -n ip link add link %s name %s type vlan id %s" %
-                       (self.pid, iface_name, vlan_sub_iface_name, vlan_id))
-        VMTopology.cmd("nsenter -t %s -n ip link set %s up" %
-                       (self.pid, vlan_sub_iface_name))
-
-    def remove_dut_if_from_docker(self, iface_name, dut_iface):
-        logging.info("=== Restore docker interface %s as dut interface %s ===" % (iface_name, dut_iface))
-        if self.pid is None:
-            return
+    def add_dut_ifs_to_docker(self, dut_ifs):
+        """Inject dut ports into the ptf docker with one ip batch on host and one in the docker.
 
-        if VMTopology.intf_exists(iface_name, pid=self.pid):
-            VMTopology.iface_down(iface_name, pid=self.pid)
-
-            if VMTopology.intf_not_exists(dut_iface, pid=self.pid):
-                VMTopology.cmd("nsenter -t %s -n ip link set dev %s name %s" %
-                               (self.pid, iface_name, dut_iface))
+        Args:
+            dut_ifs (list): (iface_name, dut_iface, vlan_subif) of the ports, vlan_subif is
+                (vlan_separator, vlan_id) of the vlan sub interface to create for the port, or None.
+        """
+        if not dut_ifs:
+            return
 
-        if VMTopology.intf_not_exists(dut_iface) and VMTopology.intf_exists(dut_iface, pid=self.pid):
-            VMTopology.cmd(
-                "nsenter -t %s -n ip link set dev %s netns 1" % (self.pid, dut_iface))
+        host_links = VMTopology.get_links()
+        ptf_links = VMTopology.get_links(pid=self.pid)
+        host_batch = IpBatch()
+        ptf_batch = IpBatch(pid=self.pid)
+        for iface_name, dut_iface, vlan_subif in dut_ifs:
+            logging.info("=== Add DUT interface %s to PTF docker as %s ===" %
+                         (dut_iface, iface_name))
+            if iface_name not in ptf_links:
+                if dut_iface in host_links and dut_iface not in ptf_links:
+                    host_batch.add("link set dev %s netns %s" % (dut_iface, self.pid))
+                    ptf_links.add(dut_iface)
+                if dut_iface in ptf_links:
+                    ptf_batch.add("link set dev %s name %s" % (dut_iface, iface_name))
+            ptf_batch.add("link set dev %s up" % iface_name)
+
+            if vlan_subif is not None:
+                vlan_separator, vlan_id = vlan_subif
+                vlan_sub_iface_name = iface_name + vlan_separator + vlan_id
+                ptf_batch.add("link add link %s name %s type vlan id %s" %
+                              (iface_name, vlan_sub_iface_name, vlan_id))
+                ptf_batch.add("link set dev %s up" % vlan_sub_iface_name)
+
+        host_batch.run()
+        ptf_batch.run()
+
+    def remove_dut_ifs_from_docker(self, dut_ifs):
+        """Restore dut ports injected by add_dut_ifs_to_docker with one ip batch in the ptf docker.
 
-    def remove_dut_vlan_subif_from_docker(self, iface_name, vlan_separator, vlan_id):
-        """Remove the vlan sub interface created for the ptf interface."""
-        if self.pid is None:
+        Args:
+            dut_ifs (list): (iface_name, dut_iface, vlan_subif) of the ports, see add_dut_ifs_to_docker.
+        """
+        if self.pid is None or not dut_ifs:
             return
 
-        vlan_sub_iface_name = iface_name + vlan_separator + vlan_id
-        if VMTopology.intf_exists(vlan_sub_iface_name, pid=self.pid):
-            VMTopology.iface_down(vlan_sub_iface_name, pid=self.pid)
-            VMTopology.cmd("nsenter -t %s -n ip link del %s" %
-                           (self.pid, vlan_sub_iface_name))
+        host_links = VMTopology.get_links()
+        ptf_links = VMTopology.get_links(pid=self.pid)
+        ptf_batch = IpBatch(pid=self.pid)
+        for iface_name, dut_iface, vlan_subif in dut_ifs:
+            logging.info("=== Restore docker interface %s as dut interface %s ===" % (iface_name, dut_iface))
+            if iface_name in ptf_links:
+                ptf_batch.add("link set dev %s down" % iface_name)
+                if dut_iface not in ptf_links:
+                    ptf_batch.add("link set dev %s name %s" % (iface_name, dut_iface))
+                    ptf_links.add(dut_iface)
+
+            if dut_iface not in host_links and dut_iface in ptf_links:
+                ptf_batch.add("link set dev %s netns 1" % dut_iface)
+
+            if vlan_subif is not None:
+                vlan_separator, vlan_id = vlan_subif
+                vlan_sub_iface_name = iface_name + vlan_separator + vlan_id
+                if vlan_sub_iface_name in ptf_links:
+                    ptf_batch.add("link set dev %s down" % vlan_sub_iface_name)
+                    ptf_batch.add("link del %s" % vlan_sub_iface_name)
+
+        ptf_batch.run()
 
     def add_veth_if_to_docker(self, ext_if, int_if, create_vlan_subintf=False, **kwargs):
         """Create vethernet devices (ext_if, int_if) and put int_if into the ptf docker."""
@@ -796,6 +945,47 @@ class VMTopology(object):
         if create_vlan_subintf:
             VMTopology.iface_up(int_sub_if, pid=self.pid)
 
+    def add_veth_ifs_to_docker(self, veth_ifs):
+        """
+        Create vethernet devices (ext_if, int_if) and put int_if into the ptf docker for a list of interfaces.
+
+        The interfaces are checked with one command on host and one in the docker. Pairs not created yet or
+        already in place are set up with one ip batch on host and one in the docker, pairs left in any other
+        state by a previous run are fixed one by one by add_veth_if_to_docker.
+        """
+        if not veth_ifs:
+            return
+
+        host_links = VMTopology.get_links()
+        ptf_links = VMTopology.get_links(pid=self.pid)
+        host_batch = IpBatch()
+        ptf_batch = IpBatch(pid=self.pid)
+        for ext_if, int_if in veth_ifs:
+            t_int_if = adaptive_temporary_interface(self.vm_set_name, int_if)
+            if t_int_if in host_links or t_int_if in ptf_links or (ext_if in host_links) != (int_if in ptf_links):
+                self.add_veth_if_to_docker(ext_if, int_if)
+                continue
+
+            logging.info('=== Create veth pair %s/%s, set %s to PTF docker namespace ===' %
+                         (ext_if, int_if, int_if))
+            created = ext_if in host_links
+            if not created:
+                host_batch.add("link add %s type veth peer name %s" % (ext_if, t_int_if))
+            if self.fp_mtu != DEFAULT_MTU:
+                host_batch.add("link set dev %s mtu %d" % (ext_if, self.fp_mtu))
+                if created:
+                    ptf_batch.add("link set dev %s mtu %d" % (int_if, self.fp_mtu))
+                else:
+                    host_batch.add("link set dev %s mtu %d" % (t_int_if, self.fp_mtu))
+            host_batch.add("link set dev %s up" % ext_if)
+            if not created:
+                host_batch.add("link set dev %s netns %s" % (t_int_if, self.pid))
+                ptf_batch.add("link set dev %s name %s" % (t_int_if, int_if))
+            ptf_batch.add("link set dev %s up" % int_if)
+
+        host_batch.run()
+        ptf_batch.run()
+
     def add_veth_if_to_netns(self, ext_if, int_if):
         """Create vethernet devices (ext_if, int_if) and put int_if into the netns for active-active."""
         logging.info('=== Create veth pair %s/%s, set %s to netns %s ===' %
@@ -836,6 +1026,7 @@ class VMTopology(object):
 
         VMTopology.iface_up(int_if, netns=self.netns)
 
+    @topology_phase
     def bind_mgmt_port(self, br_name, mgmt_port):
         logging.info('=== Bind mgmt port %s to bridge %s ===' %
                      (mgmt_port, br_name))
@@ -843,12 +1034,14 @@ class VMTopology(object):
         if mgmt_port not in if_to_br:
             VMTopology.cmd("brctl addif %s %s" % (br_name, mgmt_port))
 
+    @topology_phase
     def unbind_mgmt_port(self, mgmt_port):
         _, if_to_br = VMTopology.brctl_show()
         if mgmt_port in if_to_br:
             VMTopology.cmd("brctl delif %s %s" %
                            (if_to_br[mgmt_port], mgmt_port))
 
+    @topology_phase
     def bind_devices_interconnect(self):
         for link_index, vlans in self.devices_interconnect_interfaces.items():
             interconnection_bridge = OVS_INTERCONNECTION_BRIDGE_TEMPLATE % (
@@ -865,6 +1058,7 @@ class VMTopology(object):
             self.bind_devices_interconnect_ports(
                 interconnection_bridge, vlan1_iface, vlan2_iface)
 
+    @topology_phase
     def unbind_devices_interconnect(self):
         for link_index, vlans in self.devices_interconnect_interfaces.items():
             interconnection_bridge = OVS_INTERCONNECTION_BRIDGE_TEMPLATE % (
@@ -897,6 +1091,7 @@ class VMTopology(object):
         VMTopology.cmd("ovs-ofctl add-flow %s table=0,in_port=%s,action=output:%s" %
                        (br_name, vlan2_iface_id, vlan1_iface_id))
 
+    @topology_phase
     def bind_fp_ports(self, disconnect_vm=False):
         """
         bind dut front panel ports to VMs
@@ -929,9 +1124,11 @@ class VMTopology(object):
                     (br_name, self.duts_fp_ports[self.duts_name[dut_index]][str(vlan_index)],
                      injected_iface, vm_iface, disconnect_vm)
                 )
+        port_to_bridge = VMTopology.get_ovs_port_to_bridge()
         with VMTopologyWorker.safe_subprocess_manager() as [processes, tmpdir]:
-            self.worker.map(lambda args: self.bind_ovs_ports(*args, processes=processes,
-                                                             tmpdir=tmpdir), bind_ovs_ports_args)
+            self.worker.map(lambda args: self.bind_ovs_ports(*args, processes=processes, tmpdir=tmpdir,
+                                                             port_to_bridge=port_to_bridge),
+                            bind_ovs_ports_args)
 
         for k, attr in self.VM_LINKs.items():
             logging.info("Create VM links for {} : {}".format(k, attr))
@@ -965,6 +1162,7 @@ class VMTopology(object):
                 injected_iface = adaptive_name(INJECTED_INTERFACES_TEMPLATE, self.vm_set_name, ptf_index)
                 self.bind_ovs_ports(br_name, port1, injected_iface, port2, disconnect_vm)
 
+    @topology_phase
     def unbind_fp_ports(self):
         logging.info("=== unbind front panel ports ===")
         unbind_ovs_ports_args = []
@@ -1047,30 +1245,35 @@ class VMTopology(object):
         VMTopology.iface_up(port1)
         VMTopology.iface_up(port2)
 
+    @topology_phase
     def bind_vm_backplane(self):
 
         if VMTopology.intf_not_exists(self.bp_bridge):
             VMTopology.cmd('brctl addbr %s' % self.bp_bridge)
 
-        VMTopology.iface_up(self.bp_bridge)
+        ip_batch = IpBatch()
+        ip_batch.add('link set dev %s up' % self.bp_bridge)
 
+        br_to_ifs, _ = VMTopology.brctl_show(self.bp_bridge)
         for attr in self.VMs.values():
             vm_name = self.vm_names[self.vm_base_index + attr['vm_offset']]
             bp_port_name = OVS_BP_TAP_TEMPLATE % vm_name
 
-            br_to_ifs, _ = VMTopology.brctl_show()
-            if bp_port_name not in br_to_ifs[self.bp_bridge]:
-                VMTopology.cmd("brctl addif %s %s" %
-                               (self.bp_bridge, bp_port_name))
+            if bp_port_name not in br_to_ifs.get(self.bp_bridge, []):
+                ip_batch.add('link set dev %s master %s' % (bp_port_name, self.bp_bridge))
+
+            ip_batch.add('link set dev %s up' % bp_port_name)
 
-            VMTopology.iface_up(bp_port_name)
+        ip_batch.run()
 
+    @topology_phase
     def unbind_vm_backplane(self):
 
         if VMTopology.intf_exists(self.bp_bridge):
             VMTopology.iface_down(self.bp_bridge)
             VMTopology.cmd('brctl delbr %s' % self.bp_bridge)
 
+    @topology_phase
     def bind_vs_chassis_ports(self, duts_midplane_ports, duts_inband_ports):
         # We have a KVM based virtaul chassis, create two ovs bridges, bind the midplane and inband ports
         self.create_ovs_bridge(self._vs_chassis_inband_br_name, self.fp_mtu)
@@ -1084,6 +1287,7 @@ class VMTopology(object):
             self.bind_vs_dut_ports(
                 self._vs_chassis_inband_br_name, dut, duts_inband_ports[dut])
 
+    @topology_phase
     def unbind_vs_chassis_ports(self, duts_midplane_ports, duts_inband_ports):
         # We have a KVM based virtaul chassis, bind the midplane and inband ports
         for dut in duts_midplane_ports.keys():
@@ -1124,29 +1328,24 @@ class VMTopology(object):
             PTF (injected_iface) --+ OVS bridge (br_name) |
                                    |                      +---- vm_iface
                                    +----------------------+
-        """
-        br = VMTopology.get_ovs_bridge_by_port(injected_iface)
-        if br is not None and br != br_name:
-            VMTopology.cmd('ovs-vsctl --if-exists del-port %s %s' % (br, injected_iface))
-
-        br = VMTopology.get_ovs_bridge_by_port(dut_iface)
-        if br is not None and br != br_name:
-            VMTopology.cmd('ovs-vsctl --if-exists del-port %s %s' % (br, dut_iface))
-
-        br = VMTopology.get_ovs_bridge_by_port(vm_iface)
-        if br is not None and br != br_name:
-            VMTopology.cmd('ovs-vsctl --if-exists del-port %s %s' % (br, vm_iface))
 
-        ports = VMTopology.get_ovs_br_ports(br_name)
-        if injected_iface not in ports:
-            VMTopology.cmd('ovs-vsctl --may-exist add-port %s %s' %
-                           (br_name, injected_iface))
-
-        if dut_iface not in ports:
-            VMTopology.cmd('ovs-vsctl --may-exist add-port %s %s' % (br_name, dut_iface))
+        The ports are moved to the bridge with one ovs-vsctl transaction. Pass port_to_bridge got by
+        get_ovs_port_to_bridge in kwargs to share it among the calls binding different ports.
+        """
+        port_to_bridge = kwargs.get("port_to_bridge")
+        if port_to_bridge is None:
+            port_to_bridge = VMTopology.get_ovs_port_to_bridge()
 
-        if vm_iface not in ports:
-            VMTopology.cmd('ovs-vsctl --may-exist add-port %s %s' % (br_name, vm_iface))
+        vsctl_cmds = []
+        for iface in (injected_iface, dut_iface, vm_iface):
+            br = port_to_bridge.get(iface)
+            if br is not None and br != br_name:
+                vsctl_cmds.append('--if-exists del-port %s %s' % (br, iface))
+        for iface in (injected_iface, dut_iface, vm_iface):
+            if port_to_bridge.get(iface) != br_name:
+                vsctl_cmds.append('--may-exist add-port %s %s' % (br_name, iface))
+        if vsctl_cmds:
+            VMTopology.cmd('ovs-vsctl -- %s' % ' -- '.join(vsctl_cmds))
 
         bindings = VMTopology.get_ovs_port_bindings(br_name, [dut_iface])
         dut_iface_id = bindings[dut_iface]
@@ -1357,6 +1556,7 @@ class VMTopology(object):
 
         self.destroy_ovs_bridge(br_name)
 
+    @topology_phase
     def add_host_ports(self):
         """
         add dut port in the ptf docker
@@ -1364,6 +1564,9 @@ class VMTopology(object):
         for non-dual topo, inject the dut port into ptf docker.
         for dual-tor topo, create ovs port and add to ptf docker.
         """
+        # (ptf_if, dut_if, vlan sub interface) of dut ports to be injected by add_dut_ifs_to_docker
+        dut_ifs = []
+
         def _add_host_port(i, intf):
             if self._is_multi_duts and not self._is_cable:
                 if isinstance(intf, list):
@@ -1404,7 +1607,7 @@ class VMTopology(object):
                     fp_port = self.duts_fp_ports[self.duts_name[intf[0]]][str(
                         intf[1])]
                     ptf_if = PTF_FP_IFACE_TEMPLATE % host_ifindex
-                    self.add_dut_if_to_docker(ptf_if, fp_port)
+                    dut_ifs.append((ptf_if, fp_port, None))
             elif self._is_multi_duts and self._is_cable:
                 # Since there could be multiple ToR's in cable topology, some Ports
                 # can be connected to muxcable and some to a DAC cable. But it could
@@ -1419,32 +1622,35 @@ class VMTopology(object):
                     fp_port = self.duts_fp_ports[self.duts_name[intf[0][0]]][str(
                         intf[0][1])]
                     ptf_if = PTF_FP_IFACE_TEMPLATE % host_ifindex
-                    self.add_dut_if_to_docker(ptf_if, fp_port)
+                    dut_ifs.append((ptf_if, fp_port, None))
 
                 host_ifindex = intf[1][2]
                 if self.duts_fp_ports[self.duts_name[intf[1][0]]].get(str(intf[1][1])) is not None:
                     fp_port = self.duts_fp_ports[self.duts_name[intf[1][0]]][str(
                         intf[1][1])]
                     ptf_if = PTF_FP_IFACE_TEMPLATE % host_ifindex
-                    self.add_dut_if_to_docker(ptf_if, fp_port)
+                    dut_ifs.append((ptf_if, fp_port, None))
             else:
                 fp_port = self.duts_fp_ports[self.duts_name[0]][str(intf)]
                 ptf_if = PTF_FP_IFACE_TEMPLATE % intf
-                self.add_dut_if_to_docker(ptf_if, fp_port)
+                vlan_subif = None
                 # only create sub interface for enabled ports defined in t0-backend
                 if self.dut_type == BACKEND_TOR_TYPE and intf not in self.disabled_host_interfaces:
                     vlan_separator = self.topo.get("DUT", {}).get(
                         "sub_interface_separator", SUB_INTERFACE_SEPARATOR)
                     vlan_id = self.vlan_ids[str(intf)]
-                    self.add_dut_vlan_subif_to_docker(
-                        ptf_if, vlan_separator, vlan_id)
+                    vlan_subif = (vlan_separator, vlan_id)
+                dut_ifs.append((ptf_if, fp_port, vlan_subif))
 
         self.worker.map(lambda args: _add_host_port(*args), enumerate(self.host_interfaces))
+        self.add_dut_ifs_to_docker(dut_ifs)
 
+    @topology_phase
     def enable_netns_loopback(self):
         """Enable loopback device in the netns."""
         VMTopology.cmd("ip netns exec %s ifconfig lo up" % self.netns)
 
+    @topology_phase
     def setup_netns_source_routing(self):
         """Setup policy-based routing to forward packet to its igress ports."""
 
@@ -1503,11 +1709,14 @@ class VMTopology(object):
                 VMTopology.cmd("ip netns exec %s ip route add default via %s dev %s table %s" % (
                     self.netns, gateway_addr, ns_if, rt_name))
 
+    @topology_phase
     def remove_host_ports(self):
         """
         remove dut port from the ptf docker
         """
         logging.info("=== Remove host ports ===")
+        # (ptf_if, dut_if, vlan sub interface) of dut ports to be restored by remove_dut_ifs_from_docker
+        dut_ifs = []
 
         def _remove_host_port(i, intf):
             if self._is_multi_duts:
@@ -1521,19 +1730,20 @@ class VMTopology(object):
                     fp_port = self.duts_fp_ports[self.duts_name[intf[0]]][str(
                         intf[1])]
                     ptf_if = PTF_FP_IFACE_TEMPLATE % host_ifindex
-                    self.remove_dut_if_from_docker(ptf_if, fp_port)
+                    dut_ifs.append((ptf_if, fp_port, None))
             else:
                 fp_port = self.duts_fp_ports[self.duts_name[0]][str(intf)]
                 ptf_if = PTF_FP_IFACE_TEMPLATE % intf
-                self.remove_dut_if_from_docker(ptf_if, fp_port)
+                vlan_subif = None
                 if self.dut_type == BACKEND_TOR_TYPE:
                     vlan_separator = self.topo.get("DUT", {}).get(
                         "sub_interface_separator", SUB_INTERFACE_SEPARATOR)
                     vlan_id = self.vlan_ids[str(intf)]
-                    self.remove_dut_vlan_subif_from_docker(
-                        ptf_if, vlan_separator, vlan_id)
+                    vlan_subif = (vlan_separator, vlan_id)
+                dut_ifs.append((ptf_if, fp_port, vlan_subif))
 
         self.worker.map(lambda args: _remove_host_port(*args), enumerate(self.host_interfaces))
+        self.remove_dut_ifs_from_docker(dut_ifs)
 
     def remove_veth_if_from_docker(self, ext_if, int_if, tmp_name):
         """
@@ -1551,17 +1761,51 @@ class VMTopology(object):
         if VMTopology.intf_exists(ext_if):
             VMTopology.cmd("ip link delete dev %s" % ext_if)
 
+    def remove_veth_ifs_from_docker(self, veth_ifs):
+        """
+        Remove veth interfaces from docker with one ip batch in the docker and one on host
+
+        Args:
+            veth_ifs (list): (ext_if, int_if, tmp_name) of the interfaces, see remove_veth_if_from_docker.
+        """
+        if not veth_ifs:
+            return
+
+        host_links = VMTopology.get_links()
+        ptf_links = VMTopology.get_links(pid=self.pid)
+        host_batch = IpBatch()
+        ptf_batch = IpBatch(pid=self.pid)
+        for ext_if, int_if, tmp_name in veth_ifs:
+            logging.info("=== Cleanup port, int_if: %s, ext_if: %s, tmp_name: %s ===" % (ext_if, int_if, tmp_name))
+            if int_if in ptf_links:
+                # Name it back to temp name in PTF container to avoid potential conflicts
+                ptf_batch.add("link set dev %s down" % int_if)
+                ptf_batch.add("link set dev %s name %s" % (int_if, tmp_name))
+                # Set it to default namespace
+                ptf_batch.add("link set dev %s netns 1" % tmp_name)
+
+            # Delete its peer in default namespace
+            if ext_if in host_links:
+                host_batch.add("link delete dev %s" % ext_if)
+
+        ptf_batch.run()
+        host_batch.run()
+
+    @topology_phase
     def remove_ptf_mgmt_port(self):
         ext_if = PTF_MGMT_IF_TEMPLATE % self.vm_set_name
         tmp_name = MGMT_PORT_NAME + VMTopology._generate_fingerprint(ext_if, MAX_INTF_LEN - len(MGMT_PORT_NAME))
         self.remove_veth_if_from_docker(ext_if, MGMT_PORT_NAME, tmp_name)
 
+    @topology_phase
     def remove_ptf_backplane_port(self):
         ext_if = PTF_BP_IF_TEMPLATE % self.vm_set_name
         tmp_name = BP_PORT_NAME + VMTopology._generate_fingerprint(ext_if, MAX_INTF_LEN - len(BP_PORT_NAME))
         self.remove_veth_if_from_docker(ext_if, BP_PORT_NAME, tmp_name)
 
+    @topology_phase
     def remove_injected_fp_ports_from_docker(self):
+        veth_ifs = []
         for vm, vlans in self.injected_fp_ports.items():
             for vlan in vlans:
                 (_, _, ptf_index) = VMTopology.parse_vm_vlan_port(vlan)
@@ -1572,7 +1816,8 @@ class VMTopology(object):
                     BACKEND_TOR_TYPE, BACKEND_LEAF_TYPE)
                 if not create_vlan_subintf:
                     tmp_name = int_if + VMTopology._generate_fingerprint(ext_if, MAX_INTF_LEN - len(int_if))
-                    self.remove_veth_if_from_docker(ext_if, int_if, tmp_name)
+                    veth_ifs.append((ext_if, int_if, tmp_name))
+        self.remove_veth_ifs_from_docker(veth_ifs)
 
     @staticmethod
     def _generate_fingerprint(name, digit=6):
@@ -1651,6 +1896,31 @@ class VMTopology(object):
         except Exception:
             return False
 
+    @staticmethod
+    def get_links(pid=None, netns=None):
+        """Get the names of all the interfaces on host, in a docker or in a netns with one command.
+
+        Args:
+            pid (str), optional): Pid of docker. Defaults to None.
+            netns (str), optional): netns name. Default to None.
+
+        Returns:
+            set: Names of the interfaces.
+        """
+        if pid:
+            cmdline = 'nsenter -t %s -n ip -o link show' % pid
+        elif netns:
+            cmdline = 'ip -n %s -o link show' % netns
+        else:
+            cmdline = 'ip -o link show'
+        links = set()
+        for line in VMTopology.cmd(cmdline).splitlines():
+            # e.g. "12: inje-vms1-0@if11: <BROADCAST,MULTICAST,UP,LOWER_UP> mtu 9100 ..."
+            fields = line.split(':')
+            if len(fields) > 2:
+                links.add(fields[1].strip().split('@')[0])
+        return links
+
     @staticmethod
     def iface_up(iface_name, pid=None, netns=None):
         return VMTopology.iface_updown(iface_name, 'up', pid, netns)
@@ -1680,6 +1950,7 @@ class VMTopology(object):
         cmdline_ori = cmdline
         cmdline = shlex.split(cmdline_ori)
 
+        PHASE_TIMER.count_command()
         return VMTopologyWorker.Popen(
                 cmdline,
                 stdin=subprocess.PIPE,
@@ -1688,7 +1959,8 @@ class VMTopology(object):
                 shell=False)
 
     @staticmethod
-    def cmd(cmdline, grep_cmd=None, retry=1, negative=False, shell=False, split_cmd=True, ignore_errors=False):
+    def cmd(cmdline, grep_cmd=None, retry=1, negative=False, shell=False, split_cmd=True, ignore_errors=False,
+            input_data=None):
         """Execute a command and return the output
 
         Args:
@@ -1697,6 +1969,7 @@ class VMTopology(object):
             retry (int, optional): Max number of retry if command result is unexpected. Defaults to 1.
             negative (bool, optional): If negative is True, expect the command to fail. Defaults to False.
             ignore_errors (bool, optional): If ignore_errors is True, return the output even if the command fails.
+            input_data (str, optional): Data written to stdin of the command, not supported with grep_cmd.
 
         Raises:
             Exception: If command result is unexpected after max number of retries, raise an exception.
@@ -1710,6 +1983,9 @@ class VMTopology(object):
         for attempt in range(retry):
             logging.debug('*** CMD: %s, grep: %s, attempt: %d' %
                           (cmdline, grep_cmd, attempt + 1))
+            if input_data is not None:
+                logging.debug('*** INPUT: \n%s' % input_data)
+            PHASE_TIMER.count_command()
             if split_cmd:
                 cmdline = shlex.split(cmdline_ori)
             process = subprocess.Popen(
@@ -1730,7 +2006,7 @@ class VMTopology(object):
                 out, err = process_grep.communicate()
                 ret_code = process_grep.returncode
             else:
-                out, err = process.communicate()
+                out, err = process.communicate(input_data.encode('utf-8') if input_data is not None else None)
                 ret_code = process.returncode
             out, err = out.decode('utf-8'), err.decode('utf-8')
 
@@ -1775,6 +2051,25 @@ class VMTopology(object):
                 ports.add(port)
         return ports
 
+    @staticmethod
+    def get_ovs_port_to_bridge():
+        """Get the bridge of the ports of all the OVS bridges with two commands.
+
+        Returns:
+            dict: {port name: bridge name}
+        """
+        bridges = json.loads(VMTopology.cmd('ovs-vsctl --format=json --columns=name,ports list Bridge'))
+        ports = json.loads(VMTopology.cmd('ovs-vsctl --format=json --columns=_uuid,name list Port'))
+        port_names = dict((row[0][1], row[1]) for row in ports['data'])
+        port_to_bridge = {}
+        for bridge, bridge_ports in bridges['data']:
+            # column of set type is ["set", [["uuid", <uuid>], ...]], or ["uuid", <uuid>] if it has one element
+            uuids = [uuid for _, uuid in bridge_ports[1]] if bridge_ports[0] == 'set' else [bridge_ports[1]]
+            for uuid in uuids:
+                if uuid in port_names:
+                    port_to_bridge[port_names[uuid]] = bridge
+        return port_to_bridge
+
     @staticmethod
     def get_ovs_bridge_by_port(port):
         try:
@@ -2520,9 +2815,9 @@ def main():
 
     except Exception as error:
         logging.error(traceback.format_exc())
-        module.fail_json(msg=str(error))
+        module.fail_json(msg=str(error), phase_timing=PHASE_TIMER.report())
 
-    module.exit_json(changed=True)
+    module.exit_json(changed=True, phase_timing=PHASE_TIMER.report())
 
 
 if __name__ == "__main__":
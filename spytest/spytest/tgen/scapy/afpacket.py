@@ -6,8 +6,15 @@ in the data returned by recv. Instead, it delivers the VLAN TCI in a control
 message. Python 2.x doesn't have built-in support for recvmsg, so we have to
 use ctypes to call it. The recv function exported by this module reconstructs
 the VLAN tag if it was offloaded.
+
+TxRing and RxRing use PACKET_MMAP (TPACKET_V2) rings shared with the kernel,
+so that frames are copied to and from the socket without a system call per
+frame. RxRing reconstructs the offloaded VLAN tag the same way as recv.
 """
 
+import mmap
+import select
+import socket
 import struct
 from ctypes import sizeof
 from ctypes import get_errno
@@ -30,6 +37,27 @@ SOL_PACKET = 263
 PACKET_AUXDATA = 8
 TP_STATUS_VLAN_VALID = 1 << 4
 
+PACKET_RX_RING = 5
+PACKET_VERSION = 10
+PACKET_TX_RING = 13
+TPACKET_V2 = 1
+
+# status of RX ring frames
+TP_STATUS_KERNEL = 0
+TP_STATUS_USER = 1
+
+# status of TX ring frames
+TP_STATUS_AVAILABLE = 0
+TP_STATUS_SEND_REQUEST = 1
+TP_STATUS_SENDING = 2
+TP_STATUS_WRONG_FORMAT = 4
+
+# struct tpacket2_hdr: status, len, snaplen, mac, net, sec, nsec, vlan_tci, vlan_tpid, padding
+TPACKET2_HDR = struct.Struct("=IIIHHIIHH4x")
+TX_LEN = struct.Struct("=I")
+# TX frame data follows the header aligned to TPACKET_ALIGNMENT (16)
+TPACKET2_DATA_OFFSET = (TPACKET2_HDR.size + 15) & ~15
+
 
 class struct_iovec(Structure):
     _fields_ = [
@@ -131,3 +159,133 @@ def recv(sk, bufsize):
         return buf.raw[:12] + tag + buf.raw[12:rv]
     else:
         return buf.raw[:rv]
+
+
+class PacketRing(object):
+    """
+    PACKET_MMAP ring of an AF_PACKET socket
+
+    The ring has frame_count frames of frame_size bytes, frame_size must be a
+    multiple of 16 and of the page size or divide it.
+    """
+
+    def __init__(self, sk, ring_type, frame_size=16384, frame_count=256):
+        self.sk = sk
+        self.frame_size = frame_size
+        self.frame_count = frame_count
+        frames_per_block = max(1, mmap.PAGESIZE // frame_size)
+        block_size = frame_size * frames_per_block
+        block_count = frame_count // frames_per_block
+        sk.setsockopt(SOL_PACKET, PACKET_VERSION, TPACKET_V2)
+        # struct tpacket_req: block_size, block_nr, frame_size, frame_nr
+        req = struct.pack("IIII", block_size, block_count, frame_size, frame_count)
+        sk.setsockopt(SOL_PACKET, ring_type, req)
+        self.ring = mmap.mmap(sk.fileno(), block_size * block_count,
+                              mmap.MAP_SHARED, mmap.PROT_READ | mmap.PROT_WRITE)
+        self.index = 0
+
+    def status(self, index):
+        return struct.unpack_from("=I", self.ring, index * self.frame_size)[0]
+
+    def set_status(self, index, status):
+        struct.pack_into("=I", self.ring, index * self.frame_size, status)
+
+    def close(self):
+        self.ring.close()
+
+
+class TxRing(PacketRing):
+    """
+    PACKET_MMAP transmit ring
+
+    Frames written are sent by the kernel on flush, in one system call.
+    The socket must be bound to the interface.
+    """
+
+    def __init__(self, sk, frame_size=16384, frame_count=256):
+        super(TxRing, self).__init__(sk, PACKET_TX_RING, frame_size, frame_count)
+        self.max_len = frame_size - TPACKET2_DATA_OFFSET
+        self.pending = 0
+
+    def write(self, data):
+        """
+        Copy a frame to the ring
+
+        Returns False if the ring is full or the frame is too long.
+        """
+        if len(data) > self.max_len:
+            return False
+        offset = self.index * self.frame_size
+        # the TX status values fit in the first byte (little endian)
+        if self.ring[offset] & (TP_STATUS_SEND_REQUEST | TP_STATUS_SENDING):
+            return False
+        self.ring[offset + TPACKET2_DATA_OFFSET:offset + TPACKET2_DATA_OFFSET + len(data)] = data
+        TX_LEN.pack_into(self.ring, offset + 4, len(data))
+        # status last, the kernel takes the frame once it is set
+        self.ring[offset] = TP_STATUS_SEND_REQUEST
+        self.index = (self.index + 1) % self.frame_count
+        self.pending = self.pending + 1
+        return True
+
+    def flush(self, wait=False):
+        """
+        Ask the kernel to send the frames written
+
+        @wait Block until the frames are sent
+        """
+        if not self.pending:
+            return 0
+        self.sk.send(b"", 0 if wait else socket.MSG_DONTWAIT)
+        sent, self.pending = self.pending, 0
+        return sent
+
+    def send(self, data):
+        """
+        Write a frame and flush the ring when it is full
+
+        Returns False if the frame can't be written in the ring.
+        """
+        if self.write(data):
+            return True
+        self.flush(wait=True)
+        return self.write(data)
+
+
+class RxRing(PacketRing):
+    """
+    PACKET_MMAP receive ring
+    """
+
+    def __init__(self, sk, frame_size=16384, frame_count=256):
+        super(RxRing, self).__init__(sk, PACKET_RX_RING, frame_size, frame_count)
+        self.poller = select.poll()
+        self.poller.register(sk.fileno(), select.POLLIN | select.POLLERR)
+
+    def recv(self, timeout=None, max_frames=None):
+        """
+        Receive the frames available in the ring
+
+        @timeout Time to wait for a frame in seconds, None to wait forever
+        @max_frames Maximum number of frames returned
+        Returns a list of frames, empty if no frame was received before timeout.
+        """
+        if not self.status(self.index) & TP_STATUS_USER:
+            self.poller.poll(None if timeout is None else int(timeout * 1000))
+
+        frames = []
+        while self.status(self.index) & TP_STATUS_USER:
+            offset = self.index * self.frame_size
+            status, _, snaplen, mac, _, _, _, vlan_tci, _ = TPACKET2_HDR.unpack_from(self.ring, offset)
+            start = offset + mac
+            if vlan_tci != 0 or status & TP_STATUS_VLAN_VALID:
+                # Insert VLAN tag
+                tag = struct.pack("!HH", ETH_P_8021Q, vlan_tci)
+                frames.append(self.ring[start:start + 12] + tag + self.ring[start + 12:start + snaplen])
+            else:
+                frames.append(self.ring[start:start + snaplen])
+            # give the frame back to the kernel
+            self.set_status(self.index, TP_STATUS_KERNEL)
+            self.index = (self.index + 1) % self.frame_count
+            if max_frames and len(frames) >= max_frames:
+                break
+        return frames
@@ -121,7 +121,8 @@ class ScapyDriver(object):
             # read packets
             while self.rx_any_enable():
                 try:
-                    packet = self.packet.readp(self.iface, self.port)
+                    decode = self.captureState.is_set() or self.protocolState.is_set()
+                    packet = self.packet.readp(self.iface, self.port, decode)
                     if packet:
                         self.handle_recv(packet)
                 except Exception as e:
@@ -153,11 +154,10 @@ class ScapyDriver(object):
             self.logger.debug("{} framesReceived: {}".format(self.iface, framesReceived))
         if pktlen > 1518:
             self.port.incrStat('oversizeFramesReceived')
-        for stream in self.port.track_streams:
-            if self.packet.match_stream(stream, packet):
-                stream.incrStat('framesReceived')
-                stream.incrStat('bytesReceived', pktlen)
-                break  # no need to check in other streams
+        stream = self.packet.classify_stream(self.port.track_streams, packet)
+        if stream:
+            stream.incrStat('framesReceived')
+            stream.incrStat('bytesReceived', pktlen)
 
     def handle_capture(self, packet):
         self.pkts_captured.append(packet)
@@ -443,6 +443,7 @@ class ScapyDriver(object):
                     ipg = self.packet.build_ipg(pwa_next)
                     pwa_next.tx_time = self.utils.clock() + ipg - build_time - send_time
                     pwa_next_list.append(pwa_next)
+            self.packet.flush_tx()
             pwa_list = pwa_next_list
         self.logger.debug("{} {} Completed {}".format(func, self.iface, tx_count))
 
@@ -454,6 +455,9 @@ class ScapyDriver(object):
         if self.dbg > 2 or (self.dbg > 1 and pwa.left != 0):
             self.logger.debug("stream: {} delay: {} pps: {}".format(pwa.stream.stream_id, delay, pwa.rate_pps))
         delay = 0 if delay < 0 else delay
+        if delay > 0:
+            # send the frames batched before waiting
+            self.packet.flush_tx()
         if delay > 1.0 / 10:
             self.utils.msleep(delay * 1000, 10)
         elif delay > 1.0 / 100:
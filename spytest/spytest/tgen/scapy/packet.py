@@ -1,5 +1,6 @@
 import os
 import zlib
+import struct
 import time
 import copy
 import random
@@ -7,6 +8,7 @@ import binascii
 import socket
 import afpacket
 import traceback
+from collections import deque
 
 from scapy.all import hexdump, sendp
 try:
@@ -21,6 +23,7 @@ from scapy.layers.inet6 import IPv6, ICMPv6ND_NA
 from scapy.contrib.igmp import IGMP
 from scapy.config import Conf
 from scapy.utils import hexstr
+from scapy.utils import mac2str
 from dicts import SpyTestDict
 from utils import Utils
 from utils import RunTimeException
@@ -127,6 +130,17 @@ stale_list_ignore = [
 ]
 
 
+# stream fields which change the checksums or the length, frames can't be built from a template when they change
+TEMPLATE_FIXED_FIELDS = ["arp_src_hw", "arp_dst_hw", "ip_src", "ip_dst", "ipv6_src", "ipv6_dst",
+                         "tcp_src_port", "tcp_dst_port", "udp_src_port", "udp_dst_port"]
+
+# frames decoded for PacketProtocol.process when only stats are collected:
+# IGMP and OSPF, DHCP and RADIUS (may carry EAP), IP tunnels
+PROTOCOL_IP_PROTOS = (2, 89)
+PROTOCOL_UDP_PORTS = (67, 68, 1812, 1813)
+PROTOCOL_IP_TUNNELS = (4, 41, 47)
+
+
 class ScapyPacket(object):
 
     def __init__(self, iface, dbg=0, dry=False, logger=None):
@@ -151,10 +165,19 @@ class ScapyPacket(object):
         self.rx_sock = None
         self.tx_sock = None
         self.tx_sock_failed = False
+        self.rx_ring = None
+        self.rx_frames = deque()
+        self.tx_ring = None
+        self.tx_ring_failed = False
+        self.tx_ring_lock = Lock()
         self.finished = False
         self.mtu = 9194
         self.use_bridge = bool(os.getenv("SPYTEST_SCAPY_USE_BRIDGE", "1") != "0")
         self.logger.info("use_bridge = {}".format(self.use_bridge))
+        self.use_mmap = bool(os.getenv("SPYTEST_SCAPY_USE_MMAP", "0") != "0")
+        self.logger.info("use_mmap = {}".format(self.use_mmap))
+        self.sid_streams = None
+        self.sid_streams_key = None
         self.pp = PacketProtocol(self)
         self.pi = PacketInterface(self)
         self.bgp = ExaBgp(self)
@@ -261,6 +284,12 @@ class ScapyPacket(object):
         self.dot1x.cleanup()
         self.dhcps.cleanup()
         self.finished = True
+        self.rx_ring = self.close_sock(self.rx_ring)
+        self.rx_frames.clear()
+        if self.tx_ring:
+            self.close_sock(self.tx_ring.sk)
+        self.tx_ring = self.close_sock(self.tx_ring)
+        self.tx_ring_failed = False
         self.rx_sock = self.close_sock(self.rx_sock)
         self.tx_sock = self.close_sock(self.tx_sock)
         self.tx_sock_failed = False
@@ -282,12 +311,21 @@ class ScapyPacket(object):
                 raise exp
             raise RunTimeException(exp, msg)
         afpacket.enable_auxdata(self.rx_sock)
+        if self.use_mmap:
+            try:
+                self.rx_ring = afpacket.RxRing(self.rx_sock)
+            except Exception as exp:
+                self.warn("Failed to create RX ring {} {}".format(self.iface, exp))
 
     def set_link(self, status):
         msg = "link:{} status:{}".format(self.iface, status)
         self.logger.debug(msg)
 
-    def readp(self, iface, port):
+    def readp(self, iface, port, decode=True):
+        """
+        Receive a packet
+        @decode Return the scapy packet, else the frame bytes unless it is a protocol packet
+        """
 
         if self.dry:
             time.sleep(2)
@@ -297,17 +335,30 @@ class ScapyPacket(object):
             return None
 
         try:
-            data = afpacket.recv(self.rx_sock, 12 * 1024)
+            if self.rx_ring:
+                if not self.rx_frames:
+                    self.rx_frames.extend(self.rx_ring.recv(timeout=1))
+                if not self.rx_frames:
+                    return None
+                data = self.rx_frames.popleft()
+            else:
+                data = afpacket.recv(self.rx_sock, 12 * 1024)
         except Exception as exp:
             if self.finished:
                 return None
             raise exp
-        packet = Ether(data)
         self.stats_lock.acquire()
         self.rx_count = self.rx_count + 1
         self.stats_lock.release()
         self.trace_stats()
 
+        if not decode and self.dbg <= 1 and not self.is_protocol_frame(data):
+            # stats only need the frame length and the stream signature
+            self.pp.periodic(port)
+            return data
+
+        packet = Ether(data)
+
         if self.dbg > 1:
             cmd = "" if not self.show_summary else packet.command()
             msg = "readp:{} len:{} count:{} {}".format
@@ -321,21 +372,57 @@ class ScapyPacket(object):
 
         return packet
 
-    def sendp(self, pkt, data, iface, stream_name, left):
+    @staticmethod
+    def is_protocol_frame(data):
+        """
+        Check if a frame may be handled by PacketProtocol.process (OSPF, DHCP, IGMP, EAP)
+        """
+        if len(data) < 14:
+            return True
+        offset = 12
+        eth_type = struct.unpack_from("!H", data, offset)[0]
+        while eth_type in (0x8100, 0x88a8, 0x9100) and len(data) >= offset + 6:
+            offset = offset + 4
+            eth_type = struct.unpack_from("!H", data, offset)[0]
+        offset = offset + 2
+        if eth_type == 0x888e:
+            return True
+        if eth_type == 0x86dd:
+            # IPv4 tunneled in IPv6
+            return len(data) < offset + 40 or struct.unpack_from("!B", data, offset + 6)[0] in PROTOCOL_IP_TUNNELS
+        if eth_type != 0x0800:
+            return False
+        if len(data) < offset + 20:
+            return True
+        ihl, proto = struct.unpack_from("!B8xB", data, offset)
+        if proto in PROTOCOL_IP_PROTOS or proto in PROTOCOL_IP_TUNNELS:
+            return True
+        if proto != 17:
+            return False
+        offset = offset + (ihl & 0x0F) * 4
+        if len(data) < offset + 4:
+            return True
+        sport, dport = struct.unpack_from("!HH", data, offset)
+        return sport in PROTOCOL_UDP_PORTS or dport in PROTOCOL_UDP_PORTS
+
+    def sendp(self, pkt, data, iface, stream_name, left, batch=False):
         self.stats_lock.acquire()
         self.tx_count = self.tx_count + 1
         self.stats_lock.release()
         self.trace_stats()
 
         if self.dbg > 2 or (self.dbg > 1 and left != 0):
+            # decode the frame only when traced
+            pkt = pkt or Ether(data)
             cmd = "" if not self.show_summary else pkt.command()
             msg = "sendp:{}:{} len:{} count:{} {}".format
             self.logger.debug(msg(iface, stream_name, len(data), self.tx_count, cmd))
 
         if self.dbg > 3:
+            pkt = pkt or Ether(data)
             self.trace_packet(pkt, self.hex)
 
-        return self.send(data, iface)
+        return self.send(data, iface, batch=batch)
 
     def mkcmd(self, data):
         try:
@@ -349,7 +436,7 @@ class ScapyPacket(object):
         cmd = self.mkcmd(data)
         return "{}:{} len:{} {} {}".format(func, iface, len(data), cmd, str(exp))
 
-    def send(self, data, iface, trace=False):
+    def send(self, data, iface, trace=False, batch=False):
 
         if trace and self.dbg > 2:
             cmd = self.mkcmd(data)
@@ -359,6 +446,10 @@ class ScapyPacket(object):
         if self.dry:
             return
 
+        # try sending using TX ring, batched frames are sent on flush_tx
+        if self.use_mmap and self.ring_send(data, iface, batch):
+            return len(data)
+
         if not self.tx_sock:
             try:
                 self.tx_sock = L2Socket(iface)
@@ -389,6 +480,43 @@ class ScapyPacket(object):
         self.logger.error("Failed to send normal {}".format(err1))
         self.logger.error("Failed to send legacy {}".format(err2))
 
+    def ring_send(self, data, iface, batch):
+        self.tx_ring_lock.acquire()
+        try:
+            if not self.tx_ring and not self.tx_ring_failed:
+                try:
+                    ETH_P_ALL = 3
+                    sock = socket.socket(socket.AF_PACKET, socket.SOCK_RAW, socket.htons(ETH_P_ALL))
+                    sock.bind((iface, ETH_P_ALL))
+                    self.tx_ring = afpacket.TxRing(sock)
+                except Exception as exp:
+                    self.tx_ring_failed = True
+                    self.error("Failed to create TX ring {} {}".format(iface, exp))
+            if not self.tx_ring or not self.tx_ring.send(data):
+                return False
+            if not batch:
+                self.tx_ring.flush()
+            return True
+        except Exception as exp:
+            self.logger.error("Failed to send ring {}".format(self.expmsg(data, iface, exp, "ring-send")))
+            return False
+        finally:
+            self.tx_ring_lock.release()
+
+    def flush_tx(self):
+        """
+        Send the frames batched in the TX ring
+        """
+        if not self.tx_ring:
+            return
+        self.tx_ring_lock.acquire()
+        try:
+            self.tx_ring.flush()
+        except Exception as exp:
+            self.logger.error("Failed to flush TX ring {} {}".format(self.iface, exp))
+        finally:
+            self.tx_ring_lock.release()
+
     def trace_stats(self):
         # self.logger.debug("Name: {} RX: {} TX: {}".format(self.iface, self.rx_count, self.tx_count))
         pass
@@ -413,7 +541,7 @@ class ScapyPacket(object):
         if hex:
             self.logger.debug(hexdump(pkt, dump=True))
 
-    def send_packet(self, pwa, iface, stream_name, left):
+    def build_frame(self, pwa):
         if pwa.padding:
             strpkt = self.utils.tobytes(pwa.pkt / pwa.padding)
         else:
@@ -427,13 +555,59 @@ class ScapyPacket(object):
                 sid = binascii.unhexlify(sid)
                 strpkt = strpkt[:-len(sid)] + sid
 
+        return strpkt
+
+    def template_frame(self, pwa):
+        """
+        Build the frame by patching the L2 fields of the first frame of the stream
+
+        Returns None if other fields of the stream change, they need the frame to be built again.
+        """
+        if pwa.get("template") is None:
+            pwa.template = False
+            if pwa.length_mode != "fixed":
+                return None
+            for name in TEMPLATE_FIXED_FIELDS:
+                if pwa.stream.kws.get(name + "_mode", "fixed").strip() != "fixed":
+                    return None
+            vlan_mode = pwa.stream.kws.get("vlan_id_mode", "fixed").strip()
+            pwa.template_vlan = vlan_mode != "fixed"
+            if pwa.template_vlan and not isinstance(pwa.pkt.payload, Dot1Q):
+                return None
+            pwa.template = bytearray(self.build_frame(pwa))
+            return bytes(pwa.template)
+
+        if not pwa.template:
+            return None
+
         try:
-            crc1 = '{:08x}'.format(socket.htonl(zlib.crc32(strpkt) & 0xFFFFFFFF))
-            crc = binascii.unhexlify(crc1)
+            src, dst = mac2str(pwa.pkt.src), mac2str(pwa.pkt.dst)
+        except Exception:
+            src, dst = b"", b""
+        if len(src) != 6 or len(dst) != 6:
+            return None
+        pwa.template[0:6] = dst
+        pwa.template[6:12] = src
+        if pwa.template_vlan:
+            dot1q = pwa.pkt.payload
+            if not 0 <= dot1q.vlan <= 0xFFF:
+                return None
+            # priority and DEI bits are not changed by build_next_dma
+            tci = struct.unpack_from("!H", pwa.template, 14)[0]
+            struct.pack_into("!H", pwa.template, 14, (tci & 0xF000) | dot1q.vlan)
+        return bytes(pwa.template)
+
+    def send_packet(self, pwa, iface, stream_name, left):
+        strpkt = self.template_frame(pwa)
+        if strpkt is None:
+            strpkt = self.build_frame(pwa)
+
+        try:
+            crc = struct.pack("!I", socket.htonl(zlib.crc32(strpkt) & 0xFFFFFFFF))
         except Exception:
             crc = binascii.unhexlify('00' * 4)
-        bstr = strpkt + self.utils.tobytes(crc)
-        self.sendp(Ether(bstr), bstr, iface, stream_name, left)
+        bstr = strpkt + crc
+        self.sendp(None, bstr, iface, stream_name, left, batch=True)
         return bstr
 
     def check(self, pkt):
@@ -1238,6 +1412,23 @@ class ScapyPacket(object):
             self.trace_packet(pkt, hex=True, force=True)
         return False
 
+    def classify_stream(self, streams, pkt):
+        """
+        Find the stream of a packet by its signature, without decoding the packet
+        """
+        if self.sid_streams_key != streams:
+            self.sid_streams = dict()
+            for stream in streams:
+                sid = stream.get_sid()
+                if sid:
+                    self.sid_streams.setdefault(binascii.unhexlify(sid), stream)
+            self.sid_streams_key = list(streams)
+        strpkt = self.utils.tobytes(pkt)
+        stream = self.sid_streams.get(strpkt[-8:-4])
+        if not stream and self.dbg > 2:
+            self.logger.debug("{}: CMP1: {}".format(self.iface, binascii.hexlify(strpkt[-8:-4])))
+        return stream
+
     def if_create(self, intf):
         return self.pi.if_create(intf)
 
@@ -46,6 +46,9 @@ class PacketProtocol(object):
         if EAP in pkt:
             self.dot1x_rx(port, pkt)
 
+        self.periodic(port)
+
+    def periodic(self, port):
         self.igmp_tx_query_periodic(port)
         self.dot1x_tx_periodic(port)
 
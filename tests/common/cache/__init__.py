@@ -1,4 +1,6 @@
 from .facts_cache import FactsCache
 from .facts_cache import cached
+from .facts_cache import dut_fingerprint_getter
+from .facts_cache import invalidate_dut_fingerprint
 
-__all__ = [FactsCache, cached]
+__all__ = [FactsCache, cached, dut_fingerprint_getter, invalidate_dut_fingerprint]
@@ -1,16 +1,17 @@
 
 
+import hashlib
 import inspect
 import logging
 import os
 import pickle
-import random
 import shutil
+import sqlite3
 import sys
+import tempfile
 import time
 
 from collections import defaultdict
-from pickle import UnpicklingError
 from threading import Lock
 from six import with_metaclass
 
@@ -21,9 +22,23 @@ CURRENT_PATH = os.path.realpath(__file__)
 CACHE_LOCATION = os.path.join(CURRENT_PATH, '../../../_cache')
 
 SIZE_LIMIT = 1000000000  # 1G bytes, max disk usage allowed by cache
-ENTRY_LIMIT = 1000000    # Max number of pickle files allowed in cache.
+ENTRY_LIMIT = 1000000    # Max number of entries allowed in cache.
 DISABLE_CACHE_PARAM = "disable_cache"
 
+# Storage of cached facts: "pickle" (default) for one pickle file per key, or "sqlite" for a single database
+CACHE_BACKEND = os.environ.get("FACTS_CACHE_BACKEND", "pickle")
+SQLITE_DB_NAME = "facts_cache.db"
+SQLITE_TIMEOUT = 60      # Seconds to wait for the database lock held by another process
+EVICT_BATCH_SIZE = 16    # Number of least recently used entries evicted at once when limits are exceeded
+
+FINGERPRINT_KEY = "__fingerprint__"
+# Boot id changes on reboot, checksums change on image upgrade and on config changes saved to config_db
+DUT_FINGERPRINT_CMD = "cat /proc/sys/kernel/random/boot_id; " \
+                      "md5sum /etc/sonic/sonic_version.yml /etc/sonic/config_db*.json"
+
+_dut_fingerprints = {}
+_dut_fingerprints_lock = Lock()
+
 
 class Singleton(type):
 
@@ -38,27 +53,23 @@ class Singleton(type):
         return cls._instances[cls]
 
 
-class FactsCache(with_metaclass(Singleton, object)):
-    """Singleton class for reading from cache and write to cache.
-
-    Used singleton design pattern. Only a single instance of this class can be initialized.
+class PickleFilesBackend(object):
+    """Store cached facts in pickle files <cache_location>/<zone>/<key>.pickle.
 
-    Args:
-        with_metaclass ([function]): Python 2&3 compatible function from the six library for adding metaclass.
+    Files are written to a temporary file and renamed, so readers never see a partially written file.
     """
 
-    NOTEXIST = object()
+    def __init__(self, cache_location):
+        self._cache_location = cache_location
 
-    def __init__(self, cache_location=CACHE_LOCATION):
-        self._cache_location = os.path.abspath(cache_location)
-        self._cache = defaultdict(dict)
-        self._write_lock = Lock()
+    def _facts_file(self, zone, key):
+        return os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
 
-    def _check_usage(self):
+    def _check_usage(self, new_size):
         """Check cache usage, raise exception if usage exceeds the limitations.
         """
-        total_size = 0
-        total_entries = 0
+        total_size = new_size
+        total_entries = 1
         for root, _, files in os.walk(self._cache_location):
             for f in files:
                 fp = os.path.join(root, f)
@@ -70,11 +81,196 @@ class FactsCache(with_metaclass(Singleton, object)):
                 .format(total_size, SIZE_LIMIT, total_entries, ENTRY_LIMIT)
             raise Exception(msg)
 
-    def _read_facts_file(self, facts_file, z, k):
-        with open(facts_file, 'rb') as f:
-            self._cache[z][k] = pickle.load(f)
-            logger.debug('[Cache] Loaded cached facts "{}.{}" from {}'.format(z, k, facts_file))
-            return self._cache[z][k]
+    def load(self, zone, key):
+        facts_file = self._facts_file(zone, key)
+        try:
+            with open(facts_file, 'rb') as f:
+                return f.read()
+        except (IOError, OSError) as e:
+            logger.info('[Cache] Load cache file "{}" failed: {}'.format(os.path.abspath(facts_file), repr(e)))
+            return None
+
+    def store(self, zone, key, data):
+        self._check_usage(len(data))
+        facts_file = self._facts_file(zone, key)
+        cache_subfolder = os.path.dirname(facts_file)
+        if not os.path.exists(cache_subfolder):
+            logger.info('[Cache] Create cache dir {}'.format(cache_subfolder))
+            os.makedirs(cache_subfolder, exist_ok=True)
+        fd, tmp_file = tempfile.mkstemp(dir=cache_subfolder, prefix='.{}.'.format(key), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_file, facts_file)
+        except Exception:
+            os.remove(tmp_file)
+            raise
+
+    def remove(self, zone, key):
+        os.remove(self._facts_file(zone, key))
+
+    def remove_zone(self, zone):
+        shutil.rmtree(os.path.join(self._cache_location, zone))
+
+
+class SqliteBackend(object):
+    """Store cached facts in a single SQLite database <cache_location>/facts_cache.db.
+
+    SQLite transactions make reads and writes safe across threads, xdist workers and parallel runs sharing the
+    cache location. Total size and number of entries are maintained by triggers, so checking the usage is O(1).
+    When a limit is exceeded, the least recently used entries are evicted.
+    """
+
+    SCHEMA = [
+        """CREATE TABLE IF NOT EXISTS facts (
+            zone TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value BLOB NOT NULL,
+            size INTEGER NOT NULL,
+            last_access REAL NOT NULL,
+            PRIMARY KEY (zone, key))""",
+        "CREATE INDEX IF NOT EXISTS facts_last_access ON facts (last_access)",
+        """CREATE TABLE IF NOT EXISTS usage (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            total_size INTEGER NOT NULL,
+            total_entries INTEGER NOT NULL)""",
+        "INSERT OR IGNORE INTO usage VALUES (0, 0, 0)",
+        """CREATE TRIGGER IF NOT EXISTS facts_insert AFTER INSERT ON facts BEGIN
+            UPDATE usage SET total_size = total_size + NEW.size, total_entries = total_entries + 1 WHERE id = 0;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS facts_update AFTER UPDATE OF size ON facts BEGIN
+            UPDATE usage SET total_size = total_size - OLD.size + NEW.size WHERE id = 0;
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS facts_delete AFTER DELETE ON facts BEGIN
+            UPDATE usage SET total_size = total_size - OLD.size, total_entries = total_entries - 1 WHERE id = 0;
+        END"""
+    ]
+
+    def __init__(self, cache_location):
+        self._db_file = os.path.join(cache_location, SQLITE_DB_NAME)
+        self._conn = None
+        self._pid = None
+        self._lock = Lock()
+
+    def _connection(self):
+        # A connection can't be used after fork, open a new one in the child process
+        if self._conn is None or self._pid != os.getpid():
+            os.makedirs(os.path.dirname(self._db_file), exist_ok=True)
+            conn = sqlite3.connect(self._db_file, timeout=SQLITE_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                for statement in self.SCHEMA:
+                    conn.execute(statement)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            self._conn = conn
+            self._pid = os.getpid()
+        return self._conn
+
+    def _transaction(self, func, *args):
+        with self._lock:
+            conn = self._connection()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = func(conn, *args)
+                conn.execute("COMMIT")
+                return result
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+
+    def usage(self):
+        """Get cache usage.
+
+        Returns:
+            tuple: (total_size, total_entries)
+        """
+        with self._lock:
+            return self._connection().execute("SELECT total_size, total_entries FROM usage WHERE id = 0").fetchone()
+
+    def _load(self, conn, zone, key):
+        row = conn.execute("SELECT value FROM facts WHERE zone = ? AND key = ?", (zone, key)).fetchone()
+        if row is None:
+            return None
+        conn.execute("UPDATE facts SET last_access = ? WHERE zone = ? AND key = ?", (time.time(), zone, key))
+        return row[0]
+
+    def load(self, zone, key):
+        return self._transaction(self._load, zone, key)
+
+    def _evict(self, conn, zone, key):
+        """Evict the least recently used entries until the usage is within the limits, except the entry (zone, key)
+        which was just stored."""
+        while True:
+            total_size, total_entries = conn.execute(
+                "SELECT total_size, total_entries FROM usage WHERE id = 0").fetchone()
+            if total_size <= SIZE_LIMIT and total_entries <= ENTRY_LIMIT:
+                return
+            evicted = conn.execute(
+                "SELECT zone, key FROM facts WHERE NOT (zone = ? AND key = ?) ORDER BY last_access LIMIT ?",
+                (zone, key, EVICT_BATCH_SIZE)).fetchall()
+            if not evicted:
+                return
+            for zone, key in evicted:
+                logger.info('[Cache] Evict least recently used facts "{}.{}"'.format(zone, key))
+                conn.execute("DELETE FROM facts WHERE zone = ? AND key = ?", (zone, key))
+
+    def _store(self, conn, zone, key, data):
+        conn.execute(
+            "INSERT INTO facts (zone, key, value, size, last_access) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT (zone, key) DO UPDATE SET value = excluded.value, size = excluded.size, "
+            "last_access = excluded.last_access",
+            (zone, key, sqlite3.Binary(data), len(data), time.time()))
+        self._evict(conn, zone, key)
+
+    def store(self, zone, key, data):
+        if len(data) > SIZE_LIMIT:
+            raise ValueError('Size of facts {} exceeds SIZE_LIMIT={}'.format(len(data), SIZE_LIMIT))
+        self._transaction(self._store, zone, key, data)
+
+    def _remove(self, conn, zone, key):
+        if not conn.execute("DELETE FROM facts WHERE zone = ? AND key = ?", (zone, key)).rowcount:
+            raise OSError('No cached facts "{}.{}"'.format(zone, key))
+
+    def remove(self, zone, key):
+        self._transaction(self._remove, zone, key)
+
+    def remove_zone(self, zone):
+        self._transaction(lambda conn: conn.execute("DELETE FROM facts WHERE zone = ?", (zone,)))
+
+
+class FactsCache(with_metaclass(Singleton, object)):
+    """Singleton class for reading from cache and write to cache.
+
+    Used singleton design pattern. Only a single instance of this class can be initialized.
+
+    Args:
+        with_metaclass ([function]): Python 2&3 compatible function from the six library for adding metaclass.
+    """
+
+    NOTEXIST = object()
+
+    def __init__(self, cache_location=CACHE_LOCATION, backend=None):
+        self._cache_location = os.path.abspath(cache_location)
+        self._cache = defaultdict(dict)
+        self._write_lock = Lock()
+        backend = backend or CACHE_BACKEND
+        if backend == "pickle":
+            self._backend = PickleFilesBackend(self._cache_location)
+        elif backend == "sqlite":
+            self._backend = SqliteBackend(self._cache_location)
+        else:
+            raise ValueError('Unknown facts cache backend "{}"'.format(backend))
 
     def read(self, zone, key):
         """Read cached facts.
@@ -91,38 +287,17 @@ class FactsCache(with_metaclass(Singleton, object)):
         if zone in self._cache and key in self._cache[zone]:
             logger.debug('[Cache] Read cached facts "{}.{}"'.format(zone, key))
             return self._cache[zone][key]
-        else:
-            facts_file = os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
-            try:
-                return self._read_facts_file(facts_file, zone, key)
-            except (IOError, ValueError) as e:
-                logger.info('[Cache] Load cache file "{}" failed with IOError or ValueError: {}'
-                            .format(os.path.abspath(facts_file), repr(e)))
-                return self.NOTEXIST
-            except (EOFError, UnpicklingError) as e:
-                # When parallel run is enabled, multiple processes may try to read/write the same cache file,
-                # so there will be a chance that
-                #   - a file is being written by process1 while process2 is reading it, causing EOFError in process2
-                #   - a file is being read by multiple processes at the same time, causing UnpicklingError in some of
-                #     the processes
-                # In these cases, we will retry to read the file after a short random sleep. If we still get the same
-                # error after retrying, we will return NOTEXIST to overwrite the file.
-                retry_attempts = 3
-                for attempt in range(retry_attempts):
-                    time.sleep(random.randint(3, 6))
-                    try:
-                        return self._read_facts_file(facts_file, zone, key)
-                    except (EOFError, UnpicklingError):
-                        logger.warning('[Cache] Retry {}/{} failed for file "{}"'
-                                       .format(attempt + 1, retry_attempts, facts_file))
-
-                logger.error('[Cache] Load cache file "{}" failed with EOFError or UnpicklingError: {}'
-                             .format(facts_file, repr(e)))
-                return self.NOTEXIST
-            except Exception as e:
-                logger.info('[Cache] Load cache file "{}" failed with unknown exception: {}'
-                            .format(os.path.abspath(facts_file), repr(e)))
+
+        try:
+            data = self._backend.load(zone, key)
+            if data is None:
                 return self.NOTEXIST
+            self._cache[zone][key] = pickle.loads(data)
+            logger.debug('[Cache] Loaded cached facts "{}.{}"'.format(zone, key))
+            return self._cache[zone][key]
+        except Exception as e:
+            logger.info('[Cache] Load cached facts "{}.{}" failed with exception: {}'.format(zone, key, repr(e)))
+            return self.NOTEXIST
 
     def write(self, zone, key, value):
         """Store facts to cache.
@@ -137,25 +312,17 @@ class FactsCache(with_metaclass(Singleton, object)):
             boolean: Caching facts is successful or not.
         """
         with self._write_lock:
-            self._check_usage()
-            facts_file = os.path.join(self._cache_location, '{}/{}.pickle'.format(zone, key))
             try:
-                cache_subfolder = os.path.join(self._cache_location, zone)
-                if not os.path.exists(cache_subfolder):
-                    logger.info('[Cache] Create cache dir {}'.format(cache_subfolder))
-                    os.makedirs(cache_subfolder)
-
-                with open(facts_file, 'wb') as f:
-                    pickle.dump(value, f, pickle.HIGHEST_PROTOCOL)
-                    self._cache[zone][key] = value
-                    logger.info('[Cache] Cached facts "{}.{}" to {}'.format(zone, key, facts_file))
-                    return True
-            except (IOError, ValueError) as e:
-                logger.error('[Cache] Dump cache file "{}" failed with exception: {}'.format(facts_file, repr(e)))
+                self._backend.store(zone, key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+                self._cache[zone][key] = value
+                logger.info('[Cache] Cached facts "{}.{}"'.format(zone, key))
+                return True
+            except (IOError, ValueError, pickle.PicklingError, sqlite3.Error) as e:
+                logger.error('[Cache] Cache facts "{}.{}" failed with exception: {}'.format(zone, key, repr(e)))
                 return False
 
     def cleanup(self, zone=None, key=None):
-        """Cleanup cached files.
+        """Cleanup cached facts.
 
         Args:
             zone (str): Cached facts are organized by zones. This argument is to specify the zone name.
@@ -169,24 +336,23 @@ class FactsCache(with_metaclass(Singleton, object)):
                     del self._cache[zone][key]
                     logger.debug('[Cache] Removed "{}.{}" from cache.'.format(zone, key))
                 try:
-                    cache_file = os.path.join(self._cache_location, zone, '{}.pickle'.format(key))
-                    os.remove(cache_file)
-                    logger.debug('[Cache] Removed cache file "{}.pickle"'.format(cache_file))
-                except OSError as e:
-                    logger.error('[Cache] Cleanup cache {}.{}.pickle failed with exception: {}'
-                                 .format(zone, key, repr(e)))
+                    self._backend.remove(zone, key)
+                    logger.debug('[Cache] Removed cached facts "{}.{}"'.format(zone, key))
+                except (OSError, sqlite3.Error) as e:
+                    logger.error('[Cache] Cleanup cache {}.{} failed with exception: {}'.format(zone, key, repr(e)))
             else:
                 if zone in self._cache:
                     del self._cache[zone]
                     logger.debug('[Cache] Removed zone "{}" from cache'.format(zone))
                 try:
-                    cache_subfolder = os.path.join(self._cache_location, zone)
-                    shutil.rmtree(cache_subfolder)
-                    logger.debug('[Cache] Removed cache subfolder "{}"'.format(cache_subfolder))
-                except OSError as e:
-                    logger.error('[Cache] Remove cache subfolder "{}" failed with exception: {}'.format(zone, repr(e)))
+                    self._backend.remove_zone(zone)
+                    logger.debug('[Cache] Removed cached facts of zone "{}"'.format(zone))
+                except (OSError, sqlite3.Error) as e:
+                    logger.error('[Cache] Remove cached zone "{}" failed with exception: {}'.format(zone, repr(e)))
         else:
             self._cache = defaultdict(dict)
+            if isinstance(self._backend, SqliteBackend):
+                self._backend.close()
             try:
                 shutil.rmtree(self._cache_location)
                 logger.debug('[Cache] Removed all cache files under "{}"'.format(self._cache_location))
@@ -241,7 +407,77 @@ def _get_disable_cache(target, args, kwargs):
     return bound_args.arguments.get(DISABLE_CACHE_PARAM, False)
 
 
-def cached(name, zone_getter=None, after_read=None, before_write=None):
+def get_dut_fingerprint(duthost):
+    """Get fingerprint of the DUT image, configuration and boot.
+
+    The fingerprint is gathered once per session, until it's invalidated by invalidate_dut_fingerprint. If it
+    couldn't be gathered, it's gathered again on the next call.
+
+    Args:
+        duthost: SonicHost object.
+
+    Returns:
+        str: Fingerprint of the DUT, or None if it couldn't be gathered.
+    """
+    with _dut_fingerprints_lock:
+        if duthost.hostname in _dut_fingerprints:
+            return _dut_fingerprints[duthost.hostname]
+
+    fingerprint = None
+    try:
+        output = duthost.shell(DUT_FINGERPRINT_CMD, module_ignore_errors=True, verbose=False)
+        if output["stdout"].strip():
+            fingerprint = hashlib.md5(output["stdout"].encode()).hexdigest()
+            logger.debug('[Cache] Fingerprint of {}: {}'.format(duthost.hostname, fingerprint))
+        else:
+            logger.warning('[Cache] Failed to get fingerprint of {}: {}'.format(duthost.hostname, output["stderr"]))
+    except Exception as e:
+        logger.warning('[Cache] Failed to get fingerprint of {}: {}'.format(duthost.hostname, repr(e)))
+        return None
+
+    if fingerprint is not None:
+        # A failure may be transient, the fingerprint is gathered again on the next use then
+        with _dut_fingerprints_lock:
+            _dut_fingerprints[duthost.hostname] = fingerprint
+    return fingerprint
+
+
+def invalidate_dut_fingerprint(hostname=None):
+    """Invalidate the fingerprint of the DUT gathered in this session, so it's gathered again on the next use of
+    facts cached with fingerprint. Must be called by helpers changing the DUT, like config reload or reboot.
+
+    Args:
+        hostname (str): Name of the DUT. Default is None, which invalidates fingerprints of all the DUTs.
+    """
+    with _dut_fingerprints_lock:
+        if hostname is None:
+            _dut_fingerprints.clear()
+        else:
+            _dut_fingerprints.pop(hostname, None)
+
+
+def dut_fingerprint_getter(function, func_args, func_kargs):
+    """
+        Fingerprint getter used for decorator cached on methods of SonicHost and SonicAsic.
+    """
+    host = func_args[0]
+    return get_dut_fingerprint(getattr(host, "sonichost", host))
+
+
+def _check_fingerprint(facts, fingerprint, zone, name):
+    """Unwrap facts cached with fingerprint, return NOTEXIST if the fingerprint doesn't match."""
+    if facts is FactsCache.NOTEXIST:
+        return facts
+    if not isinstance(facts, dict) or FINGERPRINT_KEY not in facts:
+        logger.info('[Cache] Facts "{}.{}" cached without fingerprint, invalidate it'.format(zone, name))
+        return FactsCache.NOTEXIST
+    if fingerprint is not None and facts[FINGERPRINT_KEY] != fingerprint:
+        logger.info('[Cache] Fingerprint of facts "{}.{}" changed, invalidate it'.format(zone, name))
+        return FactsCache.NOTEXIST
+    return facts["facts"]
+
+
+def cached(name, zone_getter=None, after_read=None, before_write=None, fingerprint_getter=None):
     """Decorator for enabling cache for facts.
 
     The cached facts are to be stored by <name>.pickle. Because the cached pickle files must be stored under subfolder
@@ -258,6 +494,9 @@ def cached(name, zone_getter=None, after_read=None, before_write=None):
         zone_getter ([function]): Function used to get hostname used as zone.
         after_read ([function]): Hook function used to process facts after read from cache.
         before_write ([function]): Hook function used to process facts before write into cache.
+        fingerprint_getter ([function]): Function used to get fingerprint of the state the facts depend on, with
+            the same signature as zone getter. Facts are cached with the fingerprint and read from cache only if the
+            fingerprint didn't change, e.g. dut_fingerprint_getter for facts of a DUT.
     Returns:
         [function]: Decorator function.
     """
@@ -275,6 +514,9 @@ def cached(name, zone_getter=None, after_read=None, before_write=None):
             zone = _zone_getter(target, args, kargs)
 
             cached_facts = cache.read(zone, name)
+            if fingerprint_getter:
+                fingerprint = fingerprint_getter(target, args, kargs)
+                cached_facts = _check_fingerprint(cached_facts, fingerprint, zone, name)
             if after_read:
                 cached_facts = after_read(cached_facts, target, args, kargs)
             if cached_facts is not FactsCache.NOTEXIST:
@@ -282,11 +524,10 @@ def cached(name, zone_getter=None, after_read=None, before_write=None):
                 return cached_facts
             else:
                 facts = target(*args, **kargs)
-                if before_write:
-                    _facts = before_write(facts, target, args, kargs)
-                    cache.write(zone, name, _facts)
-                else:
-                    cache.write(zone, name, facts)
+                _facts = before_write(facts, target, args, kargs) if before_write else facts
+                if fingerprint_getter:
+                    _facts = {FINGERPRINT_KEY: fingerprint, "facts": _facts}
+                cache.write(zone, name, _facts)
                 return facts
         return wrapper
     return decorator
@@ -2,6 +2,7 @@ import time
 import logging
 import os
 
+from tests.common.cache import invalidate_dut_fingerprint
 from tests.common.helpers.assertions import pytest_assert
 from tests.common.helpers.parallel_utils import synchronized_config_reload
 from tests.common.plugins.loganalyzer.utils import support_ignore_loganalyzer
@@ -202,6 +203,9 @@ def config_reload(sonic_host, config_source='config_db', wait=120, start_bgp=Tru
             cmd = f'config reload -y -f -l {golden_path}'
         sonic_host.shell(cmd, executable="/bin/bash")
 
+    # Configuration may have changed, facts cached with fingerprint of the DUT are checked again on next use
+    invalidate_dut_fingerprint(sonic_host.hostname)
+
     modular_chassis = sonic_host.get_facts().get("modular_chassis")
     wait = max(wait, 600) if modular_chassis else wait
 
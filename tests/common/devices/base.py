@@ -1,10 +1,16 @@
+import asyncio
+import functools
 import inspect
 import json
 import logging
 import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing.pool import ThreadPool
 
 from tests.common.errors import RunAnsibleModuleFail
+from tests.common.devices.ssh_fast_path import FAST_PATH_MODULES, SshFastPath, SshFastPathUnavailable, record_latency
 
 logger = logging.getLogger(__name__)
 
@@ -30,8 +36,21 @@ class AnsibleHostBase(object):
     This class filters an object from the ansible_adhoc fixture by hostname. The object can be considered as an
     ansible host object although it is not under the hood. Anyway, we can use this object to run ansible module
     on the host.
+
+    If ssh_fast_path is enabled, 'shell' and 'command' modules called with a plain command string are run over
+    a persistent SSH connection instead of the ansible module invocation, see SshFastPath.
+
+    Modules can be awaited from asyncio code with async_module, async_shell and async_command. They run in a
+    thread pool shared by all the hosts, so the event loop keeps running other tasks meanwhile.
     """
 
+    ssh_fast_path = False
+
+    # Maximum number of module calls run concurrently by the async methods, for all the hosts
+    ASYNC_MAX_WORKERS = 16
+    _async_executor = None
+    _async_executor_lock = threading.Lock()
+
     class CustomEncoder(json.JSONEncoder):
         def default(self, obj):
             if isinstance(obj, bytes):
@@ -52,12 +71,84 @@ class AnsibleHostBase(object):
                 self.mgmt_ipv6 = None
         self.hostname = hostname
 
+    def _get_ssh_fast_path(self):
+        """Get the SshFastPath of the host, created on the first use.
+
+        Returns:
+            SshFastPath or None if the fast path can't be used for the host.
+        """
+        if "_ssh_fast_path" not in self.__dict__:
+            fast_path = None
+            if self.hostname != "localhost" and getattr(self, "mgmt_ip", None):
+                try:
+                    fast_path = SshFastPath.from_ansible_host(self.host, self.hostname, self.mgmt_ip)
+                except Exception as e:
+                    logger.warning("SSH fast path is not available for {}: {}".format(self.hostname, repr(e)))
+            self.__dict__["_ssh_fast_path"] = fast_path
+        return self.__dict__["_ssh_fast_path"]
+
+    def _run_ssh_fast_path(self, module_name, module_args, complex_args):
+        """Run the module via the SSH fast path if possible.
+
+        Returns:
+            ModuleResult or None if the ansible module should be used instead.
+        """
+        if not (self.ssh_fast_path and SshFastPath.supports(module_name, module_args, complex_args)):
+            return None
+        fast_path = self._get_ssh_fast_path()
+        if fast_path is None or not fast_path.enabled:
+            return None
+        try:
+            return fast_path.run(module_name, module_args[0])
+        except SshFastPathUnavailable as e:
+            logger.debug("{}, fallback to AnsibleModule::{}".format(e, module_name))
+            return None
+
+    @classmethod
+    def _get_async_executor(cls):
+        with AnsibleHostBase._async_executor_lock:
+            if AnsibleHostBase._async_executor is None:
+                AnsibleHostBase._async_executor = ThreadPoolExecutor(max_workers=cls.ASYNC_MAX_WORKERS,
+                                                                     thread_name_prefix="async_module")
+            return AnsibleHostBase._async_executor
+
+    async def async_call(self, func, *args, **kwargs):
+        """Run a blocking function without blocking the event loop, e.g. a host method running several modules.
+
+        If the awaiting task is cancelled, the function still runs to completion in the thread pool.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_async_executor(), functools.partial(func, *args, **kwargs))
+
+    async def async_module(self, module_name, *module_args, **complex_args):
+        """Run an ansible module without blocking the event loop.
+
+        Args:
+            module_name: Name of the ansible module, or of a host method wrapping it
+            module_args: Module args, same as for the blocking call
+            complex_args: Module keyword args, same as for the blocking call, including module_ignore_errors
+
+        Returns:
+            The module result, same as for the blocking call.
+        """
+        return await self.async_call(getattr(self, module_name), *module_args, **complex_args)
+
+    async def async_shell(self, *module_args, **complex_args):
+        """Awaitable version of shell."""
+        return await self.async_module("shell", *module_args, **complex_args)
+
+    async def async_command(self, *module_args, **complex_args):
+        """Awaitable version of command."""
+        return await self.async_module("command", *module_args, **complex_args)
+
     def __getattr__(self, module_name):
         if self.host.has_module(module_name):
             self.module_name = module_name
             self.module = getattr(self.host, module_name)
 
-            return self._run
+            # The module is bound to the returned callable, so that modules run concurrently from multiple
+            # threads don't see the module_name of each other
+            return functools.partial(self._run, _module=(module_name, self.module))
         raise AttributeError(
             "'%s' object has no attribute '%s'" % (self.__class__, module_name)
             )
@@ -67,6 +158,7 @@ class AnsibleHostBase(object):
         previous_frame = inspect.currentframe().f_back
         filename, line_number, function_name, lines, index = inspect.getframeinfo(previous_frame)
 
+        module_name, module = complex_args.pop('_module', (self.module_name, self.module))
         verbose = complex_args.pop('verbose', True)
 
         if verbose:
@@ -76,7 +168,7 @@ class AnsibleHostBase(object):
                     function_name,
                     line_number,
                     self.hostname,
-                    self.module_name,
+                    module_name,
                     json.dumps(module_args, cls=AnsibleHostBase.CustomEncoder),
                     json.dumps(complex_args, cls=AnsibleHostBase.CustomEncoder)
                 )
@@ -88,7 +180,7 @@ class AnsibleHostBase(object):
                     function_name,
                     line_number,
                     self.hostname,
-                    self.module_name
+                    module_name
                 )
             )
 
@@ -97,15 +189,21 @@ class AnsibleHostBase(object):
 
         if module_async:
             def run_module(module_args, complex_args):
-                return self.module(*module_args, **complex_args)[self.hostname]
+                return module(*module_args, **complex_args)[self.hostname]
             pool = ThreadPool()
             result = pool.apply_async(run_module, (module_args, complex_args))
             return pool, result
 
-        module_args = json.loads(json.dumps(module_args, cls=AnsibleHostBase.CustomEncoder))
-        complex_args = json.loads(json.dumps(complex_args, cls=AnsibleHostBase.CustomEncoder))
-        res = self.module(*module_args, **complex_args)[self.hostname]
+        start = time.time()
+        res = self._run_ssh_fast_path(module_name, module_args, complex_args)
+        path = "ssh" if res is not None else "ansible"
+        if res is None:
+            module_args = json.loads(json.dumps(module_args, cls=AnsibleHostBase.CustomEncoder))
+            complex_args = json.loads(json.dumps(complex_args, cls=AnsibleHostBase.CustomEncoder))
+            res = module(*module_args, **complex_args)[self.hostname]
         res.encoder = AnsibleHostBase.CustomEncoder
+        if module_name in FAST_PATH_MODULES:
+            record_latency(self.hostname, module_name, path, time.time() - start)
 
         if verbose:
             logger.debug(
@@ -114,7 +212,7 @@ class AnsibleHostBase(object):
                     function_name,
                     line_number,
                     self.hostname,
-                    self.module_name, json.dumps(res, cls=AnsibleHostBase.CustomEncoder)
+                    module_name, json.dumps(res, cls=AnsibleHostBase.CustomEncoder)
                 )
             )
         else:
@@ -124,14 +222,14 @@ class AnsibleHostBase(object):
                     function_name,
                     line_number,
                     self.hostname,
-                    self.module_name,
+                    module_name,
                     res.is_failed,
                     res.get('rc', None)
                 )
             )
 
         if (res.is_failed or 'exception' in res) and not module_ignore_errors:
-            raise RunAnsibleModuleFail("run module {} failed".format(self.module_name), res)
+            raise RunAnsibleModuleFail("run module {} failed".format(module_name), res)
 
         return res
 
@@ -0,0 +1,186 @@
+"""
+Run many shell commands on a host in one remote round trip.
+
+Every ansible module call has a fixed overhead, so helpers running one command per interface, ASIC or container
+spend most of their time in the round trips. CommandBatch collects the commands, runs them in a single 'shell'
+module call and splits the output back into per-command results using unique delimiters, so every command keeps
+its own rc, stdout and stderr.
+"""
+import logging
+import re
+import uuid
+
+from tests.common.errors import RunAnsibleModuleFail
+
+logger = logging.getLogger(__name__)
+
+
+class CommandResult(dict):
+    """Result of one command of the batch, with the same keys as the 'shell' module result.
+
+    It is empty until the batch is run.
+    """
+
+    @property
+    def is_failed(self):
+        return self.get("failed", False)
+
+
+class CommandBatch(object):
+    """
+    Collect shell commands and run them in one 'shell' module call.
+
+    Usage:
+        with duthost.batch() as batch:
+            running = batch.shell("docker inspect -f '{{.State.Running}}' swss")
+            status = batch.shell("docker exec swss supervisorctl status")
+        if running["stdout"] == "true":
+            ...
+
+    Or:
+        results = duthost.batch().run(["cmd1", "cmd2"])
+
+    Each command runs in its own subshell with stdin redirected from /dev/null, so a failing command or an 'exit'
+    doesn't affect the other commands. Commands are run in the order they were added.
+    """
+
+    def __init__(self, host, module_ignore_errors=True, executable=None):
+        """
+        Args:
+            host: Host object to run the batch on, it must support the 'shell' ansible module.
+            module_ignore_errors: If False, raise RunAnsibleModuleFail for the first command with non-zero rc.
+            executable: Shell used to run the batch, default is the default of the 'shell' module.
+        """
+        self.host = host
+        self.module_ignore_errors = module_ignore_errors
+        self.executable = executable
+        self.commands = []
+        self.results = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.run()
+        return False
+
+    def shell(self, cmd):
+        """Add a command to the batch.
+
+        Returns:
+            CommandResult: Result of the command, filled when the batch is run.
+        """
+        result = CommandResult()
+        self.commands.append(cmd)
+        self.results.append(result)
+        return result
+
+    def _build_script(self, delimiter):
+        lines = []
+        for index, cmd in enumerate(self.commands):
+            lines.append("printf '%s_START_%d\\n' {0} {1}; printf '%s_START_%d\\n' {0} {1} >&2".format(
+                delimiter, index))
+            # The command is on its own lines, so comments or heredocs in it don't break the script
+            lines.append("(\n{}\n) </dev/null".format(cmd))
+            lines.append("printf '\\n%s_END_%d_%d\\n' {0} {1} $?; printf '\\n%s_END_%d\\n' {0} {1} >&2".format(
+                delimiter, index))
+        return "\n".join(lines)
+
+    @staticmethod
+    def _split_output(output, delimiter, count, with_rc):
+        """Split the output of the batch to the outputs of the commands.
+
+        Returns:
+            dict: {index: (output, rc)}, rc is None if with_rc is False
+        """
+        end_pattern = r"\n{}_END_\1_(-?\d+)\n".format(delimiter) if with_rc else r"\n{}_END_\1\n".format(delimiter)
+        pattern = re.compile(r"{}_START_(\d+)\n(.*?){}".format(delimiter, end_pattern), re.DOTALL)
+        outputs = {}
+        # The module strips the trailing new line of the batch output
+        for match in pattern.finditer(output + "\n"):
+            index = int(match.group(1))
+            if index < count:
+                outputs[index] = (match.group(2), int(match.group(3)) if with_rc else None)
+        return outputs
+
+    @staticmethod
+    def _split_unfinished(output, delimiter):
+        """Get the output of the commands which printed the start delimiter but not the end delimiter.
+
+        Returns:
+            dict: {index: output printed after the start delimiter}
+        """
+        outputs = {}
+        for match in re.finditer(r"{0}_START_(\d+)\n(.*?)(?=\n{0}_END_\1[_\n]|\Z)".format(delimiter),
+                                 output + "\n", re.DOTALL):
+            if match.end() == len(output) + 1:
+                outputs[int(match.group(1))] = match.group(2)
+        return outputs
+
+    def _fill_result(self, result, cmd, rc, stdout, stderr):
+        stdout = stdout.rstrip("\r\n")
+        stderr = stderr.rstrip("\r\n")
+        result.clear()
+        result.update({
+            "cmd": cmd,
+            "rc": rc,
+            "failed": rc != 0,
+            "stdout": stdout,
+            "stderr": stderr,
+            "stdout_lines": stdout.splitlines(),
+            "stderr_lines": stderr.splitlines()
+        })
+
+    def run(self, cmds=None):
+        """Run the collected commands.
+
+        Args:
+            cmds: Optional list of commands to add to the batch before running it.
+
+        Returns:
+            list: CommandResult of every command in the batch, in the order the commands were added.
+        """
+        for cmd in cmds or []:
+            self.shell(cmd)
+        if not self.commands:
+            return []
+
+        delimiter = "BATCH_{}".format(uuid.uuid4().hex)
+        complex_args = {"executable": self.executable} if self.executable else {}
+        output = self.host.shell(self._build_script(delimiter), module_ignore_errors=True, verbose=False,
+                                 **complex_args)
+        stdouts = self._split_output(output.get("stdout", ""), delimiter, len(self.commands), True)
+        stderrs = self._split_output(output.get("stderr", ""), delimiter, len(self.commands), False)
+
+        unfinished_stdouts = self._split_unfinished(output.get("stdout", ""), delimiter)
+        unfinished_stderrs = self._split_unfinished(output.get("stderr", ""), delimiter)
+
+        for index, (cmd, result) in enumerate(zip(self.commands, self.results)):
+            if index in stdouts:
+                stdout, rc = stdouts[index]
+                stderr = stderrs.get(index, ("", None))[0]
+                self._fill_result(result, cmd, rc, stdout, stderr)
+            elif index in unfinished_stdouts or index in unfinished_stderrs:
+                # The command was started but the batch was interrupted, e.g. the connection was lost or the
+                # command killed the shell. It may have completed partly or fully, running it again could repeat
+                # its side effects, so it's reported as failed.
+                msg = "Command '{}' of batch on {} was interrupted".format(cmd, self.host.hostname)
+                logger.warning(msg)
+                stderr = unfinished_stderrs.get(index, "").rstrip("\r\n")
+                self._fill_result(result, cmd, -1, unfinished_stdouts.get(index, ""),
+                                  "\n".join(line for line in (stderr, msg) if line))
+                result["msg"] = msg
+            else:
+                # The batch was interrupted before the command was started, run it separately
+                logger.warning("Command '{}' of batch on {} wasn't started, run it separately".format(
+                    cmd, self.host.hostname))
+                res = self.host.shell(cmd, module_ignore_errors=True, **complex_args)
+                self._fill_result(result, cmd, res.get("rc", -1), res.get("stdout", ""), res.get("stderr", ""))
+
+        logger.debug("{}: ran {} commands in one batch".format(self.host.hostname, len(self.commands)))
+        if not self.module_ignore_errors:
+            for result in self.results:
+                if result.is_failed:
+                    raise RunAnsibleModuleFail("run command '{}' in batch failed".format(result["cmd"]), result)
+        return self.results
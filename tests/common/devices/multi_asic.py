@@ -1,8 +1,10 @@
 import copy
-from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 import ipaddress
 import json
 import logging
+import time
 
 from tests.common.errors import RunAnsibleModuleFail
 from tests.common.devices.sonic import SonicHost
@@ -25,6 +27,8 @@ class MultiAsicSonicHost(object):
     """
 
     _DEFAULT_SERVICES = ["pmon", "snmp", "database"]
+    # Max number of ASICs an ansible module is run on concurrently when asic_index is 'all'
+    _MAX_CONCURRENT_ASICS = 8
 
     def __init__(self, ansible_adhoc, hostname, duthosts, topo_type):
         """ Initializing a MultiAsicSonicHost.
@@ -36,6 +40,9 @@ class MultiAsicSonicHost(object):
         self.duthosts = duthosts
         self.topo_type = topo_type
         self.loganalyzer = None
+        # Run ansible modules on all ASICs concurrently when asic_index is 'all',
+        # can be overridden per call with the 'asic_concurrent' keyword arg
+        self.asic_concurrent = True
         self.sonichost = SonicHost(ansible_adhoc, hostname)
         self.asics = [SonicAsic(self.sonichost, asic_index) for asic_index in self.sonichost.facts[ASICS_PRESENT]]
 
@@ -130,6 +137,8 @@ class MultiAsicSonicHost(object):
         Args:
             module_args: other ansible module args passed from the caller
             complex_args: other ansible keyword args
+                asic_concurrent: if asic_index is 'all', run the module on all asics concurrently
+                    or one after another. Defaults to self.asic_concurrent.
 
         Raises:
             ValueError:  if asic_index is specified and it is neither an int or string 'all'.
@@ -146,25 +155,57 @@ class MultiAsicSonicHost(object):
                 for all the asics on the SonicHost
                     - for single asic, this would be a list of size 1.
         """
+        multi_asic_attr = complex_args.pop("_multi_asic_attr", self.multi_asic_attr)
         if "asic_index" not in complex_args:
             # Default ASIC/namespace
-            return getattr(self.sonichost, self.multi_asic_attr)(*module_args, **complex_args)
+            complex_args.pop("asic_concurrent", None)
+            return getattr(self.sonichost, multi_asic_attr)(*module_args, **complex_args)
         else:
             asic_complex_args = copy.deepcopy(complex_args)
             asic_index = asic_complex_args.pop("asic_index")
+            asic_concurrent = asic_complex_args.pop("asic_concurrent", self.asic_concurrent)
             if type(asic_index) == int:
                 # Specific ASIC/namespace
                 if self.sonichost.facts['num_asic'] == 1:
                     if asic_index != 0:
                         raise ValueError("Trying to run module '{}' against asic_index '{}' on a single asic dut '{}'"
-                                         .format(self.multi_asic_attr, asic_index, self.sonichost.hostname))
-                return getattr(self.asic_instance(asic_index), self.multi_asic_attr)(*module_args, **asic_complex_args)
+                                         .format(multi_asic_attr, asic_index, self.sonichost.hostname))
+                return getattr(self.asic_instance(asic_index), multi_asic_attr)(*module_args, **asic_complex_args)
             elif type(asic_index) == str and asic_index.lower() == "all":
                 # All ASICs/namespace
-                return [getattr(asic, self.multi_asic_attr)(*module_args, **asic_complex_args) for asic in self.asics]
+                if asic_concurrent and len(self.asics) > 1:
+                    return self._run_on_all_asics_concurrently(multi_asic_attr, *module_args, **asic_complex_args)
+                return [getattr(asic, multi_asic_attr)(*module_args, **asic_complex_args) for asic in self.asics]
             else:
                 raise ValueError("Argument 'asic_index' must be an int or string 'all'.")
 
+    def _run_on_all_asics_concurrently(self, multi_asic_attr, *module_args, **complex_args):
+        """ Run an ansible module on all asics using a bounded thread pool.
+        The threads share the ansible connection of the SonicHost.
+
+        Args:
+            multi_asic_attr: name of the SonicAsic method to run
+            module_args: other ansible module args passed from the caller
+            complex_args: other ansible keyword args
+
+        Returns:
+            list of the ansible module outputs, in the same order as self.asics.
+            If the module failed on any asic, the exception of the first failed asic
+            in that order is raised, after the module finished on all asics.
+        """
+        def run_on_asic(asic):
+            start = time.time()
+            try:
+                return getattr(asic, multi_asic_attr)(*module_args, **complex_args)
+            finally:
+                logger.debug("Module '{}' on {} asic {} took {:.3f}s".format(
+                    multi_asic_attr, self.sonichost.hostname, asic.asic_index, time.time() - start))
+
+        max_workers = min(len(self.asics), self._MAX_CONCURRENT_ASICS)
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(run_on_asic, asic) for asic in self.asics]
+        return [future.result() for future in futures]
+
     def get_dut_iface_mac(self, iface_name):
         """
         Gets the MAC address of specified interface.
@@ -343,10 +384,24 @@ class MultiAsicSonicHost(object):
         sonic_asic_attr = getattr(SonicAsic, attr, None)
         if not attr.startswith("_") and sonic_asic_attr and callable(sonic_asic_attr):
             self.multi_asic_attr = attr
-            return self._run_on_asics
+            # Bind the attr to the returned callable, for calls from multiple threads
+            return partial(self._run_on_asics, _multi_asic_attr=attr)
         else:
             return getattr(self.sonichost, attr)  # For backward compatibility
 
+    async def async_module(self, module_name, *module_args, **complex_args):
+        """Awaitable version of an ansible module, supporting the 'asic_index' keyword like the blocking call.
+
+        The module runs in the thread pool of the async methods of SonicHost.
+        """
+        return await self.sonichost.async_call(getattr(self, module_name), *module_args, **complex_args)
+
+    async def async_shell(self, *module_args, **complex_args):
+        return await self.async_module("shell", *module_args, **complex_args)
+
+    async def async_command(self, *module_args, **complex_args):
+        return await self.async_module("command", *module_args, **complex_args)
+
     def get_asic_or_sonic_host(self, asic_id):
         if asic_id == DEFAULT_ASIC_ID:
             return self.sonichost
@@ -15,11 +15,12 @@ from ansible import constants as ansible_constants
 from ansible.plugins.loader import connection_loader
 
 from tests.common.devices.base import AnsibleHostBase
+from tests.common.devices.command_batch import CommandBatch
 from tests.common.devices.constants import ACL_COUNTERS_UPDATE_INTERVAL_IN_SEC
 from tests.common.helpers.dut_utils import is_supervisor_node, is_macsec_capable_node
 from tests.common.str_utils import str2bool
 from tests.common.utilities import get_host_visible_vars
-from tests.common.cache import cached
+from tests.common.cache import cached, dut_fingerprint_getter
 from tests.common.helpers.constants import DEFAULT_ASIC_ID, DEFAULT_NAMESPACE
 from tests.common.helpers.platform_api.chassis import is_inband_port
 from tests.common.helpers.parallel import parallel_run_threaded
@@ -197,7 +198,7 @@ class SonicHost(AnsibleHostBase):
 
         self.critical_services = service_list
 
-    @cached(name='basic_facts')
+    @cached(name='basic_facts', fingerprint_getter=dut_fingerprint_getter)
     def _gather_facts(self):
         """
         Gather facts about the platform for this SONiC device.
@@ -349,7 +350,7 @@ class SonicHost(AnsibleHostBase):
 
         return result
 
-    @cached(name='os_version')
+    @cached(name='os_version', fingerprint_getter=dut_fingerprint_getter)
     def _get_os_version(self):
         """
         Gets the SONiC OS version that is running on this device.
@@ -358,7 +359,7 @@ class SonicHost(AnsibleHostBase):
         output = self.command("sonic-cfggen -y /etc/sonic/sonic_version.yml -v build_version")
         return output["stdout_lines"][0].strip()
 
-    @cached(name='sonic_release')
+    @cached(name='sonic_release', fingerprint_getter=dut_fingerprint_getter)
     def _get_sonic_release(self):
         """
         Gets the SONiC Release that is running on this device.
@@ -374,7 +375,7 @@ class SonicHost(AnsibleHostBase):
             return 'none'
         return output["stdout_lines"][0].strip()
 
-    @cached(name='kernel_version')
+    @cached(name='kernel_version', fingerprint_getter=dut_fingerprint_getter)
     def _get_kernel_version(self):
         """
         Gets the SONiC kernel version
@@ -438,6 +439,16 @@ class SonicHost(AnsibleHostBase):
         inv_files = im._sources
         return is_macsec_capable_node(inv_files, self.hostname)
 
+    def batch(self, module_ignore_errors=True):
+        """
+        @summary: Get a CommandBatch to run many shell commands in one round trip to the DUT.
+
+        @param module_ignore_errors: If False, raise RunAnsibleModuleFail if any command of the batch fails
+        @return: CommandBatch, which runs the collected commands when it's used as context manager
+                 and the context exits, or when its run() method is called
+        """
+        return CommandBatch(self, module_ignore_errors=module_ignore_errors)
+
     def is_service_fully_started(self, service):
         """
         @summary: Check whether a SONiC specific service is fully started.
@@ -571,12 +582,31 @@ class SonicHost(AnsibleHostBase):
                   critical_processes file in the specified container
         @return: Two lists which include the critical groups and critical processes respectively
         """
+        process_list = None
+        with self.batch() as batch:
+            file_content = batch.shell(self._critical_processes_file_cmd(container_name))
+            if container_name == "pmon":
+                # Get the process status in the same round trip
+                process_list = batch.shell("docker exec {} supervisorctl status".format(container_name))
+
+        return self._parse_critical_group_and_process_lists(container_name, file_content, process_list)
+
+    def _critical_processes_file_cmd(self, container_name):
+        return "docker exec {} bash -c '[ -f /etc/supervisor/critical_processes ] \
+                && cat /etc/supervisor/critical_processes'".format(container_name)
+
+    def _parse_critical_group_and_process_lists(self, container_name, file_content, process_list):
+        """
+        @summary: Parse critical group and process lists of the container
+        @param file_content: Result of reading the critical_processes file in the container
+        @param process_list: Result of command "docker exec <container_name> supervisorctl status",
+                             only used for PMon container
+        @return: Two lists which include the critical groups and critical processes respectively
+        """
         critical_group_list = []
         critical_process_list = []
         succeeded = True
 
-        file_content = self.shell("docker exec {} bash -c '[ -f /etc/supervisor/critical_processes ] \
-                && cat /etc/supervisor/critical_processes'".format(container_name), module_ignore_errors=True)
         for line in file_content["stdout_lines"]:
             line_info = line.strip().split(':')
             if len(line_info) != 2:
@@ -603,8 +633,6 @@ class SonicHost(AnsibleHostBase):
         if succeeded and container_name == "pmon":
             expected_critical_group_list = []
             expected_critical_process_list = []
-            process_list = self.shell("docker exec {} supervisorctl status"
-                                      .format(container_name), module_ignore_errors=True)
             for process_info in process_list["stdout_lines"]:
                 process_name = process_info.split()[0].strip()
                 process_status = process_info.split()[1].strip()
@@ -684,20 +712,24 @@ class SonicHost(AnsibleHostBase):
             'running_critical_process': []
         }
 
+        # Get service state, critical processes definition and process status in one round trip
+        with self.batch() as batch:
+            service_state = batch.shell(r"docker inspect -f \{\{.State.Running\}\} %s" % service)
+            file_content = batch.shell(self._critical_processes_file_cmd(service))
+            output = batch.shell("docker exec {} supervisorctl status".format(service))
+
         # return false if the service is not started
-        service_status = self.is_service_fully_started(service)
-        if service_status is False:
+        if service_state["rc"] != 0 or service_state["stdout"].strip() != "true":
             result['status'] = False
             return result
 
         # get critical group and process lists for the service
-        critical_group_list, critical_process_list, succeeded = self.get_critical_group_and_process_lists(service)
+        critical_group_list, critical_process_list, succeeded = self._parse_critical_group_and_process_lists(
+            service, file_content, output)
         if succeeded is False:
             result['status'] = False
             return result
 
-        # get process status for the service
-        output = self.command("docker exec {} supervisorctl status".format(service), module_ignore_errors=True)
         logging.info("====== supervisor process status for service {} ======".format(service))
 
         return self.parse_service_status_and_critical_process(
@@ -969,16 +1001,18 @@ class SonicHost(AnsibleHostBase):
         # some services are meant to have a short life span or not part of the daemons
         exemptions = ['lm-sensors', 'start.sh', 'rsyslogd', 'start', 'dependent-startup', 'chassis_db_init', 'delay']
 
-        daemons = self.shell('docker exec pmon supervisorctl status', module_ignore_errors=True)['stdout_lines']
-
-        daemon_list = [line.strip().split()[0] for line in daemons if len(line.strip()) > 0]
-
         daemon_ctl_key_prefix = 'skip_'
         daemon_config_file_path = os.path.join('/usr/share/sonic/device',
                                                self.facts["platform"], 'pmon_daemon_control.json')
 
+        with self.batch() as batch:
+            status = batch.shell('docker exec pmon supervisorctl status')
+            output = batch.shell('cat %s' % daemon_config_file_path)
+        daemons = status['stdout_lines']
+
+        daemon_list = [line.strip().split()[0] for line in daemons if len(line.strip()) > 0]
+
         try:
-            output = self.shell('cat %s' % daemon_config_file_path)
             json_data = json.loads(output["stdout"])
             logging.debug("Original file content is %s" % str(json_data))
             for key in daemon_list:
@@ -1605,7 +1639,7 @@ Totals               6450                 6449
 
         return container_autorestart_states
 
-    @cached(name='feature_status')
+    @cached(name='feature_status', fingerprint_getter=dut_fingerprint_getter)
     def get_feature_status(self, disable_cache=True):
         """
         Gets the list of features and states
@@ -1783,7 +1817,7 @@ Totals               6450                 6449
             output = output[start_line_index:end_line_index]
         return self._parse_show(output, header_len)
 
-    @cached(name='mg_facts')
+    @cached(name='mg_facts', fingerprint_getter=dut_fingerprint_getter)
     def get_extended_minigraph_facts(self, tbinfo, namespace=DEFAULT_NAMESPACE):
         mg_facts = self.minigraph_facts(host=self.hostname, namespace=namespace)['ansible_facts']
         mg_facts['minigraph_ptf_indices'] = {}
@@ -3,7 +3,7 @@ import logging
 import socket
 import re
 
-from tests.common.cache import cached
+from tests.common.cache import cached, dut_fingerprint_getter
 from tests.common.helpers.assertions import pytest_assert
 from tests.common.helpers.cache_utils import sonic_asic_zone_getter
 from tests.common.helpers.constants import DEFAULT_NAMESPACE, NAMESPACE_PREFIX
@@ -70,7 +70,7 @@ class SonicAsic(object):
                 service, self.asic_index if self.sonichost.is_multi_asic else ""))
         return a_service
 
-    @cached(name='is_frontend_asic', zone_getter=sonic_asic_zone_getter)
+    @cached(name='is_frontend_asic', zone_getter=sonic_asic_zone_getter, fingerprint_getter=dut_fingerprint_getter)
     def is_it_frontend(self):
         if self.sonichost.is_multi_asic:
             sub_role_cmd = 'sudo sonic-cfggen -d  -v DEVICE_METADATA.localhost.sub_role -n {}'.format(self.namespace)
@@ -79,7 +79,7 @@ class SonicAsic(object):
                 return True
         return False
 
-    @cached(name='is_backend_asic', zone_getter=sonic_asic_zone_getter)
+    @cached(name='is_backend_asic', zone_getter=sonic_asic_zone_getter, fingerprint_getter=dut_fingerprint_getter)
     def is_it_backend(self):
         if self.sonichost.is_multi_asic:
             sub_role_cmd = 'sudo sonic-cfggen -d  -v DEVICE_METADATA.localhost.sub_role -n {}'.format(self.namespace)
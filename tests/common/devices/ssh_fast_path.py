@@ -0,0 +1,222 @@
+"""
+Fast path for the 'shell' and 'command' ansible modules.
+
+Running a trivial command through ansible costs module packaging, upload, python startup on the remote host and
+a JSON round trip. SshFastPath runs the command over one persistent SSH connection per host instead, every call
+opens a new channel on the same transport, so concurrent calls are multiplexed over it. The result has the same
+structure as the ansible module result, so callers don't need to know which path was used.
+"""
+import logging
+import select
+import shlex
+import socket
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import paramiko
+from ansible.template import Templar
+from pytest_ansible.results import ModuleResult
+
+logger = logging.getLogger(__name__)
+
+FAST_PATH_MODULES = ("shell", "command")
+SSH_CONNECTIONS = (None, "ssh", "smart", "paramiko")
+SUDO_PASSWORD_ERRORS = ("sudo: a password is required", "sudo: a terminal is required")
+
+_latencies = defaultdict(list)
+_latencies_lock = threading.Lock()
+
+
+def record_latency(hostname, module_name, path, seconds):
+    """Record the duration of a 'shell'/'command' call.
+
+    Args:
+        hostname: Name of the host the module was run on
+        module_name: 'shell' or 'command'
+        path: 'ssh' for the fast path, 'ansible' for the ansible module invocation
+        seconds: Duration of the call
+    """
+    with _latencies_lock:
+        _latencies[(hostname, module_name, path)].append(seconds)
+
+
+def get_latency_summary():
+    """Get statistics of recorded call durations, to compare the fast path with the ansible path.
+
+    Returns:
+        dict: {(hostname, module_name, path): {"count": int, "mean": float, "median": float, "max": float}}
+    """
+    summary = {}
+    with _latencies_lock:
+        for key, durations in _latencies.items():
+            durations = sorted(durations)
+            summary[key] = {
+                "count": len(durations),
+                "mean": sum(durations) / len(durations),
+                "median": durations[len(durations) // 2],
+                "max": durations[-1]
+            }
+    return summary
+
+
+def log_latency_summary():
+    for (hostname, module_name, path), stats in sorted(get_latency_summary().items()):
+        logger.info("[{}] {} via {}: {} calls, mean {:.3f}s, median {:.3f}s, max {:.3f}s".format(
+            hostname, module_name, path, stats["count"], stats["mean"], stats["median"], stats["max"]))
+
+
+class SshFastPathUnavailable(Exception):
+    """Raised when the command can't be run via the fast path and the ansible module should be used instead."""
+    pass
+
+
+class SshFastPath(object):
+    """
+    Runs 'shell' and 'command' ansible modules over a persistent SSH connection.
+    """
+
+    def __init__(self, hostname, address, username, password=None, port=22, key_filename=None, become=True):
+        self.hostname = hostname
+        self.address = address
+        self.username = username
+        self.password = password
+        self.port = port
+        self.key_filename = key_filename
+        self.become = become
+        self.enabled = True
+        self._client = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_ansible_host(cls, host, hostname, address):
+        """Create fast path using the connection variables of the host in the ansible inventory.
+
+        Args:
+            host: Object filtered from the ansible_adhoc fixture by hostname
+            hostname: Name of the host in the ansible inventory
+            address: Management IP address of the host
+
+        Returns:
+            SshFastPath or None if the host is not connected via SSH.
+        """
+        vm = host.options["variable_manager"]
+        im = host.options["inventory_manager"]
+        hostvars = vm.get_vars(host=im.get_host(hostname))
+        templar = Templar(loader=vm._loader, variables=hostvars)
+
+        def get_var(*names):
+            for name in names:
+                if name in hostvars:
+                    return templar.template(hostvars[name])
+            return None
+
+        if get_var("ansible_connection") not in SSH_CONNECTIONS:
+            return None
+        username = get_var("ansible_user", "ansible_ssh_user")
+        if not username:
+            return None
+        return cls(hostname, address, username,
+                   password=get_var("ansible_password", "ansible_ssh_pass", "ansible_ssh_password"),
+                   port=int(get_var("ansible_port", "ansible_ssh_port") or 22),
+                   key_filename=get_var("ansible_ssh_private_key_file", "ansible_private_key_file"))
+
+    @staticmethod
+    def supports(module_name, module_args, complex_args):
+        """Check if the module call can be run via the fast path. Only the raw command is supported,
+        other module arguments like 'chdir' or 'executable' are left to the ansible module."""
+        return module_name in FAST_PATH_MODULES and not complex_args \
+            and len(module_args) == 1 and isinstance(module_args[0], str)
+
+    def _get_transport(self):
+        with self._lock:
+            if self._client is None or not self._client.get_transport() \
+                    or not self._client.get_transport().is_active():
+                client = paramiko.SSHClient()
+                client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+                client.connect(self.address, port=self.port, username=self.username, password=self.password,
+                               key_filename=self.key_filename, allow_agent=self.password is None,
+                               look_for_keys=self.password is None, timeout=10)
+                client.get_transport().set_keepalive(30)
+                self._client = client
+            return self._client.get_transport()
+
+    def close(self):
+        with self._lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+    def _build_command(self, module_name, cmd):
+        if module_name == "shell":
+            remote_cmd = "/bin/sh -c {}".format(shlex.quote(cmd))
+        else:
+            remote_cmd = " ".join(shlex.quote(arg) for arg in shlex.split(cmd))
+        if self.become:
+            remote_cmd = "sudo -n " + remote_cmd
+        return remote_cmd
+
+    def _exec(self, remote_cmd):
+        channel = self._get_transport().open_session()
+        stdout = []
+        stderr = []
+        with channel:
+            channel.exec_command(remote_cmd)
+            while True:
+                if channel.recv_ready():
+                    stdout.append(channel.recv(65536))
+                elif channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(65536))
+                elif channel.exit_status_ready():
+                    break
+                else:
+                    select.select([channel], [], [], 1)
+            rc = channel.recv_exit_status()
+        return rc, b"".join(stdout), b"".join(stderr)
+
+    def run(self, module_name, cmd):
+        """Run the command the way the 'shell' or 'command' ansible module would.
+
+        Raises:
+            SshFastPathUnavailable: if the command couldn't be run, the ansible module should be used instead.
+
+        Returns:
+            ModuleResult: result with the same keys as the ansible module result.
+        """
+        remote_cmd = self._build_command(module_name, cmd)
+        start = datetime.now()
+        try:
+            rc, stdout, stderr = self._exec(remote_cmd)
+        except paramiko.AuthenticationException as e:
+            # Credentials won't change in the session, don't retry the handshake on every call
+            self.close()
+            self.enabled = False
+            raise SshFastPathUnavailable("SSH fast path to {} failed to authenticate: {}"
+                                         .format(self.hostname, repr(e)))
+        except (paramiko.SSHException, socket.error, EOFError) as e:
+            # The connection may be lost e.g. because of reboot, reconnect on the next call
+            self.close()
+            raise SshFastPathUnavailable("SSH fast path to {} failed: {}".format(self.hostname, repr(e)))
+        end = datetime.now()
+
+        stdout = stdout.decode("utf-8", errors="replace").rstrip("\r\n")
+        stderr = stderr.decode("utf-8", errors="replace").rstrip("\r\n")
+        if self.become and rc != 0 and any(error in stderr for error in SUDO_PASSWORD_ERRORS):
+            self.enabled = False
+            raise SshFastPathUnavailable("Passwordless sudo is not available on {}".format(self.hostname))
+
+        return ModuleResult({
+            "changed": True,
+            "cmd": cmd if module_name == "shell" else shlex.split(cmd),
+            "rc": rc,
+            "failed": rc != 0,
+            "msg": "non-zero return code" if rc != 0 else "",
+            "start": str(start),
+            "end": str(end),
+            "delta": str(end - start),
+            "stdout": stdout,
+            "stderr": stderr,
+            "stdout_lines": stdout.splitlines(),
+            "stderr_lines": stderr.splitlines(),
+            "invocation": {"module_args": {"_raw_params": cmd, "_uses_shell": module_name == "shell"}}
+        })
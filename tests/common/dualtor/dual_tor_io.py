@@ -18,6 +18,12 @@ from tests.common.utilities import wait_until, convert_scapy_packet_to_bytes
 from natsort import natsorted
 from collections import defaultdict
 
+try:
+    from tests.common.dualtor.pcap_columns import PcapColumns
+except ImportError:
+    # NumPy is not installed, the captured packets are examined as scapy packets
+    PcapColumns = None
+
 TCP_DST_PORT = 5000
 SOCKET_RECV_BUFFER_SIZE = 10 * 1024 * 1024
 PTFRUNNER_QLEN = 1000
@@ -130,6 +136,7 @@ class DualTorIO:
             self.packets_per_server = self.packets_to_send // len(self.test_interfaces)
 
         self.all_packets = []
+        self.captured_columns = None
 
     def setup_ptf_sniffer(self):
         """Setup ptf sniffer supervisor config."""
@@ -622,8 +629,14 @@ class DualTorIO:
         """Fetch the captured packet file generated by the ptf sniffer."""
         logger.info('Fetching pcap file from ptf')
         self.ptfhost.fetch(src=self.capture_pcap, dest='/tmp/', flat=True, fail_on_missing=False)
-        self.all_packets = scapyall.rdpcap(self.capture_pcap)
-        logger.info("Number of all packets captured: {}".format(len(self.all_packets)))
+        self.all_packets = []
+        self.captured_columns = PcapColumns.read(self.capture_pcap) if PcapColumns else None
+        if self.captured_columns is None:
+            self.all_packets = scapyall.rdpcap(self.capture_pcap)
+            captured_count = len(self.all_packets)
+        else:
+            captured_count = len(self.captured_columns)
+        logger.info("Number of all packets captured: {}".format(captured_count))
 
     def send_packets(self):
         """Send packets generated."""
@@ -671,6 +684,14 @@ class DualTorIO:
             server_addr = packet[scapyall.IP].src
         return server_addr
 
+    def get_server_address_field(self):
+        """Return the column of PcapColumns with the server address of the traffic direction."""
+        if self.traffic_direction in ("t1_to_server", "t1_to_soc"):
+            return "ip_dst"
+        if self.traffic_direction in ("server_to_t1", "soc_to_t1", "server_to_server"):
+            return "ip_src"
+        return None
+
     def get_test_results(self):
         return self.test_results
 
@@ -687,21 +708,23 @@ class DualTorIO:
         examine_start = datetime.datetime.now()
         logger.info("Packet flow examine started {}".format(str(examine_start)))
 
-        if not self.all_packets:
+        if not self.all_packets and not self.captured_columns:
             logger.error("self.all_packets not defined.")
             return None
 
+        if self.captured_columns is not None:
+            server_address_field = self.get_server_address_field()
+            flow = self.captured_columns.select(self.tcp_sport, TCP_DST_PORT, self.sent_pkt_dst_mac,
+                                                self.received_pkt_src_mac, self.is_flow_packet)
+            if flow is not None and server_address_field is not None:
+                self.examine_flow_columns(flow, server_address_field)
+                return
+            # Some frames need scapy to tell whether they belong to the flow
+            logger.info("Examining captured packets with scapy")
+            self.all_packets = scapyall.rdpcap(self.capture_pcap)
+
         # Filter out packets:
-        filtered_packets = [pkt for pkt in self.all_packets if
-                            scapyall.TCP in pkt and
-                            scapyall.ICMP not in pkt and
-                            pkt[scapyall.TCP].sport == self.tcp_sport and
-                            pkt[scapyall.TCP].dport == TCP_DST_PORT and
-                            self.check_tcp_payload(pkt) and
-                            (
-                                pkt[scapyall.Ether].dst == self.sent_pkt_dst_mac or
-                                pkt[scapyall.Ether].src in self.received_pkt_src_mac
-                            )]
+        filtered_packets = [pkt for pkt in self.all_packets if self.is_flow_packet(pkt)]
         logger.info("Number of filtered packets captured: {}".format(len(filtered_packets)))
         if not filtered_packets or len(filtered_packets) == 0:
             logger.error("Sniffer failed to capture any traffic")
@@ -741,13 +764,40 @@ class DualTorIO:
                         .format(server_ip, json.dumps(result, indent=4)))
             self.test_results[server_ip] = result
 
+    def examine_flow_columns(self, flow, server_address_field):
+        """
+        @summary: Same as examine_flow, on the frames of the flow selected from self.captured_columns
+        """
+        logger.info("Number of filtered packets captured: {}".format(len(flow)))
+        if len(flow) == 0:
+            logger.error("Sniffer failed to capture any traffic")
+
+        # Split frames into separate lists based on server IP, sorted by payload then timestamp
+        server_to_packet_map = self.captured_columns.split(flow, server_address_field)
+
+        logger.info("Measuring traffic disruptions...")
+        for server_ip, indexes in list(server_to_packet_map.items()):
+            filename = '/tmp/capture_filtered_{}.pcap'.format(server_ip)
+            self.captured_columns.write_pcap(filename, indexes)
+            logger.info("Filtered pcap dumped to {}".format(filename))
+
+        self.test_results = {}
+
+        for server_ip in natsorted(list(server_to_packet_map.keys())):
+            num_sent_packets, received_ends, num_received_packets, duplicate_ranges, disruption_ranges = \
+                self.captured_columns.examine_sequence(server_to_packet_map[server_ip], self.sent_pkt_dst_mac,
+                                                       self.received_pkt_src_mac)
+            result = self.get_server_result(server_ip, num_sent_packets, received_ends, num_received_packets,
+                                            duplicate_ranges, disruption_ranges)
+            logger.info("Server {} results:\n{}"
+                        .format(server_ip, json.dumps(result, indent=4)))
+            self.test_results[server_ip] = result
+
     def examine_each_packet(self, server_ip, packets):
         num_sent_packets = 0
         received_packet_list = list()
         duplicate_packet_list = list()
         disruption_ranges = list()
-        disruption_before_traffic = False
-        disruption_after_traffic = False
         duplicate_ranges = []
 
         for packet in packets:
@@ -826,19 +876,35 @@ class DualTorIO:
                 }
                 duplicate_ranges.append(duplicate_dict)
 
+        received_ends = [received_packet_list[0], received_packet_list[-1]] if received_packet_list else []
+        return self.get_server_result(server_ip, num_sent_packets, received_ends, len(received_packet_list),
+                                      duplicate_ranges, disruption_ranges)
+
+    def get_server_result(self, server_ip, num_sent_packets, received_ends, num_received_packets,
+                          duplicate_ranges, disruption_ranges):
+        """
+        @summary: Build the results of the server from the examined packets
+
+        Args:
+            received_ends: (payload_id, timestamp) of the first and the last received packets,
+                empty if no packet was received
+        """
+        disruption_before_traffic = False
+        disruption_after_traffic = False
+        if received_ends:
             # If the first packet we received is not #0, some disruption started
             # before traffic started. Store the id of the first received packet
-            if received_packet_list[0][0] != 0:
-                disruption_before_traffic = received_packet_list[0][0]
+            if received_ends[0][0] != 0:
+                disruption_before_traffic = received_ends[0][0]
             # If the last packet we received does not match the number of packets
             # sent, some disruption continued after the traffic finished.
             # Store the id of the last received packet
-            if received_packet_list[-1][0] != self.packets_sent_per_server.get(server_ip) - 1:
-                disruption_after_traffic = received_packet_list[-1][0]
+            if received_ends[-1][0] != self.packets_sent_per_server.get(server_ip) - 1:
+                disruption_after_traffic = received_ends[-1][0]
 
         result = {
             'sent_packets': num_sent_packets,
-            'received_packets': len(received_packet_list),
+            'received_packets': num_received_packets,
             'disruption_before_traffic': disruption_before_traffic,
             'disruption_after_traffic': disruption_after_traffic,
             'duplications': duplicate_ranges,
@@ -846,14 +912,30 @@ class DualTorIO:
         }
 
         if num_sent_packets < self.packets_sent_per_server.get(server_ip):
-            server_addr = self.get_server_address(packet)
             logger.error('Not all sent packets were captured. '
                          'Something went wrong!')
             logger.error('Dumping server {} results and continuing:\n{}'
-                         .format(server_addr, json.dumps(result, indent=4)))
+                         .format(server_ip, json.dumps(result, indent=4)))
 
         return result
 
+    def is_flow_packet(self, pkt):
+        """
+        @summary: Helper method
+
+        Returns: Bool: True if the packet is a TCP packet of the I/O test flow,
+            sent to or received from the DUT
+        """
+        return (scapyall.TCP in pkt and
+                scapyall.ICMP not in pkt and
+                pkt[scapyall.TCP].sport == self.tcp_sport and
+                pkt[scapyall.TCP].dport == TCP_DST_PORT and
+                self.check_tcp_payload(pkt) and
+                (
+                    pkt[scapyall.Ether].dst == self.sent_pkt_dst_mac or
+                    pkt[scapyall.Ether].src in self.received_pkt_src_mac
+                ))
+
     def check_tcp_payload(self, packet):
         """
         @summary: Helper method
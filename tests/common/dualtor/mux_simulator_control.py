@@ -17,7 +17,7 @@ from tests.common.dualtor.dual_tor_common import mux_config
 from tests.common.dualtor.dual_tor_common import CableType
 from tests.common.helpers.assertions import pytest_assert
 from tests.common.dualtor.constants import UPPER_TOR, LOWER_TOR, TOGGLE, RANDOM, NIC, DROP, \
-                                           OUTPUT, FLAP_COUNTER, CLEAR_FLAP_COUNTER, RESET
+                                           OUTPUT, FLAP_COUNTER, CLEAR_FLAP_COUNTER, RESET, BULK
 
 __all__ = [
     'mux_server_info',
@@ -40,6 +40,7 @@ __all__ = [
     'toggle_all_simulator_ports_to_random_side',
     'toggle_simulator_port_to_upper_tor',
     'toggle_simulator_port_to_lower_tor',
+    'toggle_simulator_ports',
     'toggle_all_simulator_ports',
     'check_mux_status',
     'validate_check_result',
@@ -134,13 +135,13 @@ def url(mux_server_url, duthost, tbinfo):
                             no '/port/action' (For polling/toggling all ports)
                             or /mux/vms/flap_counter for retrieving flap counter for all ports
                             or /mux/vms/clear_flap_counter for clearing flap counter for given ports
-            action: a str, output|drop|None. If action is None, the returned url contains no '/action'
+            action: a str, output|drop|bulk|None. If action is None, the returned url contains no '/action'
         Returns:
             The url for posting flow update request, like http://10.0.0.64:8080/mux/vms17-8[/1/drop|output]
         """
         if not interface_name:
             if action:
-                # For flap_counter, clear_flap_counter, drop(for all), output(for all) or reset
+                # For flap_counter, clear_flap_counter, drop(for all), output(for all), reset or bulk
                 return mux_server_url + "/{}".format(action)
             return mux_server_url
         mg_facts = duthost.get_extended_minigraph_facts(tbinfo)
@@ -339,6 +340,30 @@ def toggle_simulator_port_to_lower_tor(url, tbinfo):
     return _toggle_simulator_port_to_lower_tor
 
 
+@pytest.fixture(scope='module')
+def toggle_simulator_ports(url, duthost, tbinfo):
+    """
+    Returns _toggle_simulator_ports to make fixture accept arguments
+    """
+
+    def _toggle_simulator_ports(active_sides):
+        """
+        Function to toggle multiple y_cable simulator ports in one request
+        Args:
+            active_sides: a dict, key is the name of interface, value is the target active side of the interface,
+                          one of "upper_tor", "lower_tor", "toggle" or "random"
+        """
+        # Skip on non dualtor testbed
+        if 'dualtor' not in tbinfo['topo']['name'] or not active_sides:
+            return
+        mg_facts = duthost.get_extended_minigraph_facts(tbinfo)
+        data = {"active_side": {str(mg_facts['minigraph_ptf_indices'][interface_name]): active_side
+                                for interface_name, active_side in list(active_sides.items())}}
+        pytest_assert(_post(url(action=BULK), data), "Failed to toggle simulator ports {}".format(active_sides))
+
+    return _toggle_simulator_ports
+
+
 @pytest.fixture(scope='module')
 def recover_directions(url):
     """
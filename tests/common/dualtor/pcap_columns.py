@@ -0,0 +1,305 @@
+"""
+Columnar reader of the pcap files captured by the dual ToR I/O sniffer.
+
+The analysis of dual ToR I/O only needs a few fields of the captured Ethernet/IPv4/TCP frames: MAC addresses,
+IP addresses, TCP ports, the sequence id in the TCP payload and the timestamp. These fields are at fixed offsets
+of the frames, so they are decoded for all the frames at once into NumPy columns, instead of dissecting every
+frame into a scapy packet. Only frames with other layouts (VLAN tags, IP or TCP options, IPv6, fragments) are
+dissected by scapy.
+"""
+import logging
+import socket
+import struct
+
+import numpy as np
+import scapy.all as scapyall
+
+logger = logging.getLogger(__name__)
+
+# pcap file magic -> (byte order, timestamp ticks per second)
+PCAP_MAGIC = {
+    b"\xd4\xc3\xb2\xa1": ("<", 10 ** 6),
+    b"\xa1\xb2\xc3\xd4": (">", 10 ** 6),
+    b"\x4d\x3c\xb2\xa1": ("<", 10 ** 9),
+    b"\xa1\xb2\x3c\x4d": (">", 10 ** 9),
+}
+PCAP_HEADER_LEN = 24
+PCAP_RECORD_HEADER_LEN = 16
+LINKTYPE_ETHERNET = 1
+
+ETH_TYPE_IPV4 = 0x0800
+IP_PROTO_TCP = 6
+# Ethernet, IPv4 and TCP headers without options
+PLAIN_HEADERS_LEN = 14 + 20 + 20
+# Payload is the sequence id followed by 'X' padding. Sequence ids with more digits are parsed by python.
+MAX_ID_DIGITS = 18
+# Longer payloads, eg. of jumbo frames, are parsed by python
+MAX_PAYLOAD_COLUMNS = 128
+CHUNK_SIZE = 1 << 16
+
+
+def mac_to_int(mac):
+    """Convert MAC address string, as scapy formats it, to integer, or return None for other strings."""
+    if not isinstance(mac, str) or mac != mac.lower() or len(mac) != 17:
+        return None
+    try:
+        return int(mac.replace(":", ""), 16)
+    except ValueError:
+        return None
+
+
+def payload_id(payload_bytes):
+    """Get sequence id of the payload the way DualTorIO.check_tcp_payload parses it, or None if it's invalid."""
+    try:
+        return int(payload_bytes.decode().replace('X', ''))
+    except Exception:
+        return None
+
+
+def _be_int(headers, start, length):
+    """Decode big-endian unsigned integer at the offset of every row of the headers matrix."""
+    value = np.zeros(len(headers), dtype=np.int64)
+    for index in range(start, start + length):
+        value = (value << 8) | headers[:, index]
+    return value
+
+
+class PcapColumns(object):
+    """
+    Fields of the frames of a pcap file, decoded into NumPy columns.
+
+    The columns are only valid for the frames marked as plain, the Ethernet/IPv4/TCP frames without options.
+    The payload_id column is valid for the plain frames marked by payload_ok.
+    """
+
+    def __init__(self, data, byte_order, ticks_per_second):
+        self.data = data
+        self.ticks_per_second = ticks_per_second
+        self._record_header = struct.Struct(byte_order + "IIII")
+
+        offsets = []
+        pos = PCAP_HEADER_LEN
+        caplen_at = struct.Struct(byte_order + "I").unpack_from
+        while pos + PCAP_RECORD_HEADER_LEN <= len(data):
+            offsets.append(pos)
+            pos += PCAP_RECORD_HEADER_LEN + caplen_at(data, pos + 8)[0]
+        self.offsets = np.array(offsets, dtype=np.int64)
+        self.count = len(offsets)
+
+        self.time = np.zeros(self.count, dtype=np.int64)
+        self.eth_dst = np.zeros(self.count, dtype=np.int64)
+        self.eth_src = np.zeros(self.count, dtype=np.int64)
+        self.ip_src = np.zeros(self.count, dtype=np.int64)
+        self.ip_dst = np.zeros(self.count, dtype=np.int64)
+        self.sport = np.zeros(self.count, dtype=np.int64)
+        self.dport = np.zeros(self.count, dtype=np.int64)
+        self.payload_id = np.zeros(self.count, dtype=np.int64)
+        self.payload_ok = np.zeros(self.count, dtype=bool)
+        self.plain = np.zeros(self.count, dtype=bool)
+
+        buf = np.frombuffer(data, dtype=np.uint8)
+        record_dtype = np.dtype(byte_order + "u4")
+        for start in range(0, self.count, CHUNK_SIZE):
+            self._decode_chunk(buf, record_dtype, slice(start, min(start + CHUNK_SIZE, self.count)))
+
+    @classmethod
+    def read(cls, filename):
+        """
+        Read the pcap file.
+
+        @return: PcapColumns instance or None if the file isn't an Ethernet pcap file, such files should be
+                 read by scapy.
+        """
+        with open(filename, "rb") as pcap_file:
+            data = pcap_file.read()
+        if len(data) < PCAP_HEADER_LEN or data[:4] not in PCAP_MAGIC:
+            return None
+        byte_order, ticks_per_second = PCAP_MAGIC[data[:4]]
+        if struct.unpack_from(byte_order + "I", data, 20)[0] != LINKTYPE_ETHERNET:
+            return None
+        return cls(data, byte_order, ticks_per_second)
+
+    def _decode_chunk(self, buf, record_dtype, chunk):
+        offsets = self.offsets[chunk]
+        last = len(buf) - 1
+
+        records = buf[np.minimum(offsets[:, None] + np.arange(PCAP_RECORD_HEADER_LEN), last)]
+        records = records.copy().view(record_dtype).astype(np.int64)
+        self.time[chunk] = records[:, 0] * self.ticks_per_second + records[:, 1]
+        frame_start = offsets + PCAP_RECORD_HEADER_LEN
+        # The last record may be truncated, scapy reads the available bytes of it
+        frame_len = np.minimum(records[:, 2], len(buf) - frame_start)
+
+        headers = buf[np.minimum(frame_start[:, None] + np.arange(PLAIN_HEADERS_LEN), last)].astype(np.int64)
+        ip_len = _be_int(headers, 16, 2)
+        plain = (frame_len >= PLAIN_HEADERS_LEN) & \
+            (_be_int(headers, 12, 2) == ETH_TYPE_IPV4) & \
+            (headers[:, 14] == 0x45) & \
+            ((_be_int(headers, 20, 2) & 0x1fff) == 0) & \
+            (headers[:, 23] == IP_PROTO_TCP) & \
+            ((headers[:, 46] >> 4) == 5)
+        self.plain[chunk] = plain
+        self.eth_dst[chunk] = _be_int(headers, 0, 6)
+        self.eth_src[chunk] = _be_int(headers, 6, 6)
+        self.ip_src[chunk] = _be_int(headers, 26, 4)
+        self.ip_dst[chunk] = _be_int(headers, 30, 4)
+        self.sport[chunk] = _be_int(headers, 34, 2)
+        self.dport[chunk] = _be_int(headers, 36, 2)
+
+        # scapy strips the bytes after the IP total length as padding
+        payload_start = frame_start + PLAIN_HEADERS_LEN
+        payload_end = frame_start + np.where(ip_len >= 20, np.minimum(frame_len, 14 + ip_len), frame_len)
+        payload_len = np.maximum(payload_end - payload_start, 0)
+        width = min(int(payload_len.max()) if len(payload_len) else 0, MAX_PAYLOAD_COLUMNS)
+        columns = np.arange(width)
+        payload = buf[np.minimum(payload_start[:, None] + columns, last)]
+        in_payload = columns < payload_len[:, None]
+        digits = in_payload & (payload >= ord("0")) & (payload <= ord("9"))
+        id_len = np.where(digits.all(axis=1), width, np.argmin(digits, axis=1))
+        padded = ~((columns >= id_len[:, None]) & in_payload & (payload != ord("X"))).any(axis=1)
+        payload_ok = plain & (payload_len <= width) & (id_len >= 1) & (id_len <= MAX_ID_DIGITS) & padded
+
+        value = np.zeros(len(offsets), dtype=np.int64)
+        for index in range(min(width, MAX_ID_DIGITS)):
+            value = np.where(index < id_len, value * 10 + (payload[:, index].astype(np.int64) - ord("0")), value)
+        self.payload_id[chunk] = value
+        self.payload_ok[chunk] = payload_ok
+
+        # Payloads which are not digits followed by 'X' padding may still be valid for int(), eg. " 12X"
+        for index in np.nonzero(plain & ~payload_ok)[0]:
+            sequence_id = payload_id(self.data[payload_start[index]:payload_end[index]])
+            if sequence_id is None:
+                continue
+            if abs(sequence_id) < 10 ** MAX_ID_DIGITS:
+                self.payload_id[chunk.start + index] = sequence_id
+                self.payload_ok[chunk.start + index] = True
+            else:
+                # Doesn't fit in the column, leave the frame to scapy
+                self.plain[chunk.start + index] = False
+
+    def __len__(self):
+        return self.count
+
+    def frame(self, index):
+        offset = int(self.offsets[index])
+        caplen = self._record_header.unpack_from(self.data, offset)[2]
+        return self.data[offset + PCAP_RECORD_HEADER_LEN:offset + PCAP_RECORD_HEADER_LEN + caplen]
+
+    def timestamp(self, index):
+        """Get timestamp of the frame as float, same value as float(packet.time) of the scapy packet."""
+        return int(self.time[index]) / self.ticks_per_second
+
+    def packet(self, index):
+        """Dissect the frame into scapy packet, the way scapy.rdpcap does."""
+        frame = self.frame(index)
+        try:
+            packet = scapyall.Ether(frame)
+        except Exception:
+            packet = scapyall.conf.raw_layer(frame)
+        packet.time = self.timestamp(index)
+        return packet
+
+    def select(self, tcp_sport, tcp_dport, sent_pkt_dst_mac, received_pkt_src_mac, is_flow_packet):
+        """
+        Get indexes of the frames of the TCP flow, sent to sent_pkt_dst_mac or received from received_pkt_src_mac,
+        with valid payload.
+
+        @param is_flow_packet: Predicate the flow packets are selected by from scapy packets
+        @return: Frame indexes in capture order, or None if some flow packet can't be analyzed from the columns
+        """
+        ports = {"sport": tcp_sport, "dport": tcp_dport}
+        for fields, _ in scapyall.TCP.payload_guess:
+            if all(ports.get(field) == value for field, value in fields.items()):
+                # Payload of the flow is dissected as some protocol, rather than raw sequence id
+                return None
+
+        for index in np.nonzero(~self.plain)[0]:
+            try:
+                if not is_flow_packet(self.packet(index)):
+                    continue
+            except Exception:
+                pass
+            logger.info("Captured frame {} of the flow can't be analyzed from columns".format(index))
+            return None
+
+        received = np.zeros(self.count, dtype=bool)
+        for mac in received_pkt_src_mac:
+            mac = mac_to_int(mac)
+            if mac is not None:
+                received |= self.eth_src == mac
+        sent_mac = mac_to_int(sent_pkt_dst_mac)
+        sent = self.eth_dst == sent_mac if sent_mac is not None else np.zeros(self.count, dtype=bool)
+        selected = self.plain & self.payload_ok & (self.sport == tcp_sport) & (self.dport == tcp_dport) & \
+            (sent | received)
+        return np.nonzero(selected)[0]
+
+    def split(self, indexes, field):
+        """
+        Split the frames by the IP address in the field, ip_src or ip_dst, and sort the frames of every address by
+        sequence id, then by timestamp, keeping the capture order of the duplicates.
+
+        @return: Dict of IP address string to frame indexes
+        """
+        addresses = getattr(self, field)[indexes]
+        order = np.lexsort((indexes, self.time[indexes], self.payload_id[indexes], addresses))
+        indexes, addresses = indexes[order], addresses[order]
+        unique, starts = np.unique(addresses, return_index=True)
+        ends = np.append(starts[1:], len(indexes))
+        return {socket.inet_ntoa(struct.pack(">I", int(address))): indexes[start:end]
+                for address, start, end in zip(unique, starts, ends)}
+
+    def examine_sequence(self, indexes, sent_pkt_dst_mac, received_pkt_src_mac):
+        """
+        Examine sequence ids of the packets sent to sent_pkt_dst_mac and received from received_pkt_src_mac.
+
+        @param indexes: Frame indexes, sorted by sequence id and timestamp
+        @return: (sent packets count, received (id, timestamp) pairs of the first and the last received packets,
+                  received packets count, duplications, disruptions). Duplications are ranges of packets
+                  received again right after the previous packet with the same id, disruptions are the gaps
+                  of ids between the consecutive received packets.
+        """
+        sent_mac = mac_to_int(sent_pkt_dst_mac)
+        sent = self.eth_dst[indexes] == sent_mac if sent_mac is not None else np.zeros(len(indexes), dtype=bool)
+        received_macs = [mac for mac in (mac_to_int(mac) for mac in received_pkt_src_mac) if mac is not None]
+        received = ~sent & np.isin(self.eth_src[indexes], received_macs)
+        ids = self.payload_id[indexes][received]
+        times = self.time[indexes][received]
+
+        def timestamp(position):
+            return int(times[position]) / self.ticks_per_second
+
+        duplications = []
+        duplicates = np.nonzero(ids[1:] == ids[:-1])[0] + 1
+        if len(duplicates):
+            group_starts = np.nonzero(np.append(True, ids[duplicates][1:] != ids[duplicates][:-1]))[0]
+            group_ends = np.append(group_starts[1:], len(duplicates))
+            for start, end in zip(group_starts, group_ends):
+                first, last = duplicates[start], duplicates[end - 1]
+                duplications.append({
+                    'start_time': timestamp(first),
+                    'end_time': timestamp(last),
+                    'start_id': int(ids[first]),
+                    'end_id': int(ids[last]),
+                    'duplication_count': int(end - start)
+                })
+
+        disruptions = []
+        for position in np.nonzero(ids[:-1] + 1 < ids[1:])[0]:
+            disruptions.append({
+                'start_time': timestamp(position),
+                'end_time': timestamp(position + 1),
+                'start_id': int(ids[position]),
+                'end_id': int(ids[position + 1])
+            })
+
+        received_ends = [(int(ids[position]), timestamp(position)) for position in (0, -1)] if len(ids) else []
+        return int(np.count_nonzero(sent)), received_ends, len(ids), duplications, disruptions
+
+    def write_pcap(self, filename, indexes):
+        """Write the frames to pcap file, in the order of the indexes."""
+        with open(filename, "wb") as pcap_file:
+            pcap_file.write(self.data[:PCAP_HEADER_LEN])
+            for index in indexes:
+                offset = int(self.offsets[index])
+                caplen = self._record_header.unpack_from(self.data, offset)[2]
+                pcap_file.write(self.data[offset:offset + PCAP_RECORD_HEADER_LEN + caplen])
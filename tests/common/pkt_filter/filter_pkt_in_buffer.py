@@ -1,6 +1,7 @@
-from collections import OrderedDict
+from collections import OrderedDict, deque
 
 import sys
+import threading
 import time
 import json
 import copy
@@ -30,16 +31,30 @@ def _parse_layer(layer):
         return None
 
     for field in layer.fields_desc:
-        value = getattr(layer, field.name)
-        if isinstance(value, type(None)):
-            value = None
+        fields[field.name] = _parse_field(layer, field.name)
 
-        if not isinstance(value, NATIVE_TYPE):
-            value = _parse_layer(value)
+    return {layer.name: fields}
 
-        fields[field.name] = str(value)
 
-    return {layer.name: fields}
+def _parse_field(layer, field_name):
+    """
+    Convert field of packet layer to string
+
+    Args:
+        layer: Layer of packet
+        field_name: Field name
+
+    Returns:
+        Field value
+    """
+    value = getattr(layer, field_name)
+    if isinstance(value, type(None)):
+        value = None
+
+    if not isinstance(value, NATIVE_TYPE):
+        value = _parse_layer(value)
+
+    return str(value)
 
 
 def convert_pkt_to_dict(pkt):
@@ -69,11 +84,287 @@ def convert_pkt_to_dict(pkt):
     return packet_dict
 
 
+MISSING = object()
+
+# Time to wait for the expected packet, and time without a new matched packet before stop waiting
+FILTER_TIMEOUT = 3
+FILTER_SETTLE_TIME = 0.5
+
+
+def field_value(pkt, layer_name, field_name):
+    """
+    Get the string value of a packet field, as in the dictionary returned by convert_pkt_to_dict
+
+    Args:
+        pkt: Scapy packet
+        layer_name: Layer name, e.g. "IP" or "802.1Q"
+        field_name: Field name, e.g. "dst"
+
+    Returns:
+        Field value, or MISSING if the packet does not have the field
+    """
+    # convert_pkt_to_dict keeps the last layer of a name, e.g. the inner IP header of an IP in IP packet
+    found = None
+    counter = 0
+    while True:
+        layer = pkt.getlayer(counter)
+        if not layer:
+            break
+        if layer.name == layer_name and hasattr(layer, 'fields_desc'):
+            found = layer
+        counter += 1
+
+    if found is None or field_name not in [field.name for field in found.fields_desc]:
+        return MISSING
+
+    return _parse_field(found, field_name)
+
+
+class IndexedPacket(object):
+    """
+    Packet received by the PTF dataplane, decoded once and only for the fields that are looked up
+    """
+    __slots__ = ('entry', '_pkt', '_keys')
+
+    def __init__(self, entry):
+        """
+        Args:
+            entry: (packet bytes, timestamp) entry of the dataplane packet queue
+        """
+        self.entry = entry
+        self._pkt = None
+        self._keys = {}
+
+    @property
+    def timestamp(self):
+        return self.entry[1]
+
+    @property
+    def packet(self):
+        """
+        Scapy packet, decoded on the first use
+        """
+        if self._pkt is None:
+            self._pkt = packet.Ether(self.entry[0])
+        return self._pkt
+
+    def key(self, fields):
+        """
+        Get the values of fields
+
+        Args:
+            fields: Tuple of (layer, field)
+
+        Returns:
+            Tuple of field values, None if the packet does not have some of the fields
+        """
+        if fields not in self._keys:
+            values = tuple(field_value(self.packet, layer, field) for layer, field in fields)
+            self._keys[fields] = None if MISSING in values else values
+        return self._keys[fields]
+
+
+class _PortIndex(object):
+    """
+    Packets of a dataplane packet queue, and their buckets by the values of the fields looked up
+    """
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.packets = deque()
+        # fields -> field values -> packets in receive order
+        self.buckets = {}
+
+    def add(self, pkt):
+        for fields, bucket in self.buckets.items():
+            key = pkt.key(fields)
+            if key is not None:
+                bucket.setdefault(key, deque()).append(pkt)
+
+    def remove(self, pkt):
+        # Packets leave the queue in the order they were received, so each one is the first of its bucket
+        for fields, bucket in self.buckets.items():
+            key = pkt.key(fields)
+            if key is not None:
+                bucket[key].popleft()
+                if not bucket[key]:
+                    del bucket[key]
+
+    def bucket(self, fields):
+        if fields not in self.buckets:
+            bucket = {}
+            for pkt in self.packets:
+                key = pkt.key(fields)
+                if key is not None:
+                    bucket.setdefault(key, deque()).append(pkt)
+            self.buckets[fields] = bucket
+        return self.buckets[fields]
+
+
+class PacketIndex(object):
+    """
+    Incremental index of the packets queued by the PTF dataplane.
+
+    Every packet is decoded once, and only for the fields that are looked up. Packets are bucketed by
+    (port, fields) and the values of the fields, so finding the packets that match is a dictionary lookup.
+    The index follows the dataplane queues: packets polled, discarded on queue overflow or flushed are
+    removed from it.
+    """
+
+    def __init__(self, dataplane):
+        """
+        Args:
+            dataplane: PTF dataplane
+        """
+        self.dataplane = dataplane
+        self._ports = {}
+        self._lock = threading.RLock()
+
+    @classmethod
+    def for_dataplane(cls, dataplane):
+        """
+        Get the index of a dataplane, it is created on the first use and kept with the dataplane
+
+        Args:
+            dataplane: PTF dataplane
+
+        Returns:
+            PacketIndex
+        """
+        index = getattr(dataplane, 'packet_index', None)
+        if index is None:
+            index = cls(dataplane)
+            dataplane.packet_index = index
+        return index
+
+    def port_id(self, port):
+        """
+        Get the (device, port) of the dataplane packet queue of a port
+
+        Args:
+            port: Port number or (device, port)
+        """
+        if isinstance(port, tuple):
+            return port
+        port_to_tuple = getattr(self.dataplane, 'port_to_tuple', None)
+        return port_to_tuple(port) if port_to_tuple else (0, port)
+
+    def _changed(self, port_id):
+        """
+        Check if the packet queue of a port changed since it was indexed, must be called with dataplane.cvar
+        """
+        queue = self.dataplane.packet_queues[port_id]
+        port_index = self._ports.get(port_id)
+        if port_index is None or port_index.queue is not queue:
+            return True
+        if len(queue) != len(port_index.packets):
+            return True
+        return bool(queue) and queue[-1] is not port_index.packets[-1].entry
+
+    def update(self, port):
+        """
+        Index the packets received on a port since the last update
+
+        Args:
+            port: Port number or (device, port)
+
+        Returns:
+            Number of packets indexed for the port
+        """
+        port_id = self.port_id(port)
+        with self._lock:
+            removed = []
+            with self.dataplane.cvar:
+                queue = self.dataplane.packet_queues[port_id]
+                port_index = self._ports.get(port_id)
+                if port_index is None:
+                    port_index = self._ports[port_id] = _PortIndex(queue)
+                elif port_index.queue is not queue:
+                    # The dataplane was flushed
+                    removed.extend(port_index.packets)
+                    port_index.packets.clear()
+                    port_index.queue = queue
+
+                packets = port_index.packets
+                # Packets are polled and discarded from the head of the queue and received at the tail
+                while packets and (not queue or packets[0].entry is not queue[0]):
+                    removed.append(packets.popleft())
+                if packets and (len(queue) < len(packets) or queue[len(packets) - 1] is not packets[-1].entry):
+                    removed.extend(packets)
+                    packets.clear()
+                added = [IndexedPacket(entry) for entry in queue[len(packets):]]
+                packets.extend(added)
+
+            # Decode out of dataplane.cvar, not to hold the dataplane thread
+            for pkt in removed:
+                port_index.remove(pkt)
+            for pkt in added:
+                port_index.add(pkt)
+
+            return len(packets)
+
+    def lookup(self, port, fields, values):
+        """
+        Get the packets received on a port whose fields have the given values
+
+        Args:
+            port: Port number or (device, port)
+            fields: List of (layer, field), e.g. [("IP", "src"), ("IP", "dst")]
+            values: Values of the fields, strings as in the dictionary returned by convert_pkt_to_dict
+
+        Returns:
+            List of IndexedPacket in receive order
+        """
+        port_id = self.port_id(port)
+        self.update(port_id)
+        with self._lock:
+            bucket = self._ports[port_id].bucket(tuple(fields))
+            return list(bucket.get(tuple(values), ()))
+
+    def wait_for(self, ports, fields, values, timeout, settle_time=0):
+        """
+        Wait for packets whose fields have the given values.
+
+        Returns once packets matched and no other packet matched during settle_time, or on timeout. The wait
+        is woken up by the dataplane when packets are received.
+
+        Args:
+            ports: List of port numbers or (device, port)
+            fields: List of (layer, field)
+            values: Values of the fields
+            timeout: Maximum time to wait in seconds
+            settle_time: Time in seconds without a new packet matched, before returning
+
+        Returns:
+            Dictionary of port to the list of IndexedPacket matched on the port
+        """
+        end_time = time.time() + timeout
+        port_ids = [self.port_id(port) for port in ports]
+        last_count = 0
+        last_change = None
+
+        while True:
+            matches = dict((port, self.lookup(port_id, fields, values)) for port, port_id in zip(ports, port_ids))
+            count = sum(len(pkts) for pkts in list(matches.values()))
+            now = time.time()
+            if count != last_count:
+                last_count, last_change = count, now
+
+            if (count and now - last_change >= settle_time) or now >= end_time:
+                return matches
+
+            wake_time = min(end_time, last_change + settle_time) if count else end_time
+            with self.dataplane.cvar:
+                if not any(self._changed(port_id) for port_id in port_ids):
+                    self.dataplane.cvar.wait(wake_time - now)
+
+
 class FilterPktBuffer(object):
     """
     FilterPktBuffer class for finding of packets in the buffer of PTF
     """
-    def __init__(self, ptfadapter, exp_pkt, dst_port_numbers, match_fields=None, ignore_fields=None):
+    def __init__(self, ptfadapter, exp_pkt, dst_port_numbers, match_fields=None, ignore_fields=None,
+                 timeout=FILTER_TIMEOUT, settle_time=FILTER_SETTLE_TIME):
         """
         Initialize an object for finding packets in the buffer
 
@@ -83,6 +374,8 @@ class FilterPktBuffer(object):
             dst_port_numbers: Destination port numbers
             match_fields: List of packet fields that should be matched
             ignore_fields: List of packet fields that should be ignored
+            timeout: Maximum time to wait for the expected packet in seconds
+            settle_time: Time in seconds without a new matched packet, before stop waiting
         """
         self.received_pkt = None
         self.received_pkt_diff = []
@@ -98,6 +391,8 @@ class FilterPktBuffer(object):
         if ignore_fields is None:
             ignore_fields = []
         self.ignore_fields = ignore_fields
+        self.timeout = timeout
+        self.settle_time = settle_time
 
         self.masked_exp_pkt = mask.Mask(self.pkt)
         self.pkt_dict = convert_pkt_to_dict(self.pkt)
@@ -129,36 +424,21 @@ class FilterPktBuffer(object):
 
         return pkt_dict
 
-    def __find_pkt_in_buffer(self, dst_port_number):
+    def __find_pkt_in_buffer(self):
         """
         Find expected packet in buffer by using matched fields
 
         Returns:
-            Received packet
+            Dictionary of destination port to the packets matched on the port
         """
-        time.sleep(3)
-        common_buffer = self.ptfadapter.dataplane.packet_queues
-        packet_buffer = common_buffer[(0, dst_port_number)][:]
-        matched_index = 0
-        received_pkt = None
-
-        for pkt in packet_buffer:
-            packet_dict = convert_pkt_to_dict(packet.Ether(pkt[0]))
+        try:
+            values = [self.pkt_dict[field][value] for field, value in self.match_fields]
+        except KeyError:
+            return {}
 
-            for field, value in self.match_fields:
-                try:
-                    if packet_dict[field][value] != self.pkt_dict[field][value]:
-                        break
-                except KeyError:
-                    break
-            else:
-                matched_index += 1
-                received_pkt = packet.Ether(pkt[0])
-
-        if received_pkt:
-            return ({dst_port_number: matched_index}, received_pkt)
-
-        return (None, None)
+        packet_index = PacketIndex.for_dataplane(self.ptfadapter.dataplane)
+        return packet_index.wait_for(self.dst_port_numbers, self.match_fields, values,
+                                     timeout=self.timeout, settle_time=self.settle_time)
 
     def __diff_between_dict(self, rcv_pkt_dict, exp_pkt_dict, path=''):
         """
@@ -211,12 +491,10 @@ class FilterPktBuffer(object):
         Returns:
             Bool value or difference between received packet and expected packet
         """
-        for dst_port in self.dst_port_numbers:
-            matched_index, received_pkt = self.__find_pkt_in_buffer(dst_port)
-
-            if received_pkt:
-                self.received_pkt = received_pkt
-                self.matched_index.update(matched_index)
+        for dst_port, matched_pkts in list(self.__find_pkt_in_buffer().items()):
+            if matched_pkts:
+                self.received_pkt = matched_pkts[-1].packet
+                self.matched_index[dst_port] = len(matched_pkts)
 
         if self.received_pkt:
             return self.masked_exp_pkt.pkt_match(self.received_pkt) or self._diff_between_pkt(self.received_pkt)
@@ -0,0 +1,190 @@
+import logging
+import random
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock
+
+import ptf.packet as packet
+import ptf.testutils as testutils
+
+from tests.common.pkt_filter.filter_pkt_in_buffer import FilterPktBuffer, PacketIndex, convert_pkt_to_dict
+
+logger = logging.getLogger(__name__)
+
+PORT = 1
+MATCH_FIELDS = [("IP", "src"), ("IP", "dst")]
+
+
+class FakeDataplane(object):
+    """Packet queues of the PTF dataplane, filled from a thread like the dataplane thread does."""
+
+    def __init__(self, ports):
+        self.cvar = threading.Condition()
+        self.packet_queues = dict(((0, port), []) for port in ports)
+
+    def receive(self, port, pkt):
+        with self.cvar:
+            self.packet_queues[(0, port)].append((bytes(pkt), time.time()))
+            self.cvar.notify_all()
+
+    def receive_later(self, delay, port, pkts):
+        def _receive():
+            time.sleep(delay)
+            for pkt in pkts:
+                self.receive(port, pkt)
+        thread = threading.Thread(target=_receive)
+        thread.start()
+        return thread
+
+
+def ip_pkt(src, dst, dport=80):
+    return testutils.simple_tcp_packet(ip_src=src, ip_dst=dst, tcp_dport=dport)
+
+
+def linear_scan(dataplane, port, exp_pkt, match_fields):
+    """Scan of the packet queue that FilterPktBuffer did before PacketIndex, returns the matched packets."""
+    exp_pkt_dict = convert_pkt_to_dict(exp_pkt)
+    matched = []
+    for pkt in dataplane.packet_queues[(0, port)][:]:
+        packet_dict = convert_pkt_to_dict(packet.Ether(pkt[0]))
+        for field, value in match_fields:
+            try:
+                if packet_dict[field][value] != exp_pkt_dict[field][value]:
+                    break
+            except KeyError:
+                break
+        else:
+            matched.append(pkt)
+    return matched
+
+
+class TestPacketIndex(unittest.TestCase):
+    """Test cases for PacketIndex."""
+
+    def setUp(self):
+        self.dataplane = FakeDataplane([PORT, PORT + 1])
+        self.index = PacketIndex.for_dataplane(self.dataplane)
+
+    def lookup(self, exp_pkt, port=PORT):
+        values = [convert_pkt_to_dict(exp_pkt)[layer][field] for layer, field in MATCH_FIELDS]
+        return [pkt.entry for pkt in self.index.lookup(port, MATCH_FIELDS, values)]
+
+    def test_index_kept_with_dataplane(self):
+        self.assertIs(PacketIndex.for_dataplane(self.dataplane), self.index)
+
+    def test_lookup_same_as_linear_scan(self):
+        rnd = random.Random(0)
+        addresses = ["10.0.0.{}".format(i) for i in range(4)]
+        for _ in range(300):
+            choice = rnd.random()
+            if choice < 0.1:
+                # No IP layer
+                pkt = testutils.simple_arp_packet()
+            elif choice < 0.2:
+                pkt = testutils.simple_tcpv6_packet()
+            elif choice < 0.3:
+                # The inner IP header is matched, as convert_pkt_to_dict keeps the last layer of a name
+                pkt = testutils.simple_ipv4ip_packet(ip_src="192.168.0.1", ip_dst="192.168.0.2",
+                                                     inner_frame=packet.IP(src=rnd.choice(addresses),
+                                                                           dst=rnd.choice(addresses)))
+            else:
+                pkt = ip_pkt(rnd.choice(addresses), rnd.choice(addresses), rnd.randrange(3))
+            self.dataplane.receive(PORT, pkt)
+
+        for src in addresses:
+            for dst in addresses:
+                exp_pkt = ip_pkt(src, dst)
+                self.assertEqual(self.lookup(exp_pkt), linear_scan(self.dataplane, PORT, exp_pkt, MATCH_FIELDS))
+
+    def test_lookup_follows_queue(self):
+        exp_pkt = ip_pkt("10.0.0.1", "10.0.0.2")
+        for _ in range(3):
+            self.dataplane.receive(PORT, exp_pkt)
+            self.dataplane.receive(PORT, ip_pkt("10.0.0.3", "10.0.0.2"))
+        self.assertEqual(len(self.lookup(exp_pkt)), 3)
+
+        # Polled from the head of the queue
+        with self.dataplane.cvar:
+            del self.dataplane.packet_queues[(0, PORT)][:3]
+        self.assertEqual(self.lookup(exp_pkt), linear_scan(self.dataplane, PORT, exp_pkt, MATCH_FIELDS))
+        self.assertEqual(len(self.lookup(exp_pkt)), 1)
+
+        # Flushed
+        with self.dataplane.cvar:
+            self.dataplane.packet_queues[(0, PORT)] = []
+        self.assertEqual(self.lookup(exp_pkt), [])
+        self.dataplane.receive(PORT, exp_pkt)
+        self.assertEqual(len(self.lookup(exp_pkt)), 1)
+        self.assertEqual(self.lookup(exp_pkt, PORT + 1), [])
+
+    def test_wait_for_returns_when_matched(self):
+        exp_pkt = ip_pkt("10.0.0.1", "10.0.0.2")
+        values = [convert_pkt_to_dict(exp_pkt)[layer][field] for layer, field in MATCH_FIELDS]
+        thread = self.dataplane.receive_later(0.2, PORT + 1, [ip_pkt("10.0.0.3", "10.0.0.2"), exp_pkt])
+
+        start = time.time()
+        matches = self.index.wait_for([PORT, PORT + 1], MATCH_FIELDS, values, timeout=10)
+        elapsed = time.time() - start
+        thread.join()
+
+        # Woken up by the dataplane on the matched packet, not on timeout
+        self.assertLess(elapsed, 5)
+        self.assertEqual(matches[PORT], [])
+        self.assertEqual([pkt.entry for pkt in matches[PORT + 1]],
+                         linear_scan(self.dataplane, PORT + 1, exp_pkt, MATCH_FIELDS))
+
+    def test_wait_for_settle_time(self):
+        exp_pkt = ip_pkt("10.0.0.1", "10.0.0.2")
+        values = [convert_pkt_to_dict(exp_pkt)[layer][field] for layer, field in MATCH_FIELDS]
+        self.dataplane.receive(PORT, exp_pkt)
+        thread = self.dataplane.receive_later(0.2, PORT, [exp_pkt])
+
+        start = time.time()
+        matches = self.index.wait_for([PORT], MATCH_FIELDS, values, timeout=10, settle_time=1)
+        elapsed = time.time() - start
+        thread.join()
+
+        # The packet received during settle_time is matched too, and settle_time restarts from it
+        self.assertEqual(len(matches[PORT]), 2)
+        self.assertGreaterEqual(elapsed, 1.2)
+        self.assertLess(elapsed, 5)
+
+    def test_wait_for_timeout(self):
+        self.dataplane.receive(PORT, ip_pkt("10.0.0.3", "10.0.0.2"))
+        values = ["10.0.0.1", "10.0.0.2"]
+
+        start = time.time()
+        matches = self.index.wait_for([PORT], MATCH_FIELDS, values, timeout=0.5)
+        elapsed = time.time() - start
+
+        self.assertEqual(matches, {PORT: []})
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertLess(elapsed, 5)
+
+
+class TestFilterPktBuffer(unittest.TestCase):
+    """Test cases for FilterPktBuffer using PacketIndex."""
+
+    def test_filter_pkt_in_buffer(self):
+        dataplane = FakeDataplane([PORT, PORT + 1])
+        ptfadapter = MagicMock()
+        ptfadapter.dataplane = dataplane
+        exp_pkt = ip_pkt("10.0.0.1", "10.0.0.2")
+        for dport in range(3):
+            dataplane.receive(PORT, ip_pkt("10.0.0.1", "10.0.0.2", dport))
+            dataplane.receive(PORT, ip_pkt("10.0.0.3", "10.0.0.2", dport))
+
+        filter_pkt_buffer = FilterPktBuffer(ptfadapter, exp_pkt, [PORT, PORT + 1], match_fields=MATCH_FIELDS,
+                                            timeout=1, settle_time=0)
+        diff = filter_pkt_buffer.filter_pkt_in_buffer()
+
+        matched = linear_scan(dataplane, PORT, exp_pkt, MATCH_FIELDS)
+        # The last matched packet is compared with the expected packet, it differs in the TCP destination port
+        self.assertEqual(bytes(filter_pkt_buffer.received_pkt), matched[-1][0])
+        self.assertEqual(filter_pkt_buffer.matched_index, {PORT: len(matched), PORT + 1: 0})
+        self.assertIn("TCP dport=2", diff)
+
+
+if __name__ == "__main__":
+    unittest.main()
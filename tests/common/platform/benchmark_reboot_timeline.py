@@ -0,0 +1,387 @@
+"""Benchmark of the post reboot analysis of syslog, bgpd.log and sairedis.rec.
+
+Compares the analysis which searched every message for every timeline regex, the way analyze_log_file and
+analyze_sairedis_rec did before the reboot timeline analyzer, with the reboot timeline analyzer streaming the
+log files, and verifies that both produce the same report.
+
+Recorded logs of a DUT may be passed with the --syslog, --bgpd-log and --sairedis-rec options, every option
+may be repeated for rotated files, oldest first. Otherwise logs of a warm reboot with FDB churn are generated,
+the older half of every log is written to a gzipped rotation.
+
+Usage:
+    python -m tests.common.platform.benchmark_reboot_timeline [--lines 200000] [--seed 0]
+    python -m tests.common.platform.benchmark_reboot_timeline --hostname <dut> --vendor brcm \
+        --syslog syslog.1.gz --syslog syslog --bgpd-log bgpd.log --sairedis-rec sairedis.rec
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from tests.common.platform.reboot_timeline import parse_timestamp, iter_log_lines, analyze_reboot_logs
+from tests.common.platform.reboot_timing_constants import SERVICE_PATTERNS, OTHER_PATTERNS, SAIREDIS_PATTERNS, \
+    FMT
+
+SYSLOG_FMT = "%b %d %H:%M:%S.%f"
+SAIREDIS_FMT = "%Y-%m-%d.%H:%M:%S.%f"
+SCAPY_MAC = "00:06:07:08:09:0A"
+
+
+def legacy_kexec_time(hostname, messages, result):
+    reboot_pattern = re.compile(
+        r'.* NOTICE (?:admin|root): Rebooting with /sbin/kexec -e to.*...')
+    reboot_time = "N/A"
+    for message in messages:
+        if re.search(reboot_pattern, message):
+            delim = "{}|{}".format(hostname, "sonic")
+            reboot_time = parse_timestamp(re.split(delim, message)[0].strip()).strftime(FMT)
+            continue
+    result["reboot_time"] = {
+        "timestamp": {"Start": reboot_time},
+    }
+
+
+def legacy_state_times(timestamp, state, state_times, first_after_offset=None):
+    time = timestamp.strftime(FMT)
+    state_name = state.split("|")[0].strip()
+    state_status = state.split("|")[1].strip()
+    state_dict = state_times.get(state_name, {"timestamp": {}})
+    timestamps = state_dict.get("timestamp")
+    if state_status in timestamps:
+        state_dict[state_status + " count"] = state_dict.get(state_status + " count") + 1
+        state_dict["last_occurence"] = time
+    elif first_after_offset:
+        state_dict[state_status + " count"] = 1
+        if parse_timestamp(first_after_offset) < parse_timestamp(time):
+            timestamps[state_status] = time
+    else:
+        state_dict[state_status + " count"] = 1
+        timestamps[state_status] = time
+    return {state_name: state_dict}
+
+
+def legacy_analyze_log_file(hostname, messages, result, offset_from_kexec, service_patterns, derived_patterns):
+    service_restart_times = dict()
+    if not messages:
+        return None
+
+    def service_time_check(message, status):
+        delim = "{}|{}".format(hostname, "sonic")
+        time = parse_timestamp(re.split(delim, message)[0].strip())
+        time = time.strftime(FMT)
+        service_name = message.split(status + " ")[1].split()[0]
+        service_name = service_name.upper()
+        if service_name == "ROUTER":
+            service_name = "RADV"
+        service_dict = service_restart_times.get(service_name, {"timestamp": {}})
+        timestamps = service_dict.get("timestamp")
+        if status in timestamps:
+            service_dict[status + " count"] = service_dict.get(status + " count") + 1
+        else:
+            service_dict[status + " count"] = 1
+        timestamps[status] = time
+        service_restart_times.update({service_name: service_dict})
+
+    for message in messages:
+        for status, pattern in list(service_patterns.items()):
+            if re.search(pattern, message):
+                service_time_check(message, status)
+                break
+        for state, pattern in list(derived_patterns.items()):
+            if re.search(pattern, message):
+                delim = "{}|{}".format(hostname, "sonic")
+                timestamp = parse_timestamp(re.split(delim, message)[0].strip())
+                state_name = state.split("|")[0].strip()
+                if state_name + "|End" not in list(derived_patterns.keys()):
+                    if "FDB_EVENT_OTHER_MAC_EXPIRY" in state_name or "FDB_EVENT_SCAPY_MAC_EXPIRY" in state_name:
+                        fdb_aging_disable_start = service_restart_times.get("FDB_AGING_DISABLE", {})\
+                            .get("timestamp", {}).get("Start")
+                        if not fdb_aging_disable_start:
+                            break
+                        first_after_offset = fdb_aging_disable_start
+                    else:
+                        first_after_offset = result.get("reboot_time", {}).get("timestamp", {}).get("Start")
+                    state_times = legacy_state_times(timestamp, state, offset_from_kexec,
+                                                     first_after_offset=first_after_offset)
+                    offset_from_kexec.update(state_times)
+                else:
+                    state_times = legacy_state_times(timestamp, state, service_restart_times)
+                    service_restart_times.update(state_times)
+                if "PORT_READY" not in state_name:
+                    break
+    for _, timings in list(service_restart_times.items()):
+        timestamps = timings["timestamp"]
+        timings["stop_time"] = (parse_timestamp(timestamps["Stopped"]) -
+                                parse_timestamp(timestamps["Stopping"])).total_seconds() \
+            if "Stopped" in timestamps and "Stopping" in timestamps else None
+
+        timings["start_time"] = (parse_timestamp(timestamps["Started"]) -
+                                 parse_timestamp(timestamps["Starting"])).total_seconds() \
+            if "Started" in timestamps and "Starting" in timestamps else None
+
+        if "Started" in timestamps and "Stopped" in timestamps:
+            timings["time_span"] = (parse_timestamp(timestamps["Started"]) -
+                                    parse_timestamp(timestamps["Stopped"])).total_seconds()
+        elif "Start" in timestamps and "End" in timestamps:
+            if "last_occurence" in timings:
+                timings["time_span"] = (parse_timestamp(timings["last_occurence"]) -
+                                        parse_timestamp(timestamps["Start"])).total_seconds()
+            else:
+                timings["time_span"] = (parse_timestamp(timestamps["End"]) -
+                                        parse_timestamp(timestamps["Start"])).total_seconds()
+
+    result["time_span"].update(service_restart_times)
+    result["offset_from_kexec"] = offset_from_kexec
+    return result
+
+
+def legacy_analyze_sairedis_rec(messages, result, offset_from_kexec):
+    sai_redis_state_times = dict()
+    for message in messages:
+        for state, pattern in list(SAIREDIS_PATTERNS.items()):
+            if re.search(pattern, message):
+                timestamp = datetime.strptime(message.split("|")[0].strip(), SAIREDIS_FMT)
+                state_name = state.split("|")[0].strip()
+                reboot_time = result.get("reboot_time", {}).get("timestamp", {}).get("Start")
+                if state_name + "|End" not in list(SAIREDIS_PATTERNS.keys()):
+                    if "FDB_EVENT_OTHER_MAC_EXPIRY" in state_name or "FDB_EVENT_SCAPY_MAC_EXPIRY" in state_name:
+                        fdb_aging_disable_start = result.get("time_span", {}).get("FDB_AGING_DISABLE", {})\
+                            .get("timestamp", {}).get("Start")
+                        if not fdb_aging_disable_start:
+                            break
+                        log_time = timestamp.strftime(FMT)
+                        if parse_timestamp(log_time) < parse_timestamp(fdb_aging_disable_start):
+                            break
+                        first_after_offset = fdb_aging_disable_start
+                    else:
+                        first_after_offset = result.get("reboot_time", {}).get("timestamp", {}).get("Start")
+                    state_times = legacy_state_times(timestamp, state, offset_from_kexec,
+                                                     first_after_offset=first_after_offset)
+                    offset_from_kexec.update(state_times)
+                else:
+                    state_times = legacy_state_times(timestamp, state, sai_redis_state_times,
+                                                     first_after_offset=reboot_time)
+                    sai_redis_state_times.update(state_times)
+
+    for _, timings in list(sai_redis_state_times.items()):
+        timestamps = timings["timestamp"]
+        if "Start" in timestamps and "End" in timestamps:
+            timings["time_span"] = (parse_timestamp(timestamps["End"]) -
+                                    parse_timestamp(timestamps["Start"])).total_seconds()
+
+    result["time_span"].update(sai_redis_state_times)
+    result["offset_from_kexec"] = offset_from_kexec
+
+
+def legacy_analyze(hostname, syslog, bgpd_log, sairedis_rec, service_patterns, derived_patterns):
+    result = {"time_span": dict(), "offset_from_kexec": dict()}
+    offset_from_kexec = dict()
+    legacy_kexec_time(hostname, syslog, result)
+    if result["reboot_time"]["timestamp"]["Start"] == "N/A":
+        return None
+    legacy_analyze_log_file(hostname, syslog, result, offset_from_kexec, service_patterns, derived_patterns)
+    legacy_analyze_log_file(hostname, bgpd_log, result, offset_from_kexec, service_patterns, derived_patterns)
+    legacy_analyze_sairedis_rec(sairedis_rec, result, offset_from_kexec)
+    reboot_start_time = result["reboot_time"]["timestamp"]["Start"]
+    for _, time_data in list(result["offset_from_kexec"].items()):
+        marker_start_time = time_data.get("timestamp", {}).get("Start")
+        if marker_start_time:
+            time_data["time_taken"] = (parse_timestamp(marker_start_time) -
+                                       parse_timestamp(reboot_start_time)).total_seconds()
+        else:
+            time_data["time_taken"] = "N/A"
+    return result
+
+
+def timeline_patterns(vendor, image):
+    derived_patterns = OrderedDict(OTHER_PATTERNS["COMMON"])
+    if vendor == "brcm":
+        derived_patterns.update(OTHER_PATTERNS["BRCM"])
+    elif vendor == "mlnx":
+        derived_patterns.update(OTHER_PATTERNS["MLNX"])
+    derived_patterns.update(OTHER_PATTERNS[image])
+    return OrderedDict(SERVICE_PATTERNS[image]), derived_patterns
+
+
+class LogGenerator(object):
+    """Generate syslog, bgpd.log and sairedis.rec of a warm reboot with FDB churn."""
+
+    def __init__(self, hostname, lines, seed):
+        self.hostname = hostname
+        self.lines = lines
+        self.rnd = random.Random(seed)
+        self.time = datetime(2024, 3, 14, 10, 0, 0)
+
+    def tick(self):
+        self.time += timedelta(microseconds=self.rnd.randint(1, 2000))
+        return self.time
+
+    def syslog(self, text):
+        return "{} {} {}".format(self.tick().strftime(SYSLOG_FMT), self.hostname, text)
+
+    def sairedis(self, text):
+        return "{}|{}".format(self.tick().strftime(SAIREDIS_FMT), text)
+
+    def fdb_event(self, mac):
+        return ('n|fdb_event|[{"fdb_entry":"{\\"bvid\\":\\"oid:0x260000000009c4\\",\\"mac\\":\\"' + mac +
+                '\\",\\"switch_id\\":\\"oid:0x21000000000000\\"}","fdb_event":"SAI_FDB_EVENT_LEARNED",'
+                '"list":[{"id":"SAI_FDB_ENTRY_ATTR_TYPE","value":"SAI_FDB_ENTRY_TYPE_DYNAMIC"},'
+                '{"id":"SAI_FDB_ENTRY_ATTR_BRIDGE_PORT_ID","value":"oid:0x3a000000000616"},'
+                '{"id":"SAI_FDB_ENTRY_ATTR_PACKET_ACTION","value":"SAI_PACKET_ACTION_FORWARD"}]}]')
+
+    def random_mac(self):
+        return "00:{:02X}:{:02X}:{:02X}:{:02X}:{:02X}".format(*[self.rnd.randint(0, 255) for _ in range(5)])
+
+    def generate(self):
+        services = ["swss", "bgp", "syncd", "teamd", "router advertiser", "database"]
+        syslog, bgpd_log, sairedis_rec = [], [], []
+        noise = ["INFO systemd[1]: session-{}.scope: Succeeded.",
+                 "NOTICE swss#orchagent: :- doTask: Ignore update of entry {}",
+                 "INFO dhcp_relay#supervisord: dhcrelay Forwarded BOOTREQUEST for {}",
+                 "NOTICE syncd#syncd: :- processEvent: event {} processed"]
+        for service in services:
+            syslog.append(self.syslog("INFO systemd[1]: Stopping {} service...".format(service)))
+            syslog.append(self.syslog("INFO systemd[1]: Stopped {} service.".format(service)))
+        syslog.append(self.syslog("NOTICE admin: Rebooting with /sbin/kexec -e to SONiC-OS-master ..."))
+        self.time += timedelta(seconds=30)
+        syslog.append(self.syslog("NOTICE swss#orchagent: :- setAgingFDB: Set switch oid:0x21 fdb_aging_time 0 sec"))
+        for service in services:
+            syslog.append(self.syslog("INFO systemd[1]: Starting {} service...".format(service)))
+        for index in range(32):
+            syslog.append(self.syslog("NOTICE swss#orchagent: :- initPort: Initialized port Ethernet{}".format(
+                index * 4)))
+        syslog.append(self.syslog("NOTICE swss#orchagent: :- notifySyncd: sending syncd: INIT_VIEW"))
+        syslog.append(self.syslog("NOTICE swss#orchagent: :- sai_redis_notify_syncd: switched ASIC to INIT VIEW"))
+        sairedis_rec.append(self.sairedis("c|SAI_OBJECT_TYPE_SWITCH:oid:0x21000000000000|SAI_SWITCH_ATTR_INIT=true"))
+        sairedis_rec.append(self.sairedis(
+            "g|SAI_OBJECT_TYPE_SWITCH:oid:0x21000000000000|SAI_SWITCH_ATTR_DEFAULT_VIRTUAL_ROUTER_ID=oid:0x0"))
+        syslog.append(self.syslog("NOTICE swss#orchagent: :- notifySyncd: sending syncd: APPLY_VIEW"))
+        syslog.append(self.syslog("NOTICE swss#orchagent: :- sai_redis_notify_syncd: switched ASIC to APPLY VIEW"))
+        syslog.append(self.syslog("NOTICE bgp#fpmsyncd: :- main: Warm-Restart timer started."))
+        for service in services:
+            syslog.append(self.syslog("INFO systemd[1]: Started {} service.".format(service)))
+
+        while len(syslog) + len(bgpd_log) + len(sairedis_rec) < self.lines:
+            choice = self.rnd.random()
+            if choice < 0.3:
+                syslog.append(self.syslog(self.rnd.choice(noise).format(self.rnd.randint(0, 10 ** 6))))
+            elif choice < 0.33:
+                port = "Ethernet{}".format(self.rnd.randint(0, 31) * 4)
+                syslog.append(self.syslog("NOTICE swss#orchagent: :- updatePortOperStatus: Port {} oper state set "
+                                          "from {} to up".format(port, self.rnd.choice(["down", "up"]))))
+            elif choice < 0.34:
+                syslog.append(self.syslog(
+                    "NOTICE teamd#tlm_teamd: :- try_add_lag: The LAG 'PortChannel{}' has been added.".format(
+                        self.rnd.randint(1, 8))))
+            elif choice < 0.36:
+                mac = SCAPY_MAC.replace(":", "-") if self.rnd.random() < 0.1 else self.random_mac().replace(":", "-")
+                syslog.append(self.syslog("NOTICE syncd#syncd: [none] SAI_API_FDB:_brcm_sai_fdb_event_cb:"
+                                          " fdbEvent: 0 for mac {}".format(mac)))
+            elif choice < 0.38:
+                bgpd_log.append(self.syslog("bgpd[45]: %ADJCHANGE: neighbor 10.0.0.{} in vrf default Up".format(
+                    self.rnd.randint(1, 64))))
+            elif choice < 0.40:
+                bgpd_log.append(self.syslog("bgpd[45]: rcvd End-of-RIB for IPv4 Unicast from 10.0.0.{}".format(
+                    self.rnd.randint(1, 64))))
+            elif choice < 0.45:
+                sairedis_rec.append(self.sairedis(
+                    "c|SAI_OBJECT_TYPE_NEIGHBOR_ENTRY:{\"ip\":\"10.0.0.%d\"}|SAI_NEIGHBOR_ENTRY_ATTR_DST_MAC_ADDRESS="
+                    "%s" % (self.rnd.randint(1, 64), self.random_mac())))
+            elif choice < 0.55:
+                sairedis_rec.append(self.sairedis(
+                    "c|SAI_OBJECT_TYPE_FDB_ENTRY:{\"bvid\":\"oid:0x26\",\"mac\":\"%s\"}|"
+                    "SAI_FDB_ENTRY_ATTR_TYPE=SAI_FDB_ENTRY_TYPE_DYNAMIC" % self.random_mac()))
+            elif choice < 0.56:
+                sairedis_rec.append(self.sairedis(
+                    "s|SAI_OBJECT_TYPE_ROUTE_ENTRY:{\"dest\":\"0.0.0.0/0\"}|"
+                    "SAI_ROUTE_ENTRY_ATTR_PACKET_ACTION=SAI_PACKET_ACTION_FORWARD"))
+            elif choice < 0.75:
+                mac = SCAPY_MAC if self.rnd.random() < 0.1 else self.random_mac()
+                sairedis_rec.append(self.sairedis(self.fdb_event(mac)))
+            else:
+                subnet, next_hop = self.rnd.randint(0, 255), self.rnd.randint(0, 255)
+                sairedis_rec.append(self.sairedis(
+                    "s|SAI_OBJECT_TYPE_ROUTE_ENTRY:{\"dest\":\"192.168.%d.0/24\"}|"
+                    "SAI_ROUTE_ENTRY_ATTR_NEXT_HOP_ID=oid:0x40000000006%02x" % (subnet, next_hop)))
+        syslog.append(self.syslog("NOTICE bgp#fpmsyncd: :- main: Warm-Restart reconciliation processed."))
+        syslog.append(self.syslog("NOTICE swss#orchagent: :- doAppSwitchTableTask: Set switch attribute "
+                                  "fdb_aging_time to 600"))
+        syslog.append(self.syslog("INFO WARMBOOT_FINALIZER: Wait for database to become ready..."))
+        syslog.append(self.syslog("INFO WARMBOOT_FINALIZER: Finalizing warmboot..."))
+        return syslog, bgpd_log, sairedis_rec
+
+
+def write_log(directory, name, lines):
+    """Write older half of the lines to gzipped rotation of the log, return the files oldest first."""
+    rotation = os.path.join(directory, name + ".1.gz")
+    current = os.path.join(directory, name)
+    half = len(lines) // 2
+    with gzip.open(rotation, "wt") as log_file:
+        log_file.writelines(line + "\n" for line in lines[:half])
+    with open(current, "w") as log_file:
+        log_file.writelines(line + "\n" for line in lines[half:])
+    return [rotation, current]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark post reboot analysis of the logs")
+    parser.add_argument("--syslog", action="append", help="Recorded syslog file, repeat for rotations")
+    parser.add_argument("--bgpd-log", action="append", help="Recorded bgpd.log file, repeat for rotations")
+    parser.add_argument("--sairedis-rec", action="append", help="Recorded sairedis.rec file, repeat for rotations")
+    parser.add_argument("--hostname", default="sonic", help="Hostname of the DUT of the recorded logs")
+    parser.add_argument("--vendor", choices=["brcm", "mlnx", "other"], default="brcm",
+                        help="Vendor of the DUT, selects platform specific regexes")
+    parser.add_argument("--image", choices=["LATEST", "201911"], default="LATEST",
+                        help="Image of the DUT, selects image specific regexes")
+    parser.add_argument("--lines", type=int, default=200000, help="Number of lines of the generated logs")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed used to generate the logs")
+    args = parser.parse_args()
+
+    service_patterns, derived_patterns = timeline_patterns(args.vendor, args.image)
+    directory = None
+    if args.syslog:
+        files = [args.syslog, args.bgpd_log or [], args.sairedis_rec or []]
+    else:
+        directory = tempfile.mkdtemp()
+        logs = LogGenerator(args.hostname, args.lines, args.seed).generate()
+        files = [write_log(directory, name, lines)
+                 for name, lines in zip(["syslog", "bgpd.log", "sairedis.rec"], logs)]
+
+    try:
+        start = time.time()
+        messages = [list(iter_log_lines(paths)) for paths in files]
+        read_time = time.time() - start
+        print("{} syslog, {} bgpd.log, {} sairedis.rec lines".format(*[len(lines) for lines in messages]))
+
+        start = time.time()
+        legacy_result = legacy_analyze(args.hostname, *messages, service_patterns=service_patterns,
+                                       derived_patterns=derived_patterns)
+        legacy_time = time.time() - start
+
+        start = time.time()
+        timeline_result = analyze_reboot_logs(args.hostname, *files, service_patterns=service_patterns,
+                                              derived_patterns=derived_patterns)
+        timeline_time = time.time() - start
+    finally:
+        if directory:
+            shutil.rmtree(directory)
+
+    if json.dumps(legacy_result) != json.dumps(timeline_result):
+        print("ERROR: analysis results differ")
+        return 1
+    print("search every regex:     {:.2f}s (excluding {:.2f}s reading the logs)".format(legacy_time, read_time))
+    print("reboot timeline:        {:.2f}s (including streaming the logs)".format(timeline_time))
+    print("speedup:                {:.1f}x".format(legacy_time / timeline_time))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,7 +7,6 @@ import os
 import json
 import glob
 import http.client
-from datetime import datetime
 from collections import OrderedDict
 from tests.common.utilities import wait_until
 from tests.common.helpers.assertions import pytest_assert
@@ -16,8 +15,10 @@ from tests.common.platform.transceiver_utils import parse_transceiver_info
 from tests.common.plugins.loganalyzer.loganalyzer import LogAnalyzer
 from tests.common.broadcom_data import is_broadcom_device
 from tests.common.mellanox_data import is_mellanox_device
-from tests.common.platform.reboot_timing_constants import SERVICE_PATTERNS, OTHER_PATTERNS, SAIREDIS_PATTERNS, \
+from tests.common.platform.reboot_timing_constants import SERVICE_PATTERNS, OTHER_PATTERNS, \
     OFFSET_ITEMS, TIME_SPAN_ITEMS, REQUIRED_PATTERNS
+from tests.common.platform.reboot_timeline import parse_timestamp, find_kexec_time, analyze_syslog, \
+    analyze_sairedis, set_kexec_offsets
 from tests.common.devices.duthosts import DutHosts
 from tests.common.plugins.ansible_fixtures import ansible_adhoc  # noqa: F401
 from tests.common.fixtures.duthost_utils import duthost_mgmt_ip  # noqa: F401
@@ -45,11 +46,6 @@ MGFX_XCVR_INTF = ['Ethernet48', 'Ethernet49', 'Ethernet50', 'Ethernet51']
 
 TEMPLATES_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), "templates")
 
-FMT = "%b %d %H:%M:%S.%f"
-FMT_YEAR = "%Y %b %d %H:%M:%S.%f"
-FMT_SHORT = "%b %d %H:%M:%S"
-FMT_ALT = "%Y-%m-%dT%H:%M:%S.%f%z"
-
 SERVER_FILE = 'platform_api_server.py'
 SERVER_PORT = 8000
 IPTABLES_PREPEND_RULE_CMD = 'iptables -I INPUT 1 -p tcp -m tcp --dport {} -j ACCEPT'.format(SERVER_PORT)
@@ -499,68 +495,14 @@ def overwrite_script_to_backup_logs(duthost, reboot_type, bgpd_log):
     duthost.shell(insert_backup_command)
 
 
-def _parse_timestamp(timestamp):
-    for format in [FMT, FMT_YEAR, FMT_SHORT, FMT_ALT]:
-        try:
-            time = datetime.strptime(timestamp, format)
-            return time
-        except ValueError:
-            continue
-    # Handling leap year FEB29 case, where year not provided causing exception
-    # if strptime fails for all format, check if its leap year
-    # ValueError exception will be raised for invalid cases for strptime
-    time = datetime.strptime(str(datetime.now().year) + " " + timestamp, FMT_YEAR)
-    return time
-
-
 def get_kexec_time(duthost, messages, result):
-    reboot_pattern = re.compile(
-        r'.* NOTICE (?:admin|root): Rebooting with /sbin/kexec -e to.*...')
-    reboot_time = "N/A"
-    logging.info("FINDING REBOOT PATTERN")
-    for message in messages:
-        # Get timestamp of reboot - Rebooting string
-        if re.search(reboot_pattern, message):
-            logging.info(
-                "FOUND REBOOT PATTERN for {}".format(duthost.hostname))
-            delim = "{}|{}".format(duthost.hostname, "sonic")
-            reboot_time = _parse_timestamp(re.split(delim, message)[
-                                           0].strip()).strftime(FMT)
-            continue
-    result["reboot_time"] = {
-        "timestamp": {"Start": reboot_time},
-    }
+    find_kexec_time(duthost.hostname, messages, result)
 
 
-def get_state_times(timestamp, state, state_times, first_after_offset=None):
-    time = timestamp.strftime(FMT)
-    state_name = state.split("|")[0].strip()
-    state_status = state.split("|")[1].strip()
-    state_dict = state_times.get(state_name, {"timestamp": {}})
-    timestamps = state_dict.get("timestamp")
-    if state_status in timestamps:
-        state_dict[state_status +
-                   " count"] = state_dict.get(state_status+" count") + 1
-        # capture last occcurence - useful in calculating events end time
-        state_dict["last_occurence"] = time
-    elif first_after_offset:
-        state_dict[state_status+" count"] = 1
-        # capture the first occurence as the one after offset timestamp and ignore the ones before
-        # this is useful to find time after a specific instance, for eg. - kexec time or FDB disable time.
-        if _parse_timestamp(first_after_offset) < _parse_timestamp(time):
-            timestamps[state_status] = time
-    else:
-        # only capture timestamp of first occurence of the entity. Otherwise, just increment the count above.
-        # this is useful in capturing start point. Eg., first neighbor entry, LAG ready, etc.
-        state_dict[state_status+" count"] = 1
-        timestamps[state_status] = time
-    return {state_name: state_dict}
-
-
-def analyze_log_file(duthost, messages, result, offset_from_kexec):
-    service_restart_times = dict()
-    derived_patterns = OTHER_PATTERNS.get("COMMON")
-    service_patterns = dict()
+def get_timeline_patterns_for_dut(duthost):
+    """Get the service and the derived state regexes for the platform and the image of the DUT, in match order."""
+    derived_patterns = OrderedDict(OTHER_PATTERNS.get("COMMON"))
+    service_patterns = OrderedDict()
     # get platform specific regexes
     if is_broadcom_device(duthost):
         derived_patterns.update(OTHER_PATTERNS.get("BRCM"))
@@ -573,131 +515,17 @@ def analyze_log_file(duthost, messages, result, offset_from_kexec):
     else:
         derived_patterns.update(OTHER_PATTERNS.get("LATEST"))
         service_patterns.update(SERVICE_PATTERNS.get("LATEST"))
+    return service_patterns, derived_patterns
 
-    if not messages:
-        logging.error("Expected messages not found in syslog")
-        return None
 
-    def service_time_check(message, status):
-        delim = "{}|{}".format(duthost.hostname, "sonic")
-        time = _parse_timestamp(re.split(delim, message)[0].strip())
-        time = time.strftime(FMT)
-        service_name = message.split(status + " ")[1].split()[0]
-        service_name = service_name.upper()
-        if service_name == "ROUTER":
-            service_name = "RADV"
-        service_dict = service_restart_times.get(
-            service_name, {"timestamp": {}})
-        timestamps = service_dict.get("timestamp")
-        if status in timestamps:
-            service_dict[status +
-                         " count"] = service_dict.get(status+" count") + 1
-        else:
-            service_dict[status+" count"] = 1
-        timestamps[status] = time
-        service_restart_times.update({service_name: service_dict})
-
-    for message in messages:
-        # Get stopping to started timestamps for services (swss, bgp, etc)
-        for status, pattern in list(service_patterns.items()):
-            if re.search(pattern, message):
-                service_time_check(message, status)
-                break
-        # Get timestamps of all other entities
-        for state, pattern in list(derived_patterns.items()):
-            if re.search(pattern, message):
-                delim = "{}|{}".format(duthost.hostname, "sonic")
-                timestamp = _parse_timestamp(
-                    re.split(delim, message)[0].strip())
-                state_name = state.split("|")[0].strip()
-                if state_name + "|End" not in list(derived_patterns.keys()):
-                    if "FDB_EVENT_OTHER_MAC_EXPIRY" in state_name or "FDB_EVENT_SCAPY_MAC_EXPIRY" in state_name:
-                        fdb_aging_disable_start = service_restart_times.get("FDB_AGING_DISABLE", {})\
-                            .get("timestamp", {}).get("Start")
-                        if not fdb_aging_disable_start:
-                            break
-                        first_after_offset = fdb_aging_disable_start
-                    else:
-                        first_after_offset = result.get("reboot_time", {}).get(
-                            "timestamp", {}).get("Start")
-                    state_times = get_state_times(timestamp, state, offset_from_kexec,
-                                                  first_after_offset=first_after_offset)
-                    offset_from_kexec.update(state_times)
-                else:
-                    state_times = get_state_times(
-                        timestamp, state, service_restart_times)
-                    service_restart_times.update(state_times)
-                if "PORT_READY" not in state_name:
-                    # If PORT_READY, don't break out of the for-loop here, because we want to
-                    # try to match the other regex as well
-                    break
-    # Calculate time that services took to stop/start
-    for _, timings in list(service_restart_times.items()):
-        timestamps = timings["timestamp"]
-        timings["stop_time"] = (_parse_timestamp(timestamps["Stopped"]) -
-                                _parse_timestamp(timestamps["Stopping"])).total_seconds() \
-            if "Stopped" in timestamps and "Stopping" in timestamps else None
-
-        timings["start_time"] = (_parse_timestamp(timestamps["Started"]) -
-                                 _parse_timestamp(timestamps["Starting"])).total_seconds() \
-            if "Started" in timestamps and "Starting" in timestamps else None
-
-        if "Started" in timestamps and "Stopped" in timestamps:
-            timings["time_span"] = (_parse_timestamp(timestamps["Started"]) -
-                                    _parse_timestamp(timestamps["Stopped"])).total_seconds()
-        elif "Start" in timestamps and "End" in timestamps:
-            if "last_occurence" in timings:
-                timings["time_span"] = (_parse_timestamp(timings["last_occurence"]) -
-                                        _parse_timestamp(timestamps["Start"])).total_seconds()
-            else:
-                timings["time_span"] = (_parse_timestamp(timestamps["End"]) -
-                                        _parse_timestamp(timestamps["Start"])).total_seconds()
-
-    result["time_span"].update(service_restart_times)
-    result["offset_from_kexec"] = offset_from_kexec
-    return result
+def analyze_log_file(duthost, messages, result, offset_from_kexec):
+    service_patterns, derived_patterns = get_timeline_patterns_for_dut(duthost)
+    return analyze_syslog(duthost.hostname, messages, result, offset_from_kexec,
+                          service_patterns, derived_patterns)
 
 
 def analyze_sairedis_rec(messages, result, offset_from_kexec):
-    sai_redis_state_times = dict()
-    for message in messages:
-        for state, pattern in list(SAIREDIS_PATTERNS.items()):
-            if re.search(pattern, message):
-                timestamp = datetime.strptime(message.split(
-                    "|")[0].strip(), "%Y-%m-%d.%H:%M:%S.%f")
-                state_name = state.split("|")[0].strip()
-                reboot_time = result.get("reboot_time", {}).get(
-                    "timestamp", {}).get("Start")
-                if state_name + "|End" not in list(SAIREDIS_PATTERNS.keys()):
-                    if "FDB_EVENT_OTHER_MAC_EXPIRY" in state_name or "FDB_EVENT_SCAPY_MAC_EXPIRY" in state_name:
-                        fdb_aging_disable_start = result.get("time_span", {}).get("FDB_AGING_DISABLE", {})\
-                            .get("timestamp", {}).get("Start")
-                        if not fdb_aging_disable_start:
-                            break
-                        # Ignore MAC learning events before FDB aging disable, as MAC learning is still allowed
-                        log_time = timestamp.strftime(FMT)
-                        if _parse_timestamp(log_time) < _parse_timestamp(fdb_aging_disable_start):
-                            break
-                        first_after_offset = fdb_aging_disable_start
-                    else:
-                        first_after_offset = result.get("reboot_time", {}).get(
-                            "timestamp", {}).get("Start")
-                    state_times = get_state_times(timestamp, state, offset_from_kexec,
-                                                  first_after_offset=first_after_offset)
-                    offset_from_kexec.update(state_times)
-                else:
-                    state_times = get_state_times(timestamp, state, sai_redis_state_times,
-                                                  first_after_offset=reboot_time)
-                    sai_redis_state_times.update(state_times)
-
-    for _, timings in list(sai_redis_state_times.items()):
-        timestamps = timings["timestamp"]
-        if "Start" in timestamps and "End" in timestamps:
-            timings["time_span"] = (_parse_timestamp(timestamps["End"]) -
-                                    _parse_timestamp(timestamps["Start"])).total_seconds()
-
-    result["time_span"].update(sai_redis_state_times)
-    result["offset_from_kexec"] = offset_from_kexec
+    analyze_sairedis(messages, result, offset_from_kexec)
 
 
 def get_report_summary(duthost, analyze_result, reboot_type, reboot_oper, base_os_version):
@@ -716,8 +544,8 @@ def get_report_summary(duthost, analyze_result, reboot_type, reboot_oper, base_o
             marker_start_time = timestamp.get(
                 "Start") if "Start" in timestamp else timestamp.get("Started")
             if reboot_start_time and reboot_start_time != "N/A" and marker_start_time:
-                time_taken = (_parse_timestamp(marker_start_time) -
-                              _parse_timestamp(reboot_start_time)).total_seconds()
+                time_taken = (parse_timestamp(marker_start_time) -
+                              parse_timestamp(reboot_start_time)).total_seconds()
         kexec_offsets_summary.update({entity.lower(): str(time_taken)})
 
     for entity in TIME_SPAN_ITEMS:
@@ -729,8 +557,8 @@ def get_report_summary(duthost, analyze_result, reboot_type, reboot_oper, base_o
                 entity).get("timestamp", {}).get("Start")
             marker_last_time = kexec_offsets.get(entity).get("last_occurence")
             if marker_first_time and marker_last_time:
-                time_taken = (_parse_timestamp(marker_last_time) -
-                              _parse_timestamp(marker_first_time)).total_seconds()
+                time_taken = (parse_timestamp(marker_last_time) -
+                              parse_timestamp(marker_first_time)).total_seconds()
         time_spans_summary.update({entity.lower(): str(time_taken)})
 
     lacp_sessions_dict = analyze_result.get("controlplane")
@@ -805,8 +633,8 @@ def verify_mac_jumping(test_name, timing_data, verification_errors):
         # and ends when SAI is instructed to enable MAC learning (warmboot recovery path)
         logging.info("Mac expiry for unexpected addresses started at {}".format(mac_expiry_start) +
                      " and FDB learning enabled at {}".format(fdb_aging_disable_end))
-        if _parse_timestamp(mac_expiry_start) > _parse_timestamp(fdb_aging_disable_start) and\
-           _parse_timestamp(mac_expiry_start) < _parse_timestamp(fdb_aging_disable_end):
+        if parse_timestamp(mac_expiry_start) > parse_timestamp(fdb_aging_disable_start) and\
+           parse_timestamp(mac_expiry_start) < parse_timestamp(fdb_aging_disable_end):
             verification_errors.append(
                 "Mac expiry detected during the window when FDB ageing was disabled")
 
@@ -964,15 +792,7 @@ def advanceboot_loganalyzer_factory(duthost, request, marker_postfix=None):
         analyze_sairedis_rec(sairedis_rec_messages,
                              analyze_result, offset_from_kexec)
 
-        for marker, time_data in list(analyze_result["offset_from_kexec"].items()):
-            marker_start_time = time_data.get("timestamp", {}).get("Start")
-            reboot_start_time = analyze_result.get(
-                "reboot_time", {}).get("timestamp", {}).get("Start")
-            if reboot_start_time and reboot_start_time != "N/A" and marker_start_time:
-                time_data["time_taken"] = (_parse_timestamp(marker_start_time) -
-                                           _parse_timestamp(reboot_start_time)).total_seconds()
-            else:
-                time_data["time_taken"] = "N/A"
+        set_kexec_offsets(analyze_result)
 
         if reboot_oper and not isinstance(reboot_oper, str):
             reboot_oper = type(reboot_oper).__name__
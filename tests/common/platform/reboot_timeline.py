@@ -0,0 +1,573 @@
+"""
+Reboot timeline analyzer
+
+Extracts the service restart and reboot milestone timestamps from syslog, bgpd.log and sairedis.rec.
+The timeline regexes of every log are compiled, with lazy wildcards, into one named-group matcher guarded by
+a prefilter of the literals the regexes require, so most lines are rejected by a single search. The timestamp
+of a matched line is parsed once into integer microseconds and all the comparisons and time spans are computed
+on these numbers.
+Logs may be passed as lists of messages or streamed from files, including gzipped rotations.
+
+The analysis results have the same "time_span" and "offset_from_kexec" structures, with timestamps formatted
+as FMT, as the results of the post reboot analysis always had.
+"""
+import glob
+import gzip
+import logging
+import os
+import re
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from tests.common.platform.reboot_timing_constants import FMT, FMT_YEAR, FMT_SHORT, FMT_ALT, \
+    SAIREDIS_PATTERNS
+
+try:
+    import re._parser as sre_parse
+except ImportError:
+    # Python < 3.11
+    import sre_parse
+
+logger = logging.getLogger(__name__)
+
+KEXEC_PATTERN = re.compile(r'.* NOTICE (?:admin|root): Rebooting with /sbin/kexec -e to.*...')
+KEXEC_LITERAL = "Rebooting with /sbin/kexec -e to"
+SAIREDIS_FMT = "%Y-%m-%d.%H:%M:%S.%f"
+FDB_EXPIRY_STATES = ["FDB_EVENT_OTHER_MAC_EXPIRY", "FDB_EVENT_SCAPY_MAC_EXPIRY"]
+
+_EPOCH = datetime(1900, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+_MONTHS = {name: index for index, name in enumerate(
+    ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"], 1)}
+_SYSLOG_TIMESTAMP = re.compile(r'([A-Z][a-z]{2})\s+(\d{1,2})\s+(\d{1,2}):(\d{1,2}):(\d{1,2})\.(\d{1,6})$')
+_SAIREDIS_TIMESTAMP = re.compile(r'\d{4}-(\d{1,2})-(\d{1,2})\.(\d{1,2}):(\d{1,2}):(\d{1,2})\.(\d{1,6})$')
+_ROTATION_SUFFIX = re.compile(r'\.(\d+)(\.gz)?$')
+
+TimelineState = namedtuple("TimelineState", ["key", "name", "status", "has_end", "fdb_expiry", "port_ready"])
+
+
+def parse_timestamp(timestamp):
+    for format in [FMT, FMT_YEAR, FMT_SHORT, FMT_ALT]:
+        try:
+            time = datetime.strptime(timestamp, format)
+            return time
+        except ValueError:
+            continue
+    # Handling leap year FEB29 case, where year not provided causing exception
+    # if strptime fails for all format, check if its leap year
+    # ValueError exception will be raised for invalid cases for strptime
+    time = datetime.strptime(str(datetime.now().year) + " " + timestamp, FMT_YEAR)
+    return time
+
+
+def _epoch(time):
+    """
+    Convert datetime to microseconds since the epoch of the FMT timestamps.
+
+    Timeline timestamps are kept as FMT strings, which have no year, so the datetime is converted the way
+    parse_timestamp() would parse it back from its FMT string.
+    """
+    try:
+        time = time.replace(year=1900, tzinfo=None)
+    except ValueError:
+        time = parse_timestamp(time.strftime(FMT))
+    return (time - _EPOCH) // _MICROSECOND
+
+
+def timestamp_epoch(timestamp):
+    """Parse syslog timestamp into microseconds since the epoch of the FMT timestamps."""
+    match = _SYSLOG_TIMESTAMP.match(timestamp)
+    if match and match.group(1) in _MONTHS:
+        day, hour, minute, second, fraction = match.groups()[1:]
+        try:
+            time = datetime(1900, _MONTHS[match.group(1)], int(day), int(hour), int(minute), int(second),
+                            int(fraction.ljust(6, "0")))
+            return (time - _EPOCH) // _MICROSECOND
+        except ValueError:
+            pass
+    return _epoch(parse_timestamp(timestamp))
+
+
+def sairedis_timestamp_epoch(timestamp):
+    """Parse sairedis.rec timestamp into microseconds since the epoch of the FMT timestamps."""
+    match = _SAIREDIS_TIMESTAMP.match(timestamp)
+    if match:
+        month, day, hour, minute, second, fraction = match.groups()
+        try:
+            time = datetime(1900, int(month), int(day), int(hour), int(minute), int(second),
+                            int(fraction.ljust(6, "0")))
+            return (time - _EPOCH) // _MICROSECOND
+        except ValueError:
+            pass
+    return _epoch(datetime.strptime(timestamp, SAIREDIS_FMT))
+
+
+def format_epoch(epoch):
+    return (_EPOCH + timedelta(microseconds=epoch)).strftime(FMT)
+
+
+def _required_literals(parsed):
+    """Get literals one of which is present in every line matching the parsed regex, or None."""
+    if len(parsed) == 1:
+        op, av = parsed[0]
+        if op == sre_parse.BRANCH:
+            literals = []
+            for branch in av[1]:
+                branch_literals = _required_literals(branch)
+                if not branch_literals:
+                    return None
+                literals.extend(branch_literals)
+            return literals
+        if op == sre_parse.SUBPATTERN:
+            return _required_literals(av[-1])
+
+    longest = ''
+    current = []
+    for op, av in parsed:
+        if op == sre_parse.LITERAL:
+            current.append(chr(av))
+            continue
+        if len(current) > len(longest):
+            longest = ''.join(current)
+        current = []
+    if len(current) > len(longest):
+        longest = ''.join(current)
+    return [longest] if longest else None
+
+
+def required_literals(pattern):
+    """Get literals one of which is present in every line matching the regex, or None if there are none."""
+    source = getattr(pattern, "pattern", pattern)
+    if getattr(pattern, "flags", 0) & (re.IGNORECASE | re.VERBOSE):
+        return None
+    try:
+        parsed = sre_parse.parse(source)
+    except re.error:
+        return None
+    if parsed.state.flags & (re.IGNORECASE | re.VERBOSE):
+        return None
+    return _required_literals(parsed)
+
+
+def lazy_wildcards(source):
+    """
+    Make the ".*" wildcards of the regex lazy.
+
+    Whether a line matches a regex doesn't depend on the wildcards being greedy or lazy, but a greedy
+    wildcard first consumes the rest of the line and then backtracks to the literal which follows it.
+    Regexes with several wildcards backtrack over the line for each of them.
+    """
+    result = []
+    index = 0
+    class_start = None
+    while index < len(source):
+        char = source[index]
+        if char == "\\":
+            result.append(source[index:index + 2])
+            index += 2
+            continue
+        result.append(char)
+        index += 1
+        if class_start is not None:
+            # "]" right after "[" or "[^" is a literal
+            if char == "]" and index - 1 > class_start:
+                class_start = None
+        elif char == "[":
+            class_start = index + 1 if source[index:index + 1] == "^" else index
+        elif char == "." and source[index:index + 1] == "*" and source[index + 1:index + 2] not in ("?", "+"):
+            result.append("*?")
+            index += 1
+    return "".join(result)
+
+
+class TimelinePatterns(object):
+    """
+    Ordered timeline regexes compiled into one named-group matcher.
+
+    Every regex becomes a named alternative of the matcher. The regexes start with ".*", so matching the
+    alternation at the beginning of a line finds the first regex, in order, which the line matches anywhere.
+    Only the regexes whose required literals are present in the line are the alternatives of the matcher,
+    matchers are compiled once for every such set of candidate regexes.
+    """
+
+    def __init__(self, patterns):
+        self.keys = list(patterns.keys())
+        self.states = []
+        for key in self.keys:
+            parts = key.split("|")
+            name = parts[0].strip()
+            self.states.append(TimelineState(
+                key=key,
+                name=name,
+                status=parts[1].strip() if len(parts) > 1 else None,
+                has_end=name + "|End" in patterns,
+                fdb_expiry=any(state in name for state in FDB_EXPIRY_STATES),
+                port_ready="PORT_READY" in name))
+
+        self._sources = []
+        for pattern in patterns.values():
+            source = getattr(pattern, "pattern", pattern)
+            if not source.startswith(".*"):
+                source = "(?s:.*?)(?:" + source + ")"
+            self._sources.append(lazy_wildcards(source))
+        self._matchers = {}
+
+        self._unfiltered = set()
+        literal_indexes = {}
+        for index, pattern in enumerate(patterns.values()):
+            literals = required_literals(pattern)
+            if literals is None:
+                self._unfiltered.add(index)
+                continue
+            for literal in literals:
+                literal_indexes.setdefault(literal, []).append(index)
+        self._literal_indexes = list(literal_indexes.items())
+        self.literals = set(literal_indexes) if not self._unfiltered else None
+
+    def matcher(self, candidates):
+        """Get the matcher of the candidate regexes, given as a tuple of their indexes."""
+        matcher = self._matchers.get(candidates)
+        if matcher is None:
+            matcher = re.compile("|".join("(?P<p{}>{})".format(index, self._sources[index])
+                                          for index in candidates))
+            self._matchers[candidates] = matcher
+        return matcher
+
+    def candidates(self, line):
+        """Get indexes of the regexes whose required literals are present in the line."""
+        candidates = set(self._unfiltered)
+        for literal, indexes in self._literal_indexes:
+            if literal in line:
+                candidates.update(indexes)
+        return tuple(sorted(candidates))
+
+    def matches(self, line):
+        """
+        Yield indexes of the regexes which match the line, in order.
+
+        The next regex is only searched when iteration continues, so the caller stops matching by breaking out.
+        """
+        candidates = self.candidates(line)
+        while candidates:
+            match = self.matcher(candidates).match(line)
+            if match is None:
+                return
+            index = int(match.lastgroup[1:])
+            yield index
+            candidates = candidates[candidates.index(index) + 1:]
+
+
+def build_prefilter(*pattern_sets):
+    """
+    Compile the literals required by the pattern sets into one regex.
+
+    @return: Compiled regex or None if some regex has no required literal and can't be prefiltered.
+    """
+    literals = set()
+    for patterns in pattern_sets:
+        if patterns.literals is None:
+            return None
+        literals.update(patterns.literals)
+    return re.compile("|".join(re.escape(literal) for literal in sorted(literals, key=len, reverse=True)))
+
+
+_timeline_patterns_cache = {}
+
+
+def get_timeline_patterns(patterns):
+    """Get compiled TimelinePatterns for the ordered dict of regexes, compiled sets are cached."""
+    key = tuple((name, getattr(pattern, "pattern", pattern)) for name, pattern in patterns.items())
+    timeline_patterns = _timeline_patterns_cache.get(key)
+    if timeline_patterns is None:
+        timeline_patterns = TimelinePatterns(patterns)
+        _timeline_patterns_cache[key] = timeline_patterns
+    return timeline_patterns
+
+
+class RebootTimeline(object):
+    """
+    Timestamps of the reboot timeline states, kept as FMT strings in the result dicts and as numbers internally.
+
+    Counters are updated on every occurrence of a state, while strings are only formatted when a timestamp is
+    set for the first time. The "last_occurence" timestamps, which change on every occurrence, are kept as
+    numbers while a log is analyzed and formatted when the analysis of the log is done.
+    """
+
+    def __init__(self):
+        self._epochs = {}
+        self._pending = {}
+
+    def epoch(self, timestamp):
+        """Get number of the FMT timestamp, or the pending "last_occurence" number itself."""
+        if isinstance(timestamp, int):
+            return timestamp
+        epoch = self._epochs.get(timestamp)
+        if epoch is None:
+            epoch = timestamp_epoch(timestamp)
+            self._epochs[timestamp] = epoch
+        return epoch
+
+    def format(self, epoch):
+        timestamp = format_epoch(epoch)
+        self._epochs[timestamp] = epoch
+        return timestamp
+
+    def record(self, state_times, state, epoch, first_after_offset=None):
+        """
+        Record occurrence of the state in state_times.
+
+        Only the first occurrence of the state sets its timestamp, or the first occurrence after
+        first_after_offset, if it's given. Eg., kexec time or FDB disable time.
+        """
+        state_dict = state_times.get(state.name)
+        if state_dict is None:
+            state_dict = {"timestamp": {}}
+            state_times[state.name] = state_dict
+        timestamps = state_dict["timestamp"]
+        if state.status in timestamps:
+            state_dict[state.status + " count"] += 1
+            # capture last occcurence - useful in calculating events end time
+            state_dict["last_occurence"] = epoch
+            self._pending[id(state_dict)] = state_dict
+        elif first_after_offset:
+            state_dict[state.status + " count"] = 1
+            # capture the first occurence as the one after offset timestamp and ignore the ones before
+            if self.epoch(first_after_offset) < epoch:
+                timestamps[state.status] = self.format(epoch)
+        else:
+            # only capture timestamp of first occurence of the entity. Otherwise, just increment the count above.
+            state_dict[state.status + " count"] = 1
+            timestamps[state.status] = self.format(epoch)
+
+    def seconds(self, end, start):
+        return (self.epoch(end) - self.epoch(start)) / 10 ** 6
+
+    def flush(self):
+        """Format the pending "last_occurence" timestamps."""
+        for state_dict in self._pending.values():
+            if isinstance(state_dict.get("last_occurence"), int):
+                state_dict["last_occurence"] = self.format(state_dict["last_occurence"])
+        self._pending = {}
+
+
+def _message_epoch(delimiter, message):
+    return timestamp_epoch(delimiter.split(message, 1)[0].strip())
+
+
+def find_kexec_time(hostname, messages, result):
+    """Set the timestamp of the last kexec reboot message in syslog, or N/A, as reboot_time of the result."""
+    delimiter = re.compile("{}|{}".format(hostname, "sonic"))
+    reboot_time = "N/A"
+    logger.info("FINDING REBOOT PATTERN")
+    for message in messages:
+        # Get timestamp of reboot - Rebooting string
+        if KEXEC_LITERAL in message and KEXEC_PATTERN.search(message):
+            logger.info("FOUND REBOOT PATTERN for {}".format(hostname))
+            reboot_time = format_epoch(_message_epoch(delimiter, message))
+    result["reboot_time"] = {
+        "timestamp": {"Start": reboot_time},
+    }
+
+
+def analyze_syslog(hostname, messages, result, offset_from_kexec, service_patterns, derived_patterns):
+    """
+    Analyze timeline of services and derived states in syslog or bgpd.log messages.
+
+    @param hostname: Hostname of the DUT, the timestamp of a message is the part before the hostname
+    @param messages: List or iterable of the log messages
+    @param result: Analysis result with reboot_time, time spans of services and derived states are added to it
+    @param offset_from_kexec: Timestamps of the derived states without End, relative to the kexec time
+    @param service_patterns: Ordered dict of the service status regexes (Stopping, Stopped, Starting, Started)
+    @param derived_patterns: Ordered dict of the derived state regexes ("STATE|Start", "STATE|End")
+    @return: result or None if there were no messages
+    """
+    service_restart_times = dict()
+    services = get_timeline_patterns(service_patterns)
+    derived = get_timeline_patterns(derived_patterns)
+    prefilter = build_prefilter(services, derived)
+    delimiter = re.compile("{}|{}".format(hostname, "sonic"))
+    reboot_time = result.get("reboot_time", {}).get("timestamp", {}).get("Start")
+    timeline = RebootTimeline()
+
+    analyzed = False
+    for message in messages:
+        analyzed = True
+        if prefilter is not None and prefilter.search(message) is None:
+            continue
+        epoch = None
+
+        # Get stopping to started timestamps for services (swss, bgp, etc)
+        for index in services.matches(message):
+            status = services.keys[index]
+            epoch = _message_epoch(delimiter, message)
+            service_name = message.split(status + " ")[1].split()[0].upper()
+            if service_name == "ROUTER":
+                service_name = "RADV"
+            service_dict = service_restart_times.get(service_name)
+            if service_dict is None:
+                service_dict = {"timestamp": {}}
+                service_restart_times[service_name] = service_dict
+            timestamps = service_dict["timestamp"]
+            if status in timestamps:
+                service_dict[status + " count"] += 1
+            else:
+                service_dict[status + " count"] = 1
+            timestamps[status] = timeline.format(epoch)
+            break
+
+        # Get timestamps of all other entities
+        for index in derived.matches(message):
+            state = derived.states[index]
+            if epoch is None:
+                epoch = _message_epoch(delimiter, message)
+            if not state.has_end:
+                if state.fdb_expiry:
+                    first_after_offset = service_restart_times.get("FDB_AGING_DISABLE", {})\
+                        .get("timestamp", {}).get("Start")
+                    if not first_after_offset:
+                        break
+                else:
+                    first_after_offset = reboot_time
+                timeline.record(offset_from_kexec, state, epoch, first_after_offset=first_after_offset)
+            else:
+                timeline.record(service_restart_times, state, epoch)
+            if not state.port_ready:
+                # If PORT_READY, don't stop here, because we want to try to match the other regex as well
+                break
+
+    if not analyzed:
+        logger.error("Expected messages not found in syslog")
+        return None
+
+    # Calculate time that services took to stop/start
+    for _, timings in list(service_restart_times.items()):
+        timestamps = timings["timestamp"]
+        timings["stop_time"] = timeline.seconds(timestamps["Stopped"], timestamps["Stopping"]) \
+            if "Stopped" in timestamps and "Stopping" in timestamps else None
+
+        timings["start_time"] = timeline.seconds(timestamps["Started"], timestamps["Starting"]) \
+            if "Started" in timestamps and "Starting" in timestamps else None
+
+        if "Started" in timestamps and "Stopped" in timestamps:
+            timings["time_span"] = timeline.seconds(timestamps["Started"], timestamps["Stopped"])
+        elif "Start" in timestamps and "End" in timestamps:
+            if "last_occurence" in timings:
+                timings["time_span"] = timeline.seconds(timings["last_occurence"], timestamps["Start"])
+            else:
+                timings["time_span"] = timeline.seconds(timestamps["End"], timestamps["Start"])
+    timeline.flush()
+
+    result["time_span"].update(service_restart_times)
+    result["offset_from_kexec"] = offset_from_kexec
+    return result
+
+
+def analyze_sairedis(messages, result, offset_from_kexec, patterns=SAIREDIS_PATTERNS):
+    """
+    Analyze timeline of SAI operations in sairedis.rec messages.
+
+    Must be called after the syslog is analyzed, FDB events are only counted after FDB aging is disabled.
+    """
+    sai_redis_state_times = dict()
+    sairedis = get_timeline_patterns(patterns)
+    prefilter = build_prefilter(sairedis)
+    reboot_time = result.get("reboot_time", {}).get("timestamp", {}).get("Start")
+    fdb_aging_disable_start = result.get("time_span", {}).get("FDB_AGING_DISABLE", {})\
+        .get("timestamp", {}).get("Start")
+    timeline = RebootTimeline()
+
+    for message in messages:
+        if prefilter is not None and prefilter.search(message) is None:
+            continue
+        epoch = None
+        for index in sairedis.matches(message):
+            state = sairedis.states[index]
+            if epoch is None:
+                epoch = sairedis_timestamp_epoch(message.split("|", 1)[0].strip())
+            if not state.has_end:
+                if state.fdb_expiry:
+                    if not fdb_aging_disable_start:
+                        break
+                    # Ignore MAC learning events before FDB aging disable, as MAC learning is still allowed
+                    if epoch < timeline.epoch(fdb_aging_disable_start):
+                        break
+                    first_after_offset = fdb_aging_disable_start
+                else:
+                    first_after_offset = reboot_time
+                timeline.record(offset_from_kexec, state, epoch, first_after_offset=first_after_offset)
+            else:
+                timeline.record(sai_redis_state_times, state, epoch, first_after_offset=reboot_time)
+
+    for _, timings in list(sai_redis_state_times.items()):
+        timestamps = timings["timestamp"]
+        if "Start" in timestamps and "End" in timestamps:
+            timings["time_span"] = timeline.seconds(timestamps["End"], timestamps["Start"])
+    timeline.flush()
+
+    result["time_span"].update(sai_redis_state_times)
+    result["offset_from_kexec"] = offset_from_kexec
+
+
+def set_kexec_offsets(result):
+    """Set time_taken from the kexec reboot to the start of every state of offset_from_kexec."""
+    reboot_start_time = result.get("reboot_time", {}).get("timestamp", {}).get("Start")
+    timeline = RebootTimeline()
+    for _, time_data in list(result["offset_from_kexec"].items()):
+        marker_start_time = time_data.get("timestamp", {}).get("Start")
+        if reboot_start_time and reboot_start_time != "N/A" and marker_start_time:
+            time_data["time_taken"] = timeline.seconds(marker_start_time, reboot_start_time)
+        else:
+            time_data["time_taken"] = "N/A"
+
+
+def rotated_log_files(path):
+    """
+    Get the log file and its rotations, oldest first.
+
+    For example: syslog.2.gz, syslog.1, syslog.
+    """
+    rotations = []
+    for rotation in glob.glob(glob.escape(path) + ".*"):
+        match = _ROTATION_SUFFIX.match(rotation[len(path):])
+        if match:
+            rotations.append((int(match.group(1)), rotation))
+    files = [rotation for _, rotation in sorted(rotations, reverse=True)]
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def iter_log_lines(paths):
+    """Stream lines of the log files, the files with .gz suffix are decompressed on the fly."""
+    if isinstance(paths, str):
+        paths = [paths]
+    for path in paths:
+        opener = gzip.open if path.endswith(".gz") else open
+        with opener(path, "rt", errors="replace") as log_file:
+            for line in log_file:
+                yield line.rstrip("\n")
+
+
+def analyze_reboot_logs(hostname, syslog, bgpd_log, sairedis_rec, service_patterns, derived_patterns):
+    """
+    Analyze reboot timeline from log files.
+
+    @param syslog, bgpd_log, sairedis_rec: Log file path or list of paths, see rotated_log_files()
+    @return: Analysis result with reboot_time, time_span and offset_from_kexec, or None if no kexec reboot
+             was found in syslog
+    """
+    result = {"time_span": dict(), "offset_from_kexec": dict()}
+    offset_from_kexec = dict()
+
+    find_kexec_time(hostname, iter_log_lines(syslog), result)
+    if result["reboot_time"]["timestamp"]["Start"] == "N/A":
+        logger.error("kexec regex \"Rebooting with /sbin/kexec\" not found in syslog")
+        return None
+
+    # sairedis.rec analysis uses FDB_AGING_DISABLE from syslog and must be done after analyzing syslog
+    analyze_syslog(hostname, iter_log_lines(syslog), result, offset_from_kexec, service_patterns, derived_patterns)
+    analyze_syslog(hostname, iter_log_lines(bgpd_log), result, offset_from_kexec, service_patterns,
+                   derived_patterns)
+    analyze_sairedis(iter_log_lines(sairedis_rec), result, offset_from_kexec)
+    set_kexec_offsets(result)
+    return result
@@ -1,5 +1,10 @@
 import re
 
+FMT = "%b %d %H:%M:%S.%f"
+FMT_YEAR = "%Y %b %d %H:%M:%S.%f"
+FMT_SHORT = "%b %d %H:%M:%S"
+FMT_ALT = "%Y-%m-%dT%H:%M:%S.%f%z"
+
 SERVICE_PATTERNS = {
     "LATEST": {
         "Stopping": re.compile(r'.*Stopping.*(service|container).*'),
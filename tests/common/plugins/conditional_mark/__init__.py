@@ -14,12 +14,14 @@ import pytest
 
 from tests.common.testbed import TestbedInfo
 from .issue import check_issues
+from .condition_index import ConditionIndex
 from tests.common.utilities import get_duts_from_host_pattern
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_CONDITIONS_FILE = 'common/plugins/conditional_mark/tests_mark_conditions*.yaml'
 ASIC_NAME_PATH = '/../../../../ansible/group_vars/sonic/variables'
+ISSUE_URL_PATTERN = re.compile('https?://[^ )]+')
 MARK_CONDITIONS_CONSTANTS = {
     "QOS_SAI_TOPO": ['t0', 't0-64', 't0-116', 't0-118', 't0-35', 't0-56', 't0-80',
                      't0-standalone-32', 't0-standalone-64', 't0-standalone-128', 't0-standalone-256',
@@ -423,45 +425,25 @@ def load_basic_facts(dut_name, session):
     return results
 
 
-def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, basic_facts):
+def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, basic_facts, evaluator=None):
     """Find all matches of the given test case name in the conditions list.
 
     Args:
         nodeid (str): Full test case name
         conditions (list): List of conditions
+        evaluator (ConditionEvaluator): Evaluator reused for all the test cases of the session, so that every
+            condition is evaluated only once. If it is None, a new evaluator is created for this test case.
 
     Returns:
         list: All match test case name or None if not found
     """
-    all_matches = []
     max_length = -1
     conditional_marks = {}
     matches = []
+    if evaluator is None:
+        evaluator = ConditionEvaluator(basic_facts, session)
 
-    for condition in conditions:
-        # condition is a dict which has only one item, so we use condition.keys()[0] to get its key.
-        condition_entry = list(condition.keys())[0]
-        condition_items = condition[condition_entry]
-        if "regex" in condition_items.keys():
-            assert isinstance(condition_items["regex"], bool), \
-                "The value of 'regex' in the mark conditions yaml should be bool type."
-            if condition_items["regex"] is True:
-                match = re.search(condition_entry, nodeid)
-            else:
-                match = None
-
-        elif "use_longest" in condition_items.keys():
-            assert isinstance(condition_items["use_longest"], bool), \
-                "The value of 'use_longest' in the mark conditions yaml should be bool type."
-            if nodeid.startswith(condition_entry) and condition_items["use_longest"] is True:
-                all_matches = []
-
-            match = nodeid.startswith(condition_entry)
-        else:
-            match = nodeid.startswith(condition_entry)
-
-        if match:
-            all_matches.append(condition)
+    all_matches = ConditionIndex.get(conditions).find(nodeid)
 
     for match in all_matches:
         case_starting_substring = list(match.keys())[0]
@@ -474,7 +456,8 @@ def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, ba
             condition_value = evaluate_conditions(dynamic_update_skip_reason, match[case_starting_substring][mark],
                                                   match[case_starting_substring][mark].get('conditions'), basic_facts,
                                                   match[case_starting_substring][mark].get(
-                                                      'conditions_logical_operator', 'AND').upper(), session)
+                                                      'conditions_logical_operator', 'AND').upper(), session,
+                                                  evaluator=evaluator)
 
             if condition_value:
                 if mark in conditional_marks:
@@ -502,7 +485,68 @@ def find_all_matches(nodeid, conditions, session, dynamic_update_skip_reason, ba
     return matches
 
 
-def update_issue_status(condition_str, session):
+def find_issues(condition_str):
+    """Find issue URLs in a condition string."""
+    return ISSUE_URL_PATTERN.findall(condition_str)
+
+
+def find_matched_conditions(items, conditions):
+    """Find the entries of the conditions matching at least one of the collected test cases.
+
+    Args:
+        items (list): List of pytest Item objects.
+        conditions (list): List of conditions loaded from mark conditions files.
+
+    Returns:
+        list: Matching entries of the conditions list, every entry once.
+    """
+    index = ConditionIndex.get(conditions)
+    matched = {}
+    for item in items:
+        for condition in index.find(item.nodeid):
+            matched[id(condition)] = condition
+    return list(matched.values())
+
+
+def load_issue_status(conditions, session):
+    """Check the state of all the issues referenced by the conditions at once.
+
+    Issues not found in the cached 'ISSUE_STATUS' are checked by a single call of check_issues, which checks
+    them in parallel, instead of one call per evaluated condition. Only the conditions matching the collected
+    test cases should be passed, see find_matched_conditions: checking the issues of all the mark conditions files
+    would exceed the rate limit of unauthenticated GitHub API requests, and issues failed to be checked are
+    considered active.
+
+    Args:
+        conditions (list): List of conditions to check the issues of.
+        session (obj): Pytest session object, for getting cached data.
+
+    Returns:
+        dict: Issue state check result. Key is issue URL, value is either True or False based on issue state.
+    """
+    issues = set()
+    for condition in conditions:
+        for mark_details in list(condition.values())[0].values():
+            if not isinstance(mark_details, dict):
+                continue
+            mark_conditions = mark_details.get('conditions', None)
+            if not isinstance(mark_conditions, list):
+                mark_conditions = [mark_conditions]
+            for condition_str in mark_conditions:
+                if isinstance(condition_str, str):
+                    issues.update(find_issues(condition_str))
+
+    issue_status_cache = session.config.cache.get('ISSUE_STATUS', {})
+    unknown_issues = sorted(issue_url for issue_url in issues if issue_url not in issue_status_cache)
+    if unknown_issues:
+        logger.info('Checking state of {} issues'.format(len(unknown_issues)))
+        proxies = session.config.cache.get('PROXIES', {})
+        issue_status_cache.update(check_issues(unknown_issues, proxies=proxies))
+        session.config.cache.set('ISSUE_STATUS', issue_status_cache)
+    return issue_status_cache
+
+
+def update_issue_status(condition_str, session, issue_status=None):
     """Replace issue URL with 'True' or 'False' based on its active state.
 
     If there is an issue URL is found, this function will try to query state of the issue and replace the URL
@@ -513,20 +557,22 @@ def update_issue_status(condition_str, session):
     Args:
         condition_str (str): Condition string that may contain issue URLs.
         session (obj): Pytest session object, for getting cached data.
+        issue_status (dict): Issue state loaded by load_issue_status. If it is None, the issue state is read from
+            the cached 'ISSUE_STATUS'.
 
     Returns:
         str: New condition string with issue URLs already replaced with 'True' or 'False'.
     """
-    issues = re.findall('https?://[^ )]+', condition_str)
+    issues = find_issues(condition_str)
     if not issues:
         logger.debug('No issue specified in condition')
         return condition_str
 
-    issue_status_cache = session.config.cache.get('ISSUE_STATUS', {})
-    proxies = session.config.cache.get('PROXIES', {})
+    issue_status_cache = session.config.cache.get('ISSUE_STATUS', {}) if issue_status is None else issue_status
 
     unknown_issues = [issue_url for issue_url in issues if issue_url not in issue_status_cache]
     if unknown_issues:
+        proxies = session.config.cache.get('PROXIES', {})
         results = check_issues(unknown_issues, proxies=proxies)
         issue_status_cache.update(results)
         session.config.cache.set('ISSUE_STATUS', issue_status_cache)
@@ -542,7 +588,62 @@ def update_issue_status(condition_str, session):
     return condition_str
 
 
-def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basic_facts, session):
+class ConditionEvaluator(object):
+    """Evaluate condition strings against the basic facts of a session.
+
+    The condition strings are compiled once, and the result of every condition is remembered, because the same
+    conditions are evaluated for all the test cases matching an entry of the mark conditions files.
+    """
+
+    # Compiled condition strings, shared by all the evaluators
+    _compiled = {}
+
+    def __init__(self, basic_facts, session, issue_status=None):
+        """
+        Args:
+            basic_facts (dict): A one level dict with basic facts. Keys of the dict can be used as variables in the
+                condition string evaluation. The facts must not be changed while the evaluator is used.
+            session (obj): Pytest session object, for getting cached data.
+            issue_status (dict): Issue state loaded by load_issue_status, see update_issue_status.
+        """
+        self.session = session
+        self.issue_status = issue_status
+        self.safe_globals = dict(basic_facts)
+        for var in ["asic_type"]:
+            if var not in self.safe_globals:
+                self.safe_globals[var] = None
+        self._results = {}
+
+    @classmethod
+    def compile(cls, condition_str):
+        code = cls._compiled.get(condition_str)
+        if code is None:
+            code = compile(condition_str, '<condition>', 'eval')
+            cls._compiled[condition_str] = code
+        return code
+
+    def evaluate(self, condition):
+        """Evaluate a raw condition string.
+
+        Returns:
+            bool: True or False based on condition string evaluation result.
+        """
+        result = self._results.get(condition)
+        if result is not None:
+            return result
+
+        condition_str = update_issue_status(condition, self.session, self.issue_status)
+        try:
+            result = bool(eval(self.compile(condition_str), self.safe_globals))
+        except Exception:
+            raise RuntimeError('Failed to evaluate condition, raw_condition={}, condition_str={}'.format(
+                condition,
+                condition_str))
+        self._results[condition] = result
+        return result
+
+
+def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basic_facts, session, evaluator=None):
     """Evaluate a condition string based on supplied basic facts.
 
     Args:
@@ -554,6 +655,7 @@ def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basi
         basic_facts (dict): A one level dict with basic facts. Keys of the dict can be used as variables in the
             condition string evaluation.
         session (obj): Pytest session object, for getting cached data.
+        evaluator (ConditionEvaluator): Evaluator of the basic facts, a new one is created if it is None.
 
     Returns:
         bool: True or False based on condition string evaluation result.
@@ -561,29 +663,17 @@ def evaluate_condition(dynamic_update_skip_reason, mark_details, condition, basi
     if condition is None or condition.strip() == '':
         return True    # Empty condition item will be evaluated as True. Equivalent to be ignored.
 
-    condition_str = update_issue_status(condition, session)
-    try:
-        safe_facts = {k: v for k, v in basic_facts.items()}
-        safe_globals = {}
-        safe_globals.update(safe_facts)
-
-        for var in ["asic_type"]:
-            if var not in safe_globals:
-                safe_globals[var] = None
-
-        condition_result = bool(eval(condition_str, safe_globals))
+    if evaluator is None:
+        evaluator = ConditionEvaluator(basic_facts, session)
+    condition_result = evaluator.evaluate(condition)
 
-        if condition_result and dynamic_update_skip_reason:
-            mark_details['reason'].append(condition)
-        return condition_result
-    except Exception:
-        raise RuntimeError('Failed to evaluate condition, raw_condition={}, condition_str={}'.format(
-            condition,
-            condition_str))
+    if condition_result and dynamic_update_skip_reason:
+        mark_details['reason'].append(condition)
+    return condition_result
 
 
 def evaluate_conditions(dynamic_update_skip_reason, mark_details, conditions, basic_facts,
-                        conditions_logical_operator, session):
+                        conditions_logical_operator, session, evaluator=None):
     """Evaluate all the condition strings.
 
     Evaluate a single condition or multiple conditions. If multiple conditions are supplied, apply AND or OR
@@ -598,24 +688,30 @@ def evaluate_conditions(dynamic_update_skip_reason, mark_details, conditions, ba
             condition string evaluation.
         conditions_logical_operator (str): logical operator which should be applied to conditions(by default 'AND')
         session (obj): Pytest session object, for getting cached data.
+        evaluator (ConditionEvaluator): Evaluator of the basic facts, a new one is created if it is None.
 
     Returns:
         bool: True or False based on condition strings evaluation result.
     """
     if dynamic_update_skip_reason:
         mark_details['reason'] = []
+    if evaluator is None:
+        evaluator = ConditionEvaluator(basic_facts, session)
     if isinstance(conditions, list):
         # Apply 'AND' or 'OR' operation to list of conditions based on conditions_logical_operator(by default 'AND')
         if conditions_logical_operator == 'OR':
-            return any([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session)
+            return any([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session,
+                                           evaluator=evaluator)
                         for c in conditions])
         else:
-            return all([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session)
+            return all([evaluate_condition(dynamic_update_skip_reason, mark_details, c, basic_facts, session,
+                                           evaluator=evaluator)
                         for c in conditions])
     else:
         if conditions is None or conditions.strip() == '':
             return True
-        return evaluate_condition(dynamic_update_skip_reason, mark_details, conditions, basic_facts, session)
+        return evaluate_condition(dynamic_update_skip_reason, mark_details, conditions, basic_facts, session,
+                                  evaluator=evaluator)
 
 
 def pytest_collection(session):
@@ -665,8 +761,11 @@ def pytest_collection_modifyitems(session, config, items):
         json.dumps(basic_facts, indent=2)))
     dynamic_update_skip_reason = session.config.option.dynamic_update_skip_reason
     basic_facts['constants'] = MARK_CONDITIONS_CONSTANTS
+    issue_status = load_issue_status(find_matched_conditions(items, conditions), session)
+    evaluator = ConditionEvaluator(basic_facts, session, issue_status)
     for item in items:
-        all_matches = find_all_matches(item.nodeid, conditions, session, dynamic_update_skip_reason, basic_facts)
+        all_matches = find_all_matches(item.nodeid, conditions, session, dynamic_update_skip_reason, basic_facts,
+                                       evaluator=evaluator)
 
         if all_matches:
             logger.debug('Found match "{}" for test case "{}"'.format(all_matches, item.nodeid))
@@ -687,7 +786,8 @@ def pytest_collection_modifyitems(session, config, items):
                             add_mark = True
                         else:
                             add_mark = evaluate_conditions(dynamic_update_skip_reason, mark_details, mark_conditions,
-                                                           basic_facts, conditions_logical_operator, session)
+                                                           basic_facts, conditions_logical_operator, session,
+                                                           evaluator=evaluator)
 
                     if add_mark:
                         reason = ''
@@ -0,0 +1,95 @@
+"""Index of the entries in mark conditions files for finding the entries matching a test case.
+
+Entries are matched by prefix of the test case nodeid, or by regular expression if the entry has 'regex: True'.
+Instead of checking every entry for every collected test case, prefix entries are stored in a trie walked once along
+the nodeid, and the regular expressions are compiled once.
+"""
+import re
+import threading
+
+
+class ConditionIndex(object):
+    """Prefix trie and compiled regular expressions over the entries of mark conditions.
+
+    The entries found for a nodeid are the same and in the same order as found by checking every entry of the
+    conditions list in order.
+    """
+
+    _END = None     # Key of the list of entries ending at a trie node
+
+    _cache = None
+    _cache_lock = threading.Lock()
+
+    def __init__(self, conditions):
+        """
+        Args:
+            conditions (list): List of conditions loaded from mark conditions files. Every condition is a dict with
+                single item, key is the test case name or regex, value is the marks.
+        """
+        self._trie = {}
+        self._regex_entries = []
+        # Entries with 'use_longest: True' drop all the entries matched before them
+        self._use_longest = set()
+
+        for position, condition in enumerate(conditions):
+            # condition is a dict which has only one item, so we use condition.keys()[0] to get its key.
+            condition_entry = list(condition.keys())[0]
+            condition_items = condition[condition_entry]
+            if "regex" in condition_items.keys():
+                assert isinstance(condition_items["regex"], bool), \
+                    "The value of 'regex' in the mark conditions yaml should be bool type."
+                if condition_items["regex"] is True:
+                    self._regex_entries.append((position, re.compile(condition_entry), condition))
+                continue
+
+            if "use_longest" in condition_items.keys():
+                assert isinstance(condition_items["use_longest"], bool), \
+                    "The value of 'use_longest' in the mark conditions yaml should be bool type."
+                if condition_items["use_longest"] is True:
+                    self._use_longest.add(position)
+
+            node = self._trie
+            for char in condition_entry:
+                node = node.setdefault(char, {})
+            node.setdefault(self._END, []).append((position, condition))
+
+    @classmethod
+    def get(cls, conditions):
+        """Get index of the conditions, reusing the index built for the same conditions list object.
+        """
+        with cls._cache_lock:
+            if cls._cache is None or cls._cache[0] is not conditions:
+                cls._cache = (conditions, cls(conditions))
+            return cls._cache[1]
+
+    def find(self, nodeid):
+        """Find all the entries matching the nodeid.
+
+        Args:
+            nodeid (str): Full test case name
+
+        Returns:
+            list: Matching conditions, in the order of the conditions list.
+        """
+        matches = []
+        node = self._trie
+        if self._END in node:
+            matches.extend(node[self._END])
+        for char in nodeid:
+            node = node.get(char)
+            if node is None:
+                break
+            if self._END in node:
+                matches.extend(node[self._END])
+
+        for position, regex, condition in self._regex_entries:
+            if regex.search(nodeid):
+                matches.append((position, condition))
+
+        matches.sort(key=lambda match: match[0])
+        all_matches = []
+        for position, condition in matches:
+            if position in self._use_longest:
+                all_matches = []
+            all_matches.append(condition)
+        return all_matches
@@ -0,0 +1,108 @@
+"""Benchmark of the collection time work of the conditional mark plugin.
+
+Compares checking every entry of the mark conditions files for every test case, the way find_all_matches did
+before ConditionIndex, with the index, and verifies that both find the same entries. The test cases are generated
+from the entries of the mark conditions files, so that every entry is matched by some test cases.
+
+Also reports how many condition strings are evaluated for the matched entries, and how many of them are distinct.
+ConditionEvaluator shared by all the test cases of the session evaluates only the distinct ones.
+
+Usage:
+    python -m tests.common.plugins.conditional_mark.unit_test.benchmark_find_all_matches [--cases 20000] [--seed 0]
+"""
+import argparse
+import random
+import re
+import sys
+import time
+from unittest.mock import MagicMock
+
+from tests.common.plugins.conditional_mark import load_conditions
+from tests.common.plugins.conditional_mark.condition_index import ConditionIndex
+
+CONDITIONS_FILES = ["tests/common/plugins/conditional_mark/tests_mark_conditions*.yaml"]
+
+
+def linear_matches(nodeid, conditions):
+    all_matches = []
+    for condition in conditions:
+        condition_entry = list(condition.keys())[0]
+        condition_items = condition[condition_entry]
+        if "regex" in condition_items.keys():
+            match = re.search(condition_entry, nodeid) if condition_items["regex"] is True else None
+        elif "use_longest" in condition_items.keys():
+            if nodeid.startswith(condition_entry) and condition_items["use_longest"] is True:
+                all_matches = []
+            match = nodeid.startswith(condition_entry)
+        else:
+            match = nodeid.startswith(condition_entry)
+        if match:
+            all_matches.append(condition)
+    return all_matches
+
+
+def generate_nodeids(conditions, count, seed):
+    rnd = random.Random(seed)
+    entries = [list(condition.keys())[0] for condition in conditions
+               if list(condition.values())[0].get("regex") is not True]
+    nodeids = []
+    for index in range(count):
+        entry = rnd.choice(entries)
+        if entry.endswith(".py"):
+            entry += "::test_case_{}".format(index % 50)
+        elif "::" in entry:
+            entry += "[param{}]".format(index % 10)
+        else:
+            entry = entry.rstrip("/") + "/test_module_{}.py::test_case".format(index % 20)
+        nodeids.append(entry)
+    return nodeids
+
+
+def matched_conditions(all_matches):
+    for match in all_matches:
+        for mark, mark_details in list(match.values())[0].items():
+            if mark in ["regex", "use_longest"] or not isinstance(mark_details, dict):
+                continue
+            mark_conditions = mark_details.get("conditions", None)
+            if not isinstance(mark_conditions, list):
+                mark_conditions = [mark_conditions]
+            for condition in mark_conditions:
+                if condition:
+                    yield condition
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark matching of mark conditions")
+    parser.add_argument("--cases", type=int, default=20000, help="Number of synthetic test cases")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed used to generate the test cases")
+    args = parser.parse_args()
+
+    session = MagicMock()
+    session.config.option.mark_conditions_files = list(CONDITIONS_FILES)
+    conditions = load_conditions(session)
+    nodeids = generate_nodeids(conditions, args.cases, args.seed)
+    print("{} entries, {} test cases".format(len(conditions), len(nodeids)))
+
+    start = time.time()
+    linear_result = [linear_matches(nodeid, conditions) for nodeid in nodeids]
+    linear_time = time.time() - start
+
+    start = time.time()
+    index = ConditionIndex(conditions)
+    index_result = [index.find(nodeid) for nodeid in nodeids]
+    index_time = time.time() - start
+
+    if linear_result != index_result:
+        print("ERROR: matches differ")
+        return 1
+    print("linear scan:    {:.2f}s".format(linear_time))
+    print("ConditionIndex: {:.2f}s (including building the index)".format(index_time))
+    print("speedup:        {:.1f}x".format(linear_time / index_time))
+
+    evaluated = [condition for all_matches in index_result for condition in matched_conditions(all_matches)]
+    print("condition evaluations: {}, distinct conditions: {}".format(len(evaluated), len(set(evaluated))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,8 @@
 import logging
 import unittest
-from unittest.mock import MagicMock
-from tests.common.plugins.conditional_mark import find_all_matches, load_conditions
+from unittest.mock import MagicMock, patch
+from tests.common.plugins.conditional_mark import ConditionEvaluator, find_all_matches, find_matched_conditions, \
+    load_conditions, load_issue_status
 
 logger = logging.getLogger(__name__)
 
@@ -293,5 +294,81 @@ class TestFindAllMatches(unittest.TestCase):
         self.assertIn('xfail', marks_found)
 
 
+class TestConditionEvaluator(unittest.TestCase):
+    """Test cases for evaluating conditions once per session."""
+
+    def test_shared_evaluator(self):
+        conditions, session_mock = load_test_conditions()
+        evaluator = ConditionEvaluator(CUSTOM_BASIC_FACTS, session_mock)
+
+        for nodeid in ["test_conditional_mark.py::test_mark", "test_conditional_mark.py::test_mark_1",
+                       "test_conditional_mark.py::test_mark_9_2", "test_conditional_mark.py::test_mark"]:
+            self.assertEqual(
+                find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON, CUSTOM_BASIC_FACTS,
+                                 evaluator=evaluator),
+                find_all_matches(nodeid, conditions, session_mock, DYNAMIC_UPDATE_SKIP_REASON, CUSTOM_BASIC_FACTS))
+
+    def test_evaluate_once(self):
+        session_mock = MagicMock()
+        evaluator = ConditionEvaluator(CUSTOM_BASIC_FACTS, session_mock)
+
+        with patch("tests.common.plugins.conditional_mark.update_issue_status",
+                   side_effect=lambda condition, session, issue_status: condition) as update_mock:
+            self.assertTrue(evaluator.evaluate("asic_type in ['vs']"))
+            self.assertTrue(evaluator.evaluate("asic_type in ['vs']"))
+            self.assertFalse(evaluator.evaluate("topo_type == 't1'"))
+            self.assertFalse(evaluator.evaluate("topo_type == 't1'"))
+        self.assertEqual(update_mock.call_count, 2)
+
+        with self.assertRaises(RuntimeError):
+            evaluator.evaluate("undefined_fact == 'vs'")
+
+    def test_load_issue_status_once(self):
+        session_mock = MagicMock()
+        session_mock.config.cache.get.side_effect = lambda key, default: \
+            {"https://github.com/sonic-net/sonic-mgmt/issues/1": False} if key == "ISSUE_STATUS" else default
+        conditions = [
+            {"test_a.py": {"skip": {"conditions": ["https://github.com/sonic-net/sonic-mgmt/issues/1",
+                                                   "asic_type in ['vs']"]}}},
+            {"test_b.py": {"xfail": {"conditions": "https://github.com/sonic-net/sonic-mgmt/issues/2 "
+                                                   "and https://github.com/sonic-net/sonic-mgmt/issues/3"},
+                           "skip": {"reason": "No conditions"}}},
+        ]
+
+        with patch("tests.common.plugins.conditional_mark.check_issues",
+                   return_value={"https://github.com/sonic-net/sonic-mgmt/issues/2": True,
+                                 "https://github.com/sonic-net/sonic-mgmt/issues/3": False}) as check_mock:
+            issue_status = load_issue_status(conditions, session_mock)
+            evaluator = ConditionEvaluator(CUSTOM_BASIC_FACTS, session_mock, issue_status)
+            self.assertFalse(evaluator.evaluate("https://github.com/sonic-net/sonic-mgmt/issues/1"))
+            self.assertFalse(evaluator.evaluate("https://github.com/sonic-net/sonic-mgmt/issues/2 "
+                                                "and https://github.com/sonic-net/sonic-mgmt/issues/3"))
+
+        check_mock.assert_called_once()
+        self.assertEqual(check_mock.call_args[0][0], ["https://github.com/sonic-net/sonic-mgmt/issues/2",
+                                                      "https://github.com/sonic-net/sonic-mgmt/issues/3"])
+
+    def test_load_issue_status_of_matched_conditions(self):
+        session_mock = MagicMock()
+        session_mock.config.cache.get.side_effect = lambda key, default: default
+        conditions = [
+            {"test_a.py": {"skip": {"conditions": "https://github.com/sonic-net/sonic-mgmt/issues/1"}}},
+            {"test_b.py": {"xfail": {"conditions": "https://github.com/sonic-net/sonic-mgmt/issues/2"}}},
+            {"test_a.py::test_x": {"xfail": {"conditions": "https://github.com/sonic-net/sonic-mgmt/issues/3"}}},
+        ]
+        items = [MagicMock(nodeid="test_a.py::test_x"), MagicMock(nodeid="test_a.py::test_y"),
+                 MagicMock(nodeid="test_c.py::test_z")]
+
+        matched = find_matched_conditions(items, conditions)
+        self.assertEqual(len(matched), 2)
+        with patch("tests.common.plugins.conditional_mark.check_issues", return_value={}) as check_mock:
+            load_issue_status(matched, session_mock)
+
+        # Issue of test_b.py is not checked, no collected test case matches it
+        check_mock.assert_called_once()
+        self.assertEqual(check_mock.call_args[0][0], ["https://github.com/sonic-net/sonic-mgmt/issues/1",
+                                                      "https://github.com/sonic-net/sonic-mgmt/issues/3"])
+
+
 if __name__ == "__main__":
     unittest.main()
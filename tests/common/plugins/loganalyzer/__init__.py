@@ -16,6 +16,9 @@ def pytest_addoption(parser):
                      help="do not fail the test if new bugs were found")
     parser.addoption("--loganalyzer_rotate_logs", action="store_true", default=True,
                      help="rotate log on all the dut engines at the beginning of the log analyzer fixture")
+    parser.addoption("--loganalyzer_on_dut", action="store_true", default=False,
+                     help="analyze logs on the DUT in a single streaming pass and fetch only the matching lines, "
+                          "instead of downloading the whole extracted syslog")
     parser.addoption("--bug_handler_params", action="store", default=None,
                      help="params that may needed in log_analyzer_bug_handler when err detected, "
                           "log_analyzer_bug_handler is called in _post_err_msg_handler, "
@@ -8,8 +8,10 @@ import shutil
 
 from . import system_msg_handler
 from .bug_handler_helper import get_bughandler_instance, BugHandler
+from tests.common.errors import RunAnsibleModuleFail
 
 from .system_msg_handler import AnsibleLogAnalyzer as ansible_loganalyzer
+from .system_msg_handler import get_regex_set
 from os.path import join, split
 
 ANSIBLE_LOGANALYZER_MODULE = system_msg_handler.__file__.replace(r".pyc", ".py")
@@ -93,6 +95,7 @@ class LogAnalyzer:
         self._markers = []
         self.fail = True
         self.store_la_logs = False
+        self.analyze_on_dut = False
 
         self.additional_files = list(additional_files.keys())
         self.additional_start_str = list(additional_files.values())
@@ -101,6 +104,7 @@ class LogAnalyzer:
             # override the fail and store_la_logs if they are set in the request config options
             self.fail = not (self.request.config.getoption("--ignore_la_failure"))
             self.store_la_logs = self.request.config.getoption("--store_la_logs")
+            self.analyze_on_dut = self.request.config.getoption("--loganalyzer_on_dut", default=False)
 
         self._la_logs_dir = "/tmp/loganalyzer/{}".format(self.ansible_host.hostname)
         self.bughandler = bughandler
@@ -337,21 +341,138 @@ class LogAnalyzer:
         self.ansible_host.command(cmd)
         return start_marker
 
-    def analyze(self, marker, fail=None, maximum_log_length=None, store_la_logs=None):
+    def _get_start_strings(self, start_string):
+        """
+        @summary: Get the start string for syslog and each additional file.
+
+        @return: List of (file_dir, file_name, start_string) tuples, syslog first.
+        """
+        log_files = [("/var/log", "syslog", start_string)]
+        for idx, path in enumerate(self.additional_files):
+            file_dir, file_name = split(path)
+            if self.additional_start_str and self.additional_start_str[idx] != '':
+                start_str = self.additional_start_str[idx]
+            else:
+                start_str = start_string
+            log_files.append((file_dir, file_name, start_str))
+        return log_files
+
+    def _analyze_on_dut(self, start_string, maximum_log_length=None, expect_hits=None):
+        """
+        @summary: Ship regular expressions to the DUT and analyze rotated log files in place.
+                  Only the matching and expected lines are returned to the sonic-mgmt host.
+
+        @param start_string: String which latest occurrence starts the analysis range in syslog.
+        @param maximum_log_length: The long message (length > maximum_log_length) will be skipped.
+        @param expect_hits: Set to be updated with indexes of the expected regexes found in the logs.
+        @return: Map <log path, [matching_lines, expected_lines]>
+        """
+        request = {
+            "match_regex": self.match_regex,
+            "ignore_regex": self.ignore_regex,
+            "expect_regex": self.expect_regex,
+            "maximum_log_length": maximum_log_length,
+            "logs": [{"directory": file_dir, "file_prefix": file_name, "start_string": start_str}
+                     for file_dir, file_name, start_str in self._get_start_strings(start_string)]
+        }
+        request_file = os.path.join(self.dut_run_dir, "loganalyzer_request.json")
+        self.ansible_host.copy(content=json.dumps(request), dest=request_file)
+
+        cmd = "python {run_dir}/loganalyzer.py --action analyze_on_dut --run_id {marker} --request_file {request}"\
+            .format(run_dir=self.dut_run_dir, marker=self.ansible_loganalyzer.run_id, request=request_file)
+        try:
+            output = self.ansible_host.command(cmd)["stdout"]
+        finally:
+            self.ansible_host.file(path=request_file, state="absent")
+
+        analyzer_parse_result = {}
+        for path, result in json.loads(output).items():
+            logging.debug("Analyzed {} lines of {} on DUT".format(result["lines_processed"], path))
+            analyzer_parse_result[path] = [result["match"], result["expect"]]
+            if expect_hits is not None:
+                expect_hits.update(result["expect_hits"])
+        return analyzer_parse_result
+
+    def _extract_logs(self, start_string):
+        """
+        @summary: On DUT extract syslog and additional files starting from the start string,
+                  each into one file located in the DUT run directory.
+
+        @param start_string: String which latest occurrence starts the extraction in syslog.
+        """
+        # On DUT extract syslog files from /var/log/ and create one file by location - /tmp/syslog
+        # Start markers placed by "init" are indexed by position, so they are found without scanning all the files
+        self.ansible_host.extract_log(directory='/var/log', file_prefix='syslog', start_string=start_string,
+                                      target_filename=self.extracted_syslog,
+                                      marker_index=system_msg_handler.marker_index_file)
+        for file_dir, file_name, start_str in self._get_start_strings(start_string)[1:]:
+            extracted_file_name = os.path.join(self.dut_run_dir, file_name)
+            self.ansible_host.extract_log(directory=file_dir, file_prefix=file_name, start_string=start_str,
+                                          target_filename=extracted_file_name,
+                                          marker_index=system_msg_handler.marker_index_file)
+
+    def _analyze_downloaded_logs(self, maximum_log_length=None, expect_hits=None):
+        """
+        @summary: Download logs extracted on the DUT and analyze them on the sonic-mgmt host.
+
+        @param maximum_log_length: The long message (length > maximum_log_length) will be skipped.
+        @param expect_hits: Set to be updated with indexes of the expected regexes found in the logs.
+        @return: Map <downloaded file path, [matching_lines, expected_lines]>
+        """
+        timestamp = time.strftime("%Y-%m-%d-%H:%M:%S", time.gmtime())
+        tmp_folder = ".".join((SYSLOG_TMP_FOLDER, self.ansible_host.hostname, timestamp))
+
+        # Download extracted logs from the DUT to the temporal folder defined in SYSLOG_TMP_FOLDER
+        self.save_extracted_log(dest=tmp_folder)
+        file_list = [tmp_folder]
+
+        for path in self.additional_files:
+            file_dir, file_name = split(path)
+            extracted_file_name = os.path.join(self.dut_run_dir, file_name)
+            tmp_folder = ".".join((extracted_file_name, timestamp))
+            self.save_extracted_file(dest=tmp_folder, src=extracted_file_name)
+            file_list.append(tmp_folder)
+
+        # Compiled regex sets are cached, so they are not compiled again for every test
+        match_messages_regex = get_regex_set(self.match_regex)
+        ignore_messages_regex = get_regex_set(self.ignore_regex)
+        expect_messages_regex = get_regex_set(self.expect_regex)
+
+        logging.debug("Analyze files {}".format(file_list))
+        logging.debug('    match_regex="{}"'.format(match_messages_regex.pattern if match_messages_regex else ''))
+        logging.debug('    ignore_regex="{}"'.format(ignore_messages_regex.pattern if ignore_messages_regex else ''))
+        logging.debug('    expect_regex="{}"'.format(expect_messages_regex.pattern if expect_messages_regex else ''))
+        analyzer_parse_result = self.ansible_loganalyzer.analyze_file_list(
+            file_list, match_messages_regex, ignore_messages_regex, expect_messages_regex,
+            maximum_log_length=maximum_log_length, expect_hits=expect_hits)
+        # Print file content and remove the file
+        for folder in file_list:
+            with open(folder) as fo:
+                logging.debug("{} file content:\n\n{}".format(folder, fo.read()))
+            os.remove(folder)
+
+        return analyzer_parse_result
+
+    def analyze(self, marker, fail=None, maximum_log_length=None, store_la_logs=None, analyze_on_dut=None):
         """
         @summary: Extract syslog logs based on the start/stop markers and compose one file.
                   Download composed file, analyze file based on defined regular expressions.
+                  If "analyze_on_dut" is enabled, regular expressions are evaluated on the DUT in a single
+                  streaming pass over rotated log files and only matching lines are downloaded.
+                  Download path is used as a fallback if the analysis on the DUT fails.
 
         @param marker: Marker obtained from "init" method.
         @param fail: Flag to enable/disable raising exception when loganalyzer find error messages.
         @param maximum_log_length: The long message (length > maximum_log_length) will be skipped.
         @param store_la_logs: Flag to save the match lines
+        @param analyze_on_dut: Flag to analyze logs on the DUT instead of downloading extracted logs
         @return: If "fail" is False - return dictionary of parsed syslog summary,
                  if dictionary can't be parsed - return empty dictionary.
                  If "fail" is True and if found match messages - raise exception.
         """
         fail = self.fail if fail is None else fail
         store_la_logs = self.store_la_logs if store_la_logs is None else store_la_logs
+        analyze_on_dut = self.analyze_on_dut if analyze_on_dut is None else analyze_on_dut
         logging.debug("Loganalyzer analyze")
         analyzer_summary = {"total": {"match": 0, "expected_match": 0, "expected_missing_match": 0},
                             "match_files": {},
@@ -359,8 +480,6 @@ class LogAnalyzer:
                             "expect_messages": {},
                             "unused_expected_regexp": []
                             }
-        timestamp = time.strftime("%Y-%m-%d-%H:%M:%S", time.gmtime())
-        tmp_folder = ".".join((SYSLOG_TMP_FOLDER, self.ansible_host.hostname, timestamp))
         marker = marker.replace(' ', '_')
         self.ansible_loganalyzer.run_id = marker
 
@@ -369,53 +488,26 @@ class LogAnalyzer:
         else:
             start_string = self.start_marker
 
+        analyzer_parse_result = None
+        expect_hits = set()
         with DisableLogrotateCronContext(self.ansible_host):
             # Add end marker into DUT syslog
             self._add_end_marker(marker)
 
-            # On DUT extract syslog files from /var/log/ and create one file by location - /tmp/syslog
-            self.ansible_host.extract_log(directory='/var/log', file_prefix='syslog', start_string=start_string,
-                                          target_filename=self.extracted_syslog)
-            for idx, path in enumerate(self.additional_files):
-                file_dir, file_name = split(path)
-                extracted_file_name = os.path.join(self.dut_run_dir, file_name)
-                if self.additional_start_str and self.additional_start_str[idx] != '':
-                    start_str = self.additional_start_str[idx]
-                else:
-                    start_str = start_string
-                self.ansible_host.extract_log(directory=file_dir, file_prefix=file_name, start_string=start_str,
-                                              target_filename=extracted_file_name)
+            if analyze_on_dut:
+                try:
+                    analyzer_parse_result = self._analyze_on_dut(start_string, maximum_log_length=maximum_log_length,
+                                                                 expect_hits=expect_hits)
+                except (RunAnsibleModuleFail, ValueError, KeyError) as e:
+                    logging.warning("Failed to analyze logs on DUT {}, fallback to downloading extracted logs: {}"
+                                    .format(self.ansible_host.hostname, repr(e)))
 
-        # Download extracted logs from the DUT to the temporal folder defined in SYSLOG_TMP_FOLDER
-        self.save_extracted_log(dest=tmp_folder)
-        file_list = [tmp_folder]
+            if analyzer_parse_result is None:
+                self._extract_logs(start_string)
 
-        for path in self.additional_files:
-            file_dir, file_name = split(path)
-            extracted_file_name = os.path.join(self.dut_run_dir, file_name)
-            tmp_folder = ".".join((extracted_file_name, timestamp))
-            self.save_extracted_file(dest=tmp_folder, src=extracted_file_name)
-            file_list.append(tmp_folder)
-
-        match_messages_regex = re.compile('|'.join(self.match_regex)) if len(self.match_regex) else None
-        ignore_messages_regex = re.compile('|'.join(self.ignore_regex)) if len(self.ignore_regex) else None
-        expect_messages_regex = re.compile('|'.join(self.expect_regex)) if len(self.expect_regex) else None
-
-        logging.debug("Analyze files {}".format(file_list))
-        logging.debug('    match_regex="{}"'.format(match_messages_regex.pattern if match_messages_regex else ''))
-        logging.debug('    ignore_regex="{}"'.format(ignore_messages_regex.pattern if ignore_messages_regex else ''))
-        logging.debug('    expect_regex="{}"'.format(expect_messages_regex.pattern if expect_messages_regex else ''))
-        analyzer_parse_result = self.ansible_loganalyzer.analyze_file_list(
-            file_list, match_messages_regex, ignore_messages_regex, expect_messages_regex,
-            maximum_log_length=maximum_log_length)
-        # Print file content and remove the file
-        for folder in file_list:
-            with open(folder) as fo:
-                logging.debug("{} file content:\n\n{}".format(folder, fo.read()))
-            os.remove(folder)
-
-        expected_lines_total = []
-        unused_regex_messages = []
+        if analyzer_parse_result is None:
+            analyzer_parse_result = self._analyze_downloaded_logs(maximum_log_length=maximum_log_length,
+                                                                  expect_hits=expect_hits)
 
         for key, value in list(analyzer_parse_result.items()):
             matching_lines, expecting_lines = value
@@ -425,15 +517,9 @@ class LogAnalyzer:
                                                     "expected_match": len(expecting_lines)}
             analyzer_summary["match_messages"][key] = matching_lines
             analyzer_summary["expect_messages"][key] = expecting_lines
-            expected_lines_total.extend(expecting_lines)
 
-        # Find unused regex matches
-        for regex in self.expect_regex:
-            for line in expected_lines_total:
-                if re.search(regex, line):
-                    break
-            else:
-                unused_regex_messages.append(regex)
+        # Find unused regex matches, hits of each expected regex are collected during the analysis
+        unused_regex_messages = [regex for index, regex in enumerate(self.expect_regex) if index not in expect_hits]
         analyzer_summary["total"]["expected_missing_match"] = len(unused_regex_messages)
         analyzer_summary["unused_expected_regexp"] = unused_regex_messages
         logging.debug("Analyzer summary: {}".format(pprint.pformat(analyzer_summary)))
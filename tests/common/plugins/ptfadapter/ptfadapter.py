@@ -1,4 +1,7 @@
 import nnpy
+import threading
+import time
+
 import ptf
 import ptf.platforms.nn as nn
 import ptf.ptfutils as ptfutils
@@ -6,7 +9,7 @@ import ptf.packet as scapy
 import ptf.mask as mask
 
 from ptf.base_tests import BaseTest
-from ptf.dataplane import DataPlane, DataPlanePortNN
+from ptf.dataplane import DataPlane, DataPlanePortNN, match_exp_pkt
 from tests.common.utilities import wait_until
 import logging
 
@@ -29,6 +32,204 @@ class PtfAdapterNNConnectionError(Exception):
         self.remote_sock_addr = remote_sock_addr
 
 
+class _QueueCursor:
+    """Position in a dataplane packet queue, to get the packets received since the last read"""
+
+    def __init__(self, queue):
+        self.queue = queue
+        self.last = queue[-1] if queue else None
+        self.last_index = len(queue) - 1
+
+    def read(self, queue):
+        """Get the packets received since the last read, must be called with dataplane.cvar"""
+        start = 0
+        if queue is self.queue and self.last is not None:
+            # Packets are only removed from the head of the queue, so the last packet read is not after where it was.
+            # If it was removed, all the packets in the queue are new
+            for index in range(min(self.last_index, len(queue) - 1), -1, -1):
+                if queue[index] is self.last:
+                    start = index + 1
+                    break
+        self.queue = queue
+        self.last = queue[-1] if queue else None
+        self.last_index = len(queue) - 1
+        return queue[start:]
+
+
+class _Expectation:
+
+    def __init__(self, pkt, port_ids, count, negative):
+        self.pkt = pkt
+        self.port_ids = port_ids
+        self.count = count
+        self.negative = negative
+        self.received = {}
+
+    @property
+    def received_count(self):
+        return sum(self.received.values())
+
+    @property
+    def met(self):
+        return self.received_count >= self.count
+
+    def describe(self):
+        pkt = self.pkt.exp_pkt if isinstance(self.pkt, mask.Mask) else self.pkt
+        if self.negative:
+            ports = ", ".join("device %d port %d" % port_id for port_id in sorted(self.received))
+            return "Unexpected packet was received on {}.\n{}".format(ports, pkt.summary())
+        return "Expected packet was received {} of {} times on (device, port) {}.\n{}".format(
+            self.received_count, self.count, self.port_ids, pkt.summary())
+
+
+class PacketExpectations:
+    """Expected and unexpected packets on many ports, verified together.
+
+    Expectations are registered before sending the traffic. A background receiver matches the packets as they are
+    received by the dataplane, and verify() returns as soon as all expected packets are received, so checking many
+    ports waits once instead of once per port. Packets are not removed from the dataplane queues, and packets received
+    on a port before its first expectation is registered are not matched.
+
+    Example:
+        with ptfadapter.expectations() as expectations:
+            expectations.expect_packet(exp_pkt, port_id)
+            expectations.expect_no_packet(exp_pkt, other_port_ids)
+            testutils.send(ptfadapter, src_port_id, pkt)
+        # verified on exit, or with expectations.verify()
+    """
+
+    def __init__(self, adapter):
+        self.adapter = adapter
+        self.dataplane = adapter.dataplane
+        self.expectations = []
+        self.cursors = {}
+        self.cond = threading.Condition()
+        self.receiver = None
+        self.stopped = False
+        self.verified = False
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        try:
+            if exc_type is None and not self.verified:
+                self.verify()
+        finally:
+            self.stop()
+
+    def _port_ids(self, ports):
+        if not isinstance(ports, list):
+            ports = [ports]
+        return [port if isinstance(port, tuple) else self.dataplane.port_to_tuple(port) for port in ports]
+
+    def _add(self, pkt, ports, count, negative):
+        port_ids = self._port_ids(ports)
+        # Expected packets are updated the same way as in the dp_poll of ptfadapter plugin
+        expectation = _Expectation(self.adapter.update_payload(pkt), port_ids, count, negative)
+        with self.dataplane.cvar:
+            for port_id in port_ids:
+                if port_id not in self.cursors:
+                    self.cursors[port_id] = _QueueCursor(self.dataplane.packet_queues[port_id])
+        with self.cond:
+            self.expectations.append(expectation)
+        return expectation
+
+    def expect_packet(self, pkt, port_id, count=1):
+        """Expect a packet to be received count times on a port
+        :param pkt: scapy packet or mask.Mask
+        :param port_id: port number or (device number, port number)
+        """
+        return self._add(pkt, port_id, count, False)
+
+    def expect_packet_any_port(self, pkt, ports, count=1):
+        """Expect a packet to be received count times on any of the ports"""
+        return self._add(pkt, ports, count, False)
+
+    def expect_no_packet(self, pkt, ports):
+        """Expect a packet not to be received on any of the ports"""
+        return self._add(pkt, ports, 1, True)
+
+    def start(self):
+        """Start the background receiver"""
+        self.stopped = False
+        self.receiver = threading.Thread(target=self._receive, name="ptf-expectations")
+        self.receiver.daemon = True
+        self.receiver.start()
+
+    def stop(self):
+        """Stop the background receiver"""
+        with self.dataplane.cvar:
+            self.stopped = True
+            self.dataplane.cvar.notify_all()
+        if self.receiver:
+            self.receiver.join()
+            self.receiver = None
+
+    def _receive(self):
+        while True:
+            with self.dataplane.cvar:
+                received = []
+                while not received and not self.stopped:
+                    for port_id, cursor in list(self.cursors.items()):
+                        for entry in cursor.read(self.dataplane.packet_queues[port_id]):
+                            received.append((port_id, entry[0]))
+                    if not received:
+                        # Woken up by the dataplane thread on every received packet
+                        self.dataplane.cvar.wait(1)
+                if self.stopped:
+                    return
+
+            # Match out of dataplane.cvar, not to hold the dataplane thread
+            with self.cond:
+                for port_id, pkt in received:
+                    for expectation in self.expectations:
+                        if port_id in expectation.port_ids and match_exp_pkt(expectation.pkt, pkt):
+                            expectation.received[port_id] = expectation.received.get(port_id, 0) + 1
+                self.cond.notify_all()
+
+    def verify(self, timeout=None, negative_timeout=None):
+        """Wait for the expected packets and fail the test if they are not received, or unexpected packets are.
+
+        Returns as soon as all expected packets are received, and negative_timeout has passed if there are
+        unexpected packets. Fails as soon as an unexpected packet is received.
+
+        :param timeout: time to wait for the expected packets, ptf default timeout if not specified
+        :param negative_timeout: time to wait for the unexpected packets, ptf default negative timeout if not
+            specified
+        :return: for each expected packet, dictionary of (device number, port number) to the number of times it
+            was received
+        """
+        if timeout is None:
+            timeout = ptfutils.default_timeout
+        if negative_timeout is None:
+            negative_timeout = ptfutils.default_negative_timeout
+        start_time = time.time()
+        self.verified = True
+        if not any(e.negative for e in self.expectations):
+            negative_timeout = 0
+
+        with self.cond:
+            while True:
+                now = time.time()
+                unexpected = [e for e in self.expectations if e.negative and e.met]
+                missing = [e for e in self.expectations if not e.negative and not e.met]
+                if unexpected:
+                    break
+                if not missing and now - start_time >= negative_timeout:
+                    break
+                if now - start_time >= timeout:
+                    break
+                wake_time = start_time + (timeout if missing else negative_timeout)
+                self.cond.wait(wake_time - now)
+
+        if unexpected or missing:
+            self.adapter.fail("\n".join(e.describe() for e in unexpected + missing))
+
+        return [e.received for e in self.expectations if not e.negative]
+
+
 class PtfTestAdapter(BaseTest):
     """PtfTestAdapater class provides interface for pytest to use ptf.testutils functions """
 
@@ -130,6 +331,12 @@ class PtfTestAdapter(BaseTest):
             )
         self.dataplane = ptf.dataplane_instance
 
+    def expectations(self):
+        """ Get PacketExpectations to register expected and unexpected packets, and verify them together
+        :return: PacketExpectations, to be used in 'with' block
+        """
+        return PacketExpectations(self)
+
     def kill(self):
         """ Close dataplane socket and kill data plane thread """
         if self.connected:
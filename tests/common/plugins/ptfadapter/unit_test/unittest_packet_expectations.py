@@ -0,0 +1,205 @@
+import logging
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+import ptf.mask as mask
+import ptf.packet as scapy
+import ptf.ptfutils as ptfutils
+import ptf.testutils as testutils
+
+from tests.common.plugins.ptfadapter.ptfadapter import PacketExpectations, _QueueCursor
+
+logger = logging.getLogger(__name__)
+
+PORTS = [0, 1, 2]
+DEVICE = 0
+
+
+class FakeDataplane(object):
+    """Packet queues of the PTF dataplane, filled from a thread like the dataplane thread does."""
+
+    def __init__(self, ports):
+        self.cvar = threading.Condition()
+        self.packet_queues = dict(((DEVICE, port), []) for port in ports)
+
+    def port_to_tuple(self, port):
+        return (DEVICE, port)
+
+    def receive(self, port, pkt):
+        with self.cvar:
+            self.packet_queues[(DEVICE, port)].append((bytes(pkt), time.time()))
+            self.cvar.notify_all()
+
+    def receive_later(self, delay, packets):
+        def _receive():
+            time.sleep(delay)
+            for port, pkt in packets:
+                self.receive(port, pkt)
+        thread = threading.Thread(target=_receive)
+        thread.start()
+        return thread
+
+
+class FakeAdapter(object):
+    """The parts of PtfTestAdapter used by PacketExpectations."""
+
+    def __init__(self, ports):
+        self.dataplane = FakeDataplane(ports)
+
+    def update_payload(self, pkt):
+        return pkt
+
+    def fail(self, msg):
+        raise AssertionError(msg)
+
+
+def tcp_pkt(dst="10.0.0.1"):
+    return testutils.simple_tcp_packet(ip_dst=dst)
+
+
+class TestQueueCursor(unittest.TestCase):
+    """Test cases for _QueueCursor."""
+
+    def test_read_new_packets(self):
+        queue = [("a", 0)]
+        cursor = _QueueCursor(queue)
+        # Packets queued before the cursor are not read
+        self.assertEqual(cursor.read(queue), [])
+        queue.append(("b", 1))
+        queue.append(("c", 2))
+        self.assertEqual(cursor.read(queue), [("b", 1), ("c", 2)])
+        self.assertEqual(cursor.read(queue), [])
+
+    def test_read_after_packets_polled(self):
+        queue = [("a", 0), ("b", 1)]
+        cursor = _QueueCursor(queue)
+        queue.append(("c", 2))
+        # Polled from the head of the queue, the last packet read is still queued
+        del queue[:1]
+        self.assertEqual(cursor.read(queue), [("c", 2)])
+        # The last packet read was polled, all the packets queued are new
+        del queue[:]
+        queue.append(("d", 3))
+        self.assertEqual(cursor.read(queue), [("d", 3)])
+
+    def test_read_after_flush(self):
+        queue = [("a", 0)]
+        cursor = _QueueCursor(queue)
+        new_queue = [("a", 0), ("b", 1)]
+        self.assertEqual(cursor.read(new_queue), new_queue)
+
+    def test_read_empty_queue(self):
+        queue = []
+        cursor = _QueueCursor(queue)
+        self.assertEqual(cursor.read(queue), [])
+        queue.append(("a", 0))
+        self.assertEqual(cursor.read(queue), [("a", 0)])
+
+
+class TestPacketExpectations(unittest.TestCase):
+    """Test cases for PacketExpectations against a fake dataplane."""
+
+    def setUp(self):
+        self.adapter = FakeAdapter(PORTS)
+        self.dataplane = self.adapter.dataplane
+
+    def test_expected_packets_received(self):
+        exp_pkt = tcp_pkt()
+        with PacketExpectations(self.adapter) as expectations:
+            expectations.expect_packet(exp_pkt, 0)
+            expectations.expect_packet(exp_pkt, (DEVICE, 1), count=2)
+            thread = self.dataplane.receive_later(0.2, [(0, exp_pkt), (1, exp_pkt), (2, exp_pkt),
+                                                        (1, tcp_pkt("10.0.0.2")), (1, exp_pkt)])
+            start = time.time()
+            received = expectations.verify(timeout=10)
+            elapsed = time.time() - start
+            thread.join()
+
+        # Returns once the expected packets are received, not on timeout
+        self.assertLess(elapsed, 5)
+        self.assertEqual(received, [{(DEVICE, 0): 1}, {(DEVICE, 1): 2}])
+
+    def test_expected_packet_any_port(self):
+        exp_pkt = mask.Mask(tcp_pkt())
+        exp_pkt.set_do_not_care_scapy(scapy.IP, "ttl")
+        exp_pkt.set_do_not_care_scapy(scapy.IP, "chksum")
+        pkt = tcp_pkt()
+        pkt[scapy.IP].ttl = 63
+        with PacketExpectations(self.adapter) as expectations:
+            expectations.expect_packet_any_port(exp_pkt, [1, 2], count=2)
+            thread = self.dataplane.receive_later(0.1, [(1, pkt), (0, pkt), (2, pkt)])
+            received = expectations.verify(timeout=10)
+            thread.join()
+
+        self.assertEqual(received, [{(DEVICE, 1): 1, (DEVICE, 2): 1}])
+
+    def test_expected_packet_missing(self):
+        expectations = PacketExpectations(self.adapter)
+        expectations.start()
+        try:
+            expectations.expect_packet(tcp_pkt(), 0, count=2)
+            self.dataplane.receive(0, tcp_pkt())
+            with self.assertRaises(AssertionError) as context:
+                expectations.verify(timeout=0.5)
+        finally:
+            expectations.stop()
+
+        self.assertIn("received 1 of 2 times", str(context.exception))
+
+    def test_packets_received_before_expectation_not_matched(self):
+        exp_pkt = tcp_pkt()
+        self.dataplane.receive(0, exp_pkt)
+        expectations = PacketExpectations(self.adapter)
+        expectations.start()
+        try:
+            expectations.expect_packet(exp_pkt, 0)
+            with self.assertRaises(AssertionError):
+                expectations.verify(timeout=0.5)
+        finally:
+            expectations.stop()
+
+    def test_unexpected_packet_received(self):
+        exp_pkt = tcp_pkt()
+        expectations = PacketExpectations(self.adapter)
+        expectations.start()
+        try:
+            expectations.expect_no_packet(exp_pkt, [1, 2])
+            thread = self.dataplane.receive_later(0.1, [(0, exp_pkt), (2, exp_pkt)])
+            start = time.time()
+            with self.assertRaises(AssertionError) as context:
+                expectations.verify(timeout=10, negative_timeout=10)
+            elapsed = time.time() - start
+            thread.join()
+        finally:
+            expectations.stop()
+
+        # Fails as soon as the unexpected packet is received
+        self.assertLess(elapsed, 5)
+        self.assertIn("Unexpected packet was received on device 0 port 2", str(context.exception))
+
+    def test_no_unexpected_packet(self):
+        with PacketExpectations(self.adapter) as expectations:
+            expectations.expect_packet(tcp_pkt(), 0)
+            expectations.expect_no_packet(tcp_pkt(), [1, 2])
+            self.dataplane.receive(0, tcp_pkt())
+            self.dataplane.receive(1, tcp_pkt("10.0.0.2"))
+            start = time.time()
+            received = expectations.verify(timeout=10, negative_timeout=0.5)
+            elapsed = time.time() - start
+
+        # Waits negative_timeout for the unexpected packets
+        self.assertGreaterEqual(elapsed, 0.5)
+        self.assertEqual(received, [{(DEVICE, 0): 1}])
+
+    @patch.object(ptfutils, "default_timeout", 0.5)
+    def test_verified_on_exit(self):
+        with self.assertRaises(AssertionError):
+            with PacketExpectations(self.adapter) as expectations:
+                expectations.expect_packet(tcp_pkt(), 0)
+        self.assertIsNone(expectations.receiver)
+
+
+if __name__ == "__main__":
+    unittest.main()
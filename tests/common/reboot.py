@@ -8,6 +8,7 @@ import pytest
 from multiprocessing.pool import ThreadPool
 from collections import deque
 
+from .cache import invalidate_dut_fingerprint
 from .helpers.assertions import pytest_assert
 from .helpers.parallel_utils import synchronized_reboot
 from .platform.interface_utils import check_interface_status_of_up_ports
@@ -354,6 +355,8 @@ def reboot(duthost, localhost, reboot_type='cold', delay=10,
                                                   reboot_kwargs, reboot_type)
 
     wait_for_shutdown(duthost, localhost, delay, timeout, reboot_res)
+    # Boot id and possibly image changed, facts cached with fingerprint of the DUT are checked again on next use
+    invalidate_dut_fingerprint(hostname)
 
     # Release event to proceed poweron for PDU.
     power_on_event.set()
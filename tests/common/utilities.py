@@ -10,12 +10,14 @@ import logging
 import os
 import re
 import random
+import shlex
 import six
 import sys
 import threading
 import time
 import traceback
 import copy
+import hashlib
 import tempfile
 import uuid
 import paramiko
@@ -36,6 +38,7 @@ from tests.common.cache import FactsCache
 from tests.common.helpers.constants import UPSTREAM_NEIGHBOR_MAP, UPSTREAM_ALL_NEIGHBOR_MAP
 from tests.common.helpers.constants import DOWNSTREAM_NEIGHBOR_MAP, DOWNSTREAM_ALL_NEIGHBOR_MAP
 from tests.common.helpers.assertions import pytest_assert
+from tests.scripts.db_condition import condition_holds
 from tests.common.portstat_utilities import parse_column_positions
 from netaddr import valid_ipv6
 
@@ -43,6 +46,7 @@ logger = logging.getLogger(__name__)
 cache = FactsCache()
 LA_START_MARKER_SCRIPT = "scripts/find_la_start_marker.sh"
 FIND_SYSLOG_MSG_SCRIPT = "scripts/find_log_msg.sh"
+DB_CONDITION_SCRIPT = "scripts/db_condition.py"
 # forced mgmt route priority hardcoded to 32764 in following j2 template:
 # https://github.com/sonic-net/sonic-buildimage/blob/master/files/image_config/interfaces/interfaces.j2#L82
 FORCED_MGMT_ROUTE_PRIORITY = 32764
@@ -176,7 +180,8 @@ async def async_wait_until(timeout, interval, delay, condition, *args, **kwargs)
     @param timeout: Maximum time to wait
     @param interval: Poll interval
     @param delay: Delay time
-    @param condition: A function that returns False or True
+    @param condition: A function that returns False or True, or a coroutine function. A coroutine function is
+        awaited, so that other tasks keep running while it is checked, e.g. a checker using duthost.async_shell
     @param *args: Extra args required by the 'condition' function.
     @param **kwargs: Extra args required by the 'condition' function.
     @return: If the condition function returns True before timeout, return True. If the condition function raises an
@@ -196,6 +201,8 @@ async def async_wait_until(timeout, interval, delay, condition, *args, **kwargs)
 
         try:
             check_result = condition(*args, **kwargs)
+            if inspect.isawaitable(check_result):
+                check_result = await check_result
         except Exception as e:
             exc_info = sys.exc_info()
             details = traceback.format_exception(*exc_info)
@@ -219,6 +226,74 @@ async def async_wait_until(timeout, interval, delay, condition, *args, **kwargs)
         return False
 
 
+def wait_for_db_condition(duthost, db, key, expected=None, exists=True, match_all=True, timeout=60, interval=1,
+                          delay=0, namespace=None):
+    """
+    @summary: Wait until the keys of a DUT database satisfy the condition, or timeout.
+        The condition is checked on the DUT by scripts/db_condition.py, on every Redis keyspace notification
+        of the keys, so the wait returns as soon as the condition holds, in a single round trip to the DUT.
+        If keyspace notifications aren't available, the script polls the database every interval on the DUT.
+        If the script fails, the database is polled with sonic-db-cli by wait_until.
+    @param duthost: DUT host
+    @param db: Database name, e.g. STATE_DB
+    @param key: Key, or Redis glob pattern of keys, e.g. "NEIGH_STATE_TABLE|*"
+    @param expected: Dict of field -> expected value, or list of accepted values, None for absent field.
+        None to only wait for the keys to exist.
+    @param exists: False to wait until no key matches
+    @param match_all: True if all the matching keys must have the expected fields, False if any of them
+    @param timeout: Maximum time to wait
+    @param interval: Poll interval, if keyspace notifications are not available
+    @param delay: Delay time
+    @param namespace: Namespace of the database on multi-ASIC DUT
+    @return: True if the condition holds before timeout, otherwise False
+    """
+    logger.debug("Wait until %s %s %s, timeout is %s seconds, delay is %s seconds" %
+                 (db, key, "exists with {}".format(expected or {}) if exists else "is absent", timeout, delay))
+
+    if delay > 0:
+        logger.debug("Delay for %s seconds first" % delay)
+        time.sleep(delay)
+
+    args = ["--db", db, "--key", key, "--timeout", str(timeout), "--interval", str(interval)]
+    if expected:
+        args += ["--expected", json.dumps(expected)]
+    if not exists:
+        args.append("--absent")
+    if not match_all:
+        args.append("--any")
+    if namespace:
+        args += ["--namespace", namespace]
+
+    start_time = time.time()
+    res = duthost.script(" ".join([DB_CONDITION_SCRIPT] + [shlex.quote(arg) for arg in args]),
+                         module_ignore_errors=True)
+    try:
+        result = json.loads(res["stdout"].strip().splitlines()[-1])
+    except (KeyError, IndexError, ValueError):
+        result = None
+    if res.get("rc", 1) == 0 and isinstance(result, dict):
+        logger.debug("%s %s condition is %s after %.3f seconds, %d checks in %s mode, entries: %s" %
+                     (db, key, result["result"], result["elapsed"], result["checks"], result["mode"],
+                      result["entries"]))
+        return result["result"]
+
+    logger.warning("Failed to wait for %s %s on DUT, poll it with sonic-db-cli: %s" %
+                   (db, key, res.get("stderr", res.get("msg"))))
+    remaining = max(timeout - (time.time() - start_time), 0)
+    return wait_until(remaining, interval, 0, _db_condition_holds, duthost, db, key, expected, exists, match_all,
+                      namespace)
+
+
+def _db_condition_holds(duthost, db, key, expected, exists, match_all, namespace):
+    cli = "sonic-db-cli {}{}".format("-n {} ".format(namespace) if namespace else "", db)
+    entries = {}
+    for name in duthost.command("{} KEYS {}".format(cli, shlex.quote(key)), verbose=False)["stdout_lines"]:
+        if name:
+            output = duthost.command("{} HGETALL {}".format(cli, shlex.quote(name)), verbose=False)["stdout"]
+            entries[name] = literal_eval(output.replace('\n', '\\n')) if output.strip() else {}
+    return condition_holds(entries, expected, exists, match_all)
+
+
 def wait_tcp_connection(client, server_hostname, listening_port, timeout_s=30):
     """
     @summary: Wait until tcp connection is ready or timeout
@@ -315,12 +390,106 @@ def join_all(threads, timeout):
                            [repr(thread) for thread in threads])
 
 
+INVENTORY_SNAPSHOT_ZONE = "inventory"
+
+_inventory_lock = threading.RLock()
+# Inventory sources -> (fingerprint, VariableManager) of the inventory parsed in this process
+_parsed_inventories = {}
+
+
+def _inventory_sources(inv_files):
+    if isinstance(inv_files, six.string_types):
+        return (inv_files,)
+    return tuple(inv_files)
+
+
+def _inventory_fingerprint(sources):
+    """Fingerprint of the inventory files, and of the host_vars and group_vars next to them, from path, mtime and
+    size of the files. It changes when a file is added, removed or modified."""
+    paths = set()
+    for source in sources:
+        source = os.path.abspath(source)
+        if not os.path.exists(source):
+            # Not a file, e.g. comma separated list of hosts
+            continue
+        inv_dir = source if os.path.isdir(source) else os.path.dirname(source)
+        for path in (source, os.path.join(inv_dir, "host_vars"), os.path.join(inv_dir, "group_vars")):
+            if os.path.isdir(path):
+                for root, _, files in os.walk(path):
+                    paths.update(os.path.join(root, name) for name in files)
+            elif os.path.isfile(path):
+                paths.add(path)
+
+    fingerprint = hashlib.md5()
+    for source in sources:
+        fingerprint.update("{}\n".format(os.path.abspath(source)).encode())
+    for path in sorted(paths):
+        try:
+            stat = os.stat(path)
+        except OSError:
+            continue
+        fingerprint.update("{}:{}:{}\n".format(path, stat.st_mtime_ns, stat.st_size).encode())
+    return fingerprint.hexdigest()
+
+
+def _parse_inventory(sources, fingerprint):
+    with _inventory_lock:
+        parsed = _parsed_inventories.get(sources)
+        if parsed is None or parsed[0] != fingerprint:
+            logger.debug("Parse inventory {}".format(list(sources)))
+            loader = DataLoader()
+            inventory = InventoryManager(loader=loader, sources=list(sources))
+            parsed = (fingerprint, VariableManager(loader=loader, inventory=inventory))
+            _parsed_inventories[sources] = parsed
+        return parsed[1]
+
+
 def get_inventory_manager(inv_files):
-    return InventoryManager(loader=DataLoader(), sources=inv_files)
+    """Get ansible InventoryManager of the inventory files.
+
+    The inventory files are parsed once per process, and parsed again only when they are changed. The returned
+    InventoryManager is shared by the callers, it must not be modified.
+    """
+    return get_variable_manager(inv_files)._inventory
 
 
 def get_variable_manager(inv_files):
-    return VariableManager(loader=DataLoader(), inventory=get_inventory_manager(inv_files))
+    """Get ansible VariableManager of the inventory files, see get_inventory_manager."""
+    sources = _inventory_sources(inv_files)
+    return _parse_inventory(sources, _inventory_fingerprint(sources))
+
+
+def get_inventory_snapshot(inv_files):
+    """Get the variables of the hosts and the members of the groups defined in the inventory files.
+
+    The snapshot is cached on disk with the fingerprint of the inventory files, so it's built once for all the
+    processes, e.g. xdist workers, until the inventory files are changed.
+
+    Args:
+        inv_files (list or string): List of inventory file paths, or string of a single inventory file path.
+
+    Returns:
+        dict: {"fingerprint": fingerprint of the inventory files,
+               "host_vars": {hostname: variables defined for the host},
+               "group_hosts": {group name: list of hostnames of the group and its children groups}}
+    """
+    sources = _inventory_sources(inv_files)
+    fingerprint = _inventory_fingerprint(sources)
+    cache = FactsCache()
+    key = hashlib.md5(repr([os.path.abspath(source) for source in sources]).encode()).hexdigest()
+    with _inventory_lock:
+        snapshot = cache.read(INVENTORY_SNAPSHOT_ZONE, key)
+        if snapshot is not FactsCache.NOTEXIST and snapshot["fingerprint"] == fingerprint:
+            return snapshot
+        inventory = _parse_inventory(sources, fingerprint)._inventory
+        snapshot = {
+            "fingerprint": fingerprint,
+            "host_vars": {host.name: host.vars.copy() for host in inventory.get_hosts()},
+            "group_hosts": {name: [host.name for host in group.get_hosts()]
+                            for name, group in inventory.groups.items()}
+        }
+        cache.write(INVENTORY_SNAPSHOT_ZONE, key, snapshot)
+        return snapshot
 
 
 def get_inventory_files(request):
@@ -390,8 +559,11 @@ def get_host_vars(inv_files, hostname):
     Returns:
         dict or None: dict if the host is found, None if the host is not found.
     """
-    im = get_inventory_manager(inv_files)
-    host = im.get_host(hostname)
+    host_vars = get_inventory_snapshot(inv_files)["host_vars"]
+    if hostname in host_vars:
+        return host_vars[hostname].copy()
+    # Not defined in the inventory files, but could be implicit host like localhost
+    host = get_inventory_manager(inv_files).get_host(hostname)
     if not host:
         logger.error("Unable to find host {} in {}".format(hostname, str(inv_files)))
         return None
@@ -460,20 +632,25 @@ def get_group_visible_vars(inv_files, group_name):
     return vm.get_vars(host=first_host)
 
 
-def get_test_server_host(inv_files, server):
-    """Get test server ansible host from the 'server' column in testbed file."""
-    vm = get_variable_manager(inv_files)
-    im = vm._inventory
-    group = im.groups.get(server, None)
-    if not group:
+def _get_test_server_hostname(inv_files, server):
+    group_hosts = get_inventory_snapshot(inv_files)["group_hosts"]
+    if server not in group_hosts:
         logger.error("Unable to find group {} in {}".format(server, str(inv_files)))
         return None
-    for host in group.get_hosts():
-        if not re.match(r'VM\d+', host.name):   # This must be the test server host
-            return host
+    for hostname in group_hosts[server]:
+        if not re.match(r'VM\d+', hostname):   # This must be the test server host
+            return hostname
     return None
 
 
+def get_test_server_host(inv_files, server):
+    """Get test server ansible host from the 'server' column in testbed file."""
+    hostname = _get_test_server_hostname(inv_files, server)
+    if not hostname:
+        return None
+    return get_inventory_manager(inv_files).get_host(hostname)
+
+
 @cached(
     "test_server_vars",
     zone_getter=zone_getter_factory("server"),
@@ -497,11 +674,11 @@ def get_test_server_vars(inv_files, server):
     Returns:
         dict or None: dict if the host is found, None if the host is not found.
     """
-    host = get_test_server_host(inv_files, server)
-    if not host:
+    hostname = _get_test_server_hostname(inv_files, server)
+    if not hostname:
         logger.error("Unable to find test server host under group {}".format(server))
         return None
-    return host.vars.copy()
+    return get_inventory_snapshot(inv_files)["host_vars"][hostname].copy()
 
 
 @cached(
@@ -32,7 +32,8 @@ from tests.common.devices.k8s import K8sMasterHost
 from tests.common.devices.k8s import K8sMasterCluster
 from tests.common.devices.duthosts import DutHosts
 from tests.common.devices.vmhost import VMHost
-from tests.common.devices.base import NeighborDevice
+from tests.common.devices.base import AnsibleHostBase, NeighborDevice
+from tests.common.devices.ssh_fast_path import log_latency_summary
 from tests.common.devices.cisco import CiscoHost
 from tests.common.fixtures.duthost_utils import backup_and_restore_config_db_session, \
     stop_route_checker_on_duthost, start_route_checker_on_duthost                           # noqa: F401
@@ -174,6 +175,9 @@ def pytest_addoption(parser):
                      help="number of minutes for show techsupport command")
     parser.addoption("--collect_techsupport", action="store", default=True, type=str2bool,
                      help="Enable/Disable tech support collection. Default is enabled (True)")
+    parser.addoption("--ssh_fast_path", action="store_true", default=False,
+                     help="Run 'shell' and 'command' modules without other arguments over a persistent SSH "
+                          "connection instead of the ansible module invocation")
 
     ############################
     #   sanity_check options   #
@@ -311,6 +315,7 @@ def pytest_addoption(parser):
 
 
 def pytest_configure(config):
+    AnsibleHostBase.ssh_fast_path = config.getoption("ssh_fast_path")
     if config.getoption("enable_macsec"):
         topo = config.getoption("topology")
         if topo is not None and "t2" in topo:
@@ -507,6 +512,7 @@ def pytest_sessionstart(session):
 
 
 def pytest_sessionfinish(session, exitstatus):
+    log_latency_summary()
     if session.config.cache.get("duthosts_fixture_failed", None):
         session.config.cache.set("duthosts_fixture_failed", None)
         session.exitstatus = DUTHOSTS_FIXTURE_FAILED_RC
@@ -0,0 +1,13 @@
+"""
+    Pytest configuration used by the fib tests.
+"""
+
+
+def pytest_addoption(parser):
+    fib_group = parser.getgroup("FIB test suite options")
+
+    fib_group.addoption("--hash_batch_mode", action="store_true", default=False,
+                        help="Send the packets of test_hash in bursts and classify the received packets afterwards, "
+                             "instead of sending and verifying the packets one by one")
+    fib_group.addoption("--hash_batch_size", action="store", type=int, default=None,
+                        help="Number of packets sent in a burst in batch mode, capped at the PTF queue length")
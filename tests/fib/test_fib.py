@@ -556,29 +556,35 @@ def test_hash(add_default_route_to_dut, duthosts, tbinfo, setup_vlan,      # noq
         # For t0 topology type with service ports, use ip-proto as hash key cause traffic unbalance issue.
         hash_keys.remove('ip-proto')
 
+    params = {
+        "fib_info_files": fib_files[:3],   # Test at most 3 DUTs
+        "ptf_test_port_map": ptf_test_port_map_active_active(
+            ptfhost, updated_tbinfo, duthosts, mux_server_url,
+            duts_running_config_facts, duts_minigraph_facts,
+            mux_status_from_nic_simulator()
+        ),
+        "hash_keys": hash_keys,
+        "src_ip_range": ",".join(src_ip_range),
+        "dst_ip_range": ",".join(dst_ip_range),
+        "vlan_ids": VLANIDS,
+        "ignore_ttl": ignore_ttl,
+        "single_fib_for_duts": single_fib_for_duts,
+        "switch_type": switch_type,
+        "is_active_active_dualtor": is_active_active_dualtor,
+        "topo_name": updated_tbinfo['topo']['name'],
+        "topo_type": updated_tbinfo['topo']['type']
+    }
+    if request.config.getoption("--hash_batch_mode"):
+        params["batch_mode"] = True
+        if request.config.getoption("--hash_batch_size"):
+            params["batch_size"] = request.config.getoption("--hash_batch_size")
+
     ptf_runner(
         ptfhost,
         "ptftests",
         "hash_test.HashTest",
         platform_dir="ptftests",
-        params={
-            "fib_info_files": fib_files[:3],   # Test at most 3 DUTs
-            "ptf_test_port_map": ptf_test_port_map_active_active(
-                ptfhost, updated_tbinfo, duthosts, mux_server_url,
-                duts_running_config_facts, duts_minigraph_facts,
-                mux_status_from_nic_simulator()
-            ),
-            "hash_keys": hash_keys,
-            "src_ip_range": ",".join(src_ip_range),
-            "dst_ip_range": ",".join(dst_ip_range),
-            "vlan_ids": VLANIDS,
-            "ignore_ttl": ignore_ttl,
-            "single_fib_for_duts": single_fib_for_duts,
-            "switch_type": switch_type,
-            "is_active_active_dualtor": is_active_active_dualtor,
-            "topo_name": updated_tbinfo['topo']['name'],
-            "topo_type": updated_tbinfo['topo']['type']
-        },
+        params=params,
         log_file=log_file,
         qlen=PTF_QLEN,
         socket_recv_size=16384,
@@ -1,13 +1,15 @@
 import asyncio
 
 
+# The commands are awaited with duthost.async_command, which runs them in a thread pool,
+# so success criteria keep being checked while an op command is running.
 async def async_command(duthost, command):
-    return duthost.command(command)
+    return await duthost.async_command(command)
 
 
 async def async_command_ignore_errors(duthost, command):
     try:
-        return duthost.command(command, module_ignore_errors=True)
+        return await duthost.async_command(command, module_ignore_errors=True)
     except Exception:
         return
 
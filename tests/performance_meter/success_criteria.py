@@ -1,3 +1,4 @@
+import inspect
 import logging
 import random
 import statistics
@@ -20,10 +21,14 @@ def get_success_criteria_stats_by_name(name):
         return globals().get(name + "_stats", None)
 
 
+# Checkers can be coroutine functions, so the result of func is awaited if needed.
 def suppress_exception(func):
-    def inner():
+    async def inner():
         try:
-            return func()
+            result = func()
+            if inspect.isawaitable(result):
+                result = await result
+            return result
         except Exception:
             return False
     return inner
@@ -48,6 +53,10 @@ def filter_vars(my_vars, prefix):
 # forever. A delay is to not run the check for said time, default
 # to 0. It is ok to throw exception as it will be handled, but it
 # prints to the console, which could be a lot.
+# The returned function can also be a coroutine function. Checkers running
+# commands on the DUT should be coroutine functions awaiting
+# duthost.async_shell/async_command, so that the op and the other checkers
+# keep running while the command runs.
 
 
 # sample success criteria function, returns True 20% of times.
@@ -155,7 +164,7 @@ def display_variable_stats(passed_op_precheck, **kwargs):
 def bgp_up(duthost, test_result, **kwargs):
     config_facts = duthost.config_facts(host=duthost.hostname, source="running")["ansible_facts"]
     bgp_neighbors = config_facts.get("BGP_NEIGHBOR", {}).keys()
-    return suppress_exception(lambda: duthost.check_bgp_session_state(bgp_neighbors))
+    return suppress_exception(lambda: duthost.async_call(duthost.check_bgp_session_state, bgp_neighbors))
 
 
 def _extract_timestamp(duthost, line):
@@ -181,15 +190,15 @@ def success_criteria_by_syslog(duthost, test_result, **kwargs):
     syslog_end_cmd = kwargs["syslog_end_cmd"]
 
     @suppress_exception
-    def syslog_checker():
+    async def syslog_checker():
         nonlocal syslog_start
         if syslog_start is None:
-            stdout = duthost.shell(syslog_start_cmd)["stdout"]
+            stdout = (await duthost.async_shell(syslog_start_cmd))["stdout"]
             timestamp = _extract_timestamp(duthost, stdout)
             if timestamp > last_timestamp:
                 syslog_start = timestamp
         if syslog_start is not None:
-            stdout = duthost.shell(syslog_end_cmd)["stdout"]
+            stdout = (await duthost.async_shell(syslog_end_cmd))["stdout"]
             timestamp = _extract_timestamp(duthost, stdout)
             if timestamp > syslog_start:
                 test_result[kwargs["result_variable"]] = (timestamp - syslog_start).seconds
@@ -232,9 +241,16 @@ def swss_create_switch_stats(passed_op_precheck, **kwargs):
                   .format(start_time_stats["quantile_result"], kwargs["p100"]))
 
 
+def _meminfo_cmd(item):
+    return "cat /proc/meminfo | grep {} | egrep -o '[0-9]+'".format(item)
+
+
 def read_meminfo(duthost, item):
-    cmd = "cat /proc/meminfo | grep {} | egrep -o '[0-9]+'".format(item)
-    return int(duthost.shell(cmd)["stdout"])
+    return int(duthost.shell(_meminfo_cmd(item))["stdout"])
+
+
+async def async_read_meminfo(duthost, item):
+    return int((await duthost.async_shell(_meminfo_cmd(item)))["stdout"])
 
 
 def startup_mem_usage_after_bgp_up(duthost, test_result, **kwargs):
@@ -242,9 +258,9 @@ def startup_mem_usage_after_bgp_up(duthost, test_result, **kwargs):
     mem_total = read_meminfo(duthost, "MemTotal")
 
     @suppress_exception
-    def checker():
-        if bgp_up_checker():
-            mem_available = read_meminfo(duthost, "MemAvailable")
+    async def checker():
+        if await bgp_up_checker():
+            mem_available = await async_read_meminfo(duthost, "MemAvailable")
             test_result["mem_available"] = mem_available
             test_result["mem_used_perc"] = 1 - mem_available / mem_total
             return True
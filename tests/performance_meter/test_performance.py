@@ -30,14 +30,18 @@ pytestmark = [
 # 3. Run success_criteria, finish some setup and return checker
 #    It doesn't check success_criteria, it only returns the checker
 # 4. Run the first part of op setup until yield is hit
-# 5. Run success criteria check for success criteria every 1 second
+# 5. Run success criteria check for success criteria every 1 second,
+#    all the checkers of the op are run concurrently
 # 6. Run the second part of op cleanup after checker returns True
 # 7. Run sanity_check again
 # 8. Log result and continue to next op
 
 
-async def check_success_criteria(timeout, delay, interval, checker, result):
-    start_time = time.time()
+async def check_success_criteria(timeout, delay, interval, checker, result, start_time=None):
+    # All checkers of an op are timed from the end of the op setup, the checkers
+    # run concurrently as they await DUT commands instead of blocking on them
+    if start_time is None:
+        start_time = time.time()
     result["passed"] = await async_wait_until(timeout=timeout, interval=interval, delay=delay, condition=checker)
     end_time = time.time()
     result["time_to_pass"] = end_time - start_time
@@ -56,7 +60,7 @@ async def run_test_performance_for_op(duthost, call_sanity_check, reorged_test_c
         return single_run_result
 
     # prior to op, prepare for checking success criteria
-    coros = []
+    checks = []
     for path, test_config_under_path in test_config_for_op.items():
         path_test_result = {}
         single_run_result[path] = path_test_result
@@ -71,7 +75,7 @@ async def run_test_performance_for_op(duthost, call_sanity_check, reorged_test_c
             success_criteria = test_config["success_criteria"]
             filtered_vars = filter_vars(test_config, success_criteria)
             checker = get_success_criteria_by_name(success_criteria)(duthost, test_result, **filtered_vars)
-            coros.append(check_success_criteria(timeout, delay, interval, checker, test_result))
+            checks.append((timeout, delay, interval, checker, test_result))
 
     # do the op setup, it can block but should NEVER block forever
     # return True on success, False on fail
@@ -79,10 +83,8 @@ async def run_test_performance_for_op(duthost, call_sanity_check, reorged_test_c
     async with asynccontextmanager(get_op_by_name(op))(duthost) as op_success:
         single_run_result["op_success"] = op_success
         if op_success:
-            await asyncio.gather(*coros)
-        else:
-            for coro in coros:
-                coro.close()
+            start_time = time.time()
+            await asyncio.gather(*[check_success_criteria(*check, start_time=start_time) for check in checks])
 
     # after op finishes cleanup, check that dut is healthy
     single_run_result["op_postcheck_success"] = sanity_check_cleanup(run_index, op)
@@ -15,13 +15,13 @@ from tests.common.platform.device_utils import advanceboot_neighbor_restore  # n
 
 
 from tests.common.fixtures.ptfhost_utils import run_icmp_responder, run_garp_service    # noqa: F401
-from tests.common.dualtor.dual_tor_utils import mux_cable_server_ip, show_muxcable_status
+from tests.common.dualtor.dual_tor_utils import show_muxcable_status
 from tests.common.dualtor.mux_simulator_control import (
     get_mux_status,
     check_mux_status,
     validate_check_result  # noqa: F401
 )
-from tests.common.dualtor.constants import LOWER_TOR
+from tests.common.dualtor.constants import LOWER_TOR, UPPER_TOR
 from tests.common.utilities import wait_until
 
 pytestmark = [
@@ -124,7 +124,7 @@ def test_warm_reboot(request, testing_config, get_advanced_reboot, verify_dut_he
                      duthosts, advanceboot_loganalyzer, consistency_checker_provider,           # noqa: F811
                      capture_interface_counters,
                      toggle_all_simulator_ports, enum_rand_one_per_hwsku_frontend_hostname,     # noqa: F811
-                     toggle_simulator_port_to_upper_tor):                                       # noqa: F811
+                     toggle_simulator_ports):                                                   # noqa: F811
     '''
     Warm reboot test case is run using advacned reboot test fixture
 
@@ -138,11 +138,9 @@ def test_warm_reboot(request, testing_config, get_advanced_reboot, verify_dut_he
         check_result = wait_until(120, 10, 10, check_mux_status, duthosts, LOWER_TOR)
         validate_check_result(check_result, duthosts, get_mux_status)
         mux_list = show_muxcable_status(duthost)
-        toggle_mux_size = len(mux_list) / 2
-        for i in range(toggle_mux_size):
-            itfs, _ = rand_selected_interface(duthost)
-            # Select half of interfaces and toggle to active on upper ToR
-            toggle_simulator_port_to_upper_tor(itfs)
+        # Select half of interfaces and toggle them to active on upper ToR in one request
+        itfs = random.sample(sorted(mux_list.keys()), len(mux_list) // 2)
+        toggle_simulator_ports({itf: UPPER_TOR for itf in itfs})
 
     advancedReboot = get_advanced_reboot(rebootType='warm-reboot',
                                          advanceboot_loganalyzer=advanceboot_loganalyzer,    # noqa: F811
@@ -231,14 +229,6 @@ def test_cancelled_warm_reboot(request, add_fail_step_to_reboot,            # no
     advancedReboot.runRebootTestcase()
 
 
-def rand_selected_interface(tor):
-    """Select a random interface to test."""
-    server_ips = mux_cable_server_ip(tor)
-    iface = str(random.choice(server_ips.keys()))
-    logging.info("select DUT interface %s to test.", iface)
-    return iface, server_ips[iface]
-
-
 def flush_dbs(duthost):
     """
     This Function will flush all unnecessary databases, to mimic reboot from other vendor
@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+"""
+Wait on the DUT until the keys of a SONiC database satisfy a condition.
+
+The script is run on the DUT by tests.common.utilities.wait_for_db_condition. It subscribes to the Redis keyspace
+notifications of the keys and checks the condition whenever the keys change, so it returns as soon as the condition
+holds. If keyspace notifications aren't enabled or the redis python package isn't available, the database is polled
+every interval on the DUT instead.
+
+condition_holds is also used by wait_for_db_condition when the database is polled from the test server, so only the
+standard library is imported at the top of the script.
+
+The result is printed as JSON:
+    {"result": true/false, "mode": "notification" or "poll", "elapsed": seconds, "checks": number of checks,
+     "entries": {key: fields} of the last check, at most MAX_REPORTED_ENTRIES keys}
+"""
+import argparse
+import ast
+import json
+import os
+import subprocess
+import sys
+import time
+
+DATABASE_CONFIG = "/var/run/redis/sonic-db/database_config.json"
+DATABASE_GLOBAL_CONFIG = "/var/run/redis/sonic-db/database_global.json"
+MAX_REPORTED_ENTRIES = 20
+
+
+def fields_match(fields, expected):
+    """
+    Check the fields of a key have the expected values.
+
+    Args:
+        fields: dict of field -> value of the key
+        expected: dict of field -> expected value, or list of accepted values. None accepts absent field.
+    """
+    for field, value in (expected or {}).items():
+        accepted = value if isinstance(value, (list, tuple, set)) else [value]
+        if fields.get(field) not in [v if v is None else str(v) for v in accepted]:
+            return False
+    return True
+
+
+def condition_holds(entries, expected=None, exists=True, match_all=True):
+    """
+    Check the condition on the keys matching the key pattern.
+
+    Args:
+        entries: dict of key -> fields of the keys matching the pattern
+        expected: dict of field -> expected value, see fields_match. None to only check the keys exist.
+        exists: False to check that no key matches the pattern
+        match_all: True if all the keys must have the expected fields, False if any of them
+    """
+    if not exists:
+        return not entries
+    if not entries:
+        return False
+    matches = (fields_match(fields, expected) for fields in entries.values())
+    return all(matches) if match_all else any(matches)
+
+
+def database_config(namespace):
+    path = DATABASE_CONFIG
+    if namespace:
+        with open(DATABASE_GLOBAL_CONFIG) as config_file:
+            includes = json.load(config_file)["INCLUDES"]
+        for include in includes:
+            if include.get("namespace") == namespace:
+                path = os.path.normpath(os.path.join(os.path.dirname(DATABASE_GLOBAL_CONFIG), include["include"]))
+                break
+        else:
+            raise ValueError("Namespace {} not found in {}".format(namespace, DATABASE_GLOBAL_CONFIG))
+    with open(path) as config_file:
+        return json.load(config_file)
+
+
+class RedisReader(object):
+    """Read the database with the redis python package, and subscribe to keyspace notifications of the keys."""
+
+    def __init__(self, db, namespace):
+        import redis
+
+        config = database_config(namespace)
+        database = config["DATABASES"][db]
+        instance = config["INSTANCES"][database["instance"]]
+        self.db_id = database["id"]
+        if instance.get("unix_socket_path"):
+            self.client = redis.Redis(unix_socket_path=instance["unix_socket_path"], db=self.db_id,
+                                      decode_responses=True)
+        else:
+            self.client = redis.Redis(host=instance["hostname"], port=instance["port"], db=self.db_id,
+                                      decode_responses=True)
+        self.response_error = redis.exceptions.ResponseError
+
+    def entries(self, key):
+        result = {}
+        for name in self.client.keys(key):
+            try:
+                result[name] = self.client.hgetall(name)
+            except self.response_error:
+                # Not a hash
+                result[name] = {}
+        return result
+
+    def notifications_enabled(self):
+        try:
+            flags = self.client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+        except self.response_error:
+            return False
+        return "K" in flags and ("A" in flags or ("g" in flags and "h" in flags))
+
+    def subscribe(self, key):
+        pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+        pubsub.psubscribe("__keyspace@{}__:{}".format(self.db_id, key))
+        return pubsub
+
+
+class CliReader(object):
+    """Read the database with sonic-db-cli."""
+
+    def __init__(self, db, namespace):
+        self.cli = ["sonic-db-cli"] + (["-n", namespace] if namespace else []) + [db]
+
+    def entries(self, key):
+        result = {}
+        for name in subprocess.check_output(self.cli + ["KEYS", key]).decode().splitlines():
+            if name:
+                output = subprocess.check_output(self.cli + ["HGETALL", name]).decode().strip()
+                result[name] = ast.literal_eval(output.replace("\n", "\\n")) if output else {}
+        return result
+
+    def notifications_enabled(self):
+        return False
+
+
+def wait(reader, args, expected):
+    start_time = time.time()
+    deadline = start_time + args.timeout
+    # Subscribe before the first check, so that no change is missed between a check and the wait
+    pubsub = reader.subscribe(args.key) if reader.notifications_enabled() else None
+    checks = 0
+    while True:
+        entries = reader.entries(args.key)
+        checks += 1
+        holds = condition_holds(entries, expected, not args.absent, not args.any)
+        remaining = deadline - time.time()
+        if holds or remaining <= 0:
+            break
+        if pubsub is None:
+            time.sleep(min(args.interval, remaining))
+            continue
+        # Check again on a change of the keys, or after the interval in case a notification is lost
+        if pubsub.get_message(timeout=min(args.interval, remaining)) is not None:
+            while pubsub.get_message(timeout=0) is not None:
+                pass
+    if pubsub is not None:
+        pubsub.close()
+    return {
+        "result": holds,
+        "mode": "notification" if pubsub is not None else "poll",
+        "elapsed": time.time() - start_time,
+        "checks": checks,
+        "entries": dict(sorted(entries.items())[:MAX_REPORTED_ENTRIES])
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Wait until the keys of a SONiC database satisfy a condition")
+    parser.add_argument("--db", required=True, help="Database name, e.g. STATE_DB")
+    parser.add_argument("--key", required=True, help="Key or Redis glob pattern of keys")
+    parser.add_argument("--expected", default=None, help="JSON dict of field -> expected value(s)")
+    parser.add_argument("--absent", action="store_true", help="Wait until no key matches")
+    parser.add_argument("--any", action="store_true", help="Any matching key may have the expected fields")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--interval", type=float, default=1)
+    parser.add_argument("--namespace", default=None)
+    args = parser.parse_args()
+    expected = json.loads(args.expected) if args.expected else None
+
+    try:
+        reader = RedisReader(args.db, args.namespace)
+    except ImportError:
+        reader = CliReader(args.db, args.namespace)
+    print(json.dumps(wait(reader, args, expected)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
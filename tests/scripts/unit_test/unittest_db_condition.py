@@ -0,0 +1,118 @@
+import argparse
+import unittest
+
+from tests.scripts.db_condition import condition_holds, fields_match, wait
+
+READY = {"state": "ready", "speed": "100000"}
+NOT_READY = {"state": "init", "speed": "100000"}
+
+
+class TestFieldsMatch(unittest.TestCase):
+    """Test cases for fields_match."""
+
+    def test_no_expected_fields(self):
+        self.assertTrue(fields_match(READY, None))
+        self.assertTrue(fields_match({}, {}))
+
+    def test_expected_value(self):
+        self.assertTrue(fields_match(READY, {"state": "ready"}))
+        self.assertFalse(fields_match(NOT_READY, {"state": "ready"}))
+        self.assertFalse(fields_match(READY, {"state": "ready", "speed": "40000"}))
+
+    def test_expected_value_compared_as_string(self):
+        self.assertTrue(fields_match(READY, {"speed": 100000}))
+
+    def test_list_of_accepted_values(self):
+        self.assertTrue(fields_match(READY, {"state": ["init", "ready"]}))
+        self.assertTrue(fields_match(NOT_READY, {"state": ("init", "ready")}))
+        self.assertFalse(fields_match(READY, {"state": ["init", "down"]}))
+
+    def test_none_accepts_absent_field(self):
+        self.assertTrue(fields_match(READY, {"admin_status": None}))
+        self.assertFalse(fields_match(READY, {"state": None}))
+        self.assertTrue(fields_match(READY, {"admin_status": [None, "up"]}))
+        self.assertTrue(fields_match({"admin_status": "up"}, {"admin_status": [None, "up"]}))
+        self.assertFalse(fields_match({"admin_status": "down"}, {"admin_status": [None, "up"]}))
+
+
+class TestConditionHolds(unittest.TestCase):
+    """Test cases for condition_holds."""
+
+    def test_exists(self):
+        self.assertTrue(condition_holds({"PORT_TABLE|Ethernet0": {}}))
+        self.assertTrue(condition_holds({"PORT_TABLE|Ethernet0": READY}))
+        self.assertFalse(condition_holds({}))
+
+    def test_absent(self):
+        self.assertTrue(condition_holds({}, exists=False))
+        self.assertFalse(condition_holds({"PORT_TABLE|Ethernet0": {}}, exists=False))
+        # Expected fields don't matter if the keys must be absent
+        self.assertFalse(condition_holds({"PORT_TABLE|Ethernet0": NOT_READY}, {"state": "ready"}, exists=False))
+
+    def test_no_keys_with_expected_fields(self):
+        self.assertFalse(condition_holds({}, {"state": "ready"}))
+        self.assertFalse(condition_holds({}, {"state": "ready"}, match_all=False))
+
+    def test_match_all(self):
+        entries = {"PORT_TABLE|Ethernet0": READY, "PORT_TABLE|Ethernet4": NOT_READY}
+        self.assertFalse(condition_holds(entries, {"state": "ready"}))
+        self.assertTrue(condition_holds(entries, {"state": ["ready", "init"]}))
+        self.assertTrue(condition_holds({"PORT_TABLE|Ethernet0": READY, "PORT_TABLE|Ethernet4": READY},
+                                        {"state": "ready"}))
+
+    def test_match_any(self):
+        entries = {"PORT_TABLE|Ethernet0": READY, "PORT_TABLE|Ethernet4": NOT_READY}
+        self.assertTrue(condition_holds(entries, {"state": "ready"}, match_all=False))
+        self.assertFalse(condition_holds(entries, {"state": "down"}, match_all=False))
+
+    def test_none_expected(self):
+        entries = {"PORT_TABLE|Ethernet0": READY, "PORT_TABLE|Ethernet4": {"state": "ready"}}
+        self.assertTrue(condition_holds(entries, None))
+        self.assertTrue(condition_holds(entries, {"speed": [None, "100000"]}))
+        self.assertFalse(condition_holds(entries, {"speed": None}))
+        self.assertTrue(condition_holds(entries, {"speed": None}, match_all=False))
+
+
+class FakeReader(object):
+    """Reader of a database whose keys change on every read, without keyspace notifications."""
+
+    def __init__(self, reads):
+        self.reads = list(reads)
+
+    def entries(self, key):
+        return self.reads.pop(0) if len(self.reads) > 1 else self.reads[0]
+
+    def notifications_enabled(self):
+        return False
+
+
+class TestWait(unittest.TestCase):
+    """Test cases for the poll mode of wait."""
+
+    def args(self, absent=False, timeout=5):
+        return argparse.Namespace(key="PORT_TABLE|*", absent=absent, any=False, timeout=timeout, interval=0.01)
+
+    def test_wait_until_condition_holds(self):
+        reader = FakeReader([{}, {"PORT_TABLE|Ethernet0": NOT_READY}, {"PORT_TABLE|Ethernet0": READY}])
+        result = wait(reader, self.args(), {"state": "ready"})
+        self.assertTrue(result["result"])
+        self.assertEqual(result["mode"], "poll")
+        self.assertEqual(result["checks"], 3)
+        self.assertEqual(result["entries"], {"PORT_TABLE|Ethernet0": READY})
+
+    def test_wait_until_absent(self):
+        reader = FakeReader([{"PORT_TABLE|Ethernet0": READY}, {}])
+        result = wait(reader, self.args(absent=True), None)
+        self.assertTrue(result["result"])
+        self.assertEqual(result["checks"], 2)
+
+    def test_wait_timeout(self):
+        reader = FakeReader([{"PORT_TABLE|Ethernet0": NOT_READY}])
+        result = wait(reader, self.args(timeout=0.1), {"state": "ready"})
+        self.assertFalse(result["result"])
+        self.assertGreaterEqual(result["elapsed"], 0.1)
+        self.assertGreater(result["checks"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()